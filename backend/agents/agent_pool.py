@@ -0,0 +1,105 @@
+import hashlib
+import json
+import threading
+from collections import defaultdict
+from typing import Any, Callable, Dict, List, Tuple
+
+
+def config_key(llm_config: Any) -> str:
+    """模型配置的摘要：字段顺序无关，配置相同的智能体可以复用"""
+    canonical = json.dumps(llm_config, ensure_ascii=False, sort_keys=True, default=str)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()[:16]
+
+
+def _factory_name(factory: Callable[..., Any]) -> str:
+    return f"{getattr(factory, '__module__', '')}.{getattr(factory, '__qualname__', repr(factory))}"
+
+
+class AgentPool:
+    """
+    智能体对象池（线程安全）
+
+    按(智能体类型, 模型配置, 构造选项)缓存已创建的智能体及其模型客户端。评估开始时借出，结束后归还，
+    同一时刻一个智能体只属于一次评估，因此每次评估的状态（用量记录、取消令牌等）可以在借出时绑定，
+    不会与并发的其他评估混在一起。常驻进程中新的评估不再重复创建智能体和客户端。
+    """
+
+    def __init__(self, max_idle_per_key: int = 8):
+        """
+        Args:
+            max_idle_per_key: 每个键最多保留的空闲智能体数，超出的归还对象直接丢弃
+        """
+        self.max_idle_per_key = max_idle_per_key
+        self._lock = threading.Lock()
+        self._idle: Dict[Tuple, List[Any]] = defaultdict(list)
+        self._leased: Dict[int, Tuple] = {}
+        self._created = 0
+        self._reused = 0
+        self._discarded = 0
+
+    def acquire(self, factory: Callable[..., Any], llm_config: Dict[str, Any], **options) -> Any:
+        """
+        借出一个智能体，没有空闲的同类智能体时新建
+
+        Args:
+            factory: 智能体类或工厂函数，以factory(llm_config=..., **options)创建
+            llm_config: 模型配置
+            options: 其他构造选项（如报告生成的sectioned），参与池的键
+
+        Returns:
+            智能体实例
+        """
+        key = (_factory_name(factory), config_key(llm_config), tuple(sorted(options.items())))
+        with self._lock:
+            idle = self._idle.get(key)
+            agent = idle.pop() if idle else None
+            if agent is not None:
+                self._reused += 1
+                self._leased[id(agent)] = key
+                return agent
+
+        agent = factory(llm_config=llm_config, **options)
+        with self._lock:
+            self._created += 1
+            self._leased[id(agent)] = key
+        return agent
+
+    def release(self, agent: Any, discard: bool = False):
+        """
+        归还智能体
+
+        Args:
+            agent: acquire借出的智能体
+            discard: 是否丢弃（如取消评估时已关闭其模型客户端）
+        """
+        with self._lock:
+            key = self._leased.pop(id(agent), None)
+            if key is None:
+                return
+            idle = self._idle[key]
+            if discard or len(idle) >= self.max_idle_per_key:
+                self._discarded += 1
+                return
+            idle.append(agent)
+
+    def stats(self) -> Dict[str, Any]:
+        """创建、复用、丢弃次数，以及各类型的空闲和借出数量"""
+        with self._lock:
+            idle: Dict[str, int] = defaultdict(int)
+            for key, agents in self._idle.items():
+                if agents:
+                    idle[key[0].rsplit(".", 1)[-1]] += len(agents)
+            leased: Dict[str, int] = defaultdict(int)
+            for key in self._leased.values():
+                leased[key[0].rsplit(".", 1)[-1]] += 1
+            return {
+                "created": self._created,
+                "reused": self._reused,
+                "discarded": self._discarded,
+                "idle": dict(idle),
+                "leased": dict(leased),
+            }
+
+
+# 进程级智能体池：未显式传入池的协调器和服务共用
+DEFAULT_AGENT_POOL = AgentPool()
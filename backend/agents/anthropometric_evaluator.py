@@ -1,8 +1,9 @@
-import autogen
+from .llm_client import create_llm_agent, DEFAULT_LLM_BACKEND
+from .deadline import call_with_timeout
 
 class AnthropometricEvaluator:
-    def __init__(self, llm_config):
-        self.agent = autogen.AssistantAgent(
+    def __init__(self, llm_config, llm_backend=DEFAULT_LLM_BACKEND):
+        self.agent = create_llm_agent(
             name="Anthropometric_Evaluator",
             llm_config=llm_config,
             system_message="""
@@ -11,10 +12,17 @@ class AnthropometricEvaluator:
             解读上臂围、皮褶厚度等测量值，以评估脂肪和肌肉储备。
             识别是否满足营养不良的表型标准（如低BMI、体重减轻、肌肉量减少），并量化其严重程度。
             请用中文提供摘要。
-            """
+            """,
+            backend=llm_backend
         )
 
-    def evaluate(self, patient_data):
+    def evaluate(self, patient_data, timeout=None, reference_scores=None, cancel_token=None):
         prompt = f"Evaluate the anthropometric data for the following patient: {patient_data}"
-        response = self.agent.generate_reply(messages=[{"role": "user", "content": prompt}])
+        if reference_scores:
+            prompt += f"\n\n规则计算的营养评分（客观参考，分析结论与之不一致时请说明理由）：\n{reference_scores}"
+        response = call_with_timeout(
+            self.agent.generate_reply, timeout,
+            messages=[{"role": "user", "content": prompt}], stage="Anthropometric_Evaluator",
+            cancel_token=cancel_token
+        )
         return response if isinstance(response, str) else response.get("content", "")
\ No newline at end of file
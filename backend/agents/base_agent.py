@@ -4,6 +4,8 @@ import uuid
 import logging
 from datetime import datetime
 
+from .llm_client import create_llm_agent, DEFAULT_LLM_BACKEND
+
 class BaseAgent(ABC):
     """
     智能体基类，定义统一的接口规范
@@ -11,7 +13,8 @@ class BaseAgent(ABC):
     所有CNA智能体都应继承此基类，确保接口一致性
     """
     
-    def __init__(self, agent_name: str, llm_config: Dict[str, Any], system_message: str):
+    def __init__(self, agent_name: str, llm_config: Dict[str, Any], system_message: str,
+                 llm_backend: str = DEFAULT_LLM_BACKEND):
         """
         初始化基础智能体
         
@@ -19,25 +22,27 @@ class BaseAgent(ABC):
             agent_name: 智能体名称
             llm_config: LLM配置
             system_message: 系统消息
+            llm_backend: 模型调用方式，"autogen" 或 "direct"（直接调用SDK，见llm_client）
         """
         self.agent_name = agent_name
         self.llm_config = llm_config
         self.system_message = system_message
+        self.llm_backend = llm_backend
         self.agent_id = str(uuid.uuid4())
         
         # 设置日志
         self.logger = logging.getLogger(f"CNA.{agent_name}")
         
-        # 初始化autogen agent
+        # 初始化模型调用智能体
         self._initialize_agent()
         
     def _initialize_agent(self):
-        """初始化autogen智能体"""
-        import autogen
-        self.agent = autogen.AssistantAgent(
+        """初始化模型调用智能体（autogen.AssistantAgent或直接调用SDK的DirectAgent）"""
+        self.agent = create_llm_agent(
             name=self.agent_name,
             llm_config=self.llm_config,
-            system_message=self.system_message
+            system_message=self.system_message,
+            backend=self.llm_backend
         )
     
     @abstractmethod
@@ -1,8 +1,9 @@
-import autogen
+from .llm_client import create_llm_agent, DEFAULT_LLM_BACKEND
+from .deadline import call_with_timeout
 
 class BiochemicalInterpreter:
-    def __init__(self, llm_config):
-        self.agent = autogen.AssistantAgent(
+    def __init__(self, llm_config, llm_backend=DEFAULT_LLM_BACKEND):
+        self.agent = create_llm_agent(
             name="Biochemical_Interpreter",
             llm_config=llm_config,
             system_message="""
@@ -11,13 +12,21 @@ class BiochemicalInterpreter:
             评估免疫功能、维生素/矿物质状态和电解质平衡的标志物。
             区分营养不良和炎症引起的低蛋白水平。
             请用中文提供摘要。
-            """
+            """,
+            backend=llm_backend
         )
 
-    def interpret(self, patient_data, clinical_context):
+    def interpret(self, patient_data, clinical_context, timeout=None, reference_scores=None, cancel_token=None):
         prompt = f"""
-        Given the following clinical context: {clinical_context}.
-        Interpret the biochemical lab results for the patient: {patient_data.get('lab_results')}
+        Interpret the biochemical lab results for the patient, taking the clinical context below into account.
+        Lab results: {patient_data.get('lab_results')}
+        Clinical context: {clinical_context}
         """
-        response = self.agent.generate_reply(messages=[{"role": "user", "content": prompt}])
+        if reference_scores:
+            prompt += f"\n\n规则计算的营养评分（客观参考，分析结论与之不一致时请说明理由）：\n{reference_scores}"
+        response = call_with_timeout(
+            self.agent.generate_reply, timeout,
+            messages=[{"role": "user", "content": prompt}], stage="Biochemical_Interpreter",
+            cancel_token=cancel_token
+        )
         return response if isinstance(response, str) else response.get("content", "")
\ No newline at end of file
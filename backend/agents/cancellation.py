@@ -0,0 +1,104 @@
+import threading
+from typing import Callable, List, Optional
+
+
+class AssessmentCancelledError(Exception):
+    """评估已被取消（客户端断开或显式取消）"""
+
+    def __init__(self, stage: Optional[str] = None, reason: Optional[str] = None):
+        self.stage = stage
+        self.reason = reason
+        where = f"（阶段 {stage}）" if stage else ""
+        super().__init__(f"评估已取消{where}：{reason or '未说明原因'}")
+
+
+class CancellationToken:
+    """
+    协作式取消令牌（线程安全）
+
+    由调用方持有并在客户端断开或显式取消时调用cancel()；评估流程在启动每个阶段和每次模型调用前检查令牌，
+    等待中的模型调用在取消后立即返回控制权。cancel()只能生效一次，之后的调用被忽略。
+    """
+
+    def __init__(self):
+        self._event = threading.Event()
+        self._lock = threading.Lock()
+        self._callbacks: List[Callable[[], None]] = []
+        self.reason: Optional[str] = None
+
+    @property
+    def cancelled(self) -> bool:
+        return self._event.is_set()
+
+    def cancel(self, reason: str = "cancelled"):
+        """
+        取消并执行已注册的回调（如关闭可中断的模型请求）
+
+        Args:
+            reason: 取消原因，写入追溯记录
+        """
+        with self._lock:
+            if self._event.is_set():
+                return
+            self.reason = reason
+            self._event.set()
+            callbacks, self._callbacks = self._callbacks, []
+        for callback in callbacks:
+            try:
+                callback()
+            except Exception:
+                pass
+
+    def on_cancel(self, callback: Callable[[], None]) -> Callable[[], None]:
+        """
+        注册取消回调，已取消时立即执行
+
+        Returns:
+            注销该回调的函数，调用结束后应注销以免持有已完成的请求
+        """
+        with self._lock:
+            if not self._event.is_set():
+                self._callbacks.append(callback)
+                return lambda: self._remove(callback)
+        callback()
+        return lambda: None
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """等待取消，返回是否已取消"""
+        return self._event.wait(timeout)
+
+    def raise_if_cancelled(self, stage: Optional[str] = None):
+        """
+        Raises:
+            AssessmentCancelledError: 已取消
+        """
+        if self._event.is_set():
+            raise AssessmentCancelledError(stage, self.reason)
+
+    def _remove(self, callback):
+        with self._lock:
+            if callback in self._callbacks:
+                self._callbacks.remove(callback)
+
+
+def close_agent_clients(agent) -> int:
+    """
+    关闭autogen智能体底层OpenAI兼容客户端的连接，进行中的请求随之中断
+
+    只有OpenAI兼容接口（DeepSeek、本地模拟服务）的客户端支持从其他线程中断；
+    其他客户端（如Gemini）没有可关闭的连接，调用在守护线程中继续直到返回，结果被丢弃。
+
+    Returns:
+        关闭的客户端数量
+    """
+    wrapper = getattr(agent, "client", None)
+    closed = 0
+    for client in getattr(wrapper, "_clients", None) or []:
+        close = getattr(getattr(client, "_oai_client", None), "close", None)
+        if callable(close):
+            try:
+                close()
+                closed += 1
+            except Exception:
+                pass
+    return closed
@@ -0,0 +1,150 @@
+import json
+import os
+import re
+import threading
+from datetime import datetime
+from typing import Any, Dict, Optional
+
+
+# 检查点状态：running（评估中或进程中断）-> completed、failed 或 cancelled
+CHECKPOINT_STATUSES = ("running", "completed", "failed", "cancelled")
+
+_SESSION_ID_PATTERN = re.compile(r"^[A-Za-z0-9_-]+$")
+
+
+class CheckpointStore:
+    """
+    评估阶段检查点的本地存储（线程安全）
+
+    每个session_id对应目录下的一个JSON文件，包含原始请求、图像整合后的患者数据、
+    已完成阶段的结果和追溯记录。每个阶段完成后立即原子写入，进程中断时最多丢失正在执行的阶段。
+    """
+
+    def __init__(self, directory: str):
+        """
+        Args:
+            directory: 检查点文件目录
+        """
+        self.directory = directory
+        self._lock = threading.Lock()
+        self._states: Dict[str, Dict[str, Any]] = {}  # 评估中的会话，结束后从内存移除
+
+    def path_for(self, session_id: str) -> str:
+        if not _SESSION_ID_PATTERN.match(session_id or ""):
+            raise ValueError(f"Invalid session_id: {session_id}")
+        return os.path.join(self.directory, f"{session_id}.json")
+
+    def begin(self, session_id: str, request: Any):
+        """
+        创建会话的检查点
+
+        Args:
+            session_id: 协调器的session_id
+            request: 原始评估请求，恢复时据此重新创建协调器
+        """
+        now = datetime.now().isoformat()
+        with self._lock:
+            self._states[session_id] = {
+                "session_id": session_id,
+                "status": "running",
+                "created_at": now,
+                "updated_at": now,
+                "request": request,
+                "patient_data": None,
+                "stages": {},
+                "step_trace_ids": {},
+                "missing_sections": [],
+                "trace": {},
+            }
+            self._save(session_id)
+
+    def save_stage(self, session_id: str, stage: str, result: Any, **fields):
+        """
+        记录一个已完成阶段的结果
+
+        Args:
+            session_id: 会话ID
+            stage: 阶段名称
+            result: 阶段结果
+            fields: 同时更新的顶层字段（如missing_sections、patient_data）
+        """
+        with self._lock:
+            state = self._state(session_id)
+            if state is None:
+                return
+            state["stages"][stage] = {"result": result, "completed_at": datetime.now().isoformat()}
+            state.update(fields)
+            self._save(session_id)
+
+    def save_trace(self, session_id: str, trace_id: str, record: Dict[str, Any], **fields):
+        """记录一条追溯记录，fields为同时更新的顶层字段"""
+        with self._lock:
+            state = self._state(session_id)
+            if state is None:
+                return
+            state["trace"][trace_id] = record
+            state.update(fields)
+            self._save(session_id)
+
+    def finish(self, session_id: str, status: str):
+        """标记评估结束；之后仍可加载，用于恢复失败的评估或重新取回已完成评估的结果"""
+        with self._lock:
+            state = self._state(session_id)
+            if state is None:
+                return
+            state["status"] = status
+            self._save(session_id)
+            self._states.pop(session_id, None)
+
+    def load(self, session_id: str) -> Optional[Dict[str, Any]]:
+        """
+        加载会话的检查点
+
+        Returns:
+            检查点内容，不存在时返回None
+
+        Raises:
+            ValueError: session_id格式无效
+        """
+        path = self.path_for(session_id)
+        with self._lock:
+            if session_id in self._states:
+                return json.loads(json.dumps(self._states[session_id], ensure_ascii=False, default=str))
+            if not os.path.exists(path):
+                return None
+            with open(path, "r", encoding="utf-8") as f:
+                return json.load(f)
+
+    def resume(self, session_id: str) -> Dict[str, Any]:
+        """
+        重新打开会话的检查点用于继续评估
+
+        Returns:
+            检查点内容
+
+        Raises:
+            ValueError: 检查点不存在或session_id格式无效
+        """
+        checkpoint = self.load(session_id)
+        if checkpoint is None:
+            raise ValueError(f"No checkpoint found for session_id: {session_id}")
+        checkpoint["status"] = "running"
+        with self._lock:
+            self._states[session_id] = checkpoint
+            self._save(session_id)
+        return json.loads(json.dumps(checkpoint, ensure_ascii=False, default=str))
+
+    def _state(self, session_id: str) -> Optional[Dict[str, Any]]:
+        """评估中的会话状态（调用方持有锁）"""
+        return self._states.get(session_id)
+
+    def _save(self, session_id: str):
+        """原子写入检查点文件（调用方持有锁）"""
+        state = self._states[session_id]
+        state["updated_at"] = datetime.now().isoformat()
+        path = self.path_for(session_id)
+        os.makedirs(self.directory, exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(state, f, ensure_ascii=False, default=str)
+        os.replace(tmp_path, path)
@@ -1,8 +1,9 @@
-import autogen
+from .llm_client import create_llm_agent, DEFAULT_LLM_BACKEND
+from .deadline import call_with_timeout
 
 class ClinicalContextAnalyzer:
-    def __init__(self, llm_config):
-        self.agent = autogen.AssistantAgent(
+    def __init__(self, llm_config, llm_backend=DEFAULT_LLM_BACKEND):
+        self.agent = create_llm_agent(
             name="Clinical_Context_Analyzer",
             llm_config=llm_config,
             system_message="""
@@ -10,14 +11,21 @@ class ClinicalContextAnalyzer:
             请用中文分析主要诊断、合并症、严重程度和当前治疗。
             识别与疾病相关的潜在营养影响，如高代谢、炎症、吸收不良或器官功能障碍。
             提供一份关于临床背景和潜在营养不良病因的中文摘要。
-            """
+            """,
+            backend=llm_backend
         )
 
-    def analyze(self, patient_data):
+    def analyze(self, patient_data, timeout=None, reference_scores=None, cancel_token=None):
         # In a real scenario, you would craft a detailed prompt based on patient_data
         prompt = f"Analyze the clinical context for the following patient data: {patient_data}"
         
         # This is a simplified interaction. A real implementation might use a UserProxyAgent.
-        response = self.agent.generate_reply(messages=[{"role": "user", "content": prompt}])
+        if reference_scores:
+            prompt += f"\n\n规则计算的营养评分（客观参考，分析结论与之不一致时请说明理由）：\n{reference_scores}"
+        response = call_with_timeout(
+            self.agent.generate_reply, timeout,
+            messages=[{"role": "user", "content": prompt}], stage="Clinical_Context_Analyzer",
+            cancel_token=cancel_token
+        )
         # Extract the string content from the response
         return response if isinstance(response, str) else response.get("content", "")
\ No newline at end of file
@@ -82,7 +82,13 @@ class ClinicalContextAnalyzerV2(BaseAgent):
     def _build_analysis_prompt(self, diagnoses: list, symptoms: dict, consultation: dict, lab_results: dict) -> str:
         """构建分析提示"""
         prompt = f"""
-        请分析以下患者的临床背景及其对营养状态的影响：
+        请分析以下患者的临床背景及其对营养状态的影响，并提供：
+        1. 临床背景对营养状态的影响分析
+        2. 疾病相关的代谢状态评估（高代谢/正常/低代谢）
+        3. 炎症水平评估（基于可用指标）
+        4. 器官功能对营养的影响
+        5. 潜在的营养不良病因因素（GLIM标准）
+        6. 营养风险评估
 
         ## 诊断信息：
         {self._format_diagnoses(diagnoses)}
@@ -96,14 +102,6 @@ class ClinicalContextAnalyzerV2(BaseAgent):
 
         ## 实验室指标（炎症相关）：
         {self._format_lab_results(lab_results)}
-
-        请提供：
-        1. 临床背景对营养状态的影响分析
-        2. 疾病相关的代谢状态评估（高代谢/正常/低代谢）
-        3. 炎症水平评估（基于可用指标）
-        4. 器官功能对营养的影响
-        5. 潜在的营养不良病因因素（GLIM标准）
-        6. 营养风险评估
         """
         return prompt
     
@@ -1,16 +1,101 @@
 import sys
 import uuid
 import json
-from typing import Dict, Any, List, Optional
+from typing import Dict, Any, List, Optional, Callable
 from datetime import datetime
 
-import autogen
 from .clinical_context_analyzer import ClinicalContextAnalyzer
 from .anthropometric_evaluator import AnthropometricEvaluator
 from .biochemical_interpreter import BiochemicalInterpreter
 from .dietary_assessor import DietaryAssessor
 from .diagnostic_reporter import DiagnosticReporter
 from .image_recognizer import ImageRecognizer
+from .fast_triage_assessor import FastTriageAssessor, ANALYSIS_FIELDS
+from .deadline import (
+    AssessmentDeadline, StageTimeoutError, call_with_timeout, call_in_progress,
+    NON_CRITICAL_STAGES, STAGE_LABELS
+)
+from .llm_usage import UsageRecorder, instrument_agent
+from .cancellation import CancellationToken, AssessmentCancelledError, close_agent_clients
+from .checkpoint_store import CheckpointStore
+from .agent_pool import AgentPool, DEFAULT_AGENT_POOL
+from .llm_client import create_llm_agent, normalize_backend, DEFAULT_LLM_BACKEND
+from .result_distiller import distill_intermediate_results
+from .nutrition_scoring import score_patient, format_scores_for_prompt, prescreen_patient
+from .json_extraction import extract_json
+
+
+# 冲突检测的固定指令（不含任何患者数据，作为提示的静态前缀，便于模型服务端的前缀缓存）
+CONFLICT_DETECTION_INSTRUCTIONS = """请分析提示末尾给出的CNA系统各智能体的评估结果，检测是否存在**严重的逻辑冲突**导致无法生成可靠的评估报告。
+
+重要说明：
+- 只有**严重的、根本性的矛盾**才应该终止评估（proceed_to_final_report设为false）
+- 轻微的数值差异（如体重下降百分比相差1-2%）、不同表述方式、数据不完整等情况不应终止评估
+- 这些轻微问题可以在conflicts_detected和recommendations中记录，但应设置proceed_to_final_report为true
+- 医学评估允许一定程度的解读差异，这是正常的
+
+严重冲突的例子（才应该终止评估）：
+- 一个智能体判断为营养不良，另一个判断为营养良好（完全相反的结论）
+- 能量需求计算相差超过50%
+- 关键指标解读完全相反且无法调和
+
+请用中文回复，格式为JSON：
+{
+    "has_conflicts": true/false,
+    "conflicts_detected": ["具体冲突描述（仅记录，不一定终止）"],
+    "data_quality_issues": ["数据质量问题（仅记录，不一定终止）"],
+    "recommendations": ["改进建议"],
+    "proceed_to_final_report": true/false  (只有严重冲突时才设为false，轻微问题仍设为true)
+}
+
+以下是各智能体的评估结果：
+"""
+
+# 预筛查判定为低风险时返回的模板报告（不调用任何模型）
+LOW_RISK_REPORT_TEMPLATE = """患者基本情况摘要
+本次为规则预筛查结果，未进行完整的多智能体营养评估。BMI：{bmi}，主要诊断：{diagnoses}。
+
+营养风险等级
+低风险。{reason}。
+
+关键评估发现
+{scores}
+
+营养干预措施
+维持当前饮食，每日能量{energy}、蛋白质{protein}。按常规每周复评营养风险，病情变化、体重下降或进食减少时请重新进行完整评估。"""
+
+# 评估模式：standard为四个分析智能体+冲突检测+报告；fast为一次融合分析+报告；triage只做一次融合分析并返回分诊结论
+ASSESSMENT_PROFILES = ("standard", "fast", "triage")
+
+COORDINATOR_SYSTEM_MESSAGE = """
+            你是CNA系统的中央协调器，负责整个营养评估流程的质量控制和决策管理。
+
+            核心职责：
+            1. 深度分析数据质量和完整性，识别关键缺失信息
+            2. 运用医学知识检测智能体结果间的逻辑冲突和不一致
+            3. 智能决策评估流程控制：是否需要重新分析、补充数据或终止评估
+            4. 生成专业的协调决策解释和质量保证说明
+            5. 确保最终报告的医学准确性和逻辑一致性
+
+            专业要求：
+            - 具备营养学和临床医学知识背景
+            - 运用批判性思维进行深度分析
+            - 提供循证医学支持的决策建议
+            - 保持最高标准的质量控制
+            - 用专业、清晰的中文进行分析和解释
+
+            作为中央协调器，你的决策直接影响整个CNA系统的可靠性和准确性。
+            """
+
+
+def create_coordinator_agent(llm_config: Dict[str, Any], llm_backend: str = DEFAULT_LLM_BACKEND):
+    """创建协调器自身的智能体（冲突检测），供智能体池调用"""
+    return create_llm_agent(
+        name="CNA_Coordinator",
+        llm_config=llm_config,
+        system_message=COORDINATOR_SYSTEM_MESSAGE,
+        backend=llm_backend
+    )
 
 
 class CNA_Coordinator:
@@ -28,7 +113,16 @@ class CNA_Coordinator:
     
     def __init__(self, patient_data: Dict[str, Any], llm_config_coordinator: Dict, llm_config_analysis: Dict,
                  llm_config_reporter: Dict, image_data: Optional[Dict[str, Any]] = None,
-                 model_series: str = "gemini"):
+                 model_series: str = "gemini", deadline_seconds: Optional[float] = None,
+                 digest_max_chars: Optional[int] = None, sectioned_report: bool = False,
+                 assessment_profile: str = "standard", prescreen_threshold: Optional[float] = None,
+                 stage_callback: Optional[Callable[[str, Any], None]] = None,
+                 cancel_token: Optional[CancellationToken] = None,
+                 checkpoint_store: Optional[CheckpointStore] = None,
+                 agent_pool: Optional[AgentPool] = None,
+                 llm_backend: str = DEFAULT_LLM_BACKEND,
+                 stream_extraction: bool = False,
+                 section_callback: Optional[Callable[[str, str, Any], None]] = None):
         """
         初始化CNA协调器
 
@@ -39,61 +133,112 @@ class CNA_Coordinator:
             llm_config_reporter: 报告生成模型配置（Gemini Flash Preview 或 DeepSeek Reasoner）
             image_data: 可选的图像数据（包含images或file_paths）
             model_series: 模型系列选择 ("gemini" 或 "deepseek")
+            deadline_seconds: 可选的整个评估总时限（秒），按阶段拆分为时间预算传递给每次LLM调用
+            digest_max_chars: 可选的中间结果摘要长度上限，设置后冲突检测和报告生成使用摘要而非完整文本
+            sectioned_report: 是否分部分并行生成最终报告
+            assessment_profile: 评估模式 ("standard"、"fast" 或 "triage")
+            prescreen_threshold: 可选的预筛查风险评分阈值，低于该值且无异常标准的患者直接返回低风险结果
+            stage_callback: 可选的阶段完成回调，参数为(阶段名称, 阶段结果)，用于异步任务汇报进度
+            cancel_token: 可选的取消令牌，客户端断开或显式取消时由调用方触发；缺省时创建新令牌，可通过cancel()取消
+            checkpoint_store: 可选的检查点存储，每个阶段完成后立即写入结果和追溯记录，用于中断后恢复
+            agent_pool: 可选的智能体池，缺省使用进程级的池；评估结束后智能体归还到池中供下一次评估复用
+            llm_backend: 模型调用方式，"autogen"（默认）或 "direct"（直接调用Gemini/OpenAI兼容SDK）
+            stream_extraction: 是否流式接收图像识别的模型输出，边接收边解析
+            section_callback: 可选的字段回调，参数为(阶段名称, 字段路径, 字段值)，图像识别结果中的顶层字段
+                （如image_1.diagnoses）一解析完即通知，不必等待整张图像识别结束
         """
         self.patient_data = patient_data
         self.image_data = image_data
         self.image_recognition_results = None
+        self.nutrition_scores = None  # 规则计算的NRS2002/GLIM/需要量
+        self.reference_scores = None  # 评分摘要，注入各智能体和冲突检测的提示
         self.intermediate_results = {}
         self.data_trace = {}  # 数据追溯映射
         self.session_id = str(uuid.uuid4())
         self.start_time = datetime.now()
         self.model_series = model_series
+        self.missing_sections = []  # 因超时未完成的非关键阶段
+        self.digest_max_chars = digest_max_chars
+        self.prescreen_threshold = prescreen_threshold
+        self.stage_callback = stage_callback
+        self.stream_extraction = stream_extraction
+        self.section_callback = section_callback
+        self.cancel_token = cancel_token or CancellationToken()
+        self.checkpoint_store = checkpoint_store
+        self._step_trace_ids: Dict[str, str] = {}  # 步骤名称 -> 追溯ID，写入检查点以便恢复后沿用
+        self._restored_stages: Dict[str, Dict[str, Any]] = {}  # 从检查点恢复的已完成阶段
+        self._restored_trace_ids = set()
+        if assessment_profile not in ASSESSMENT_PROFILES:
+            print(f"未知的评估模式 {assessment_profile}，使用standard", file=sys.stderr)
+            assessment_profile = "standard"
+        self.assessment_profile = assessment_profile
+
+        # 端到端截止时间：每个阶段开始时按剩余时间和阶段权重分配预算
+        if assessment_profile == "standard":
+            stages = ["clinical_context", "anthropometric_evaluation", "biochemical_interpretation",
+                      "dietary_assessment", "conflict_analysis", "final_report"]
+        elif assessment_profile == "fast":
+            stages = ["fast_triage", "final_report"]
+        else:
+            stages = ["fast_triage"]
+        if image_data:
+            stages.insert(0, "image_recognition")
+        self.deadline = AssessmentDeadline(deadline_seconds, stages)
 
         # CNA_Coordinator使用协调器模型进行协调和管理任务
         # Gemini: gemini-2.5-flash-preview-09-2025
         # DeepSeek: deepseek-chat
         self.llm_config = llm_config_coordinator
-        self.agent = autogen.AssistantAgent(
-            name="CNA_Coordinator",
-            llm_config=llm_config_coordinator,
-            system_message="""
-            你是CNA系统的中央协调器，负责整个营养评估流程的质量控制和决策管理。
-
-            核心职责：
-            1. 深度分析数据质量和完整性，识别关键缺失信息
-            2. 运用医学知识检测智能体结果间的逻辑冲突和不一致
-            3. 智能决策评估流程控制：是否需要重新分析、补充数据或终止评估
-            4. 生成专业的协调决策解释和质量保证说明
-            5. 确保最终报告的医学准确性和逻辑一致性
-
-            专业要求：
-            - 具备营养学和临床医学知识背景
-            - 运用批判性思维进行深度分析
-            - 提供循证医学支持的决策建议
-            - 保持最高标准的质量控制
-            - 用专业、清晰的中文进行分析和解释
+        self.agent_pool = agent_pool or DEFAULT_AGENT_POOL
+        self.llm_backend = normalize_backend(llm_backend)
+        self._pooled_agents = []
+        self._clients_closed = False
+        # 记录每次模型调用的token用量和前缀缓存命中数
+        self.usage_recorder = UsageRecorder()
+        self._llm_agents = []
+        # 中途构造失败时归还已借出的智能体，否则它们一直留在池的借出表中
+        try:
+            self.agent = self._acquire(create_coordinator_agent, llm_config_coordinator, llm_backend=self.llm_backend)
 
-            作为中央协调器，你的决策直接影响整个CNA系统的可靠性和准确性。
-            """
-        )
+            # 初始化专门智能体 - 使用中间分析模型
+            # Gemini: gemini-2.5-flash
+            # DeepSeek: deepseek-chat
+            # 快速模式用一次融合分析代替四个分析智能体
+            print(f"使用 {model_series.upper()} 系列模型初始化中间分析智能体", file=sys.stderr)
+            if assessment_profile == "standard":
+                self.clinical_analyzer = self._acquire(ClinicalContextAnalyzer, llm_config_analysis, llm_backend=self.llm_backend)
+                self.anthropometric_evaluator = self._acquire(AnthropometricEvaluator, llm_config_analysis, llm_backend=self.llm_backend)
+                self.biochemical_interpreter = self._acquire(BiochemicalInterpreter, llm_config_analysis, llm_backend=self.llm_backend)
+                self.dietary_assessor = self._acquire(DietaryAssessor, llm_config_analysis, llm_backend=self.llm_backend)
+                analysis_agents = [("clinical_context", self.clinical_analyzer.agent),
+                                   ("anthropometric_evaluation", self.anthropometric_evaluator.agent),
+                                   ("biochemical_interpretation", self.biochemical_interpreter.agent),
+                                   ("dietary_assessment", self.dietary_assessor.agent)]
+            else:
+                self.fast_triage_assessor = self._acquire(FastTriageAssessor, llm_config_analysis, llm_backend=self.llm_backend)
+                analysis_agents = [("fast_triage", self.fast_triage_assessor.agent)]
 
-        # 初始化专门智能体 - 使用中间分析模型
-        # Gemini: gemini-2.5-flash
-        # DeepSeek: deepseek-chat
-        print(f"使用 {model_series.upper()} 系列模型初始化中间分析智能体", file=sys.stderr)
-        self.clinical_analyzer = ClinicalContextAnalyzer(llm_config=llm_config_analysis)
-        self.anthropometric_evaluator = AnthropometricEvaluator(llm_config=llm_config_analysis)
-        self.biochemical_interpreter = BiochemicalInterpreter(llm_config=llm_config_analysis)
-        self.dietary_assessor = DietaryAssessor(llm_config=llm_config_analysis)
+            # 初始化报告生成智能体
+            # Gemini: gemini-2.5-flash-preview-09-2025
+            # DeepSeek: deepseek-reasoner
+            print(f"使用 {model_series.upper()} 系列模型初始化报告生成智能体", file=sys.stderr)
+            self.diagnostic_reporter = self._acquire(DiagnosticReporter, llm_config_reporter, sectioned=sectioned_report, llm_backend=self.llm_backend)
 
-        # 初始化报告生成智能体
-        # Gemini: gemini-2.5-flash-preview-09-2025
-        # DeepSeek: deepseek-reasoner
-        print(f"使用 {model_series.upper()} 系列模型初始化报告生成智能体", file=sys.stderr)
-        self.diagnostic_reporter = DiagnosticReporter(llm_config=llm_config_reporter)
+            # 图像识别始终使用分析模型，只在提供了图像时借出
+            self.image_recognizer = self._acquire(ImageRecognizer, llm_config_analysis) if image_data else None
 
-        # 图像识别始终使用分析模型
-        self.image_recognizer = ImageRecognizer(llm_config=llm_config_analysis)
+            # 复用的智能体在这里绑定到本次评估的用量记录器
+            for stage, agent in [("conflict_analysis", self.agent), *analysis_agents,
+                                 ("final_report", self.diagnostic_reporter.agent),
+                                 *[("final_report", a) for a in self.diagnostic_reporter.section_agents.values()]]:
+                instrument_agent(agent, stage, self.usage_recorder)
+                self._llm_agents.append(agent)
+        except BaseException:
+            self.release_agents()
+            raise
+        
+        # 取消时中断各智能体进行中的模型请求（客户端支持时）
+        self.cancel_token.on_cancel(self._abort_provider_calls)
         
         # 验证数据完整性
         self.validation_results = self._validate_data()
@@ -158,6 +303,22 @@ class CNA_Coordinator:
         trace_id = f"{agent_name}_{data_type}_{uuid.uuid4().hex[:8]}"
         return trace_id
     
+    def _stage_trace_id(self, step: str, agent_name: str, data_type: str) -> str:
+        """
+        获取评估步骤的追溯ID：从检查点恢复的步骤沿用原ID，否则生成新ID
+        
+        Args:
+            step: 步骤名称（如clinical_context、nutrition_scores）
+            agent_name: 智能体名称
+            data_type: 数据类型
+            
+        Returns:
+            追溯ID
+        """
+        if step not in self._step_trace_ids:
+            self._step_trace_ids[step] = self._generate_trace_id(agent_name, data_type)
+        return self._step_trace_ids[step]
+    
     def _add_trace_record(self, trace_id: str, agent_name: str, input_data: Any, output_data: Any, dependencies: List[str] = None):
         """
         添加数据追溯记录
@@ -169,6 +330,9 @@ class CNA_Coordinator:
             output_data: 输出数据
             dependencies: 依赖的其他追溯ID
         """
+        # 从检查点恢复的记录保持原样
+        if trace_id in self._restored_trace_ids:
+            return
         self.data_trace[trace_id] = {
             "agent": agent_name,
             "timestamp": datetime.now().isoformat(),
@@ -177,14 +341,173 @@ class CNA_Coordinator:
             "dependencies": dependencies or [],
             "session_id": self.session_id
         }
+        self._checkpoint("save_trace", trace_id, self.data_trace[trace_id], step_trace_ids=self._step_trace_ids)
+    
+    def _checkpoint(self, method: str, *args, **kwargs):
+        """写入检查点，写入失败只记录日志，不影响评估"""
+        if self.checkpoint_store is None:
+            return
+        try:
+            getattr(self.checkpoint_store, method)(self.session_id, *args, **kwargs)
+        except Exception as e:
+            print(f"写入检查点失败（{method}）: {e}", file=sys.stderr)
+    
+    def restore_checkpoint(self, checkpoint: Dict[str, Any]):
+        """
+        从检查点恢复已完成的阶段，之后调用run_assessment从第一个未完成的阶段继续
+        
+        恢复的阶段直接使用检查点中的结果，不再调用模型；追溯记录沿用原来的ID。
+        因超时记为缺失部分的阶段及其之后的阶段不算已完成，继续评估时重新执行（图像识别除外：
+        其结果已整合进检查点中的患者数据，未超时的图像结果照常使用）。
+        
+        Args:
+            checkpoint: CheckpointStore中的检查点内容
+        """
+        self.session_id = checkpoint["session_id"]
+        if checkpoint.get("patient_data") is not None:
+            self.patient_data = checkpoint["patient_data"]
+            self.validation_results = self._validate_data()
+        self.data_trace.update(checkpoint.get("trace", {}))
+        self._restored_trace_ids = set(checkpoint.get("trace", {}))
+        self._step_trace_ids.update(checkpoint.get("step_trace_ids", {}))
+        missing_sections = checkpoint.get("missing_sections", [])
+        rerun = [self.deadline.stages.index(stage) for stage in missing_sections
+                 if stage != "image_recognition" and stage in self.deadline.stages]
+        # 冲突检测和报告等后续阶段使用了缺失阶段的替代结果，同样重新执行
+        first_rerun = min(rerun, default=len(self.deadline.stages))
+        self._restored_stages = {
+            stage: saved for stage, saved in checkpoint.get("stages", {}).items()
+            if stage not in self.deadline.stages[first_rerun:]
+        }
+        self.missing_sections = [stage for stage in missing_sections if stage in self._restored_stages]
+        print(f"从检查点恢复评估 {self.session_id}，已完成阶段: {list(self._restored_stages)}", file=sys.stderr)
+        
+    def _run_stage(self, stage: str, func, *args, fallback: Any = None, **kwargs) -> Any:
+        """
+        在阶段时间预算内执行一个评估阶段
+        
+        非关键阶段超时后记录为缺失部分并返回fallback，关键阶段超时则向上抛出异常。
+        只有正常完成的阶段写入检查点，超时的阶段在继续评估时重新执行。
+        
+        Args:
+            stage: 阶段名称
+            func: 阶段执行函数，需接受timeout关键字参数
+            fallback: 非关键阶段超时时的替代结果
+            
+        Returns:
+            阶段结果或fallback
+            
+        Raises:
+            AssessmentCancelledError: 评估已取消，不再启动该阶段或该阶段被中断
+        """
+        self.cancel_token.raise_if_cancelled(stage)
+        if stage in self._restored_stages:
+            result = self._restored_stages[stage]["result"]
+            self.deadline.complete(stage)
+            self._notify_stage(stage, result)
+            return result
+        
+        budget = self.deadline.budget_for(stage)
+        try:
+            result = func(*args, timeout=budget, cancel_token=self.cancel_token, **kwargs)
+        except StageTimeoutError:
+            if stage not in NON_CRITICAL_STAGES:
+                raise
+            print(f"阶段 {stage} 超出时间预算，标记为缺失部分继续评估", file=sys.stderr)
+            self.missing_sections.append(stage)
+            result = fallback
+        finally:
+            self.deadline.complete(stage)
+        if stage not in self.missing_sections:
+            self._checkpoint("save_stage", stage, result, missing_sections=self.missing_sections)
+        self._notify_stage(stage, result)
+        return result
+    
+    def _acquire(self, factory, llm_config: Dict[str, Any], **options):
+        """从智能体池借出智能体，评估结束时统一归还"""
+        agent = self.agent_pool.acquire(factory, llm_config, **options)
+        self._pooled_agents.append(agent)
+        return agent
+    
+    def release_agents(self):
+        """
+        归还借出的智能体
+
+        模型客户端已因取消而关闭的智能体，以及超时或取消后调用仍在后台进行的智能体不再复用：
+        后者被下一次评估借出时会与进行中的调用共用客户端，且进行中调用的用量会记到新的评估上。
+        """
+        agents, self._pooled_agents = self._pooled_agents, []
+        # autogen智能体在连续自动回复达到上限（默认100次）后generate_reply返回None，复用前清零计数
+        for agent in self._llm_agents:
+            reset = getattr(agent, "reset_consecutive_auto_reply_counter", None)
+            if reset is not None:
+                reset()
+        for agent in agents:
+            self.agent_pool.release(agent, discard=self._clients_closed or self._agent_busy(agent))
+    
+    @staticmethod
+    def _agent_busy(agent) -> bool:
+        """借出的智能体（或其内部的autogen智能体、分部分报告的子智能体）是否还有进行中的调用"""
+        section_agents = getattr(agent, "section_agents", None) or {}
+        return any(
+            call_in_progress(owner)
+            for owner in (agent, getattr(agent, "agent", None), *section_agents.values())
+            if owner is not None
+        )
+    
+    def cancel(self, reason: str = "cancelled"):
+        """取消评估：不再启动新的阶段，进行中的模型调用立即返回"""
+        self.cancel_token.cancel(reason)
+    
+    def _abort_provider_calls(self):
+        closed = sum(close_agent_clients(agent) for agent in self._llm_agents)
+        self._clients_closed = closed > 0
+        print(f"评估 {self.session_id} 已取消（{self.cancel_token.reason}），中断 {closed} 个模型客户端连接", file=sys.stderr)
+    
+    def _notify_stage(self, stage: str, result: Any):
+        """通知阶段完成，回调异常不影响评估流程"""
+        if self.stage_callback is None:
+            return
+        try:
+            self.stage_callback(stage, result)
+        except Exception as e:
+            print(f"阶段回调失败 {stage}: {e}", file=sys.stderr)
+    
+    def _notify_image_section(self, index: int, key: str, value: Any):
+        """通知图像识别中已解析完的顶层字段，回调异常不影响识别"""
+        try:
+            self.section_callback("image_recognition", f"image_{index + 1}.{key}", value)
+        except Exception as e:
+            print(f"字段回调失败 image_{index + 1}.{key}: {e}", file=sys.stderr)
+    
+    def _missing_placeholder(self, stage: str) -> str:
+        """超时阶段在中间结果中的占位文本"""
+        return f"（{STAGE_LABELS.get(stage, stage)}因超时未完成，该部分数据缺失）"
     
     def run_assessment(self) -> Dict[str, Any]:
         """
         运行完整的CNA评估流程
         
+        配置了检查点存储时，每个阶段完成后立即写入检查点，评估结束时记录最终状态。
+        评估结束后借出的智能体归还到智能体池，同一个协调器只应运行一次。
+        
         Returns:
             最终的评估报告
         """
+        try:
+            response = self._run_assessment()
+        finally:
+            self.release_agents()
+        if response.get("cancelled"):
+            status = "cancelled"
+        elif response.get("error"):
+            status = "failed"
+        else:
+            status = "completed"
+        self._checkpoint("finish", status)
+        return response
+    
+    def _run_assessment(self) -> Dict[str, Any]:
         try:
             # 检查数据验证结果
             if not self.validation_results["is_valid"]:
@@ -194,10 +517,29 @@ class CNA_Coordinator:
                     "session_id": self.session_id
                 }
             
+            self.cancel_token.raise_if_cancelled()
+            
             # 步骤0: 图像识别（如果提供了图像数据）
-            if self.image_data:
-                image_trace_id = self._generate_trace_id("ImageRecognizer", "image_recognition")
-                self.image_recognition_results = self.image_recognizer.process(self.image_data)
+            if self.image_data and "image_recognition" in self._restored_stages:
+                # 从检查点恢复：识别结果已整合进检查点中的患者数据
+                self.image_recognition_results = self._restored_stages["image_recognition"]["result"]
+                self.deadline.complete("image_recognition")
+                self.intermediate_results['image_recognition'] = {
+                    "data": self.image_recognition_results,
+                    "trace_id": self._stage_trace_id("image_recognition", "ImageRecognizer", "image_recognition")
+                }
+            elif self.image_data:
+                image_trace_id = self._stage_trace_id("image_recognition", "ImageRecognizer", "image_recognition")
+                image_budget = self.deadline.budget_for("image_recognition")
+                self.image_recognition_results = self.image_recognizer.process(
+                    self.image_data,
+                    {"timeout": image_budget, "cancel_token": self.cancel_token, "usage_recorder": self.usage_recorder,
+                     "stream": self.stream_extraction,
+                     "on_section": self._notify_image_section if self.section_callback is not None else None}
+                )
+                self.deadline.complete("image_recognition")
+                if self.image_recognition_results.get("data", {}).get("timed_out_images"):
+                    self.missing_sections.append("image_recognition")
                 self._add_trace_record(
                     image_trace_id,
                     "ImageRecognizer",
@@ -242,10 +584,47 @@ class CNA_Coordinator:
                     "data": self.image_recognition_results,
                     "trace_id": image_trace_id
                 }
+                self._checkpoint("save_stage", "image_recognition", self.image_recognition_results,
+                                 patient_data=self.patient_data, missing_sections=self.missing_sections)
+                self._notify_stage("image_recognition", self.image_recognition_results)
+            
+            # 规则评分：在图像识别结果整合之后计算，作为各智能体和冲突检测的客观参考
+            scoring_trace_id = self._stage_trace_id("nutrition_scores", "NutritionScoring", "nutrition_scores")
+            self.nutrition_scores = score_patient(self.patient_data)
+            self.reference_scores = format_scores_for_prompt(self.nutrition_scores)
+            self._add_trace_record(
+                scoring_trace_id,
+                "NutritionScoring",
+                {"patient_info": self.patient_data.get("patient_info", {}),
+                 "lab_results": self.patient_data.get("lab_results", {})},
+                self.nutrition_scores
+            )
+            self._notify_stage("nutrition_scores", self.nutrition_scores)
+            
+            # 预筛查：低风险患者跳过多智能体评估，判定结果无论是否跳过都写入追溯记录
+            if self.prescreen_threshold:
+                prescreen = prescreen_patient(self.patient_data, self.prescreen_threshold)
+                prescreen_trace_id = self._stage_trace_id("prescreen", "CNA_Coordinator", "prescreen")
+                self._add_trace_record(
+                    prescreen_trace_id,
+                    "CNA_Coordinator",
+                    {"threshold": self.prescreen_threshold, "nrs2002": self.nutrition_scores["nrs2002"]},
+                    prescreen,
+                    dependencies=[scoring_trace_id]
+                )
+                print(f"预筛查：{'跳过完整评估' if prescreen['skip_full_assessment'] else '进入完整评估'}，"
+                      f"{prescreen['reason']}", file=sys.stderr)
+                if prescreen["skip_full_assessment"]:
+                    return self._low_risk_response(prescreen, [scoring_trace_id, prescreen_trace_id])
+            
+            # 快速模式：一次融合分析代替步骤1-5
+            if self.assessment_profile != "standard":
+                return self._run_fast_assessment()
             
             # 步骤1: 临床背景分析
-            clinical_trace_id = self._generate_trace_id("Clinical_Context_Analyzer", "clinical_analysis")
-            clinical_summary = self.clinical_analyzer.analyze(self.patient_data)
+            clinical_trace_id = self._stage_trace_id("clinical_context", "Clinical_Context_Analyzer", "clinical_analysis")
+            clinical_summary = self._run_stage("clinical_context", self.clinical_analyzer.analyze, self.patient_data,
+                                               reference_scores=self.reference_scores)
             self._add_trace_record(
                 clinical_trace_id,
                 "Clinical_Context_Analyzer",
@@ -260,8 +639,12 @@ class CNA_Coordinator:
             }
             
             # 步骤2: 人体测量评估
-            anthro_trace_id = self._generate_trace_id("Anthropometric_Evaluator", "anthropometric_eval")
-            anthropometric_summary = self.anthropometric_evaluator.evaluate(self.patient_data)
+            anthro_trace_id = self._stage_trace_id("anthropometric_evaluation", "Anthropometric_Evaluator", "anthropometric_eval")
+            anthropometric_summary = self._run_stage(
+                "anthropometric_evaluation", self.anthropometric_evaluator.evaluate, self.patient_data,
+                fallback=self._missing_placeholder("anthropometric_evaluation"),
+                reference_scores=self.reference_scores
+            )
             self._add_trace_record(
                 anthro_trace_id,
                 "Anthropometric_Evaluator",
@@ -274,10 +657,12 @@ class CNA_Coordinator:
             }
             
             # 步骤3: 生化指标解读（依赖临床背景）
-            biochem_trace_id = self._generate_trace_id("Biochemical_Interpreter", "biochemical_interp")
-            biochemical_summary = self.biochemical_interpreter.interpret(
+            biochem_trace_id = self._stage_trace_id("biochemical_interpretation", "Biochemical_Interpreter", "biochemical_interp")
+            biochemical_summary = self._run_stage(
+                "biochemical_interpretation", self.biochemical_interpreter.interpret,
                 self.patient_data, 
-                clinical_summary
+                clinical_summary,
+                reference_scores=self.reference_scores
             )
             self._add_trace_record(
                 biochem_trace_id,
@@ -293,8 +678,12 @@ class CNA_Coordinator:
             }
             
             # 步骤4: 膳食评估
-            dietary_trace_id = self._generate_trace_id("Dietary_Assessor", "dietary_assessment")
-            dietary_summary = self.dietary_assessor.assess(self.patient_data)
+            dietary_trace_id = self._stage_trace_id("dietary_assessment", "Dietary_Assessor", "dietary_assessment")
+            dietary_summary = self._run_stage(
+                "dietary_assessment", self.dietary_assessor.assess, self.patient_data,
+                fallback=self._missing_placeholder("dietary_assessment"),
+                reference_scores=self.reference_scores
+            )
             self._add_trace_record(
                 dietary_trace_id,
                 "Dietary_Assessor",
@@ -307,11 +696,35 @@ class CNA_Coordinator:
                 "trace_id": dietary_trace_id
             }
             
+            # 步骤4.5: 中间结果提炼，冲突检测和报告生成使用有长度上限的摘要，完整文本保留在追溯记录中
+            downstream_results = self.intermediate_results
+            if self.digest_max_chars:
+                downstream_results = distill_intermediate_results(self.intermediate_results, self.digest_max_chars)
+                digest_trace_id = self._stage_trace_id("result_digest", "CNA_Coordinator", "result_digest")
+                self._add_trace_record(
+                    digest_trace_id,
+                    "CNA_Coordinator",
+                    {k: v["data"] for k, v in self.intermediate_results.items()},
+                    {k: v["data"] for k, v in downstream_results.items()},
+                    dependencies=[clinical_trace_id, anthro_trace_id, biochem_trace_id, dietary_trace_id]
+                )
+            
             # 步骤5: 智能冲突检测 (使用CNA_Coordinator的AI能力)
-            conflict_analysis = self._intelligent_conflict_detection(self.intermediate_results)
+            conflict_analysis = self._run_stage(
+                "conflict_analysis", self._intelligent_conflict_detection, downstream_results,
+                reference_scores=self.reference_scores,
+                fallback={
+                    "has_conflicts": False,
+                    "conflicts_detected": [],
+                    "data_quality_issues": [],
+                    "recommendations": ["冲突检测超时未完成，建议人工review"],
+                    "proceed_to_final_report": True,
+                    "timed_out": True
+                }
+            )
             
             # 记录冲突检测结果
-            conflict_trace_id = self._generate_trace_id("CNA_Coordinator", "conflict_analysis")
+            conflict_trace_id = self._stage_trace_id("conflict_analysis", "CNA_Coordinator", "conflict_analysis")
             self._add_trace_record(
                 conflict_trace_id,
                 "CNA_Coordinator",
@@ -330,8 +743,11 @@ class CNA_Coordinator:
                 }
             
             # 步骤6: 生成最终报告
-            report_trace_id = self._generate_trace_id("Diagnostic_Reporter", "final_report")
-            final_report = self.diagnostic_reporter.generate_report(self.intermediate_results)
+            report_trace_id = self._stage_trace_id("final_report", "Diagnostic_Reporter", "final_report")
+            final_report = self._run_stage(
+                "final_report", self.diagnostic_reporter.generate_report, downstream_results,
+                missing_sections=[s for s in self.missing_sections if s != "conflict_analysis"]
+            )
             
             # 收集所有依赖
             all_trace_ids = [clinical_trace_id, anthro_trace_id, biochem_trace_id, dietary_trace_id, conflict_trace_id]
@@ -356,6 +772,11 @@ class CNA_Coordinator:
                 "processing_duration": (datetime.now() - self.start_time).total_seconds(),
                 "validation_results": self.validation_results,
                 "conflict_analysis": conflict_analysis,  # 包含冲突分析结果
+                "assessment_profile": self.assessment_profile,
+                "report_status": "partial" if self.missing_sections else "complete",
+                "missing_sections": self.missing_sections,
+                "nutrition_scores": self.nutrition_scores,
+                "llm_usage": self.usage_recorder.summary(),
                 "trace_summary": {
                     "total_steps": len(all_trace_ids) + 1,
                     "final_report_trace_id": report_trace_id,
@@ -370,6 +791,8 @@ class CNA_Coordinator:
             
             return response
             
+        except AssessmentCancelledError as e:
+            return self._cancelled_response(e)
         except Exception as e:
             error_trace_id = self._generate_trace_id("CNA_Coordinator", "error")
             self._add_trace_record(
@@ -387,6 +810,175 @@ class CNA_Coordinator:
                 "validation_results": self.validation_results
             }
     
+    def _run_fast_assessment(self) -> Dict[str, Any]:
+        """
+        快速评估流程：一次融合分析完成四项分析和风险分诊
+        
+        fast模式将融合分析结果直接交给报告生成智能体（共两次LLM调用）；
+        triage模式直接返回分诊结论（一次LLM调用）。融合分析只有单一来源，不再进行冲突检测。
+        
+        Returns:
+            评估响应
+        """
+        triage_trace_id = self._stage_trace_id("fast_triage", "Fast_Triage_Assessor", "fast_triage")
+        triage = self._run_stage("fast_triage", self.fast_triage_assessor.assess, self.patient_data,
+                                 reference_scores=self.reference_scores)
+        self._add_trace_record(
+            triage_trace_id,
+            "Fast_Triage_Assessor",
+            {"patient_data": self.patient_data},
+            triage
+        )
+        for field in ANALYSIS_FIELDS:
+            self.intermediate_results[field] = {
+                "data": triage[field],
+                "trace_id": triage_trace_id
+            }
+        
+        all_trace_ids = [triage_trace_id]
+        if self.image_data and 'image_recognition' in self.intermediate_results:
+            all_trace_ids.insert(0, self.intermediate_results['image_recognition']['trace_id'])
+        
+        if self.assessment_profile == "triage":
+            report_trace_id = triage_trace_id
+            final_report = f"营养风险等级：{triage['risk_level']}\n\n{triage['triage_summary']}".strip()
+        else:
+            report_trace_id = self._stage_trace_id("final_report", "Diagnostic_Reporter", "final_report")
+            final_report = self._run_stage(
+                "final_report", self.diagnostic_reporter.generate_report, self.intermediate_results,
+                missing_sections=list(self.missing_sections)
+            )
+            self._add_trace_record(
+                report_trace_id,
+                "Diagnostic_Reporter",
+                {k: v["data"] for k, v in self.intermediate_results.items()},
+                final_report,
+                dependencies=all_trace_ids
+            )
+        
+        response = {
+            "report": final_report,
+            "session_id": self.session_id,
+            "assessment_time": datetime.now().isoformat(),
+            "processing_duration": (datetime.now() - self.start_time).total_seconds(),
+            "validation_results": self.validation_results,
+            "assessment_profile": self.assessment_profile,
+            "triage": {
+                "risk_level": triage["risk_level"],
+                "triage_summary": triage["triage_summary"],
+                "needs_full_assessment": triage["needs_full_assessment"]
+            },
+            "report_status": "partial" if self.missing_sections else "complete",
+            "missing_sections": self.missing_sections,
+            "nutrition_scores": self.nutrition_scores,
+            "llm_usage": self.usage_recorder.summary(),
+            "trace_summary": {
+                "total_steps": len(all_trace_ids) + (1 if report_trace_id != triage_trace_id else 0),
+                "final_report_trace_id": report_trace_id,
+                "intermediate_trace_ids": all_trace_ids
+            }
+        }
+        
+        if self.image_recognition_results:
+            response["image_recognition_results"] = self.image_recognition_results.get("data", {})
+        
+        return response
+    
+    def _cancelled_response(self, error: AssessmentCancelledError) -> Dict[str, Any]:
+        """
+        评估被取消时的响应：已完成阶段的追溯记录保留，并追加一条取消记录
+        
+        Args:
+            error: 取消异常，包含被中断的阶段和取消原因
+            
+        Returns:
+            取消响应
+        """
+        completed_trace_ids = list(self.data_trace)
+        completed_stages = list(self.intermediate_results)
+        cancel_trace_id = self._generate_trace_id("CNA_Coordinator", "cancelled")
+        self._add_trace_record(
+            cancel_trace_id,
+            "CNA_Coordinator",
+            {"stage": error.stage, "reason": error.reason},
+            {"completed_stages": completed_stages, "llm_usage": self.usage_recorder.summary()},
+            dependencies=completed_trace_ids
+        )
+        print(f"{error}，已完成阶段 {completed_stages}", file=sys.stderr)
+        
+        return {
+            "error": "评估已取消",
+            "cancelled": True,
+            "cancelled_stage": error.stage,
+            "cancel_reason": error.reason,
+            "session_id": self.session_id,
+            "processing_duration": (datetime.now() - self.start_time).total_seconds(),
+            "completed_stages": completed_stages,
+            "llm_usage": self.usage_recorder.summary(),
+            "trace_summary": {
+                "cancel_trace_id": cancel_trace_id,
+                "intermediate_trace_ids": completed_trace_ids
+            }
+        }
+    
+    def _low_risk_response(self, prescreen: Dict[str, Any], trace_ids: List[str]) -> Dict[str, Any]:
+        """
+        预筛查判定为低风险时的模板结果，响应结构与完整评估一致
+        
+        Args:
+            prescreen: 预筛查决策
+            trace_ids: 规则评分和预筛查的追溯ID
+            
+        Returns:
+            评估响应
+        """
+        requirements = self.nutrition_scores["requirements"]
+        
+        def _fmt_range(values, unit):
+            return f"{values[0]:g}-{values[1]:g} {unit}" if values else "按实际体重计算"
+        
+        diagnoses = [d.get("description", "") for d in self.patient_data.get("diagnoses", []) if isinstance(d, dict)]
+        report = LOW_RISK_REPORT_TEMPLATE.format(
+            bmi=self.nutrition_scores["inputs"]["bmi"],
+            diagnoses="、".join(d for d in diagnoses[:3] if d) or "无",
+            reason=prescreen["reason"],
+            scores=self.reference_scores,
+            energy=_fmt_range(requirements["energy_kcal"], "kcal"),
+            protein=_fmt_range(requirements["protein_g"], "g")
+        )
+        report_trace_id = self._generate_trace_id("CNA_Coordinator", "low_risk_report")
+        self._add_trace_record(
+            report_trace_id,
+            "CNA_Coordinator",
+            prescreen,
+            report,
+            dependencies=trace_ids
+        )
+        
+        response = {
+            "report": report,
+            "session_id": self.session_id,
+            "assessment_time": datetime.now().isoformat(),
+            "processing_duration": (datetime.now() - self.start_time).total_seconds(),
+            "validation_results": self.validation_results,
+            "assessment_profile": self.assessment_profile,
+            "report_status": "prescreened",
+            "missing_sections": [],
+            "prescreen": prescreen,
+            "nutrition_scores": self.nutrition_scores,
+            "llm_usage": self.usage_recorder.summary(),
+            "trace_summary": {
+                "total_steps": len(trace_ids) + 1,
+                "final_report_trace_id": report_trace_id,
+                "intermediate_trace_ids": trace_ids
+            }
+        }
+        
+        if self.image_recognition_results:
+            response["image_recognition_results"] = self.image_recognition_results.get("data", {})
+        
+        return response
+    
     def get_trace_info(self, trace_id: str) -> Optional[Dict[str, Any]]:
         """
         获取指定追溯ID的详细信息
@@ -429,64 +1021,55 @@ class CNA_Coordinator:
         _collect_dependencies(trace_id)
         return trace_chain
     
-    def _intelligent_conflict_detection(self, intermediate_results: Dict[str, Any]) -> Dict[str, Any]:
+    def _intelligent_conflict_detection(self, intermediate_results: Dict[str, Any],
+                                        timeout: Optional[float] = None,
+                                        reference_scores: Optional[str] = None,
+                                        cancel_token: Optional[CancellationToken] = None) -> Dict[str, Any]:
         """
         使用AI智能检测智能体结果间的冲突和不一致
         
         Args:
             intermediate_results: 中间结果字典
+            timeout: 可选的时间预算（秒）
+            reference_scores: 可选的规则计算评分摘要，作为判断各智能体结论是否矛盾的客观依据
+            cancel_token: 可选的取消令牌
             
         Returns:
             冲突检测结果和建议
         """
         try:
-            # 构建冲突检测提示
-            prompt = f"""
-            请分析以下CNA系统各智能体的评估结果，检测是否存在**严重的逻辑冲突**导致无法生成可靠的评估报告。
-
-            临床背景分析结果：
-            {intermediate_results.get('clinical_context', {}).get('data', '无数据')}
-
-            人体测量评估结果：
-            {intermediate_results.get('anthropometric_evaluation', {}).get('data', '无数据')}
-
-            生化指标解读结果：
-            {intermediate_results.get('biochemical_interpretation', {}).get('data', '无数据')}
-
-            膳食评估结果：
-            {intermediate_results.get('dietary_assessment', {}).get('data', '无数据')}
-
-            重要说明：
-            - 只有**严重的、根本性的矛盾**才应该终止评估（proceed_to_final_report设为false）
-            - 轻微的数值差异（如体重下降百分比相差1-2%）、不同表述方式、数据不完整等情况不应终止评估
-            - 这些轻微问题可以在conflicts_detected和recommendations中记录，但应设置proceed_to_final_report为true
-            - 医学评估允许一定程度的解读差异，这是正常的
-
-            严重冲突的例子（才应该终止评估）：
-            - 一个智能体判断为营养不良，另一个判断为营养良好（完全相反的结论）
-            - 能量需求计算相差超过50%
-            - 关键指标解读完全相反且无法调和
-
-            请用中文回复，格式为JSON：
-            {{
-                "has_conflicts": true/false,
-                "conflicts_detected": ["具体冲突描述（仅记录，不一定终止）"],
-                "data_quality_issues": ["数据质量问题（仅记录，不一定终止）"],
-                "recommendations": ["改进建议"],
-                "proceed_to_final_report": true/false  (只有严重冲突时才设为false，轻微问题仍设为true)
-            }}
-            """
+            # 构建冲突检测提示：固定指令在前，各智能体结果在后
+            prompt = f"""{CONFLICT_DETECTION_INSTRUCTIONS}
+临床背景分析结果：
+{intermediate_results.get('clinical_context', {}).get('data', '无数据')}
+
+人体测量评估结果：
+{intermediate_results.get('anthropometric_evaluation', {}).get('data', '无数据')}
+
+生化指标解读结果：
+{intermediate_results.get('biochemical_interpretation', {}).get('data', '无数据')}
+
+膳食评估结果：
+{intermediate_results.get('dietary_assessment', {}).get('data', '无数据')}
+"""
+            if reference_scores:
+                prompt += f"""
+规则计算的营养评分（客观依据，智能体结论与之明显矛盾时应记录为冲突）：
+{reference_scores}
+"""
             
-            response = self.agent.generate_reply(messages=[{"role": "user", "content": prompt}])
+            response = call_with_timeout(
+                self.agent.generate_reply, timeout,
+                messages=[{"role": "user", "content": prompt}], stage="CNA_Coordinator",
+                cancel_token=cancel_token
+            )
             
             # 解析AI响应
             if isinstance(response, str):
                 try:
-                    # 尝试从响应中提取JSON
-                    import re
-                    json_match = re.search(r'\{.*\}', response, re.DOTALL)
-                    if json_match:
-                        conflict_analysis = json.loads(json_match.group())
+                    # 从响应中提取JSON（允许代码块标记、说明文字、多余的逗号和被截断的结尾）
+                    conflict_analysis = extract_json(response, expect=dict)
+                    if conflict_analysis is not None:
 
                         # 添加安全措施：只有检测到严重冲突时才真正终止
                         # 如果has_conflicts为true但proceed_to_final_report为false，
@@ -528,6 +1111,8 @@ class CNA_Coordinator:
             
             return conflict_analysis
             
+        except (StageTimeoutError, AssessmentCancelledError):
+            raise
         except Exception as e:
             return {
                 "has_conflicts": False,
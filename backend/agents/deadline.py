@@ -0,0 +1,219 @@
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, Optional
+
+from .cancellation import CancellationToken, AssessmentCancelledError
+
+
+# 各阶段的预算权重：剩余时间按待执行阶段的权重比例分配
+DEFAULT_STAGE_WEIGHTS = {
+    "image_recognition": 2.0,
+    "clinical_context": 1.0,
+    "anthropometric_evaluation": 1.0,
+    "biochemical_interpretation": 1.0,
+    "dietary_assessment": 1.0,
+    "fast_triage": 2.0,
+    "conflict_analysis": 1.0,
+    "final_report": 3.0,
+}
+
+# 非关键阶段：超时后不终止评估，报告中标注缺失部分
+NON_CRITICAL_STAGES = {
+    "image_recognition",
+    "anthropometric_evaluation",
+    "dietary_assessment",
+    "conflict_analysis",
+}
+
+# 阶段名称的中文标签，用于报告中的缺失说明
+STAGE_LABELS = {
+    "image_recognition": "图像识别",
+    "clinical_context": "临床背景分析",
+    "anthropometric_evaluation": "人体测量评估",
+    "biochemical_interpretation": "生化指标解读",
+    "dietary_assessment": "膳食评估",
+    "fast_triage": "快速分诊评估",
+    "conflict_analysis": "冲突检测",
+    "final_report": "最终报告",
+}
+
+
+class StageTimeoutError(TimeoutError):
+    """单个阶段（一次LLM调用）超出其时间预算"""
+
+    def __init__(self, stage: str, budget: Optional[float]):
+        self.stage = stage
+        self.budget = budget
+        budget_text = f"{budget:.1f}秒" if budget is not None else "未知"
+        super().__init__(f"阶段 {stage} 超出时间预算（{budget_text}）")
+
+
+class AssessmentDeadline:
+    """
+    单次评估的端到端截止时间
+
+    总时限在创建时确定，每个阶段开始时按剩余时间和待执行阶段的权重计算该阶段的预算。
+    total_seconds为None时表示不限时，所有预算均为None。
+    """
+
+    def __init__(self, total_seconds: Optional[float], stages: Iterable[str],
+                 stage_weights: Optional[Dict[str, float]] = None):
+        """
+        初始化截止时间
+
+        Args:
+            total_seconds: 整个评估的总时限（秒），None表示不限时
+            stages: 按执行顺序排列的阶段名称
+            stage_weights: 可选的阶段权重，缺省使用DEFAULT_STAGE_WEIGHTS
+        """
+        self.total_seconds = total_seconds
+        self.stages = list(stages)
+        self.stage_weights = dict(DEFAULT_STAGE_WEIGHTS)
+        if stage_weights:
+            self.stage_weights.update(stage_weights)
+        self._started = time.monotonic()
+        self._completed = set()
+
+    def remaining(self) -> Optional[float]:
+        """返回剩余时间（秒），不限时返回None"""
+        if self.total_seconds is None:
+            return None
+        return max(0.0, self.total_seconds - (time.monotonic() - self._started))
+
+    def expired(self) -> bool:
+        """是否已超过总时限"""
+        remaining = self.remaining()
+        return remaining is not None and remaining <= 0
+
+    def budget_for(self, stage: str) -> Optional[float]:
+        """
+        计算指定阶段的时间预算
+
+        Args:
+            stage: 阶段名称
+
+        Returns:
+            该阶段可用的秒数，不限时返回None
+        """
+        remaining = self.remaining()
+        if remaining is None:
+            return None
+
+        pending = [s for s in self.stages if s not in self._completed]
+        if stage not in pending:
+            pending.append(stage)
+        total_weight = sum(self.stage_weights.get(s, 1.0) for s in pending)
+        return remaining * self.stage_weights.get(stage, 1.0) / total_weight
+
+    def complete(self, stage: str):
+        """标记阶段已结束（无论成功或超时），其权重不再参与后续分配"""
+        self._completed.add(stage)
+
+
+# 守护线程中仍在运行的调用，按所属对象（绑定方法的__self__，如智能体）的id计数；
+# 超时或取消后调用方已返回，但请求可能仍在进行，此时该对象不能交给其他评估复用
+_running_calls: Dict[int, int] = {}
+_running_lock = threading.Lock()
+
+
+def call_in_progress(owner: Any) -> bool:
+    """owner是否还有经call_with_timeout发起、尚未结束的调用"""
+    with _running_lock:
+        return _running_calls.get(id(owner), 0) > 0
+
+
+def _track_call(owner: Any, delta: int):
+    if owner is None:
+        return
+    key = id(owner)
+    with _running_lock:
+        count = _running_calls.get(key, 0) + delta
+        if count > 0:
+            _running_calls[key] = count
+        else:
+            _running_calls.pop(key, None)
+
+
+# 执行调用的线程中当前调用的截止时刻（time.monotonic()），模型客户端据此设置SDK的单次请求超时
+_call_deadline = threading.local()
+
+# 单次请求超时的下限（秒）：预算已用完时仍交给SDK一个极短的超时，让请求立即结束而不是不限时
+_MIN_REQUEST_TIMEOUT = 0.01
+
+
+def request_timeout() -> Optional[float]:
+    """
+    当前线程中由call_with_timeout发起的调用剩余的时间预算（秒），不在限时调用中时返回None
+
+    模型客户端把它作为SDK的请求超时（OpenAI的timeout、Gemini的request_options），
+    预算用完时请求在SDK内结束，执行调用的守护线程随之退出，而不是在后台一直等待响应。
+    """
+    deadline = getattr(_call_deadline, "value", None)
+    if deadline is None:
+        return None
+    return max(_MIN_REQUEST_TIMEOUT, deadline - time.monotonic())
+
+
+def call_with_timeout(func: Callable[..., Any], timeout: Optional[float], *args,
+                      stage: str = "llm_call", cancel_token: Optional[CancellationToken] = None,
+                      **kwargs) -> Any:
+    """
+    在时间预算内执行一次阻塞调用
+
+    调用在守护线程中运行，超时或取消后立即返回控制权，挂起的请求不会阻止进程退出。
+    线程内的模型调用可通过request_timeout()取得剩余预算并交给SDK，使请求在预算用完时结束。
+
+    Args:
+        func: 要执行的函数（通常是一次LLM调用）
+        timeout: 时间预算（秒），None表示不限时
+        stage: 阶段名称，用于超时异常信息
+        cancel_token: 可选的取消令牌，已取消时不再发起调用，等待中取消则立即返回
+
+    Returns:
+        func的返回值
+
+    Raises:
+        StageTimeoutError: 超出时间预算
+        AssessmentCancelledError: 评估已取消
+    """
+    if cancel_token is not None:
+        cancel_token.raise_if_cancelled(stage)
+    if timeout is None and cancel_token is None:
+        return func(*args, **kwargs)
+    if timeout is not None and timeout <= 0:
+        raise StageTimeoutError(stage, timeout)
+
+    outcome = {}
+    wake = threading.Event()
+    # 线程持有func（及其所属对象）直到结束，计数期间id不会被复用
+    owner = getattr(func, "__self__", None)
+    deadline = time.monotonic() + timeout if timeout is not None else None
+
+    def _target():
+        _call_deadline.value = deadline
+        try:
+            outcome["value"] = func(*args, **kwargs)
+        except BaseException as e:
+            outcome["error"] = e
+        finally:
+            _call_deadline.value = None
+            _track_call(owner, -1)
+            wake.set()
+
+    _track_call(owner, 1)
+    worker = threading.Thread(target=_target, name=f"cna-{stage}", daemon=True)
+    worker.start()
+    unregister = cancel_token.on_cancel(wake.set) if cancel_token is not None else None
+    try:
+        wake.wait(timeout)
+    finally:
+        if unregister is not None:
+            unregister()
+
+    if not outcome:
+        if cancel_token is not None and cancel_token.cancelled:
+            raise AssessmentCancelledError(stage, cancel_token.reason)
+        raise StageTimeoutError(stage, timeout)
+    if "error" in outcome:
+        raise outcome["error"]
+    return outcome.get("value")
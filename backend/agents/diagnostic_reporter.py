@@ -1,9 +1,80 @@
-import autogen
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+from .llm_client import create_llm_agent, DEFAULT_LLM_BACKEND
+from .deadline import call_with_timeout, STAGE_LABELS, StageTimeoutError
+
+# 报告各部分的标题和写作要求，顺序即报告中的固定顺序
+REPORT_SECTIONS = [
+    ("患者基本情况摘要", "[此处总结患者的核心临床问题和当前状况]"),
+    ("营养风险等级", "[此处明确指出营养风险等级，并简要说明判断依据]"),
+    ("关键评估发现", "[此处整合人体测量、生化和膳食评估的关键阳性发现]"),
+    ("营养诊断 (PES格式)", "[此处以“问题(P) ... 与 ... 有关(E) ... 表现为 ...(S)”的格式写出结构化的PES声明]"),
+    ("主要营养问题", "[此处列出1-3个最主要的营养问题]"),
+    ("营养治疗目标", "[此处根据SMART原则，制定具体、可量化的短期和长期目标]"),
+    ("营养干预措施", "[此处提供具体、可操作的营养干预建议]"),
+]
+
+# 分部分生成模式下先生成的核心部分（风险等级和PES诊断），其余部分以核心部分为依据并行生成
+CORE_SECTION_TITLES = ("营养风险等级", "营养诊断 (PES格式)")
+CORE_SECTIONS = [section for section in REPORT_SECTIONS if section[0] in CORE_SECTION_TITLES]
+FANOUT_SECTIONS = [section for section in REPORT_SECTIONS if section[0] not in CORE_SECTION_TITLES]
+
+_REPORT_RULES = """**禁止**在报告开头添加任何引导性语句（如“好的，这是...”）。
+**禁止**在报告中使用任何Markdown格式（如'###', '*', '1.'）。
+每个部分标题后直接跟内容，部分之间用两个换行符分隔。
+"""
+
+
+def _section_template(sections):
+    return "\n\n".join(f"**{title}**\n{guidance}" for title, guidance in sections)
+
+
+# 报告生成的固定指令和章节模板（不含任何患者数据，作为提示的静态前缀）
+REPORT_INSTRUCTIONS = f"""请根据提示末尾提供的各方面评估结果，严格按照指定的报告结构，生成一份专业的临床营养诊断报告。
+{_REPORT_RULES}
+请严格按照以下标题和顺序生成报告：
+
+{_section_template(REPORT_SECTIONS)}
+"""
+
+# 分部分生成模式：核心部分的固定指令
+CORE_SECTION_INSTRUCTIONS = f"""请根据提示末尾提供的各方面评估结果，生成临床营养诊断报告的核心部分。
+{_REPORT_RULES}
+请严格按照以下标题和顺序生成，不要生成其他部分：
+
+{_section_template(CORE_SECTIONS)}
+"""
+
+# 分部分生成模式：单个后续部分的固定指令前缀，后接该部分的标题和要求
+SECTION_INSTRUCTIONS = f"""请根据提示末尾提供的各方面评估结果和已完成的报告核心部分，只生成临床营养诊断报告中的指定部分。
+{_REPORT_RULES}
+直接输出该部分的正文，不要重复标题，不要生成其他部分，内容须与核心部分中的风险等级和营养诊断保持一致。
+
+需要生成的部分：
+"""
 
 class DiagnosticReporter:
-    def __init__(self, llm_config):
-        self.agent = autogen.AssistantAgent(
-            name="Diagnostic_Reporter",
+    def __init__(self, llm_config, sectioned=False, llm_backend=DEFAULT_LLM_BACKEND):
+        """
+        Args:
+            llm_config: 报告生成模型配置
+            sectioned: 是否分部分生成报告（先生成核心部分，其余部分并行生成）
+            llm_backend: 模型调用方式（"autogen" 或 "direct"）
+        """
+        self.sectioned = sectioned
+        self.llm_backend = llm_backend
+        self.agent = self._create_agent("Diagnostic_Reporter", llm_config)
+        # 并行生成的后续部分各使用独立的智能体实例，避免并发调用共享同一个对话状态
+        self.section_agents = {}
+        if sectioned:
+            for index, (title, _) in enumerate(REPORT_SECTIONS, 1):
+                if title not in CORE_SECTION_TITLES:
+                    self.section_agents[title] = self._create_agent(f"Diagnostic_Reporter_Section{index}", llm_config)
+
+    def _create_agent(self, name, llm_config):
+        return create_llm_agent(
+            name=name,
             llm_config=llm_config,
             system_message="""
             你是一位专业的临床营养诊断报告专家。
@@ -20,58 +91,148 @@ class DiagnosticReporter:
             7. 营养干预措施
 
             报告必须清晰、简洁，语言通顺，符合中国临床医生的阅读习惯。
-            """
+            """,
+            backend=self.llm_backend
+        )
+
+    def _generate(self, agent, prompt, timeout, stage, cancel_token=None):
+        response = call_with_timeout(
+            agent.generate_reply, timeout,
+            messages=[{"role": "user", "content": prompt}], stage=stage, cancel_token=cancel_token
         )
+        return response if isinstance(response, str) else response.get("content", "")
 
-    def generate_report(self, intermediate_results):
+    def generate_report(self, intermediate_results, missing_sections=None, timeout=None, cancel_token=None):
         # 提取每个智能体的核心分析结果
         clinical_context = intermediate_results.get('clinical_context', {}).get('data', '无')
         anthropometric_eval = intermediate_results.get('anthropometric_evaluation', {}).get('data', '无')
         biochemical_interp = intermediate_results.get('biochemical_interpretation', {}).get('data', '无')
         dietary_assess = intermediate_results.get('dietary_assessment', {}).get('data', '无')
 
-        # 构建一个更结构化、更具引导性的提示
-        prompt = f"""
-        请根据以下各方面评估结果，严格按照指定的报告结构，生成一份专业的临床营养诊断报告。
-        **禁止**在报告开头添加任何引导性语句（如“好的，这是...”）。
-        **禁止**在报告中使用任何Markdown格式（如'###', '*', '1.'）。
-        每个部分标题后直接跟内容，部分之间用两个换行符分隔。
+        # 部分评估因超时未完成时，要求模型在相应部分注明缺失而不是推测
+        missing_labels = [STAGE_LABELS.get(s, s) for s in (missing_sections or [])]
+        missing_instruction = ""
+        if missing_labels:
+            missing_instruction = (
+                f"\n注意：以下评估部分因超时未完成：{'、'.join(missing_labels)}。"
+                "请在报告相应部分注明“该部分评估数据缺失，待补充评估”，不要推测缺失部分的内容。\n"
+            )
+
+        # 患者数据放在固定指令之后，保证每次请求的提示前缀逐字节一致，便于模型服务端的前缀缓存
+        assessment_data = f"""--- 原始评估数据 ---
+1.  **临床背景分析**: {clinical_context}
+2.  **人体测量评估**: {anthropometric_eval}
+3.  **生化指标解读**: {biochemical_interp}
+4.  **膳食评估**: {dietary_assess}
+--- 原始评估数据结束 ---
+{missing_instruction}"""
 
-        --- 原始评估数据 ---
-        1.  **临床背景分析**: {clinical_context}
-        2.  **人体测量评估**: {anthropometric_eval}
-        3.  **生化指标解读**: {biochemical_interp}
-        4.  **膳食评估**: {dietary_assess}
-        --- 报告生成指令 ---
+        if self.sectioned:
+            report_text = self._generate_sectioned(assessment_data, timeout, cancel_token)
+        else:
+            report_text = self._generate(
+                self.agent, f"{REPORT_INSTRUCTIONS}\n{assessment_data}", timeout, "Diagnostic_Reporter", cancel_token
+            )
+        
+        # 清理响应，移除潜在的Markdown和多余的换行符
+        report_text = report_text.replace("###", "").replace("####", "").replace("*", "").strip()
 
-        请严格按照以下标题和顺序生成报告：
+        if missing_labels:
+            report_text = f"【部分报告】本报告缺少以下评估部分：{'、'.join(missing_labels)}\n\n{report_text}"
+        
+        return report_text
 
-        **患者基本情况摘要**
-        [此处总结患者的核心临床问题和当前状况]
+    def _generate_sectioned(self, assessment_data, timeout=None, cancel_token=None):
+        """
+        分部分生成报告：先生成核心部分（风险等级和PES诊断），再以核心部分为依据并行生成其余五个部分，
+        按REPORT_SECTIONS的固定顺序拼接
 
-        **营养风险等级**
-        [此处明确指出营养风险等级，并简要说明判断依据]
+        总耗时约为两个核心部分加上最慢的一个后续部分，而不是所有部分之和。
 
-        **关键评估发现**
-        [此处整合人体测量、生化和膳食评估的关键阳性发现]
+        Args:
+            assessment_data: 提示中的评估数据部分
+            timeout: 整个报告生成的时间预算（秒）
+            cancel_token: 可选的取消令牌，核心部分完成后取消则不再发起其余部分
 
-        **营养诊断 (PES格式)**
-        [此处以“问题(P) ... 与 ... 有关(E) ... 表现为 ...(S)”的格式写出结构化的PES声明]
+        Returns:
+            拼接后的报告文本（尚未清理）
+        """
+        started = time.monotonic()
+        core_text = self._generate(
+            self.agent, f"{CORE_SECTION_INSTRUCTIONS}\n{assessment_data}", timeout, "Diagnostic_Reporter_core",
+            cancel_token
+        ).strip()
 
-        **主要营养问题**
-        [此处列出1-3个最主要的营养问题]
+        remaining = None
+        if timeout is not None:
+            remaining = timeout - (time.monotonic() - started)
+            if remaining <= 0:
+                raise StageTimeoutError("Diagnostic_Reporter", timeout)
 
-        **营养治疗目标**
-        [此处根据SMART原则，制定具体、可量化的短期和长期目标]
+        def _generate_section(section):
+            title, guidance = section
+            prompt = (
+                f"{SECTION_INSTRUCTIONS}**{title}**\n{guidance}\n\n{assessment_data}\n"
+                f"--- 已完成的报告核心部分 ---\n{core_text}\n--- 核心部分结束 ---\n"
+            )
+            content = self._generate(self.section_agents[title], prompt, remaining, f"Diagnostic_Reporter_{title}",
+                                     cancel_token)
+            content = content.strip()
+            # 模型仍输出了标题时去掉，由拼接统一添加
+            match = _title_pattern(title).match(content.lstrip("*# "))
+            if match:
+                content = content.lstrip("*# ")[match.end():].lstrip("*:： \n")
+            return content
 
-        **营养干预措施**
-        [此处提供具体、可操作的营养干预建议]
-        """
-        
-        response = self.agent.generate_reply(messages=[{"role": "user", "content": prompt}])
-        
-        # 清理响应，移除潜在的Markdown和多余的换行符
-        report_text = response if isinstance(response, str) else response.get("content", "")
-        report_text = report_text.replace("###", "").replace("####", "").replace("*", "").strip()
-        
-        return report_text
\ No newline at end of file
+        with ThreadPoolExecutor(max_workers=len(FANOUT_SECTIONS)) as executor:
+            contents = dict(zip([title for title, _ in FANOUT_SECTIONS],
+                                executor.map(_generate_section, FANOUT_SECTIONS)))
+
+        core_contents = _split_sections(core_text, CORE_SECTION_TITLES)
+        if core_contents is None:
+            # 核心部分的标题无法识别时保留原文，放在第一个核心部分（营养风险等级）的位置，其余部分顺序不变
+            return "\n\n".join(
+                core_text if title == CORE_SECTION_TITLES[0] else f"{title}\n{contents[title]}"
+                for title, _ in REPORT_SECTIONS if title in contents or title == CORE_SECTION_TITLES[0]
+            )
+        contents.update(core_contents)
+        return "\n\n".join(f"{title}\n{contents[title]}" for title, _ in REPORT_SECTIONS)
+
+
+def _title_pattern(title):
+    """
+    标题的宽松匹配模式：半角/全角括号视为相同，忽略空白和大小写
+    （如"营养诊断（PES格式）"、"营养诊断(PES 格式)"都匹配"营养诊断 (PES格式)"）
+    """
+    parts = []
+    for char in title:
+        if char.isspace():
+            continue
+        if char in "(（":
+            parts.append("[(（]")
+        elif char in ")）":
+            parts.append("[)）]")
+        else:
+            parts.append(re.escape(char))
+    return re.compile(r"\s*".join(parts), re.IGNORECASE)
+
+
+def _split_sections(text, titles):
+    """
+    按标题把模型输出切分为各部分正文
+
+    Returns:
+        {标题: 正文}；任一标题未出现或顺序不符时返回None
+    """
+    positions = []
+    start = 0
+    for title in titles:
+        match = _title_pattern(title).search(text, start)
+        if match is None:
+            return None
+        positions.append((title, match.start(), match.end()))
+        start = match.end()
+    contents = {}
+    for (title, _, end), following in zip(positions, positions[1:] + [(None, len(text), None)]):
+        contents[title] = text[end:following[1]].strip("*#:： \n")
+    return contents
\ No newline at end of file
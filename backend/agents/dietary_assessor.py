@@ -1,8 +1,9 @@
-import autogen
+from .llm_client import create_llm_agent, DEFAULT_LLM_BACKEND
+from .deadline import call_with_timeout
 
 class DietaryAssessor:
-    def __init__(self, llm_config):
-        self.agent = autogen.AssistantAgent(
+    def __init__(self, llm_config, llm_backend=DEFAULT_LLM_BACKEND):
+        self.agent = create_llm_agent(
             name="Dietary_Assessor",
             llm_config=llm_config,
             system_message="""
@@ -12,10 +13,17 @@ class DietaryAssessor:
             识别饮食的定性方面（如质地、不耐受等）。
             确定是否满足营养不良的病因标准（摄入减少/吸收障碍）。
             请用中文提供摘要。
-            """
+            """,
+            backend=llm_backend
         )
 
-    def assess(self, patient_data):
+    def assess(self, patient_data, timeout=None, reference_scores=None, cancel_token=None):
         prompt = f"Assess the dietary intake and needs for the following patient: {patient_data}"
-        response = self.agent.generate_reply(messages=[{"role": "user", "content": prompt}])
+        if reference_scores:
+            prompt += f"\n\n规则计算的营养评分（客观参考，分析结论与之不一致时请说明理由）：\n{reference_scores}"
+        response = call_with_timeout(
+            self.agent.generate_reply, timeout,
+            messages=[{"role": "user", "content": prompt}], stage="Dietary_Assessor",
+            cancel_token=cancel_token
+        )
         return response if isinstance(response, str) else response.get("content", "")
\ No newline at end of file
@@ -0,0 +1,184 @@
+from collections import deque
+from typing import Dict, Any, Iterable, Iterator, List, Tuple
+
+
+# 各文档类型的关键词及权重（关键词均为小写）
+# 顺序同时作为同分时的优先级
+DOCUMENT_TYPE_KEYWORDS = {
+    "病历首页": {"入院诊断": 3, "目前诊断": 3, "出院诊断": 3, "主诉": 2, "现病史": 2, "既往史": 2, "病历": 2, "病程": 1},
+    "生化检查": {"白蛋白": 2, "总蛋白": 1, "肌酐": 2, "尿素": 2, "转氨酶": 2, "c-反应蛋白": 2, "crp": 2,
+                 "血糖": 1, "甘油三酯": 1, "胆固醇": 1, "胆红素": 1},
+    "血常规": {"白细胞": 2, "红细胞": 2, "血红蛋白": 2, "血小板": 2, "中性粒细胞": 1, "淋巴细胞": 1,
+               "wbc": 2, "rbc": 2, "hgb": 1, "plt": 1},
+    "大便常规": {"大便": 3, "隐血": 3, "粪便": 3, "潜血": 2},
+    "会诊记录": {"会诊": 3, "会诊意见": 3, "营养科": 1, "pes": 1, "nrs2002": 1},
+    "营养评估": {"营养评估": 3, "营养风险": 3, "nrs2002": 2, "glim": 2, "pg-sga": 2, "营养不良": 1},
+    "人体测量": {"身高": 2, "体重": 2, "bmi": 2, "上臂围": 2, "皮褶": 2, "小腿围": 2},
+    "护理记录": {"护理": 3, "观察": 1, "记录": 1},
+}
+
+DEFAULT_DOCUMENT_TYPE = "其他"
+
+# 标准结构中的字段名在每份文档中都会出现，不参与分类
+_STANDARD_KEYS = {
+    "document_type", "patient_info", "name", "age", "gender", "height_cm", "weight_kg", "bmi",
+    "diagnoses", "type", "description", "symptoms_and_history", "chief_complaint",
+    "history_of_present_illness_summary", "lab_results", "biochemistry", "complete_blood_count",
+    "stool_routine", "value", "unit", "interpretation", "treatment_plan", "summary", "key_medications",
+    "consultation_record", "department", "purpose", "findings_and_conclusion", "recommendations",
+    "NRS2002_score", "PES_statement_summary",
+}
+
+# 与文档内容无关的字段
+_IGNORED_KEYS = {"raw_response", "error", "parse_error", "error_details"}
+
+
+class KeywordAutomaton:
+    """
+    Aho-Corasick多模式匹配自动机
+
+    构建一次后，单次扫描即可找出文本中所有关键词的出现位置，耗时与文本长度线性相关，
+    与关键词数量无关。
+    """
+
+    def __init__(self, keywords: Iterable[str]):
+        """
+        构建自动机
+
+        Args:
+            keywords: 关键词列表
+        """
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._output: List[List[str]] = [[]]
+
+        for keyword in keywords:
+            self._add(keyword)
+        self._build_failure_links()
+
+    def _add(self, keyword: str):
+        state = 0
+        for char in keyword:
+            next_state = self._goto[state].get(char)
+            if next_state is None:
+                next_state = len(self._goto)
+                self._goto[state][char] = next_state
+                self._goto.append({})
+                self._fail.append(0)
+                self._output.append([])
+            state = next_state
+        if keyword not in self._output[state]:
+            self._output[state].append(keyword)
+
+    def _build_failure_links(self):
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, next_state in self._goto[state].items():
+                queue.append(next_state)
+                fallback = self._fail[state]
+                while fallback and char not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                self._fail[next_state] = self._goto[fallback].get(char, 0)
+                self._output[next_state] = self._output[next_state] + self._output[self._fail[next_state]]
+
+    def iter_matches(self, text: str) -> Iterator[Tuple[int, str]]:
+        """
+        扫描文本，依次产出(结束位置, 关键词)
+
+        Args:
+            text: 待扫描文本
+        """
+        state = 0
+        for index, char in enumerate(text):
+            while state and char not in self._goto[state]:
+                state = self._fail[state]
+            state = self._goto[state].get(char, 0)
+            for keyword in self._output[state]:
+                yield index, keyword
+
+
+class DocumentClassifier:
+    """
+    基于关键词加权计分的医疗文档类型分类器
+    """
+
+    def __init__(self, type_keywords: Dict[str, Dict[str, float]], default_type: str = DEFAULT_DOCUMENT_TYPE):
+        """
+        初始化分类器
+
+        Args:
+            type_keywords: {文档类型: {关键词: 权重}}，字典顺序即同分时的优先级
+            default_type: 无任何关键词命中时返回的类型
+        """
+        self.default_type = default_type
+        self._type_order = list(type_keywords)
+        self._keyword_weights: Dict[str, List[Tuple[str, float]]] = {}
+        for doc_type, keywords in type_keywords.items():
+            for keyword, weight in keywords.items():
+                self._keyword_weights.setdefault(keyword.lower(), []).append((doc_type, weight))
+        self._automaton = KeywordAutomaton(self._keyword_weights)
+
+    def score_text(self, text: str) -> Dict[str, float]:
+        """
+        计算文本在各文档类型上的得分
+
+        Args:
+            text: 待分类文本
+
+        Returns:
+            {文档类型: 得分}，只包含得分大于0的类型
+        """
+        scores: Dict[str, float] = {}
+        for _, keyword in self._automaton.iter_matches(text.lower()):
+            for doc_type, weight in self._keyword_weights[keyword]:
+                scores[doc_type] = scores.get(doc_type, 0) + weight
+        return scores
+
+    def classify_text(self, text: str) -> str:
+        """返回文本得分最高的文档类型"""
+        scores = self.score_text(text)
+        if not scores:
+            return self.default_type
+        return max(self._type_order, key=lambda doc_type: (scores.get(doc_type, 0), -self._type_order.index(doc_type)))
+
+    def classify(self, data: Any) -> str:
+        """
+        对提取结果（字典、列表或字符串）分类
+
+        只扫描与内容相关的字段：非标准结构的字段名和字符串值。
+        """
+        return self.classify_text("\n".join(_iter_relevant_text(data)))
+
+
+def _iter_relevant_text(data: Any) -> Iterator[str]:
+    """遍历提取结果中参与分类的文本片段"""
+    if isinstance(data, dict):
+        for key, value in data.items():
+            if key in _IGNORED_KEYS:
+                continue
+            if key not in _STANDARD_KEYS:
+                yield str(key)
+            yield from _iter_relevant_text(value)
+    elif isinstance(data, list):
+        for item in data:
+            yield from _iter_relevant_text(item)
+    elif isinstance(data, str):
+        yield data
+
+
+# 模块级共享的分类器，自动机只构建一次
+DEFAULT_CLASSIFIER = DocumentClassifier(DOCUMENT_TYPE_KEYWORDS)
+
+
+def classify_document(data: Any) -> str:
+    """
+    使用默认分类器识别文档类型
+
+    Args:
+        data: 提取结果字典、列表或原始文本
+
+    Returns:
+        文档类型
+    """
+    return DEFAULT_CLASSIFIER.classify(data)
@@ -0,0 +1,88 @@
+import json
+from .llm_client import create_llm_agent, DEFAULT_LLM_BACKEND
+from .deadline import call_with_timeout
+from .json_extraction import extract_json
+
+# 快速评估的固定指令（静态前缀），一次调用同时完成四个分析智能体的工作
+FAST_TRIAGE_INSTRUCTIONS = """请根据提示末尾的患者数据，一次性完成以下四项营养相关分析，并给出营养风险分诊结论。
+
+1. clinical_context：临床背景分析（主要诊断、合并症、疾病对营养的影响，如高代谢、炎症、吸收不良）
+2. anthropometric_evaluation：人体测量评估（BMI、体重变化百分比、是否满足营养不良的表型标准）
+3. biochemical_interpretation：生化指标解读（结合炎症指标解读白蛋白、前白蛋白等）
+4. dietary_assessment：膳食评估（能量和蛋白质需求估算、摄入是否减少）
+
+每项分析用2-4句中文概括关键发现和数值，数据缺失时注明“数据缺失”，不要推测。
+
+请只返回如下JSON，不要包含其他文字或代码块标记：
+{
+    "clinical_context": "临床背景分析",
+    "anthropometric_evaluation": "人体测量评估",
+    "biochemical_interpretation": "生化指标解读",
+    "dietary_assessment": "膳食评估",
+    "risk_level": "低风险/中风险/高风险",
+    "triage_summary": "不超过100字的分诊结论和下一步建议",
+    "needs_full_assessment": true/false
+}
+
+患者数据：
+"""
+
+# 融合结果中对应四个分析智能体的字段
+ANALYSIS_FIELDS = ("clinical_context", "anthropometric_evaluation", "biochemical_interpretation", "dietary_assessment")
+
+
+class FastTriageAssessor:
+    def __init__(self, llm_config, llm_backend=DEFAULT_LLM_BACKEND):
+        self.agent = create_llm_agent(
+            name="Fast_Triage_Assessor",
+            llm_config=llm_config,
+            system_message="""
+            你是一名临床营养快速筛查专家，同时具备临床背景分析、人体测量评估、生化指标解读和膳食评估的能力。
+            你的任务是在一次分析中快速判断患者的营养风险，给出简明、结构化的中文结论。
+            只依据提供的数据作出判断，数据不足时明确说明。
+            """,
+            backend=llm_backend
+        )
+
+    def assess(self, patient_data, timeout=None, reference_scores=None, cancel_token=None):
+        """
+        一次调用完成四项分析和风险分诊
+
+        Args:
+            patient_data: 患者数据
+            timeout: 可选的时间预算（秒）
+            reference_scores: 可选的规则计算评分摘要，附加在提示末尾
+            cancel_token: 可选的取消令牌
+
+        Returns:
+            包含四项分析、risk_level、triage_summary和needs_full_assessment的字典
+        """
+        prompt = f"{FAST_TRIAGE_INSTRUCTIONS}{json.dumps(patient_data, ensure_ascii=False, default=str)}"
+        if reference_scores:
+            prompt += f"\n\n规则计算的营养评分（客观参考）：\n{reference_scores}"
+        response = call_with_timeout(
+            self.agent.generate_reply, timeout,
+            messages=[{"role": "user", "content": prompt}], stage="Fast_Triage_Assessor",
+            cancel_token=cancel_token
+        )
+        content = response if isinstance(response, str) else response.get("content", "")
+        return self._parse(content)
+
+    def _parse(self, content):
+        """解析模型返回的JSON，失败时将原文作为分诊结论并要求完整评估"""
+        result = extract_json(content, expect=dict)
+        if result is None:
+            result = {
+                "risk_level": "未知",
+                "triage_summary": (content or "").strip()[:500],
+                "needs_full_assessment": True,
+                "parse_error": True
+            }
+
+        for field in ANALYSIS_FIELDS:
+            if not result.get(field):
+                result[field] = "数据缺失"
+        result.setdefault("risk_level", "未知")
+        result.setdefault("triage_summary", "")
+        result.setdefault("needs_full_assessment", result.get("risk_level") != "低风险")
+        return result
@@ -2,9 +2,95 @@ import base64
 import json
 from typing import Dict, Any, Optional, List
 from .base_agent import BaseAgent
+from .deadline import call_with_timeout, StageTimeoutError
+from .cancellation import AssessmentCancelledError
+from .patient_record import PatientRecord, LabItem
+from .rule_extractor import parse_lab_value_text
+from .document_classifier import classify_document
+from .llm_usage import record_usage
+from .llm_client import response_text as _response_text
+from .streaming_json import StreamingJSONParser
+from .json_extraction import extract_json
 from PIL import Image
 import io
 import os
+import time
+
+
+# 图像数据提取的固定提示（静态前缀，不含任何患者数据）
+IMAGE_EXTRACTION_PROMPT = """你是一个专业的临床数据提取AI助理，严格遵循指示。你的任务是分析所提供的医疗文书图片，为后续的【临床营养评估多智能体系统】提供高度结构化的JSON输入数据。请务必遵循以下规则：
+
+1. **最终目的**: 所有提取的数据都是为了进行临床营养评估，请优先关注与营养状况、炎症反应、疾病代谢、膳食摄入和治疗方案相关的信息。
+2. **严格的JSON格式**: 输出必须严格遵循下面定义的JSON结构。即使某些字段在图片中不存在，也请在JSON中保留该字段，并将其值设为`null`。
+3. **精确提取，禁止推断**: 仅提取图片中明确存在的原始数据。不要进行计算（如自行计算BMI）、总结或推断图片中没有的信息。数值必须与原文完全一致。
+
+【目标JSON结构】
+{
+  "document_type": "<文档类型>",
+  "patient_info": {
+    "height_cm": <身高_数值>,
+    "weight_kg": <体重_数值>,
+    "bmi": <BMI_数值>
+  },
+  "diagnoses": [
+    {
+      "type": "<诊断类型，如入院诊断、目前诊断>",
+      "description": "<诊断描述>"
+    }
+  ],
+  "symptoms_and_history": {
+    "chief_complaint": "<主诉>",
+    "history_of_present_illness_summary": "<现病史摘要，重点关注消化道症状、食欲、体重变化>"
+  },
+  "lab_results": {
+    "biochemistry": [
+      {
+        "name": "<指标名称>",
+        "value": "<数值>",
+        "unit": "<单位>",
+        "interpretation": "<箭头或结论，如↑, ↓, 正常, 阳性>"
+      }
+    ],
+    "complete_blood_count": [
+      {
+        "name": "<指标名称>",
+        "value": "<数值>",
+        "unit": "<单位>",
+        "interpretation": "<箭头或结论>"
+      }
+    ],
+    "stool_routine": [
+      {
+        "name": "<指标名称>",
+        "value": "<结果>",
+        "interpretation": "<箭头或结论>"
+      }
+    ]
+  },
+  "treatment_plan": {
+    "summary": "<治疗方案或诊疗经过摘要>",
+    "key_medications": [
+      "<关键药物名称>"
+    ]
+  },
+  "consultation_record": {
+    "department": "<会诊科室>",
+    "purpose": "<会诊目的>",
+    "findings_and_conclusion": "<会诊意见或结论摘要>",
+    "recommendations": "<会诊建议>",
+    "NRS2002_score": <NRS2002评分>,
+    "PES_statement_summary": "<营养诊断PES声明的摘要>"
+  }
+}
+
+【具体提取指南】
+- **文档类型识别**: 首先，将`document_type`识别为以下之一: '病历首页', '生化检查', '血常规', '大便常规', '会诊记录', '营养评估', '人体测量', '护理记录', '其他'。
+- **生化检查**: **必须提取** `白蛋白(ALB)`, `总蛋白(TP)`, `谷丙转氨酶(ALT)`, `肌酐(CREA)`, `尿素(UREA)`, `血糖(GLU)`, `C-反应蛋白(CRP)`, `甘油三酯(TG)`, `总胆固醇(CHOL)`。如果存在，也提取`前白蛋白(PA)`。
+- **血常规**: **必须提取** `白细胞计数(WBC)`, `中性粒细胞计数(NEUT#)`, `淋巴细胞计数(LYM#)`, `血红蛋白(HGB)`, `红细胞计数(RBC)`, `血小板计数(PLT)`。
+- **病历/会诊记录**: 如果文书中提到身高、体重或BMI，请填入`patient_info`。尽可能将所有列出的诊断都填入`diagnoses`数组。从会诊记录中特别提取NRS2002评分和营养支持建议。
+
+请直接返回JSON格式的结果，不要包含任何其他说明文字、markdown标记或代码块标记。
+"""
 
 class ImageRecognizer(BaseAgent):
     """
@@ -47,6 +133,9 @@ class ImageRecognizer(BaseAgent):
         
         super().__init__("ImageRecognizer", llm_config, system_message)
         
+        # Gemini模型客户端，首次识别时创建；智能体池复用该识别器时不再重复创建
+        self._gemini_model = None
+        
     def process(self, input_data: Dict[str, Any], context: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
         """
         处理图像数据，提取医疗信息
@@ -56,11 +145,26 @@ class ImageRecognizer(BaseAgent):
                 - images: 图像文件列表或base64编码的图像数据列表
                 - file_paths: 可选的图像文件路径列表
             context: 可选的上下文信息
+                - timeout: 可选的本阶段时间预算（秒），由所有图像共享
+                - cancel_token: 可选的取消令牌，取消后不再识别剩余图像
+                - usage_recorder: 可选的用量记录器，为None时记录到进程级默认记录器
+                - stream: 是否流式接收模型输出，边接收边解析
+                - on_section: 可选的回调，以(图像索引, 字段名, 字段值)通知每个已解析完的顶层字段
             
         Returns:
             处理结果，包含提取的医疗信息
+            
+        Raises:
+            AssessmentCancelledError: 评估已取消
         """
         try:
+            timeout = (context or {}).get("timeout")
+            cancel_token = (context or {}).get("cancel_token")
+            usage_recorder = (context or {}).get("usage_recorder")
+            stream = bool((context or {}).get("stream"))
+            on_section = (context or {}).get("on_section")
+            stage_end = time.monotonic() + timeout if timeout is not None else None
+
             # 验证输入
             is_valid, error_msg = self.validate_input(input_data)
             if not is_valid:
@@ -84,7 +188,12 @@ class ImageRecognizer(BaseAgent):
             # 处理每个图像
             all_results = []
             for idx, image_data in enumerate(images):
-                result = self._process_single_image(image_data, idx)
+                if cancel_token is not None:
+                    cancel_token.raise_if_cancelled("image_recognition")
+                remaining = max(0.0, stage_end - time.monotonic()) if stage_end is not None else None
+                result = self._process_single_image(image_data, idx, timeout=remaining, cancel_token=cancel_token,
+                                                    usage_recorder=usage_recorder, stream=stream,
+                                                    on_section=on_section)
                 all_results.append(result)
             
             # 整合结果
@@ -92,6 +201,8 @@ class ImageRecognizer(BaseAgent):
             
             return self._create_result(consolidated_result)
             
+        except AssessmentCancelledError:
+            raise
         except Exception as e:
             self.logger.error(f"图像识别过程中发生错误: {str(e)}")
             return self._create_result(
@@ -124,13 +235,44 @@ class ImageRecognizer(BaseAgent):
         
         return images
     
-    def _process_single_image(self, image_data: str, index: int) -> Dict[str, Any]:
+    def _get_model(self):
+        """Gemini模型客户端，首次使用时创建，之后复用"""
+        if self._gemini_model is None:
+            import google.generativeai as genai
+            genai.configure(api_key=self.llm_config["config_list"][0]["api_key"])
+            self._gemini_model = genai.GenerativeModel('gemini-2.5-flash')
+        return self._gemini_model
+    
+    def _generate(self, model, contents: List[Any], parser: StreamingJSONParser, stream: bool = False,
+                  request_options: Optional[Dict[str, Any]] = None):
+        """
+        调用Gemini并把输出交给解析器
+
+        流式调用时每收到一段文本就解析，已完成的顶层字段立即通知订阅者。
+        """
+        if not stream:
+            response = model.generate_content(contents, request_options=request_options)
+            parser.feed(_response_text(response))
+            return response
+        response = model.generate_content(contents, stream=True, request_options=request_options)
+        for chunk in response:
+            parser.feed(_response_text(chunk))
+        return response
+    
+    def _process_single_image(self, image_data: str, index: int, timeout: Optional[float] = None,
+                              cancel_token=None, usage_recorder=None, stream: bool = False,
+                              on_section=None) -> Dict[str, Any]:
         """
         处理单个图像
         
         Args:
             image_data: base64编码的图像数据或文件路径
             index: 图像索引
+            timeout: 可选的时间预算（秒），None表示不限时
+            cancel_token: 可选的取消令牌
+            usage_recorder: 可选的用量记录器
+            stream: 是否流式接收模型输出
+            on_section: 可选的回调，以(图像索引, 字段名, 字段值)通知已解析完的顶层字段
             
         Returns:
             图像识别结果
@@ -143,94 +285,15 @@ class ImageRecognizer(BaseAgent):
                 with open(image_data, 'rb') as img_file:
                     image_data = base64.b64encode(img_file.read()).decode('utf-8')
             
-            # 构建Gemini API请求的提示
-            prompt = """
-            你是一个专业的临床数据提取AI助理，严格遵循指示。你的任务是分析所提供的医疗文书图片，为后续的【临床营养评估多智能体系统】提供高度结构化的JSON输入数据。请务必遵循以下规则：
-
-            1. **最终目的**: 所有提取的数据都是为了进行临床营养评估，请优先关注与营养状况、炎症反应、疾病代谢、膳食摄入和治疗方案相关的信息。
-            2. **严格的JSON格式**: 输出必须严格遵循下面定义的JSON结构。即使某些字段在图片中不存在，也请在JSON中保留该字段，并将其值设为`null`。
-            3. **精确提取，禁止推断**: 仅提取图片中明确存在的原始数据。不要进行计算（如自行计算BMI）、总结或推断图片中没有的信息。数值必须与原文完全一致。
-
-            【目标JSON结构】
-            {
-              "document_type": "<文档类型>",
-              "patient_info": {
-                "height_cm": <身高_数值>,
-                "weight_kg": <体重_数值>,
-                "bmi": <BMI_数值>
-              },
-              "diagnoses": [
-                {
-                  "type": "<诊断类型，如入院诊断、目前诊断>",
-                  "description": "<诊断描述>"
-                }
-              ],
-              "symptoms_and_history": {
-                "chief_complaint": "<主诉>",
-                "history_of_present_illness_summary": "<现病史摘要，重点关注消化道症状、食欲、体重变化>"
-              },
-              "lab_results": {
-                "biochemistry": [
-                  {
-                    "name": "<指标名称>",
-                    "value": "<数值>",
-                    "unit": "<单位>",
-                    "interpretation": "<箭头或结论，如↑, ↓, 正常, 阳性>"
-                  }
-                ],
-                "complete_blood_count": [
-                  {
-                    "name": "<指标名称>",
-                    "value": "<数值>",
-                    "unit": "<单位>",
-                    "interpretation": "<箭头或结论>"
-                  }
-                ],
-                "stool_routine": [
-                  {
-                    "name": "<指标名称>",
-                    "value": "<结果>",
-                    "interpretation": "<箭头或结论>"
-                  }
-                ]
-              },
-              "treatment_plan": {
-                "summary": "<治疗方案或诊疗经过摘要>",
-                "key_medications": [
-                  "<关键药物名称>"
-                ]
-              },
-              "consultation_record": {
-                "department": "<会诊科室>",
-                "purpose": "<会诊目的>",
-                "findings_and_conclusion": "<会诊意见或结论摘要>",
-                "recommendations": "<会诊建议>",
-                "NRS2002_score": <NRS2002评分>,
-                "PES_statement_summary": "<营养诊断PES声明的摘要>"
-              }
-            }
-
-            【具体提取指南】
-            - **文档类型识别**: 首先，将`document_type`识别为以下之一: '病历首页', '生化检查', '血常规', '大便常规', '会诊记录', '营养评估', '人体测量', '护理记录', '其他'。
-            - **生化检查**: **必须提取** `白蛋白(ALB)`, `总蛋白(TP)`, `谷丙转氨酶(ALT)`, `肌酐(CREA)`, `尿素(UREA)`, `血糖(GLU)`, `C-反应蛋白(CRP)`, `甘油三酯(TG)`, `总胆固醇(CHOL)`。如果存在，也提取`前白蛋白(PA)`。
-            - **血常规**: **必须提取** `白细胞计数(WBC)`, `中性粒细胞计数(NEUT#)`, `淋巴细胞计数(LYM#)`, `血红蛋白(HGB)`, `红细胞计数(RBC)`, `血小板计数(PLT)`。
-            - **病历/会诊记录**: 如果文书中提到身高、体重或BMI，请填入`patient_info`。尽可能将所有列出的诊断都填入`diagnoses`数组。从会诊记录中特别提取NRS2002评分和营养支持建议。
-
-            请直接返回JSON格式的结果，不要包含任何其他说明文字、markdown标记或代码块标记。
-            """
+            # 固定的提取提示放在图像之前，每次请求的前缀逐字节一致，便于前缀缓存
+            prompt = IMAGE_EXTRACTION_PROMPT
             
             try:
                 # 对于autogen，我们需要使用纯文本方式处理
                 # 由于autogen可能不直接支持图像，我们需要使用其他方式
                 # 这里我们直接调用Gemini API
-                import google.generativeai as genai
-                
-                # 配置API
                 api_key = self.llm_config["config_list"][0]["api_key"]
-                genai.configure(api_key=api_key)
-                
-                # 选择模型
-                model = genai.GenerativeModel('gemini-2.5-flash')
+                model = self._get_model()
                 
                 self.logger.info(f"使用Gemini API处理图像，API密钥前缀: {api_key[:10]}...")
                 
@@ -250,35 +313,34 @@ class ImageRecognizer(BaseAgent):
                 
                 # 生成内容
                 self.logger.info("调用Gemini API生成内容...")
-                response = model.generate_content([prompt, image])
+                request_options = {"timeout": timeout} if timeout else None
+                parser = StreamingJSONParser()
+                if on_section is not None:
+                    parser.subscribe(lambda key, value: on_section(index, key, value))
+                response = call_with_timeout(
+                    self._generate, timeout, model, [prompt, image], parser, stream=stream,
+                    request_options=request_options, stage=f"ImageRecognizer_image_{index + 1}",
+                    cancel_token=cancel_token
+                )
+                
+                record_usage(f"image_recognition_{index + 1}", response, usage_recorder)
                 
                 # 解析响应
-                response_text = response.text
+                response_text = parser.text
                 self.logger.info(f"收到响应，长度: {len(response_text)}")
                 
-                try:
-                    # 尝试从响应中提取JSON
-                    import re
-                    
-                    # 首先尝试提取标准的JSON格式
-                    json_match = re.search(r'\{.*\}', response_text, re.DOTALL)
-                    if json_match:
-                        extracted_data = json.loads(json_match.group())
-                        self.logger.info(f"成功提取JSON数据")
-                        
-                        # 验证和标准化提取的数据
-                        extracted_data = self._standardize_extracted_data(extracted_data)
-                    else:
-                        self.logger.warning("无法从响应中找到JSON格式数据")
-                        extracted_data = {
-                            "error": "无法从响应中提取JSON格式数据",
-                            "raw_response": response_text[:500] + "..." if len(response_text) > 500 else response_text
-                        }
-                except json.JSONDecodeError as e:
-                    self.logger.error(f"JSON解析失败: {str(e)}")
+                # 流式解析未得到完整对象（如输出被截断）时，从整段响应中提取并修复JSON
+                extracted_data = parser.close()
+                if extracted_data is None:
+                    extracted_data = extract_json(response_text, expect=dict)
+                if extracted_data is not None:
+                    self.logger.info("成功提取JSON数据")
+                    # 验证和标准化提取的数据
+                    extracted_data = self._standardize_extracted_data(extracted_data)
+                else:
+                    self.logger.warning("无法从响应中找到JSON格式数据")
                     extracted_data = {
-                        "error": "JSON解析失败",
-                        "parse_error": str(e),
+                        "error": "无法从响应中提取JSON格式数据",
                         "raw_response": response_text[:500] + "..." if len(response_text) > 500 else response_text
                     }
                 
@@ -288,6 +350,8 @@ class ImageRecognizer(BaseAgent):
                     "success": "error" not in extracted_data
                 }
                 
+            except AssessmentCancelledError:
+                raise
             except Exception as api_error:
                 self.logger.error(f"Gemini API调用失败: {str(api_error)}")
                 
@@ -307,9 +371,12 @@ class ImageRecognizer(BaseAgent):
                     "image_index": index + 1,
                     "error": str(api_error),
                     "error_details": error_details,
+                    "timed_out": isinstance(api_error, StageTimeoutError),
                     "success": False
                 }
             
+        except AssessmentCancelledError:
+            raise
         except Exception as e:
             self.logger.error(f"处理图像 {index + 1} 时发生错误: {str(e)}")
             return {
@@ -332,6 +399,7 @@ class ImageRecognizer(BaseAgent):
         consolidated = {
             "total_images": len(results),
             "successful_extractions": sum(1 for r in results if r.get("success", False)),
+            "timed_out_images": sum(1 for r in results if r.get("timed_out", False)),
             "documents": []
         }
         
@@ -389,30 +457,11 @@ class ImageRecognizer(BaseAgent):
             文档类型
         """
         # 首先检查是否有明确的document_type字段
-        if "document_type" in extracted_data:
+        if extracted_data.get("document_type"):
             return extracted_data["document_type"]
             
-        # 基于提取的字段内容判断文档类型
-        data_str = str(extracted_data).lower()
-        
-        if any(key in data_str for key in ["入院诊断", "目前诊断", "主诉", "现病史", "病历"]):
-            return "病历首页"
-        elif any(key in data_str for key in ["白蛋白", "肌酐", "尿素", "转氨酶", "c-反应蛋白", "crp"]):
-            return "生化检查"
-        elif any(key in data_str for key in ["白细胞", "红细胞", "血红蛋白", "血小板", "wbc", "rbc"]):
-            return "血常规"
-        elif any(key in data_str for key in ["大便", "隐血", "粪便"]):
-            return "大便常规"
-        elif any(key in data_str for key in ["会诊", "营养科", "nrs2002", "pes"]):
-            return "会诊记录"
-        elif any(key in data_str for key in ["nrs2002", "营养风险", "营养评估"]):
-            return "营养评估"
-        elif any(key in data_str for key in ["身高", "体重", "bmi"]):
-            return "人体测量"
-        elif any(key in data_str for key in ["护理", "观察", "记录"]):
-            return "护理记录"
-        else:
-            return "其他"
+        # 基于相关字段的关键词加权计分判断文档类型
+        return classify_document(extracted_data)
     
     def _integrate_key_data(self, document_types: Dict[str, List[Dict]]) -> Dict[str, Any]:
         """
@@ -424,98 +473,26 @@ class ImageRecognizer(BaseAgent):
         Returns:
             整合后的关键数据
         """
-        # 初始化标准化的整合数据结构
-        integrated = {
-            "document_type": "综合病例",
-            "patient_info": {
-                "height_cm": None,
-                "weight_kg": None,
-                "bmi": None
-            },
-            "diagnoses": [],
-            "symptoms_and_history": {
-                "chief_complaint": None,
-                "history_of_present_illness_summary": None
-            },
-            "lab_results": {
-                "biochemistry": [],
-                "complete_blood_count": [],
-                "stool_routine": []
-            },
-            "treatment_plan": {
-                "summary": None,
-                "key_medications": []
-            },
-            "consultation_record": {
-                "department": None,
-                "purpose": None,
-                "findings_and_conclusion": None,
-                "recommendations": None,
-                "NRS2002_score": None,
-                "PES_statement_summary": None
-            }
-        }
+        # 初始化标准化的整合记录
+        integrated = PatientRecord(document_type="综合病例")
         
         # 处理每种文档类型
         for doc_type, docs in document_types.items():
             for doc in docs:
                 # 如果文档已经包含标准化结构，直接合并
                 if isinstance(doc, dict) and "patient_info" in doc:
-                    # 合并patient_info
-                    if doc.get("patient_info"):
-                        for key, value in doc["patient_info"].items():
-                            if value is not None and integrated["patient_info"][key] is None:
-                                integrated["patient_info"][key] = value
-                    
-                    # 合并diagnoses
-                    if doc.get("diagnoses"):
-                        integrated["diagnoses"].extend(doc["diagnoses"])
-                    
-                    # 合并symptoms_and_history
-                    if doc.get("symptoms_and_history"):
-                        for key, value in doc["symptoms_and_history"].items():
-                            if value is not None and integrated["symptoms_and_history"][key] is None:
-                                integrated["symptoms_and_history"][key] = value
-                    
-                    # 合并lab_results
-                    if doc.get("lab_results"):
-                        for result_type, results in doc["lab_results"].items():
-                            if isinstance(results, list):
-                                integrated["lab_results"][result_type].extend(results)
-                    
-                    # 合并treatment_plan
-                    if doc.get("treatment_plan"):
-                        if doc["treatment_plan"].get("summary") and not integrated["treatment_plan"]["summary"]:
-                            integrated["treatment_plan"]["summary"] = doc["treatment_plan"]["summary"]
-                        if doc["treatment_plan"].get("key_medications"):
-                            integrated["treatment_plan"]["key_medications"].extend(doc["treatment_plan"]["key_medications"])
-                    
-                    # 合并consultation_record
-                    if doc.get("consultation_record"):
-                        for key, value in doc["consultation_record"].items():
-                            if value is not None and integrated["consultation_record"][key] is None:
-                                integrated["consultation_record"][key] = value
+                    integrated.merge_dict(doc)
                 
                 # 处理旧格式数据（向后兼容）
                 else:
                     self._integrate_legacy_format(doc, doc_type, integrated)
         
-        # 去除重复的诊断
-        seen_diagnoses = set()
-        unique_diagnoses = []
-        for diagnosis in integrated["diagnoses"]:
-            diagnosis_key = f"{diagnosis.get('type', '')}_{diagnosis.get('description', '')}"
-            if diagnosis_key not in seen_diagnoses:
-                seen_diagnoses.add(diagnosis_key)
-                unique_diagnoses.append(diagnosis)
-        integrated["diagnoses"] = unique_diagnoses
-        
-        # 去除重复的药物
-        integrated["treatment_plan"]["key_medications"] = list(set(integrated["treatment_plan"]["key_medications"]))
+        # 去除重复的诊断和药物
+        integrated.deduplicate()
         
-        return integrated
+        return integrated.to_dict(include_identity=False)
     
-    def _integrate_legacy_format(self, doc: Dict, doc_type: str, integrated: Dict):
+    def _integrate_legacy_format(self, doc: Dict, doc_type: str, integrated: PatientRecord):
         """
         处理旧格式数据，向后兼容
         """
@@ -523,68 +500,52 @@ class ImageRecognizer(BaseAgent):
             # 提取身高、体重、BMI
             for key in ["身高", "height"]:
                 if key in doc:
-                    integrated["patient_info"]["height_cm"] = self._extract_numeric_value({key: doc[key]}, [key])
+                    integrated.patient_info.height_cm = self._extract_numeric_value({key: doc[key]}, [key])
             for key in ["体重", "weight"]:
                 if key in doc:
-                    integrated["patient_info"]["weight_kg"] = self._extract_numeric_value({key: doc[key]}, [key])
+                    integrated.patient_info.weight_kg = self._extract_numeric_value({key: doc[key]}, [key])
             for key in ["bmi", "BMI"]:
                 if key in doc:
-                    integrated["patient_info"]["bmi"] = self._extract_numeric_value({key: doc[key]}, [key])
+                    integrated.patient_info.bmi = self._extract_numeric_value({key: doc[key]}, [key])
         
         elif doc_type == "生化检查":
             # 转换为标准格式
             for key, value in doc.items():
                 if key not in ["检查日期", "document_type"]:
-                    item = {
-                        "name": key,
-                        "value": None,
-                        "unit": None,
-                        "interpretation": None
-                    }
+                    item = LabItem(name=key)
                     if isinstance(value, str):
                         # 解析值、单位和解释
-                        import re
-                        match = re.match(r'([\d.]+)\s*([a-zA-Z/]+)?\s*(↑|↓)?', value)
-                        if match:
-                            item["value"] = match.group(1)
-                            item["unit"] = match.group(2) or ""
-                            item["interpretation"] = match.group(3) or ""
+                        parsed = parse_lab_value_text(value)
+                        if parsed:
+                            item.value, item.unit, item.interpretation = parsed
                         else:
-                            item["value"] = value
-                    integrated["lab_results"]["biochemistry"].append(item)
+                            item.value = value
+                    integrated.lab_results["biochemistry"].append(item)
         
         elif doc_type == "血常规":
             # 转换为标准格式
             for key, value in doc.items():
                 if key not in ["检查日期", "document_type"]:
-                    item = {
-                        "name": key,
-                        "value": None,
-                        "unit": None,
-                        "interpretation": None
-                    }
+                    item = LabItem(name=key)
                     if isinstance(value, str):
                         # 解析值、单位和解释
-                        import re
-                        match = re.match(r'([\d.]+)\s*([a-zA-Z/^×]+)?\s*(↑|↓)?', value)
-                        if match:
-                            item["value"] = match.group(1)
-                            item["unit"] = match.group(2) or ""
-                            item["interpretation"] = match.group(3) or ""
+                        parsed = parse_lab_value_text(value)
+                        if parsed:
+                            item.value, item.unit, item.interpretation = parsed
                         else:
-                            item["value"] = value
-                    integrated["lab_results"]["complete_blood_count"].append(item)
+                            item.value = value
+                    integrated.lab_results["complete_blood_count"].append(item)
         
         elif doc_type in ["会诊记录", "营养评估"]:
             # 提取NRS2002评分
             for key in ["nrs2002", "NRS2002", "NRS2002评分"]:
                 if key in doc:
-                    integrated["consultation_record"]["NRS2002_score"] = self._extract_numeric_value({key: doc[key]}, [key])
+                    integrated.consultation_record.NRS2002_score = self._extract_numeric_value({key: doc[key]}, [key])
             
             # 提取PES声明
             for key in ["营养诊断", "PES", "pes", "结论"]:
-                if key in doc and not integrated["consultation_record"]["PES_statement_summary"]:
-                    integrated["consultation_record"]["PES_statement_summary"] = str(doc[key])
+                if key in doc and not integrated.consultation_record.PES_statement_summary:
+                    integrated.consultation_record.PES_statement_summary = str(doc[key])
     
     def _extract_numeric_value(self, data: Dict[str, Any], keys: List[str]) -> Optional[float]:
         """
@@ -688,60 +649,11 @@ class ImageRecognizer(BaseAgent):
         Returns:
             标准化后的数据
         """
-        # 定义标准模板
-        template = {
-            "document_type": None,
-            "patient_info": {
-                "height_cm": None,
-                "weight_kg": None,
-                "bmi": None
-            },
-            "diagnoses": [],
-            "symptoms_and_history": {
-                "chief_complaint": None,
-                "history_of_present_illness_summary": None
-            },
-            "lab_results": {
-                "biochemistry": [],
-                "complete_blood_count": [],
-                "stool_routine": []
-            },
-            "treatment_plan": {
-                "summary": None,
-                "key_medications": []
-            },
-            "consultation_record": {
-                "department": None,
-                "purpose": None,
-                "findings_and_conclusion": None,
-                "recommendations": None,
-                "NRS2002_score": None,
-                "PES_statement_summary": None
-            }
-        }
-        
-        # 如果数据已经是标准格式，合并到模板中
+        # 如果数据已经是标准格式，转换为类型化记录后再序列化，补齐所有必需字段
         if "document_type" in data or "patient_info" in data:
-            standardized = self._deep_merge(template, data)
+            standardized = PatientRecord.from_dict(data).to_dict(include_identity=False)
         else:
             # 如果是旧格式，返回原始数据（后续会在_integrate_legacy_format中处理）
             standardized = data
         
-        return standardized
-    
-    def _deep_merge(self, template: Dict, data: Dict) -> Dict:
-        """
-        深度合并两个字典，保留模板的结构
-        """
-        result = template.copy()
-        
-        for key, value in data.items():
-            if key in result:
-                if isinstance(result[key], dict) and isinstance(value, dict):
-                    result[key] = self._deep_merge(result[key], value)
-                elif value is not None:
-                    result[key] = value
-            else:
-                result[key] = value
-        
-        return result
\ No newline at end of file
+        return standardized
\ No newline at end of file
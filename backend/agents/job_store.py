@@ -0,0 +1,163 @@
+import threading
+import time
+from datetime import datetime
+from typing import Any, Dict, Optional
+
+
+# 任务状态：queued（排队）-> running（执行中）-> completed（完成）、failed（失败）或 cancelled（已取消）
+JOB_STATUSES = ("queued", "running", "completed", "failed", "cancelled")
+FINISHED_STATUSES = ("completed", "failed", "cancelled")
+
+
+class JobStore:
+    """
+    异步评估任务的本地存储（线程安全）
+
+    以协调器的session_id为任务ID，记录状态、已完成阶段的中间结果和最终响应。
+    已结束的任务保留ttl_seconds后清理。
+    """
+
+    def __init__(self, ttl_seconds: float = 3600):
+        """
+        Args:
+            ttl_seconds: 已结束任务的保留时间（秒）
+        """
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        self._jobs: Dict[str, Dict[str, Any]] = {}
+        self._active_keys: Dict[str, str] = {}  # 请求键 -> 未结束任务的session_id
+        self._finished_at: Dict[str, float] = {}
+
+    def create(self, session_id: str, key: Optional[str] = None, **metadata) -> Dict[str, Any]:
+        """
+        登记一个排队中的任务
+
+        Args:
+            session_id: 协调器的session_id
+            key: 可选的请求键，相同键的未结束任务可通过find_active查到
+            metadata: 附加在任务上的信息（如评估模式、优先级）
+
+        Returns:
+            任务快照
+        """
+        with self._lock:
+            self._evict()
+            job = {
+                "session_id": session_id,
+                "status": "queued",
+                "current_stage": None,
+                "completed_stages": [],
+                "intermediate_results": {},
+                "partial_results": {},
+                "result": None,
+                "error": None,
+                "created_at": datetime.now().isoformat(),
+                "started_at": None,
+                "finished_at": None,
+                **metadata,
+            }
+            self._jobs[session_id] = job
+            if key:
+                job["_key"] = key
+                self._active_keys[key] = session_id
+            return self._snapshot(job)
+
+    def find_active(self, key: str) -> Optional[str]:
+        """返回相同请求键的未结束任务的session_id"""
+        with self._lock:
+            return self._active_keys.get(key)
+
+    def mark_running(self, session_id: str):
+        self._update(session_id, status="running", started_at=datetime.now().isoformat())
+
+    def record_stage(self, session_id: str, stage: str, result: Any):
+        """记录一个已完成阶段的结果（协调器的阶段回调）"""
+        with self._lock:
+            job = self._jobs.get(session_id)
+            if job is None:
+                return
+            job["intermediate_results"][stage] = result
+            if stage not in job["completed_stages"]:
+                job["completed_stages"].append(stage)
+            job["current_stage"] = stage
+
+    def record_section(self, session_id: str, stage: str, section: str, value: Any):
+        """记录进行中阶段已解析完的字段（协调器的字段回调），阶段完成前即可查询"""
+        with self._lock:
+            job = self._jobs.get(session_id)
+            if job is None:
+                return
+            job["partial_results"].setdefault(stage, {})[section] = value
+
+    def complete(self, session_id: str, result: Dict[str, Any]):
+        """记录最终响应；协调器返回错误响应时任务标记为失败，返回取消响应时标记为已取消"""
+        status = "completed"
+        if isinstance(result, dict) and result.get("cancelled"):
+            status = "cancelled"
+        elif isinstance(result, dict) and result.get("error"):
+            status = "failed"
+        self._finish(session_id, status, result=result, error=(result or {}).get("error"))
+
+    def fail(self, session_id: str, error: str):
+        self._finish(session_id, "failed", error=error)
+
+    def discard(self, session_id: str):
+        """删除未能开始执行的任务（如调度队列已满被拒绝）"""
+        with self._lock:
+            job = self._jobs.pop(session_id, None)
+            if job is not None and self._active_keys.get(job.get("_key")) == session_id:
+                del self._active_keys[job["_key"]]
+            self._finished_at.pop(session_id, None)
+
+    def is_finished(self, session_id: str) -> bool:
+        with self._lock:
+            job = self._jobs.get(session_id)
+            return job is None or job["status"] in FINISHED_STATUSES
+
+    def get(self, session_id: str) -> Optional[Dict[str, Any]]:
+        """返回任务快照，不存在或已过期时返回None"""
+        with self._lock:
+            self._evict()
+            job = self._jobs.get(session_id)
+            return self._snapshot(job) if job else None
+
+    def counts(self) -> Dict[str, int]:
+        """各状态的任务数"""
+        with self._lock:
+            counts = {status: 0 for status in JOB_STATUSES}
+            for job in self._jobs.values():
+                counts[job["status"]] += 1
+            return counts
+
+    def _update(self, session_id: str, **fields):
+        with self._lock:
+            job = self._jobs.get(session_id)
+            if job is not None:
+                job.update(fields)
+
+    def _finish(self, session_id: str, status: str, **fields):
+        with self._lock:
+            job = self._jobs.get(session_id)
+            if job is None:
+                return
+            job.update(fields, status=status, current_stage=None, finished_at=datetime.now().isoformat())
+            key = job.get("_key")
+            if key and self._active_keys.get(key) == session_id:
+                del self._active_keys[key]
+            self._finished_at[session_id] = time.monotonic()
+
+    def _evict(self):
+        """清理超过保留时间的已结束任务（调用方持有锁）"""
+        now = time.monotonic()
+        for session_id, finished in list(self._finished_at.items()):
+            if now - finished > self.ttl_seconds:
+                del self._finished_at[session_id]
+                self._jobs.pop(session_id, None)
+
+    @staticmethod
+    def _snapshot(job: Dict[str, Any]) -> Dict[str, Any]:
+        snapshot = {k: v for k, v in job.items() if not k.startswith("_")}
+        snapshot["completed_stages"] = list(job["completed_stages"])
+        snapshot["intermediate_results"] = dict(job["intermediate_results"])
+        snapshot["partial_results"] = {stage: dict(sections) for stage, sections in job["partial_results"].items()}
+        return snapshot
@@ -0,0 +1,186 @@
+import json
+import logging
+import re
+from typing import Any, List, Optional, Tuple
+
+
+logger = logging.getLogger("CNA.json_extraction")
+
+# 字符串外需要处理的结构字符；字符串内只需关心引号和转义
+STRUCTURAL = re.compile(r'["{}\[\],]')
+STRING_SPECIAL = re.compile(r'["\\]')
+
+_OPENER = {dict: re.compile(r"\{"), list: re.compile(r"\["), None: re.compile(r"[{\[]")}
+_CLOSER = {"{": "}", "[": "]"}
+# 截断处之后的内容以这些结尾时视为完整的值（数字可能只输出了一部分，不保留）
+_COMPLETE_TAIL = re.compile(r'(?:"|\btrue|\bfalse|\bnull)\s*$')
+# 最多尝试的起始位置数：第一个括号可能出现在说明文字中（如"结果{见下}"）
+_MAX_CANDIDATES = 8
+
+_decoder = json.JSONDecoder()
+
+REPAIR_TRAILING_COMMA = "trailing_comma"
+REPAIR_TRUNCATED = "truncated"
+
+
+class ExtractedJSON:
+    """从模型输出中提取的JSON值及其位置和修复记录"""
+
+    __slots__ = ("value", "start", "end", "repairs")
+
+    def __init__(self, value: Any, start: int, end: int, repairs: Tuple[str, ...] = ()):
+        self.value = value
+        self.start = start
+        self.end = end  # 截断时为文本长度
+        self.repairs = repairs  # 空表示原文即为合法JSON
+
+    def __repr__(self):
+        return f"ExtractedJSON(start={self.start}, end={self.end}, repairs={self.repairs})"
+
+
+def _scan(text: str, start: int):
+    """
+    从text[start]处的括号开始单遍扫描，跟踪字符串、转义和括号栈
+
+    Returns:
+        (结束位置或None（截断）, 未闭合的括号栈, 末尾逗号位置, 最后一个安全截断点, 是否截断在字符串中)；
+        括号不匹配时返回None
+    """
+    stack: List[str] = []
+    trailing: List[int] = []
+    last_comma = -1
+    safe_end = start
+    pos = start
+    length = len(text)
+    while True:
+        match = STRUCTURAL.search(text, pos)
+        if match is None:
+            return None, stack, trailing, safe_end, False
+        char = match.group()
+        index = match.start()
+        pos = index + 1
+        if char == '"':
+            while True:
+                special = STRING_SPECIAL.search(text, pos)
+                if special is None or (special.group() == "\\" and special.end() >= length):
+                    return None, stack, trailing, safe_end, True
+                if special.group() == "\\":
+                    pos = special.end() + 1
+                    continue
+                pos = special.end()
+                break
+        elif char in "{[":
+            stack.append(_CLOSER[char])
+            safe_end = pos
+        elif char in "}]":
+            if last_comma >= 0 and not text[last_comma + 1:index].strip():
+                trailing.append(last_comma)
+            last_comma = -1
+            if not stack or stack[-1] != char:
+                return None
+            stack.pop()
+            safe_end = pos
+            if not stack:
+                return pos, stack, trailing, safe_end, False
+        else:
+            if last_comma >= 0 and not text[last_comma + 1:index].strip():
+                # 连续的逗号（",,"）同样按多余的逗号删除
+                trailing.append(last_comma)
+            last_comma = index
+            safe_end = index
+
+
+def _without(text: str, start: int, end: int, removed: List[int]) -> str:
+    """text[start:end]去掉removed中的位置（已按升序排列）"""
+    parts = []
+    cursor = start
+    for index in removed:
+        if index >= end:
+            break
+        parts.append(text[cursor:index])
+        cursor = index + 1
+    parts.append(text[cursor:end])
+    return "".join(parts)
+
+
+def _repair(text: str, start: int) -> Optional[ExtractedJSON]:
+    """原文不是合法JSON时扫描并修复：删除多余的逗号，补全被截断的括号"""
+    scanned = _scan(text, start)
+    if scanned is None:
+        return None
+    end, stack, trailing, safe_end, in_string = scanned
+    repairs = (REPAIR_TRAILING_COMMA,) if trailing else ()
+
+    if end is not None:
+        try:
+            return ExtractedJSON(json.loads(_without(text, start, end, trailing)), start, end, repairs)
+        except json.JSONDecodeError:
+            return None
+
+    # 输出被截断：末尾是完整的字符串或字面量时保留到文本末尾，否则退回到最后一个完整的值，再依次闭合括号
+    closing = "".join(reversed(stack))
+    candidates = []
+    tail = text[safe_end:]
+    if not in_string and _COMPLETE_TAIL.search(tail):
+        candidates.append(_without(text, start, len(text), trailing).rstrip() + closing)
+    candidates.append(_without(text, start, safe_end, trailing).rstrip().rstrip(",") + closing)
+    for candidate in candidates:
+        try:
+            return ExtractedJSON(json.loads(candidate), start, len(text), repairs + (REPAIR_TRUNCATED,))
+        except json.JSONDecodeError:
+            continue
+    return None
+
+
+def find_json(text: Optional[str], expect: Optional[type] = None) -> Optional[ExtractedJSON]:
+    """
+    从模型输出中找出第一个JSON对象或数组
+
+    先以C实现的解码器从第一个括号处解析（忽略其前的```json代码块标记、说明文字和其后的内容），
+    失败时单遍扫描括号平衡并修复多余的逗号和被截断的结尾。总耗时与文本长度成线性关系。
+
+    Args:
+        text: 模型输出
+        expect: dict或list时只接受该类型，None时接受对象或数组
+
+    Returns:
+        提取结果，找不到可解析的JSON时返回None
+    """
+    if not text:
+        return None
+    opener = _OPENER[expect]
+    pos = 0
+    for _ in range(_MAX_CANDIDATES):
+        match = opener.search(text, pos)
+        if match is None:
+            return None
+        start = match.start()
+        try:
+            value, end = _decoder.raw_decode(text, start)
+            result = ExtractedJSON(value, start, end)
+        except json.JSONDecodeError:
+            result = _repair(text, start)
+        if result is not None and (expect is None or isinstance(result.value, expect)):
+            if result.repairs:
+                logger.info(f"模型输出的JSON已修复: {', '.join(result.repairs)}")
+            return result
+        if result is not None and REPAIR_TRUNCATED in result.repairs:
+            return None
+        pos = start + 1
+    return None
+
+
+def extract_json(text: Optional[str], expect: Optional[type] = None, default: Any = None) -> Any:
+    """
+    从模型输出中提取JSON值
+
+    Args:
+        text: 模型输出
+        expect: dict或list时只接受该类型
+        default: 找不到可解析的JSON时的返回值
+
+    Returns:
+        解析后的值或default
+    """
+    result = find_json(text, expect)
+    return result.value if result is not None else default
@@ -0,0 +1,479 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+from .llm_usage import extract_usage
+
+
+logger = logging.getLogger("CNA.cassette")
+
+# off：不干预；record：真实调用并写入cassette；replay：只从cassette回放，不访问网络
+CASSETTE_MODES = ("off", "record", "replay")
+
+# 2：每次调用追加一行JSON记录（JSON Lines）；1：整个文件为{"version": 1, "entries": {...}}，加载时仍可读取
+CASSETTE_VERSION = 2
+
+# 不参与请求哈希的参数（超时、鉴权等与模型输出无关的传输参数）
+_TRANSPORT_KWARGS = ("timeout", "request_options", "extra_headers", "extra_query", "extra_body")
+
+
+class CassetteMissError(RuntimeError):
+    """回放模式下cassette中没有对应请求的录制"""
+
+    def __init__(self, provider: str, key: str):
+        super().__init__(f"cassette中没有 {provider} 请求 {key[:12]} 的录制，请先在record模式下运行")
+        self.provider = provider
+        self.key = key
+
+
+class CassetteResponse:
+    """回放的响应对象，支持与SDK响应相同的属性访问（如response.text、response.usage_metadata）"""
+
+    def __init__(self, data: Dict[str, Any]):
+        for name, value in data.items():
+            setattr(self, name, _to_response(value))
+
+    def __repr__(self):
+        return f"CassetteResponse({self.__dict__})"
+
+
+class CassetteStream:
+    """
+    流式调用的录制/回放结果：迭代得到各分块，其余属性（如Gemini流结束后的text、usage_metadata）
+    录制时取自真实响应，回放时取自录制的完整响应
+    """
+
+    def __init__(self, chunks: Iterator[Any], response: Any = None):
+        self._chunks = chunks
+        self._response = response
+
+    def __iter__(self) -> Iterator[Any]:
+        return iter(self._chunks)
+
+    def __getattr__(self, name: str) -> Any:
+        if name.startswith("_") or self._response is None:
+            raise AttributeError(name)
+        return getattr(self._response, name)
+
+
+def _to_response(value: Any) -> Any:
+    if isinstance(value, dict):
+        return CassetteResponse(value)
+    if isinstance(value, list):
+        return [_to_response(item) for item in value]
+    return value
+
+
+def _normalize(value: Any) -> Any:
+    """
+    将请求内容转换为可稳定哈希的JSON结构
+
+    图像只保留像素内容的摘要和尺寸，不写入cassette。
+    """
+    if value is None or isinstance(value, (str, int, float, bool)):
+        return value
+    if isinstance(value, dict):
+        return {str(k): _normalize(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_normalize(v) for v in value]
+    if isinstance(value, (bytes, bytearray)):
+        return {"bytes_sha256": hashlib.sha256(value).hexdigest(), "length": len(value)}
+    if hasattr(value, "tobytes") and hasattr(value, "size") and hasattr(value, "mode"):
+        return {"image_sha256": hashlib.sha256(value.tobytes()).hexdigest(),
+                "size": list(value.size), "mode": value.mode}
+    if hasattr(value, "model_dump"):
+        return _normalize(value.model_dump())
+    return repr(value)
+
+
+class LLMCassette:
+    """
+    按请求哈希保存模型调用的请求和响应，用于离线重放完整评估流程
+
+    录制文件为JSON Lines，每次调用追加一行{key, provider, request, response, elapsed_s}
+    （流式调用为chunks和final），同一请求以最后一行为准。追加只写入新记录，多个线程和
+    预派生的多个工作进程可以同时录制到同一文件；进程中断时写了一半的行在加载时跳过。
+    """
+
+    def __init__(self, path: str, mode: str = "record", latency_scale: float = 0.0):
+        """
+        Args:
+            path: cassette文件路径
+            mode: "record" 或 "replay"
+            latency_scale: 回放时按录制耗时乘以该系数等待，0为不等待，1为还原录制时的延迟
+        """
+        if mode not in ("record", "replay"):
+            raise ValueError(f"不支持的cassette模式: {mode}")
+        self.path = path
+        self.mode = mode
+        self.latency_scale = latency_scale
+        self._lock = threading.Lock()
+        self.entries: Dict[str, Dict[str, Any]] = {}
+        self.hits = 0
+        self.recorded = 0
+
+        if os.path.exists(path):
+            self._load()
+        elif mode == "replay":
+            raise FileNotFoundError(f"cassette文件不存在: {path}")
+
+    def _load(self):
+        """读取录制文件；旧版的整文件JSON在录制模式下转换为JSON Lines，之后即可追加"""
+        with open(self.path, "r", encoding="utf-8") as f:
+            content = f.read()
+        try:
+            legacy = json.loads(content)
+        except json.JSONDecodeError:
+            legacy = None
+        if isinstance(legacy, dict) and isinstance(legacy.get("entries"), dict):
+            self.entries = legacy["entries"]
+            if self.mode == "record":
+                self._rewrite()
+            return
+
+        if self.mode == "record" and content and not content.endswith("\n"):
+            # 上次录制中断在行中间：先补一个换行，之后追加的记录从新行开始
+            self._append("\n")
+        for number, line in enumerate(content.splitlines(), 1):
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+                self.entries[record.pop("key")] = record
+            except (json.JSONDecodeError, KeyError, AttributeError):
+                logger.warning(f"跳过cassette第{number}行（内容不完整）: {self.path}")
+
+    @staticmethod
+    def key(provider: str, request: Dict[str, Any]) -> str:
+        """请求的稳定哈希"""
+        payload = json.dumps({"provider": provider, "request": request}, ensure_ascii=False, sort_keys=True)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def call(self, provider: str, request: Dict[str, Any], func: Callable[[], Any],
+             serialize: Callable[[Any], Any], deserialize: Callable[[Any], Any]) -> Any:
+        """
+        按模式录制或回放一次调用
+
+        Args:
+            provider: 调用来源（autogen、gemini、openai）
+            request: 已规范化的请求内容
+            func: 执行真实调用的无参函数
+            serialize: 将真实响应转换为可写入JSON的结构
+            deserialize: 将录制的响应还原为调用方期望的对象
+
+        Returns:
+            真实响应或回放的响应
+        """
+        key = self.key(provider, request)
+
+        if self.mode == "replay":
+            entry = self.entries.get(key)
+            if entry is None:
+                raise CassetteMissError(provider, key)
+            if self.latency_scale > 0 and entry.get("elapsed_s"):
+                time.sleep(entry["elapsed_s"] * self.latency_scale)
+            with self._lock:
+                self.hits += 1
+            return deserialize(entry["response"])
+
+        started = time.monotonic()
+        response = func()
+        self._record(key, {
+            "provider": provider,
+            "request": request,
+            "response": serialize(response),
+            "elapsed_s": round(time.monotonic() - started, 3),
+        })
+        return response
+
+    def call_stream(self, provider: str, request: Dict[str, Any], func: Callable[[], Any],
+                    serialize_chunk: Callable[[Any], Any], deserialize_chunk: Callable[[Any], Any],
+                    serialize_final: Optional[Callable[[Any], Any]] = None) -> CassetteStream:
+        """
+        按模式录制或回放一次流式调用
+
+        录制时边迭代真实的流边保存各分块，流被完整读完后才写入记录（中途放弃的流不录制）。
+
+        Args:
+            provider: 调用来源（gemini、openai）
+            request: 已规范化的请求内容（包含stream参数，与非流式调用的录制互不影响）
+            func: 执行真实调用的无参函数，返回可迭代的流
+            serialize_chunk: 将分块转换为可写入JSON的结构
+            deserialize_chunk: 将录制的分块还原为调用方期望的对象
+            serialize_final: 可选，流读完后将完整响应转换为可写入JSON的结构（如Gemini的text和用量）
+
+        Returns:
+            可迭代各分块的CassetteStream
+        """
+        key = self.key(provider, request)
+
+        if self.mode == "replay":
+            entry = self.entries.get(key)
+            if entry is None or "chunks" not in entry:
+                raise CassetteMissError(provider, key)
+            if self.latency_scale > 0 and entry.get("elapsed_s"):
+                time.sleep(entry["elapsed_s"] * self.latency_scale)
+            with self._lock:
+                self.hits += 1
+            final = entry.get("final")
+            return CassetteStream([deserialize_chunk(chunk) for chunk in entry["chunks"]],
+                                  _to_response(final) if final is not None else None)
+
+        started = time.monotonic()
+        response = func()
+
+        def _chunks():
+            chunks: List[Any] = []
+            for chunk in response:
+                chunks.append(serialize_chunk(chunk))
+                yield chunk
+            self._record(key, {
+                "provider": provider,
+                "request": request,
+                "chunks": chunks,
+                "final": serialize_final(response) if serialize_final is not None else None,
+                "elapsed_s": round(time.monotonic() - started, 3),
+            })
+
+        return CassetteStream(_chunks(), response)
+
+    def _record(self, key: str, entry: Dict[str, Any]):
+        """保存一条录制并追加到文件"""
+        line = json.dumps({"key": key, **entry}, ensure_ascii=False, default=str) + "\n"
+        with self._lock:
+            self.entries[key] = entry
+            self.recorded += 1
+            self._append(line)
+
+    def _append(self, line: str):
+        """
+        以O_APPEND一次写入一行（调用方持有锁）
+
+        追加写入的位置由内核保证在文件末尾，多个进程同时追加时各行不会互相覆盖。
+        """
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            os.write(fd, line.encode("utf-8"))
+        finally:
+            os.close(fd)
+
+    def _rewrite(self):
+        """将全部录制原子写为JSON Lines，临时文件名包含进程和线程ID，避免并发写入互相覆盖"""
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = f"{self.path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            for key, entry in self.entries.items():
+                f.write(json.dumps({"key": key, **entry}, ensure_ascii=False, default=str) + "\n")
+        os.replace(tmp_path, self.path)
+
+
+# 当前线程是否处于autogen调用内部：内部的SDK调用不单独录制，只采集用量
+_state = threading.local()
+_active_cassette: Optional[LLMCassette] = None
+
+
+def active_cassette() -> Optional[LLMCassette]:
+    """返回已安装的cassette（未安装时为None）"""
+    return _active_cassette
+
+
+def _in_agent_call() -> bool:
+    return getattr(_state, "depth", 0) > 0
+
+
+def _serialize_gemini(response: Any) -> Dict[str, Any]:
+    try:
+        text = response.text
+    except Exception:
+        text = None
+    usage = extract_usage(response)
+    usage_metadata = None
+    if usage is not None:
+        usage_metadata = {
+            "prompt_token_count": usage["prompt_tokens"],
+            "candidates_token_count": usage["completion_tokens"],
+            "cached_content_token_count": usage["cached_tokens"],
+        }
+    return {"text": text, "usage_metadata": usage_metadata}
+
+
+def _serialize_openai(response: Any) -> Any:
+    return response.model_dump() if hasattr(response, "model_dump") else _normalize(response)
+
+
+def _deserialize_openai(data: Any) -> Any:
+    try:
+        from openai.types.chat import ChatCompletion
+        return ChatCompletion.model_validate(data)
+    except Exception:
+        return _to_response(data)
+
+
+def _deserialize_openai_chunk(data: Any) -> Any:
+    try:
+        from openai.types.chat import ChatCompletionChunk
+        return ChatCompletionChunk.model_validate(data)
+    except Exception:
+        return _to_response(data)
+
+
+def _patch_autogen(cassette: LLMCassette):
+    try:
+        import autogen
+    except ImportError:
+        return
+    agent_class = getattr(autogen, "ConversableAgent", None)
+    if agent_class is None or getattr(agent_class.generate_reply, "_cassette_patched", False):
+        return
+    original_generate_reply = agent_class.generate_reply
+
+    def generate_reply(self, messages=None, sender=None, **kwargs):
+        llm_config = getattr(self, "llm_config", None) or {}
+        request = {
+            "agent": getattr(self, "name", None),
+            "system_message": getattr(self, "system_message", None),
+            "models": [c.get("model") for c in llm_config.get("config_list", [])] if isinstance(llm_config, dict) else [],
+            "messages": _normalize(messages),
+        }
+
+        def _call():
+            _state.depth = getattr(_state, "depth", 0) + 1
+            _state.usage = None
+            try:
+                return original_generate_reply(self, messages=messages, sender=sender, **kwargs)
+            finally:
+                _state.depth -= 1
+
+        def _serialize(reply):
+            return {"reply": reply, "usage": _state.usage}
+
+        def _deserialize(data):
+            # 回放时通过instrument_agent挂接的回调补记用量，保持llm_usage汇总与真实运行一致
+            callback = getattr(getattr(self, "client", None), "_record_usage", None)
+            usage = data.get("usage")
+            if callback and usage:
+                callback({"usage": {"prompt_tokens": usage["prompt_tokens"],
+                                    "completion_tokens": usage["completion_tokens"],
+                                    "prompt_cache_hit_tokens": usage["cached_tokens"]}})
+            return data["reply"]
+
+        return cassette.call("autogen", request, _call, _serialize, _deserialize)
+
+    generate_reply._cassette_patched = True
+    agent_class.generate_reply = generate_reply
+
+    # 录制时从autogen的模型客户端读取每次调用的用量
+    wrapper_class = getattr(autogen, "OpenAIWrapper", None)
+    if wrapper_class is not None:
+        original_create = wrapper_class.create
+
+        def create(self, *args, **kwargs):
+            response = original_create(self, *args, **kwargs)
+            if _in_agent_call():
+                _state.usage = extract_usage(response)
+            return response
+
+        wrapper_class.create = create
+
+
+def _patch_gemini(cassette: LLMCassette):
+    try:
+        import google.generativeai as genai
+    except ImportError:
+        return
+    model_class = genai.GenerativeModel
+    if getattr(model_class.generate_content, "_cassette_patched", False):
+        return
+    original_generate_content = model_class.generate_content
+
+    def generate_content(self, contents, *args, **kwargs):
+        if _in_agent_call():
+            return original_generate_content(self, contents, *args, **kwargs)
+        request = {
+            "model": getattr(self, "model_name", None),
+            "contents": _normalize(contents),
+            "args": _normalize(args),
+            "kwargs": _normalize({k: v for k, v in kwargs.items() if k not in _TRANSPORT_KWARGS}),
+        }
+        if kwargs.get("stream"):
+            # 流读完后的完整响应同样保存text和用量，调用方可以在迭代后读取response.text、记录用量
+            return cassette.call_stream(
+                "gemini", request, lambda: original_generate_content(self, contents, *args, **kwargs),
+                _serialize_gemini, _to_response, serialize_final=_serialize_gemini
+            )
+        return cassette.call(
+            "gemini", request, lambda: original_generate_content(self, contents, *args, **kwargs),
+            _serialize_gemini, _to_response
+        )
+
+    generate_content._cassette_patched = True
+    model_class.generate_content = generate_content
+
+
+def _patch_openai(cassette: LLMCassette):
+    try:
+        from openai.resources.chat.completions import Completions
+    except ImportError:
+        return
+    if getattr(Completions.create, "_cassette_patched", False):
+        return
+    original_create = Completions.create
+
+    def create(self, *args, **kwargs):
+        # autogen内部的调用不单独录制
+        if _in_agent_call():
+            return original_create(self, *args, **kwargs)
+        request = _normalize({k: v for k, v in kwargs.items() if k not in _TRANSPORT_KWARGS})
+        if kwargs.get("stream"):
+            return cassette.call_stream(
+                "openai", request, lambda: original_create(self, *args, **kwargs),
+                _serialize_openai, _deserialize_openai_chunk
+            )
+        return cassette.call(
+            "openai", request, lambda: original_create(self, *args, **kwargs),
+            _serialize_openai, _deserialize_openai
+        )
+
+    create._cassette_patched = True
+    Completions.create = create
+
+
+def install_cassette(mode: str, path: str, latency_scale: float = 0.0) -> Optional[LLMCassette]:
+    """
+    按模式为autogen的generate_reply、Gemini的generate_content和OpenAI客户端安装录制/回放（包括流式调用）
+
+    在进程启动、创建任何智能体之前调用一次；mode为off时不做任何修改。
+
+    Args:
+        mode: "off"、"record" 或 "replay"
+        path: cassette文件路径
+        latency_scale: 回放延迟系数
+
+    Returns:
+        安装的cassette，mode为off时返回None
+    """
+    global _active_cassette
+    mode = (mode or "off").lower()
+    if mode not in CASSETTE_MODES:
+        raise ValueError(f"LLM_CASSETTE_MODE必须是{'、'.join(CASSETTE_MODES)}之一，当前为: {mode}")
+    if mode == "off":
+        return None
+    if _active_cassette is not None:
+        return _active_cassette
+
+    cassette = LLMCassette(path, mode, latency_scale)
+    _patch_autogen(cassette)
+    _patch_gemini(cassette)
+    _patch_openai(cassette)
+    _active_cassette = cassette
+    logger.info(f"模型调用{'录制' if mode == 'record' else '回放'}已启用: {path}（{len(cassette.entries)}条录制）")
+    return cassette
@@ -0,0 +1,255 @@
+import logging
+from typing import Any, Dict, Iterator, List, Optional
+
+from .deadline import request_timeout
+
+
+logger = logging.getLogger("CNA.llm_client")
+
+# autogen：经由autogen.AssistantAgent.generate_reply调用；direct：直接调用Gemini/OpenAI兼容SDK
+LLM_BACKENDS = ("autogen", "direct")
+DEFAULT_LLM_BACKEND = "autogen"
+
+# llm_config中传给模型的生成参数，及其在Gemini generation_config中的名称
+_GENERATION_PARAMS = {"temperature": "temperature", "top_p": "top_p", "max_tokens": "max_output_tokens"}
+
+
+def normalize_backend(backend: Optional[str]) -> str:
+    """
+    规范化模型调用方式
+
+    Raises:
+        ValueError: 未知的调用方式
+    """
+    value = (backend or DEFAULT_LLM_BACKEND).strip().lower()
+    if value not in LLM_BACKENDS:
+        raise ValueError(f"LLM_BACKEND必须是{'、'.join(LLM_BACKENDS)}之一，当前为: {backend}")
+    return value
+
+
+def _generation_params(llm_config: Dict[str, Any], entry: Dict[str, Any]) -> Dict[str, Any]:
+    """llm_config顶层和config_list条目中的生成参数，条目中的优先"""
+    params = {}
+    for source in (llm_config, entry):
+        for name in _GENERATION_PARAMS:
+            if source.get(name) is not None:
+                params[name] = source[name]
+    return params
+
+
+def response_text(response: Any) -> str:
+    """提取Gemini（response.text）或OpenAI兼容接口（choices[0].message.content）响应中的文本"""
+    choices = getattr(response, "choices", None)
+    if choices:
+        return getattr(choices[0].message, "content", None) or ""
+    try:
+        return response.text or ""
+    except (AttributeError, ValueError):
+        # Gemini的响应被安全策略拦截时没有文本
+        return ""
+
+
+class _OpenAICompatibleClient:
+    """OpenAI兼容接口（DeepSeek、本地模拟服务）的单个模型配置"""
+
+    def __init__(self, entry: Dict[str, Any], params: Dict[str, Any], system_message: str, timeout: Optional[float]):
+        from openai import OpenAI
+        self.model = entry["model"]
+        self.params = params
+        self.system_message = system_message
+        # 属性名与autogen的OpenAIClient一致，cancellation.close_agent_clients据此关闭连接
+        self._oai_client = OpenAI(api_key=entry.get("api_key"), base_url=entry.get("base_url"), timeout=timeout)
+
+    def _messages(self, messages: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        if not self.system_message:
+            return list(messages)
+        return [{"role": "system", "content": self.system_message}, *messages]
+
+    @staticmethod
+    def _request_options() -> Dict[str, Any]:
+        # 在限时调用中时以剩余预算作为本次请求的超时
+        timeout = request_timeout()
+        return {"timeout": timeout} if timeout is not None else {}
+
+    def create(self, messages: List[Dict[str, Any]]) -> Any:
+        return self._oai_client.chat.completions.create(
+            model=self.model, messages=self._messages(messages), **self.params, **self._request_options()
+        )
+
+    def stream(self, messages: List[Dict[str, Any]]) -> Iterator[Any]:
+        return self._oai_client.chat.completions.create(
+            model=self.model, messages=self._messages(messages), stream=True,
+            stream_options={"include_usage": True}, **self.params, **self._request_options()
+        )
+
+    @staticmethod
+    def chunk_text(chunk: Any) -> str:
+        choices = getattr(chunk, "choices", None)
+        if not choices:
+            return ""
+        return getattr(choices[0].delta, "content", None) or ""
+
+
+class _GeminiClient:
+    """Gemini的单个模型配置"""
+
+    def __init__(self, entry: Dict[str, Any], params: Dict[str, Any], system_message: str):
+        import google.generativeai as genai
+        genai.configure(api_key=entry.get("api_key"))
+        self.model = entry["model"]
+        self._model = genai.GenerativeModel(
+            self.model,
+            system_instruction=system_message or None,
+            generation_config={_GENERATION_PARAMS[k]: v for k, v in params.items()} or None
+        )
+
+    @staticmethod
+    def _contents(messages: List[Dict[str, Any]]) -> Any:
+        # 单轮调用直接传文本，与其他直接调用Gemini的代码（图像识别、文本处理）一致
+        if len(messages) == 1 and messages[0].get("role", "user") == "user":
+            return messages[0].get("content") or ""
+        return [
+            {"role": "model" if message.get("role") == "assistant" else "user", "parts": [message.get("content") or ""]}
+            for message in messages
+        ]
+
+    @staticmethod
+    def _request_options() -> Optional[Dict[str, Any]]:
+        # 在限时调用中时以剩余预算作为本次请求的超时（与图像识别相同的request_options）
+        timeout = request_timeout()
+        return {"timeout": timeout} if timeout is not None else None
+
+    def create(self, messages: List[Dict[str, Any]]) -> Any:
+        return self._model.generate_content(self._contents(messages), request_options=self._request_options())
+
+    def stream(self, messages: List[Dict[str, Any]]) -> Iterator[Any]:
+        return self._model.generate_content(self._contents(messages), stream=True,
+                                            request_options=self._request_options())
+
+    @staticmethod
+    def chunk_text(chunk: Any) -> str:
+        return response_text(chunk)
+
+
+class DirectLLMClient:
+    """
+    直接调用模型SDK的客户端，接受与autogen相同的llm_config
+
+    与autogen的OpenAIWrapper一样按config_list顺序尝试，前一个配置调用失败时使用下一个；
+    create返回SDK的原始响应，llm_usage.instrument_agent可以同样包装它来记录用量。
+    """
+
+    def __init__(self, llm_config: Dict[str, Any], system_message: str = ""):
+        """
+        Args:
+            llm_config: 模型配置（config_list及temperature等生成参数）
+            system_message: 系统消息，每次调用都作为系统指令发送
+        """
+        self._clients = []
+        for entry in llm_config.get("config_list", []):
+            params = _generation_params(llm_config, entry)
+            if entry.get("api_type") == "google":
+                self._clients.append(_GeminiClient(entry, params, system_message))
+            else:
+                self._clients.append(_OpenAICompatibleClient(entry, params, system_message, llm_config.get("timeout")))
+        if not self._clients:
+            raise ValueError("llm_config中没有可用的config_list")
+
+    def create(self, messages: Optional[List[Dict[str, Any]]] = None, **kwargs) -> Any:
+        """
+        执行一次调用
+
+        Raises:
+            Exception: 所有模型配置都调用失败时抛出最后一个错误
+        """
+        last_error = None
+        for client in self._clients:
+            try:
+                return client.create(messages or [])
+            except Exception as e:
+                logger.warning(f"{client.model} 调用失败: {e}")
+                last_error = e
+        raise last_error
+
+    def stream(self, messages: Optional[List[Dict[str, Any]]] = None) -> Iterator[str]:
+        """
+        流式调用第一个模型配置，逐段返回文本
+
+        流结束后按最后一个带用量的分块补记用量（客户端已通过instrument_agent挂接时）。
+        """
+        client = self._clients[0]
+        usage_chunk = None
+        for chunk in client.stream(messages or []):
+            if getattr(chunk, "usage", None) is not None or getattr(chunk, "usage_metadata", None) is not None:
+                usage_chunk = chunk
+            text = client.chunk_text(chunk)
+            if text:
+                yield text
+        record = getattr(self, "_record_usage", None)
+        if record is not None and usage_chunk is not None:
+            record(usage_chunk)
+
+
+class DirectAgent:
+    """
+    单轮调用的轻量智能体，提供与autogen.AssistantAgent相同的name、system_message、client和generate_reply
+
+    各智能体的每次调用都只有一条用户消息，不需要autogen的对话历史、回复钩子和配置解析；
+    直接调用SDK省去了这部分开销，也便于使用流式输出和响应中的用量信息。
+    """
+
+    def __init__(self, name: str, llm_config: Dict[str, Any], system_message: str = ""):
+        self.name = name
+        self.llm_config = llm_config
+        self.system_message = system_message
+        self.client = DirectLLMClient(llm_config, system_message)
+
+    def generate_reply(self, messages: Optional[List[Dict[str, Any]]] = None, sender=None, **kwargs) -> str:
+        """与autogen相同的调用方式，返回回复文本"""
+        return response_text(self.client.create(messages=messages or []))
+
+    def stream_reply(self, messages: Optional[List[Dict[str, Any]]] = None) -> Iterator[str]:
+        """流式返回回复文本"""
+        return self.client.stream(messages or [])
+
+
+def create_llm_agent(name: str, llm_config: Dict[str, Any], system_message: str, backend: str = DEFAULT_LLM_BACKEND):
+    """
+    按调用方式创建智能体
+
+    Args:
+        name: 智能体名称
+        llm_config: 模型配置
+        system_message: 系统消息
+        backend: "autogen" 或 "direct"
+
+    Returns:
+        autogen.AssistantAgent或DirectAgent，两者都可以用generate_reply(messages=[...])调用
+    """
+    if normalize_backend(backend) == "direct":
+        return DirectAgent(name, llm_config, system_message)
+    import autogen
+    agent = autogen.AssistantAgent(name=name, llm_config=llm_config, system_message=system_message)
+    _pass_request_timeout(agent)
+    return agent
+
+
+def _pass_request_timeout(agent: Any):
+    """
+    包装autogen智能体的模型客户端，在限时调用中把剩余预算作为timeout传给OpenAIWrapper.create
+
+    OpenAIWrapper把timeout原样交给OpenAI SDK作为单次请求超时。autogen的Gemini客户端每次调用都新建SDK客户端，
+    不接受请求超时，会忽略该参数；需要Gemini请求随预算结束时使用direct调用方式。
+    """
+    client = getattr(agent, "client", None)
+    if client is None:
+        return
+    original_create = client.create
+
+    def create(*args, **kwargs):
+        timeout = request_timeout()
+        if timeout is not None and "timeout" not in kwargs:
+            kwargs["timeout"] = timeout
+        return original_create(*args, **kwargs)
+
+    client.create = create
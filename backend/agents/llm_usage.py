@@ -0,0 +1,155 @@
+import logging
+import threading
+from typing import Any, Dict, List, Optional
+
+
+logger = logging.getLogger("CNA.usage")
+
+
+def _get(obj: Any, name: str) -> Any:
+    """同时兼容SDK响应对象和字典形式的字段读取"""
+    if obj is None:
+        return None
+    if isinstance(obj, dict):
+        return obj.get(name)
+    return getattr(obj, name, None)
+
+
+def extract_usage(response: Any) -> Optional[Dict[str, int]]:
+    """
+    从模型响应中提取token用量和前缀缓存命中数
+
+    支持Gemini（usage_metadata.cached_content_token_count）和
+    OpenAI兼容接口（DeepSeek的usage.prompt_cache_hit_tokens，或usage.prompt_tokens_details.cached_tokens）。
+
+    Args:
+        response: SDK返回的响应对象
+
+    Returns:
+        {"prompt_tokens", "completion_tokens", "cached_tokens"}，响应中没有用量信息时返回None
+    """
+    metadata = _get(response, "usage_metadata")
+    if metadata is not None:
+        return {
+            "prompt_tokens": _get(metadata, "prompt_token_count") or 0,
+            "completion_tokens": _get(metadata, "candidates_token_count") or 0,
+            "cached_tokens": _get(metadata, "cached_content_token_count") or 0,
+        }
+
+    usage = _get(response, "usage")
+    if usage is not None:
+        cached = _get(usage, "prompt_cache_hit_tokens")
+        if cached is None:
+            cached = _get(_get(usage, "prompt_tokens_details"), "cached_tokens")
+        return {
+            "prompt_tokens": _get(usage, "prompt_tokens") or 0,
+            "completion_tokens": _get(usage, "completion_tokens") or 0,
+            "cached_tokens": cached or 0,
+        }
+
+    return None
+
+
+class UsageRecorder:
+    """
+    记录每次模型调用的token用量和缓存命中情况（线程安全）
+    """
+
+    def __init__(self):
+        self._records: List[Dict[str, Any]] = []
+        self._lock = threading.Lock()
+
+    def record(self, stage: str, response: Any) -> Optional[Dict[str, Any]]:
+        """
+        记录一次调用的用量
+
+        Args:
+            stage: 调用所属的阶段或智能体名称
+            response: SDK返回的响应对象
+
+        Returns:
+            记录的用量，响应中没有用量信息时返回None
+        """
+        usage = extract_usage(response)
+        if usage is None:
+            return None
+        entry = {"stage": stage, **usage}
+        with self._lock:
+            self._records.append(entry)
+        logger.info(
+            f"{stage} token用量: 输入 {usage['prompt_tokens']}（缓存命中 {usage['cached_tokens']}），"
+            f"输出 {usage['completion_tokens']}"
+        )
+        return entry
+
+    def records(self) -> List[Dict[str, Any]]:
+        """返回所有调用记录的副本"""
+        with self._lock:
+            return list(self._records)
+
+    def summary(self) -> Dict[str, Any]:
+        """
+        汇总所有调用的用量
+
+        Returns:
+            调用次数、各类token总数和缓存命中率
+        """
+        records = self.records()
+        prompt_tokens = sum(r["prompt_tokens"] for r in records)
+        cached_tokens = sum(r["cached_tokens"] for r in records)
+        return {
+            "calls": len(records),
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": sum(r["completion_tokens"] for r in records),
+            "cached_tokens": cached_tokens,
+            "cache_hit_ratio": round(cached_tokens / prompt_tokens, 4) if prompt_tokens else 0.0,
+            "calls_detail": records,
+        }
+
+
+# 未显式传入记录器时使用的进程级记录器
+DEFAULT_USAGE_RECORDER = UsageRecorder()
+
+
+def record_usage(stage: str, response: Any, recorder: Optional[UsageRecorder] = None) -> Optional[Dict[str, Any]]:
+    """使用指定（或默认）记录器记录一次调用的用量"""
+    return (recorder or DEFAULT_USAGE_RECORDER).record(stage, response)
+
+
+def instrument_agent(agent: Any, stage: str, recorder: Optional[UsageRecorder] = None):
+    """
+    为autogen智能体的模型客户端挂接用量记录
+
+    autogen的generate_reply只返回文本，这里包装agent.client.create，在每次调用后读取原始响应中的用量。
+    已挂接的客户端再次调用时只更新阶段名称和记录器，智能体池复用的智能体借此记录到当前评估。
+
+    Args:
+        agent: autogen.AssistantAgent实例
+        stage: 记录使用的阶段名称
+        recorder: 可选的用量记录器
+    """
+    client = getattr(agent, "client", None)
+    if client is None:
+        return
+    client._usage_target = (stage, recorder)
+    if getattr(client, "_usage_instrumented", False):
+        return
+
+    original_create = client.create
+
+    def _record(response):
+        target_stage, target_recorder = client._usage_target
+        try:
+            record_usage(target_stage, response, target_recorder)
+        except Exception as e:
+            logger.debug(f"记录 {target_stage} 用量失败: {e}")
+
+    def create(*args, **kwargs):
+        response = original_create(*args, **kwargs)
+        _record(response)
+        return response
+
+    client.create = create
+    # 不经过client.create的调用（如cassette回放）通过该回调补记用量
+    client._record_usage = _record
+    client._usage_instrumented = True
@@ -0,0 +1,473 @@
+import re
+from typing import Dict, Any, Iterable, List, Optional
+
+import numpy as np
+
+from .rule_extractor import canonical_lab_name
+
+
+# ==================== 评分阈值 ====================
+# NRS2002疾病严重程度评分的诊断关键词（取命中的最高分）
+DISEASE_SEVERITY_KEYWORDS = {
+    3: ["颅脑损伤", "骨髓移植", "ICU", "重症监护", "APACHE"],
+    2: ["腹部大手术", "胃切除", "结肠切除", "胰十二指肠", "脑卒中", "脑梗", "脑出血", "重症肺炎", "血液恶性肿瘤",
+        "白血病", "淋巴瘤"],
+    1: ["髋部骨折", "慢性疾病急性发作", "肝硬化", "慢性阻塞性肺", "慢阻肺", "COPD", "血液透析", "糖尿病",
+        "肿瘤", "癌", "心力衰竭", "心衰", "慢性肾"],
+}
+
+# GLIM病因标准中提示炎症/疾病负担的诊断关键词
+INFLAMMATORY_KEYWORDS = ["感染", "炎", "脓毒", "肿瘤", "癌", "烧伤", "创伤", "术后", "肝硬化", "慢阻肺", "COPD",
+                         "心力衰竭", "心衰", "慢性肾", "类风湿", "克罗恩"]
+
+NRS2002_RISK_THRESHOLD = 3          # NRS2002总分≥3分存在营养风险
+NRS2002_AGE_THRESHOLD = 70          # 年龄≥70岁加1分
+ALBUMIN_LOW_G_L = 35.0              # 白蛋白低于该值视为偏低
+CRP_INFLAMMATION_MG_L = 10.0        # CRP高于该值视为存在炎症
+HEMOGLOBIN_LOW_G_L = 110.0          # 血红蛋白低于该值视为贫血
+GLIM_LOW_BMI = 18.5                 # GLIM低BMI表型（亚洲人群，<70岁）
+GLIM_LOW_BMI_ELDERLY = 20.0         # GLIM低BMI表型（亚洲人群，≥70岁）
+GLIM_SEVERE_BMI = 17.0              # 重度营养不良的BMI界值
+
+# ==================== 能量/蛋白质/液体需要量 ====================
+ENERGY_KCAL_PER_KG = (25.0, 30.0)
+PROTEIN_G_PER_KG_AT_RISK = (1.2, 1.5)
+PROTEIN_G_PER_KG_DEFAULT = (1.0, 1.2)
+FLUID_ML_PER_KG = (30.0, 35.0)
+FLUID_ML_PER_KG_ELDERLY = (25.0, 30.0)
+OBESITY_BMI = 30.0                  # 肥胖患者使用校正体重计算需要量
+IDEAL_BMI = 22.0
+
+# 队列评分的输入列，缺失值为NaN
+COHORT_FIELDS = ("age", "height_cm", "weight_kg", "bmi", "weight_loss_percent", "weight_loss_months",
+                 "intake_reduction_percent", "intake_reduced", "disease_severity", "inflammatory_disease",
+                 "albumin", "crp", "hemoglobin", "reported_nrs2002", "has_diagnosis")
+
+GLIM_SEVERITY_LABELS = {0: "无营养不良", 1: "中度营养不良", 2: "重度营养不良"}
+
+_CHINESE_NUMBERS = {"一": 1, "二": 2, "两": 2, "三": 3, "四": 4, "五": 5, "六": 6, "七": 7, "八": 8, "九": 9,
+                    "十": 10, "半": 0.5}
+_NUMBER_PATTERN = re.compile(r'-?\d+(?:\.\d+)?')
+WEIGHT_LOSS_PATTERN = re.compile(
+    r'(?P<period>\d+(?:\.\d+)?|[一二两三四五六七八九十半])\s*(?:个)?\s*(?P<period_unit>月|周|年)'
+    r'[^。；;\n]{0,15}?体重(?:下降|减轻|减少|丢失)(?:了|约|近)*\s*'
+    r'(?P<amount>\d+(?:\.\d+)?)\s*(?P<amount_unit>kg|KG|Kg|公斤|千克|斤|%)'
+)
+INTAKE_REDUCTION_PATTERN = re.compile(
+    r'(?:进食量?|摄入量?|饮食量?|食量)(?:较前|较平时)?(?:减少|下降)(?:了|约)*\s*(?P<value>\d+(?:\.\d+)?)\s*%'
+)
+INTAKE_FRACTION_PATTERN = re.compile(
+    r'(?:进食量?|摄入量?|饮食量?|食量)(?:仅|为|仅为|约为|约)*(?:平时|正常|需要量)的?\s*(?P<value>\d+(?:\.\d+)?)\s*%'
+)
+INTAKE_FLAG_PATTERN = re.compile(r'(?:进食|摄入|饮食|食量)(?:明显)?(?:减少|下降|差|不足)|食欲(?:差|下降|减退|不振)|纳差|厌食')
+
+
+def _to_float(value: Any) -> float:
+    """将数值或带单位的字符串转换为浮点数，无法解析时返回NaN"""
+    if isinstance(value, bool) or value is None:
+        return np.nan
+    if isinstance(value, (int, float)):
+        return float(value)
+    match = _NUMBER_PATTERN.search(str(value))
+    return float(match.group()) if match else np.nan
+
+
+def _collect_text(patient_data: Dict[str, Any]) -> str:
+    """收集病史、会诊和诊断中的自由文本，用于解析体重变化和摄入情况"""
+    parts = []
+    for section in ("symptoms_and_history", "consultation_record", "treatment_plan"):
+        value = patient_data.get(section)
+        if isinstance(value, dict):
+            parts.extend(str(v) for v in value.values() if isinstance(v, str))
+        elif isinstance(value, str):
+            parts.append(value)
+    for diagnosis in patient_data.get("diagnoses") or []:
+        parts.append(diagnosis.get("description", "") if isinstance(diagnosis, dict) else str(diagnosis))
+    return "\n".join(p for p in parts if p)
+
+
+def _diagnosis_text(patient_data: Dict[str, Any]) -> str:
+    return "\n".join(
+        str(d.get("description", "")) if isinstance(d, dict) else str(d)
+        for d in patient_data.get("diagnoses") or []
+    )
+
+
+def _lab_values(patient_data: Dict[str, Any]) -> Dict[str, float]:
+    """按标准名称取检验结果中的首个数值"""
+    values = {}
+    lab_results = patient_data.get("lab_results") or {}
+    if not isinstance(lab_results, dict):
+        return values
+    for results in lab_results.values():
+        if not isinstance(results, list):
+            continue
+        for item in results:
+            if not isinstance(item, dict):
+                continue
+            name = canonical_lab_name(item.get("name", ""))
+            if name and name not in values:
+                value = _to_float(item.get("value"))
+                if not np.isnan(value):
+                    values[name] = value
+    return values
+
+
+def _reported_nrs2002(patient_data: Dict[str, Any]) -> float:
+    """病历中已记录的NRS2002评分"""
+    consultation = patient_data.get("consultation_record") or {}
+    return _to_float(consultation.get("NRS2002_score")) if isinstance(consultation, dict) else np.nan
+
+
+def extract_scoring_inputs(patient_data: Dict[str, Any]) -> Dict[str, float]:
+    """
+    从标准格式的患者记录中提取评分所需的数值输入
+
+    Args:
+        patient_data: 患者数据（patient_info、diagnoses、lab_results等）
+
+    Returns:
+        以COHORT_FIELDS为键的字典，缺失值为NaN，布尔值为0/1
+    """
+    patient_info = patient_data.get("patient_info") or {}
+    height = _to_float(patient_info.get("height_cm"))
+    weight = _to_float(patient_info.get("weight_kg"))
+    bmi = _to_float(patient_info.get("bmi"))
+    if np.isnan(bmi) and height > 0 and weight > 0:
+        bmi = weight / (height / 100) ** 2
+
+    text = _collect_text(patient_data)
+
+    weight_loss_percent = weight_loss_months = np.nan
+    match = WEIGHT_LOSS_PATTERN.search(text)
+    if match:
+        period = match.group("period")
+        months = _CHINESE_NUMBERS.get(period) or float(period)
+        if match.group("period_unit") == "周":
+            months /= 4.345
+        elif match.group("period_unit") == "年":
+            months *= 12
+        amount = float(match.group("amount"))
+        unit = match.group("amount_unit")
+        if unit == "%":
+            weight_loss_percent = amount
+        else:
+            loss_kg = amount / 2 if unit == "斤" else amount
+            if weight > 0:
+                weight_loss_percent = loss_kg / (weight + loss_kg) * 100
+        weight_loss_months = months
+
+    intake_reduction = np.nan
+    match = INTAKE_REDUCTION_PATTERN.search(text)
+    if match:
+        intake_reduction = float(match.group("value"))
+    else:
+        match = INTAKE_FRACTION_PATTERN.search(text)
+        if match:
+            intake_reduction = max(0.0, 100 - float(match.group("value")))
+    intake_reduced = float(intake_reduction > 0 or bool(INTAKE_FLAG_PATTERN.search(text)))
+
+    diagnosis_text = _diagnosis_text(patient_data)
+    disease_severity = 0.0
+    for score, keywords in DISEASE_SEVERITY_KEYWORDS.items():
+        if any(keyword.lower() in diagnosis_text.lower() for keyword in keywords):
+            disease_severity = max(disease_severity, float(score))
+    inflammatory = float(any(keyword.lower() in diagnosis_text.lower() for keyword in INFLAMMATORY_KEYWORDS))
+
+    labs = _lab_values(patient_data)
+    return {
+        "age": _to_float(patient_info.get("age")),
+        "height_cm": height,
+        "weight_kg": weight,
+        "bmi": bmi,
+        "weight_loss_percent": weight_loss_percent,
+        "weight_loss_months": weight_loss_months,
+        "intake_reduction_percent": intake_reduction,
+        "intake_reduced": intake_reduced,
+        "disease_severity": disease_severity,
+        "inflammatory_disease": inflammatory,
+        "albumin": labs.get("白蛋白", np.nan),
+        "crp": labs.get("C-反应蛋白", np.nan),
+        "hemoglobin": labs.get("血红蛋白", np.nan),
+        "reported_nrs2002": _reported_nrs2002(patient_data),
+        "has_diagnosis": float(bool(diagnosis_text.strip())),
+    }
+
+
+def records_to_columns(records: Iterable[Dict[str, Any]]) -> Dict[str, np.ndarray]:
+    """将多条患者记录转换为队列评分的列数组"""
+    rows = [extract_scoring_inputs(record) for record in records]
+    return {name: np.array([row[name] for row in rows], dtype=float) for name in COHORT_FIELDS}
+
+
+def score_cohort(columns: Dict[str, np.ndarray]) -> Dict[str, np.ndarray]:
+    """
+    向量化计算一组患者的NRS2002、GLIM和营养需要量
+
+    所有输入为等长的浮点数组（缺失值为NaN，布尔值为0/1），与NaN的比较结果为False，
+    因此缺失数据不会触发任何阳性标准。
+
+    Args:
+        columns: 以COHORT_FIELDS为键的列数组，可由records_to_columns生成
+
+    Returns:
+        以评分项为键的结果数组
+    """
+    n = len(next(iter(columns.values())))
+    col = {name: np.asarray(columns.get(name, np.full(n, np.nan)), dtype=float) for name in COHORT_FIELDS}
+    age, bmi, weight, height = col["age"], col["bmi"], col["weight_kg"], col["height_cm"]
+    loss, months = col["weight_loss_percent"], col["weight_loss_months"]
+    intake, intake_flag = col["intake_reduction_percent"], col["intake_reduced"] > 0
+
+    with np.errstate(invalid="ignore"):
+        # NRS2002营养状况受损评分（0-3）
+        impaired = intake_flag | (loss > 0)
+        status_3 = (bmi < 18.5) | ((loss > 5) & (months <= 1)) | ((loss > 15) & (months <= 3)) | (intake >= 75)
+        status_2 = ((loss > 5) & (months <= 2)) | ((bmi >= 18.5) & (bmi < 20.5) & impaired) | (intake >= 50)
+        status_1 = ((loss > 5) & (months <= 3)) | (intake >= 25) | intake_flag
+        nutritional_status = np.select([status_3, status_2, status_1], [3, 2, 1], 0)
+
+        disease_severity = np.nan_to_num(col["disease_severity"]).astype(int)
+        elderly = age >= NRS2002_AGE_THRESHOLD
+        nrs_total = nutritional_status + disease_severity + elderly.astype(int)
+
+        # GLIM表型标准和病因标准
+        low_bmi = np.where(elderly, bmi < GLIM_LOW_BMI_ELDERLY, bmi < GLIM_LOW_BMI)
+        weight_loss_criterion = ((loss > 5) & (months <= 6)) | ((loss > 10) & (months > 6))
+        reduced_intake = (intake >= 50) | intake_flag
+        inflammation = (col["crp"] > CRP_INFLAMMATION_MG_L) | (col["inflammatory_disease"] > 0)
+        malnutrition = (low_bmi | weight_loss_criterion) & (reduced_intake | inflammation)
+        severe = malnutrition & (((loss > 10) & (months <= 6)) | ((loss > 20) & (months > 6)) | (bmi < GLIM_SEVERE_BMI))
+        glim_severity = np.where(severe, 2, np.where(malnutrition, 1, 0))
+
+        # 需要量：肥胖患者使用校正体重
+        ideal_weight = IDEAL_BMI * (height / 100) ** 2
+        reference_weight = np.where(bmi >= OBESITY_BMI, ideal_weight + 0.25 * (weight - ideal_weight), weight)
+        at_risk = (nrs_total >= NRS2002_RISK_THRESHOLD) | malnutrition
+        protein_per_kg_low = np.where(at_risk, PROTEIN_G_PER_KG_AT_RISK[0], PROTEIN_G_PER_KG_DEFAULT[0])
+        protein_per_kg_high = np.where(at_risk, PROTEIN_G_PER_KG_AT_RISK[1], PROTEIN_G_PER_KG_DEFAULT[1])
+        fluid_low = np.where(elderly, FLUID_ML_PER_KG_ELDERLY[0], FLUID_ML_PER_KG[0])
+        fluid_high = np.where(elderly, FLUID_ML_PER_KG_ELDERLY[1], FLUID_ML_PER_KG[1])
+
+        return {
+            "nrs2002_nutritional_status": nutritional_status,
+            "nrs2002_disease_severity": disease_severity,
+            "nrs2002_age_adjustment": elderly.astype(int),
+            "nrs2002_total": nrs_total,
+            "nrs2002_at_risk": nrs_total >= NRS2002_RISK_THRESHOLD,
+            "glim_low_bmi": low_bmi,
+            "glim_weight_loss": weight_loss_criterion,
+            "glim_reduced_intake": reduced_intake,
+            "glim_inflammation": inflammation,
+            "glim_malnutrition": malnutrition,
+            "glim_severity": glim_severity,
+            "albumin_low": col["albumin"] < ALBUMIN_LOW_G_L,
+            "crp_elevated": col["crp"] > CRP_INFLAMMATION_MG_L,
+            "anemia": col["hemoglobin"] < HEMOGLOBIN_LOW_G_L,
+            "reference_weight_kg": reference_weight,
+            "energy_kcal_low": np.round(reference_weight * ENERGY_KCAL_PER_KG[0], -1),
+            "energy_kcal_high": np.round(reference_weight * ENERGY_KCAL_PER_KG[1], -1),
+            "protein_g_low": np.round(reference_weight * protein_per_kg_low),
+            "protein_g_high": np.round(reference_weight * protein_per_kg_high),
+            "fluid_ml_low": np.round(reference_weight * fluid_low / 50) * 50,
+            "fluid_ml_high": np.round(reference_weight * fluid_high / 50) * 50,
+        }
+
+
+def _scalar(value: Any) -> Any:
+    """numpy标量转换为JSON友好的Python值，NaN转换为None"""
+    if isinstance(value, np.bool_):
+        return bool(value)
+    if isinstance(value, np.integer):
+        return int(value)
+    if isinstance(value, np.floating):
+        return None if np.isnan(value) else round(float(value), 1)
+    return value
+
+
+def _range(low: Any, high: Any) -> Optional[List[Any]]:
+    low, high = _scalar(low), _scalar(high)
+    return None if low is None or high is None else [low, high]
+
+
+def score_patient(patient_data: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    计算单个患者的NRS2002、GLIM和能量/蛋白质/液体需要量
+
+    与队列评分使用同一套向量化实现，保证结果一致。
+
+    Args:
+        patient_data: 标准格式的患者数据
+
+    Returns:
+        结构化的评分结果（可直接序列化为JSON）
+    """
+    inputs = extract_scoring_inputs(patient_data)
+    result = {name: values[0] for name, values in
+              score_cohort({name: np.array([value]) for name, value in inputs.items()}).items()}
+
+    return {
+        "nrs2002": {
+            "nutritional_status": _scalar(result["nrs2002_nutritional_status"]),
+            "disease_severity": _scalar(result["nrs2002_disease_severity"]),
+            "age_adjustment": _scalar(result["nrs2002_age_adjustment"]),
+            "total": _scalar(result["nrs2002_total"]),
+            "at_risk": _scalar(result["nrs2002_at_risk"]),
+            "reported_total": _scalar(np.float64(inputs["reported_nrs2002"])),
+        },
+        "glim": {
+            "phenotypic": {
+                "low_bmi": _scalar(result["glim_low_bmi"]),
+                "weight_loss": _scalar(result["glim_weight_loss"]),
+            },
+            "etiologic": {
+                "reduced_intake": _scalar(result["glim_reduced_intake"]),
+                "inflammation": _scalar(result["glim_inflammation"]),
+            },
+            "malnutrition": _scalar(result["glim_malnutrition"]),
+            "severity": GLIM_SEVERITY_LABELS[int(result["glim_severity"])],
+        },
+        "lab_flags": {
+            "albumin_low": _scalar(result["albumin_low"]),
+            "crp_elevated": _scalar(result["crp_elevated"]),
+            "anemia": _scalar(result["anemia"]),
+        },
+        "requirements": {
+            "reference_weight_kg": _scalar(result["reference_weight_kg"]),
+            "energy_kcal": _range(result["energy_kcal_low"], result["energy_kcal_high"]),
+            "protein_g": _range(result["protein_g_low"], result["protein_g_high"]),
+            "fluid_ml": _range(result["fluid_ml_low"], result["fluid_ml_high"]),
+        },
+        "inputs": {name: _scalar(np.float64(value)) for name, value in inputs.items()},
+    }
+
+
+def format_scores_for_prompt(scores: Dict[str, Any]) -> str:
+    """
+    将评分结果格式化为提示中的参考信息
+
+    Args:
+        scores: score_patient的返回值
+
+    Returns:
+        中文的评分摘要
+    """
+    nrs = scores["nrs2002"]
+    glim = scores["glim"]
+    requirements = scores["requirements"]
+    inputs = scores["inputs"]
+
+    def _fmt_range(values, unit):
+        return f"{values[0]:g}-{values[1]:g} {unit}" if values else "数据不足，无法计算"
+
+    lines = [
+        f"NRS2002（规则计算）：营养状况{nrs['nutritional_status']}分 + 疾病严重程度{nrs['disease_severity']}分"
+        f" + 年龄{nrs['age_adjustment']}分 = {nrs['total']}分，{'存在营养风险' if nrs['at_risk'] else '暂无营养风险'}"
+        + (f"（记录中的评分：{nrs['reported_total']:g}分）" if nrs["reported_total"] is not None else ""),
+        f"GLIM：低BMI {'是' if glim['phenotypic']['low_bmi'] else '否'}，"
+        f"体重下降 {'是' if glim['phenotypic']['weight_loss'] else '否'}，"
+        f"摄入减少 {'是' if glim['etiologic']['reduced_intake'] else '否'}，"
+        f"炎症/疾病负担 {'是' if glim['etiologic']['inflammation'] else '否'}，结论：{glim['severity']}",
+        f"BMI：{inputs['bmi'] if inputs['bmi'] is not None else '未知'}，"
+        f"近期体重下降：{str(inputs['weight_loss_percent']) + '%' if inputs['weight_loss_percent'] is not None else '未记录'}",
+        f"每日需要量（参考体重{str(requirements['reference_weight_kg']) + ' kg' if requirements['reference_weight_kg'] else '未知'}）："
+        f"能量{_fmt_range(requirements['energy_kcal'], 'kcal')}，"
+        f"蛋白质{_fmt_range(requirements['protein_g'], 'g')}，液体{_fmt_range(requirements['fluid_ml'], 'ml')}",
+    ]
+    return "\n".join(lines)
+
+
+# ==================== 预筛查 ====================
+# 命中任意一项时不跳过完整评估，即使风险评分低于阈值
+PRESCREEN_RED_FLAGS = {
+    "glim_malnutrition": "符合GLIM营养不良标准",
+    "glim_low_bmi": "BMI偏低",
+    "glim_weight_loss": "近期体重明显下降",
+    "glim_reduced_intake": "进食减少",
+    "albumin_low": "白蛋白偏低",
+    "crp_elevated": "CRP升高",
+}
+
+# 跳过完整评估前必须有记录的输入；缺少任意一项时无法排除营养风险（如只有BMI而没有化验和诊断）
+PRESCREEN_REQUIRED_FIELDS = {
+    "bmi": "身高体重/BMI",
+    "albumin": "白蛋白",
+    "crp": "CRP",
+    "has_diagnosis": "诊断",
+}
+
+
+def prescreen_cohort(columns: Dict[str, np.ndarray], threshold: float) -> Dict[str, np.ndarray]:
+    """
+    向量化判断一组患者能否跳过完整的多智能体评估
+
+    风险评分取规则计算的NRS2002总分和病历记录评分中的较高者。只有BMI、白蛋白、CRP
+    和诊断（PRESCREEN_REQUIRED_FIELDS）均有记录、未命中任何PRESCREEN_RED_FLAGS且风险评分
+    低于阈值的患者判定为低风险，数据不足的患者一律进入完整评估。
+
+    Args:
+        columns: 以COHORT_FIELDS为键的列数组
+        threshold: 风险评分阈值，低于该值为低风险
+
+    Returns:
+        risk_score、data_sufficient、low_risk以及各红旗标准的结果数组
+    """
+    scores = score_cohort(columns)
+    reported = np.asarray(columns.get("reported_nrs2002", np.full(len(scores["nrs2002_total"]), np.nan)),
+                          dtype=float)
+    risk_score = np.fmax(scores["nrs2002_total"].astype(float), reported)
+    red_flag = np.zeros(len(risk_score), dtype=bool)
+    for key in PRESCREEN_RED_FLAGS:
+        red_flag |= scores[key]
+    n = len(risk_score)
+    data_sufficient = np.ones(n, dtype=bool)
+    for name in PRESCREEN_REQUIRED_FIELDS:
+        values = np.asarray(columns.get(name, np.full(n, np.nan)), dtype=float)
+        data_sufficient &= ~np.isnan(values) if name != "has_diagnosis" else values > 0
+
+    result = {key: scores[key] for key in PRESCREEN_RED_FLAGS}
+    result.update({
+        "risk_score": risk_score,
+        "data_sufficient": data_sufficient,
+        "low_risk": data_sufficient & ~red_flag & (risk_score < threshold),
+    })
+    return result
+
+
+def prescreen_patient(patient_data: Dict[str, Any], threshold: float) -> Dict[str, Any]:
+    """
+    判断单个患者能否跳过完整评估，返回可写入追溯记录的决策
+
+    Args:
+        patient_data: 标准格式的患者数据
+        threshold: 风险评分阈值
+
+    Returns:
+        包含skip_full_assessment、risk_score、red_flags和reason的字典
+    """
+    inputs = extract_scoring_inputs(patient_data)
+    result = {name: values[0] for name, values in
+              prescreen_cohort({name: np.array([value]) for name, value in inputs.items()}, threshold).items()}
+    red_flags = [label for key, label in PRESCREEN_RED_FLAGS.items() if result[key]]
+    missing = [label for name, label in PRESCREEN_REQUIRED_FIELDS.items()
+               if (np.isnan(inputs[name]) if name != "has_diagnosis" else not inputs[name])]
+    skip = bool(result["low_risk"])
+
+    if skip:
+        reason = f"风险评分{_scalar(result['risk_score']):g}分低于阈值{threshold:g}分，且未见营养不良相关异常"
+    elif not result["data_sufficient"]:
+        reason = f"缺少{'、'.join(missing)}，无法排除营养风险"
+    elif red_flags:
+        reason = f"存在异常：{'、'.join(red_flags)}"
+    else:
+        reason = f"风险评分{_scalar(result['risk_score']):g}分，达到阈值{threshold:g}分"
+
+    return {
+        "skip_full_assessment": skip,
+        "risk_score": _scalar(result["risk_score"]),
+        "threshold": threshold,
+        "data_sufficient": bool(result["data_sufficient"]),
+        "missing_data": missing,
+        "red_flags": red_flags,
+        "reason": reason,
+    }
@@ -0,0 +1,318 @@
+from dataclasses import dataclass, field, fields
+from functools import lru_cache
+from typing import Dict, Any, List, Optional
+
+
+@lru_cache(maxsize=None)
+def _field_names(cls) -> tuple:
+    """数据类中除extras以外的字段名"""
+    return tuple(f.name for f in fields(cls) if f.name != "extras")
+
+
+class _FlatRecord:
+    """
+    扁平记录的公共方法
+
+    子类为slots数据类，未知字段统一保存在extras中。本类声明空的__slots__，不会为实例引入__dict__。
+    """
+    __slots__ = ()
+
+    @classmethod
+    def from_dict(cls, data: Optional[Dict[str, Any]]):
+        """按字段名从字典构造记录，未知字段放入extras"""
+        record = cls()
+        if isinstance(data, dict):
+            record.update(data)
+        return record
+
+    def update(self, data: Optional[Dict[str, Any]], only_missing: bool = False):
+        """
+        用字典中的值更新记录（原地修改）
+
+        Args:
+            data: 字段字典
+            only_missing: True时只填入仍为空的字段且忽略空值（首个非空值优先）
+        """
+        if not isinstance(data, dict):
+            return
+        names = _field_names(type(self))
+        for key, value in data.items():
+            if only_missing and value is None:
+                continue
+            if key in names:
+                if not only_missing or getattr(self, key) is None:
+                    setattr(self, key, value)
+            elif not only_missing or self.extras.get(key) is None:
+                self.extras[key] = value
+
+    def to_dict(self, include_empty: bool = True, optional_fields: tuple = ()) -> Dict[str, Any]:
+        """
+        序列化为字典
+
+        Args:
+            include_empty: 是否输出值为None的字段
+            optional_fields: 即使include_empty为True，值为None时也不输出的字段
+        """
+        result = {}
+        for name in _field_names(type(self)):
+            value = getattr(self, name)
+            if value is None and (not include_empty or name in optional_fields):
+                continue
+            result[name] = value
+        result.update(self.extras)
+        return result
+
+
+@dataclass(slots=True)
+class PatientInfo(_FlatRecord):
+    """患者基本信息"""
+    name: Any = None
+    age: Any = None
+    gender: Any = None
+    height_cm: Any = None
+    weight_kg: Any = None
+    bmi: Any = None
+    extras: Dict[str, Any] = field(default_factory=dict)
+
+
+@dataclass(slots=True)
+class Diagnosis(_FlatRecord):
+    """单条诊断"""
+    type: Any = None
+    description: Any = None
+    extras: Dict[str, Any] = field(default_factory=dict)
+
+    @property
+    def dedupe_key(self) -> str:
+        return f"{self.type or ''}_{self.description or ''}"
+
+
+@dataclass(slots=True)
+class LabItem(_FlatRecord):
+    """单项检验结果"""
+    name: Any = None
+    value: Any = None
+    unit: Any = None
+    interpretation: Any = None
+    extras: Dict[str, Any] = field(default_factory=dict)
+
+
+@dataclass(slots=True)
+class SymptomsHistory(_FlatRecord):
+    """症状与病史"""
+    chief_complaint: Any = None
+    history_of_present_illness_summary: Any = None
+    extras: Dict[str, Any] = field(default_factory=dict)
+
+
+@dataclass(slots=True)
+class TreatmentPlan(_FlatRecord):
+    """治疗方案"""
+    summary: Any = None
+    key_medications: List[Any] = field(default_factory=list)
+    extras: Dict[str, Any] = field(default_factory=dict)
+
+
+@dataclass(slots=True)
+class ConsultationRecord(_FlatRecord):
+    """会诊记录"""
+    department: Any = None
+    purpose: Any = None
+    findings_and_conclusion: Any = None
+    recommendations: Any = None
+    NRS2002_score: Any = None
+    PES_statement_summary: Any = None
+    extras: Dict[str, Any] = field(default_factory=dict)
+
+
+# 患者身份字段：图像识别的标准结构中不包含，值为空时不输出
+_IDENTITY_FIELDS = ("name", "age", "gender")
+
+# 标准的检验结果分类
+LAB_RESULT_TYPES = ("biochemistry", "complete_blood_count", "stool_routine")
+
+
+def _item_from_value(cls, value):
+    """列表元素为字典时转换为记录，其他类型原样保留"""
+    return cls.from_dict(value) if isinstance(value, dict) else value
+
+
+def _item_to_value(item, include_empty: bool = True):
+    return item.to_dict(include_empty) if isinstance(item, _FlatRecord) else item
+
+
+@dataclass(slots=True)
+class PatientRecord:
+    """
+    患者记录的统一类型化表示
+
+    与现有JSON结构一一对应：from_dict从标准格式字典构造，merge_dict/merge原地合并，
+    to_dict序列化回原有的JSON结构。
+    """
+    document_type: Any = None
+    patient_info: PatientInfo = field(default_factory=PatientInfo)
+    diagnoses: List[Any] = field(default_factory=list)
+    symptoms_and_history: SymptomsHistory = field(default_factory=SymptomsHistory)
+    lab_results: Dict[str, Any] = field(default_factory=lambda: {key: [] for key in LAB_RESULT_TYPES})
+    treatment_plan: TreatmentPlan = field(default_factory=TreatmentPlan)
+    consultation_record: ConsultationRecord = field(default_factory=ConsultationRecord)
+    extras: Dict[str, Any] = field(default_factory=dict)
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "PatientRecord":
+        """
+        从标准格式字典构造记录
+
+        字典中的非空值覆盖默认值，未知字段保留在extras中，序列化时原样输出。
+
+        Args:
+            data: 标准格式的患者数据字典
+
+        Returns:
+            患者记录
+        """
+        record = cls()
+        for key, value in data.items():
+            if key == "patient_info":
+                if isinstance(value, dict):
+                    record.patient_info = PatientInfo.from_dict(value)
+            elif key == "diagnoses":
+                if value is not None:
+                    record.diagnoses = [_item_from_value(Diagnosis, d) for d in value]
+            elif key == "symptoms_and_history":
+                if isinstance(value, dict):
+                    record.symptoms_and_history = SymptomsHistory.from_dict(value)
+            elif key == "lab_results":
+                if isinstance(value, dict):
+                    for result_type, results in value.items():
+                        if results is None:
+                            continue
+                        record.lab_results[result_type] = (
+                            [_item_from_value(LabItem, item) for item in results]
+                            if isinstance(results, list) else results
+                        )
+            elif key == "treatment_plan":
+                if isinstance(value, dict):
+                    record.treatment_plan = TreatmentPlan.from_dict(value)
+                    if record.treatment_plan.key_medications is None:
+                        record.treatment_plan.key_medications = []
+                elif value is not None:
+                    record.treatment_plan = TreatmentPlan(summary=value)
+            elif key == "consultation_record":
+                if isinstance(value, dict):
+                    record.consultation_record = ConsultationRecord.from_dict(value)
+            elif key == "document_type":
+                record.document_type = value
+            else:
+                record.extras[key] = value
+        return record
+
+    def merge_dict(self, doc: Dict[str, Any]):
+        """
+        将一份标准格式的文档直接合并到记录中（原地修改，不构造中间记录）
+
+        合并规则：单值字段保留首个非空值，诊断、检验结果和药物列表依次追加。
+
+        Args:
+            doc: 标准格式的文档数据
+        """
+        self.patient_info.update(doc.get("patient_info"), only_missing=True)
+
+        if doc.get("diagnoses"):
+            self.diagnoses.extend(_item_from_value(Diagnosis, d) for d in doc["diagnoses"])
+
+        self.symptoms_and_history.update(doc.get("symptoms_and_history"), only_missing=True)
+
+        if doc.get("lab_results"):
+            for result_type, results in doc["lab_results"].items():
+                if isinstance(results, list):
+                    self.lab_results.setdefault(result_type, []).extend(
+                        _item_from_value(LabItem, item) for item in results
+                    )
+
+        treatment_plan = doc.get("treatment_plan")
+        if isinstance(treatment_plan, dict):
+            if treatment_plan.get("summary") and not self.treatment_plan.summary:
+                self.treatment_plan.summary = treatment_plan["summary"]
+            if treatment_plan.get("key_medications"):
+                self.treatment_plan.key_medications.extend(treatment_plan["key_medications"])
+
+        self.consultation_record.update(doc.get("consultation_record"), only_missing=True)
+
+    def merge(self, other: "PatientRecord"):
+        """
+        将另一条记录合并到当前记录中（原地修改），规则与merge_dict相同
+
+        Args:
+            other: 要合并的记录
+        """
+        for section in ("patient_info", "symptoms_and_history", "consultation_record"):
+            target, source = getattr(self, section), getattr(other, section)
+            for name in _field_names(type(target)):
+                if getattr(target, name) is None:
+                    setattr(target, name, getattr(source, name))
+            for key, value in source.extras.items():
+                if value is not None and target.extras.get(key) is None:
+                    target.extras[key] = value
+
+        self.diagnoses.extend(other.diagnoses)
+        for result_type, results in other.lab_results.items():
+            if isinstance(results, list):
+                self.lab_results.setdefault(result_type, []).extend(results)
+
+        if other.treatment_plan.summary and not self.treatment_plan.summary:
+            self.treatment_plan.summary = other.treatment_plan.summary
+        self.treatment_plan.key_medications.extend(other.treatment_plan.key_medications)
+
+    def deduplicate(self, diagnosis_by_type: bool = True):
+        """
+        去除重复的诊断和药物（原地修改，保持原有顺序）
+
+        Args:
+            diagnosis_by_type: True时按“类型+描述”去重，False时只按描述去重
+        """
+        seen_diagnoses = set()
+        unique_diagnoses = []
+        for diagnosis in self.diagnoses:
+            if isinstance(diagnosis, Diagnosis):
+                key = diagnosis.dedupe_key if diagnosis_by_type else diagnosis.description
+            else:
+                key = str(diagnosis)
+            if key not in seen_diagnoses:
+                seen_diagnoses.add(key)
+                unique_diagnoses.append(diagnosis)
+        self.diagnoses = unique_diagnoses
+
+        try:
+            self.treatment_plan.key_medications = list(dict.fromkeys(self.treatment_plan.key_medications))
+        except TypeError:
+            # 药物条目为字典等不可哈希类型时保持原样
+            pass
+
+    def to_dict(self, include_identity: bool = True, include_empty: bool = True) -> Dict[str, Any]:
+        """
+        序列化为现有的JSON结构
+
+        Args:
+            include_identity: 是否输出为空的患者身份字段（姓名、年龄、性别）
+            include_empty: 是否输出值为None的字段
+
+        Returns:
+            患者数据字典
+        """
+        optional_fields = () if include_identity else _IDENTITY_FIELDS
+        result = {}
+        if self.document_type is not None or include_empty:
+            result["document_type"] = self.document_type
+        result["patient_info"] = self.patient_info.to_dict(include_empty, optional_fields)
+        result["diagnoses"] = [_item_to_value(d, include_empty) for d in self.diagnoses]
+        result["symptoms_and_history"] = self.symptoms_and_history.to_dict(include_empty)
+        result["lab_results"] = {
+            result_type: [_item_to_value(item, include_empty) for item in results]
+            if isinstance(results, list) else results
+            for result_type, results in self.lab_results.items()
+        }
+        result["treatment_plan"] = self.treatment_plan.to_dict(include_empty)
+        result["consultation_record"] = self.consultation_record.to_dict(include_empty)
+        result.update(self.extras)
+        return result
@@ -0,0 +1,327 @@
+import gc
+import glob
+import http.client
+import os
+import random
+import select
+import shutil
+import signal
+import socket
+import socketserver
+import sys
+import tempfile
+import threading
+import time
+import traceback
+from typing import Callable, Dict, List, Optional
+
+
+def _log(message: str):
+    print(message, file=sys.stderr, flush=True)
+
+
+def _rss_bytes(pid: int) -> Optional[int]:
+    """进程当前的常驻内存（字节），无法读取/proc时返回None"""
+    try:
+        with open(f"/proc/{pid}/statm", "r") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def child_socket_path(run_dir: str, pid: int) -> str:
+    """子进程内部通信用的Unix socket路径"""
+    return os.path.join(run_dir, f"worker-{pid}.sock")
+
+
+class UnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """子进程间转发请求用的HTTP服务（Unix socket）"""
+    daemon_threads = True
+
+
+class UnixHTTPConnection(http.client.HTTPConnection):
+    """连接到UnixHTTPServer的HTTP客户端"""
+
+    def __init__(self, path: str, timeout: float = 5.0):
+        super().__init__("localhost", timeout=timeout)
+        self.unix_path = path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(self.timeout)
+        self.sock.connect(self.unix_path)
+
+
+class ChildContext:
+    """
+    子进程侧的运行状态：心跳、请求计数和排空
+
+    排空（drain）后子进程不再接收新连接，处理完进行中的请求和任务后退出，由主进程启动新的子进程替换。
+    """
+
+    def __init__(self, run_dir: str, heartbeat_fd: int, heartbeat_interval: float, max_requests: int):
+        self.pid = os.getpid()
+        self.run_dir = run_dir
+        self.socket_path = child_socket_path(run_dir, self.pid)
+        self.draining = threading.Event()
+        self.drain_reason: Optional[str] = None
+        # 各子进程的回收阈值错开最多10%，避免同时启动的子进程同时回收
+        self.max_requests = max_requests + random.randint(0, max_requests // 10) if max_requests > 0 else 0
+        self.requests = 0
+        self._heartbeat_fd = heartbeat_fd
+        self._heartbeat_interval = heartbeat_interval
+        self._lock = threading.Lock()
+
+    def start_heartbeat(self):
+        """启动心跳线程；主进程超过heartbeat_timeout收不到心跳时认为子进程已卡死"""
+        threading.Thread(target=self._heartbeat, name="prefork-heartbeat", daemon=True).start()
+
+    def request_finished(self):
+        """记录一个已处理的请求，达到回收阈值后开始排空"""
+        with self._lock:
+            self.requests += 1
+            reached = self.max_requests and self.requests >= self.max_requests
+        if reached:
+            self.drain(f"已处理 {self.requests} 个请求")
+
+    def drain(self, reason: str):
+        """开始排空（重复调用被忽略）"""
+        with self._lock:
+            if self.draining.is_set():
+                return
+            self.drain_reason = reason
+            self.draining.set()
+        self._send(b"d")
+
+    def sibling_socket_paths(self) -> List[str]:
+        """其他子进程（包括正在排空的）的内部socket"""
+        return [
+            path for path in sorted(glob.glob(os.path.join(self.run_dir, "worker-*.sock")))
+            if path != self.socket_path
+        ]
+
+    def _heartbeat(self):
+        while True:
+            if not self._send(b"."):
+                # 主进程已退出，没有进程再替换本进程
+                self.drain("主进程已退出")
+                return
+            time.sleep(self._heartbeat_interval)
+
+    def _send(self, message: bytes) -> bool:
+        try:
+            os.write(self._heartbeat_fd, message)
+            return True
+        except OSError:
+            return False
+
+
+class _Child:
+    __slots__ = ("pid", "fd", "started", "last_beat", "draining_since", "term_sent")
+
+    def __init__(self, pid: int, fd: int):
+        self.pid = pid
+        self.fd = fd
+        self.started = time.monotonic()
+        self.last_beat = self.started
+        self.draining_since: Optional[float] = None
+        self.term_sent = False
+
+
+class PreforkSupervisor:
+    """
+    预派生多进程工作池的主进程
+
+    主进程在派生前已导入autogen、模型SDK和全部智能体模块，gc.freeze()后fork出N个子进程，
+    子进程以写时复制共享这些内存页，并共同accept同一个监听socket。主进程本身不处理请求，只负责：
+    - 健康检查：子进程定期通过管道发送心跳，超时未收到时强制结束并替换
+    - 回收：子进程处理max_requests个请求或常驻内存超过max_rss_mb后排空退出，主进程同时启动替换的子进程
+    - 异常退出的子进程自动重启；收到SIGTERM/SIGINT时排空全部子进程后退出，SIGHUP时排空并替换全部子进程
+    """
+
+    def __init__(
+        self,
+        listen_socket: socket.socket,
+        processes: int,
+        serve_child: Callable[[socket.socket, ChildContext], None],
+        max_requests: int = 0,
+        max_rss_mb: float = 0,
+        heartbeat_timeout: float = 30.0,
+        drain_timeout: float = 600.0,
+        name: str = "worker"
+    ):
+        """
+        Args:
+            listen_socket: 已监听的非阻塞socket，由所有子进程共享
+            processes: 子进程数
+            serve_child: 子进程入口，返回后子进程退出
+            max_requests: 每个子进程处理多少个请求后回收，0为不回收
+            max_rss_mb: 子进程常驻内存上限（MB），超过后回收，0为不限制
+            heartbeat_timeout: 心跳超时（秒）
+            drain_timeout: 排空中的子进程最长等待时间（秒），超时后强制结束
+            name: 运行目录名前缀
+        """
+        self.listen_socket = listen_socket
+        self.processes = max(1, processes)
+        self.serve_child = serve_child
+        self.max_requests = max(0, max_requests)
+        self.max_rss_bytes = int(max_rss_mb * 1024 * 1024) if max_rss_mb > 0 else 0
+        self.heartbeat_timeout = heartbeat_timeout
+        self.drain_timeout = drain_timeout
+        self.name = name
+        self.run_dir: Optional[str] = None
+        self._children: Dict[int, _Child] = {}
+        self._stopping = False
+        self._reload = False
+
+    def run(self):
+        """启动并维持子进程，直到收到SIGTERM/SIGINT且全部子进程退出"""
+        self.run_dir = tempfile.mkdtemp(prefix=f"{self.name}-")
+        # 派生前把已导入模块的对象移出GC跟踪，子进程的垃圾回收不会触碰（并复制）这些共享页
+        gc.collect()
+        gc.freeze()
+        signal.signal(signal.SIGTERM, self._on_stop)
+        signal.signal(signal.SIGINT, self._on_stop)
+        signal.signal(signal.SIGHUP, self._on_reload)
+        if self.max_rss_bytes and _rss_bytes(os.getpid()) is None:
+            _log("当前平台无法读取子进程内存，常驻内存上限不生效")
+        try:
+            while True:
+                if self._stopping:
+                    self._terminate_all()
+                    if not self._children:
+                        break
+                else:
+                    if self._reload:
+                        self._reload = False
+                        _log("收到SIGHUP，替换全部工作子进程")
+                        self._terminate_all()
+                    self._spawn_missing()
+                self._poll(1.0)
+                self._reap()
+                self._check_children()
+        finally:
+            for child in self._children.values():
+                self._kill(child, signal.SIGKILL)
+            shutil.rmtree(self.run_dir, ignore_errors=True)
+
+    def _on_stop(self, signum, frame):
+        self._stopping = True
+
+    def _on_reload(self, signum, frame):
+        self._reload = True
+
+    def _spawn_missing(self):
+        active = sum(1 for child in self._children.values() if child.draining_since is None)
+        for _ in range(self.processes - active):
+            self._spawn()
+
+    def _spawn(self):
+        read_fd, write_fd = os.pipe()
+        pid = os.fork()
+        if pid == 0:
+            os.close(read_fd)
+            for child in self._children.values():
+                os.close(child.fd)
+            self._run_child(write_fd)
+        os.close(write_fd)
+        self._children[pid] = _Child(pid, read_fd)
+        _log(f"工作子进程 {pid} 已启动")
+
+    def _run_child(self, heartbeat_fd: int):
+        """子进程：重置信号和随机数状态后执行serve_child，不返回"""
+        code = 0
+        try:
+            random.seed()
+            context = ChildContext(self.run_dir, heartbeat_fd, max(1.0, self.heartbeat_timeout / 3), self.max_requests)
+            signal.signal(signal.SIGTERM, lambda signum, frame: context.drain("收到SIGTERM"))
+            signal.signal(signal.SIGINT, signal.SIG_IGN)
+            signal.signal(signal.SIGHUP, signal.SIG_IGN)
+            self.serve_child(self.listen_socket, context)
+        except BaseException:
+            _log(traceback.format_exc())
+            code = 1
+        finally:
+            sys.stderr.flush()
+            os._exit(code)
+
+    def _poll(self, timeout: float):
+        """读取子进程的心跳和排空通知"""
+        fds = {child.fd: child for child in self._children.values()}
+        if not fds:
+            time.sleep(timeout)
+            return
+        try:
+            readable, _, _ = select.select(list(fds), [], [], timeout)
+        except InterruptedError:
+            return
+        now = time.monotonic()
+        for fd in readable:
+            child = fds[fd]
+            try:
+                data = os.read(fd, 4096)
+            except OSError:
+                data = b""
+            if not data:
+                continue
+            child.last_beat = now
+            if b"d" in data and child.draining_since is None:
+                child.draining_since = now
+
+    def _reap(self):
+        while True:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                return
+            if pid == 0:
+                return
+            child = self._children.pop(pid, None)
+            if child is None:
+                continue
+            os.close(child.fd)
+            try:
+                os.unlink(child_socket_path(self.run_dir, pid))
+            except OSError:
+                pass
+            code = os.waitstatus_to_exitcode(status)
+            if child.draining_since is None and not self._stopping:
+                _log(f"工作子进程 {pid} 异常退出（退出码 {code}），重新启动")
+            else:
+                _log(f"工作子进程 {pid} 已退出")
+
+    def _check_children(self):
+        now = time.monotonic()
+        for child in list(self._children.values()):
+            if child.draining_since is None:
+                if now - child.last_beat > self.heartbeat_timeout:
+                    _log(f"工作子进程 {child.pid} 超过 {self.heartbeat_timeout:.0f} 秒无心跳，强制结束")
+                    self._kill(child, signal.SIGKILL)
+                    child.draining_since = now
+                elif self.max_rss_bytes:
+                    rss = _rss_bytes(child.pid)
+                    if rss is not None and rss > self.max_rss_bytes:
+                        _log(f"工作子进程 {child.pid} 常驻内存 {rss / 1024 / 1024:.0f}MB 超过上限，回收")
+                        self._terminate(child)
+            elif now - child.draining_since > self.drain_timeout:
+                _log(f"工作子进程 {child.pid} 排空超过 {self.drain_timeout:.0f} 秒，强制结束")
+                self._kill(child, signal.SIGKILL)
+
+    def _terminate_all(self):
+        for child in list(self._children.values()):
+            self._terminate(child)
+
+    def _terminate(self, child: _Child):
+        """通知子进程排空（只发送一次）"""
+        if child.term_sent:
+            return
+        child.term_sent = True
+        if child.draining_since is None:
+            child.draining_since = time.monotonic()
+        self._kill(child, signal.SIGTERM)
+
+    def _kill(self, child: _Child, sig: int):
+        try:
+            os.kill(child.pid, sig)
+        except ProcessLookupError:
+            pass
@@ -0,0 +1,157 @@
+import json
+import re
+from typing import Dict, Any, List
+
+
+# 每个中间结果摘要的默认最大长度（字符）；是否启用由调用方决定（见config.RESULT_DIGEST_MAX_CHARS）
+DEFAULT_DIGEST_MAX_CHARS = 1200
+
+# 参与提炼的中间结果（冲突检测和报告生成的输入）
+DISTILLED_STAGES = ("clinical_context", "anthropometric_evaluation", "biochemical_interpretation", "dietary_assessment")
+
+# 摘要的各部分（键、标题）及长度预算的分配顺序：未用完的预算顺延给后面的部分
+DIGEST_SECTIONS = (("risk_level", "风险等级"), ("abnormal_values", "异常指标"), ("diagnoses", "诊断"))
+
+# 风险结论：营养风险筛查和营养不良评定的结论
+_RISK_PATTERN = re.compile(
+    r'[高中低]风险|营养风险|风险等级|营养不良|恶病质|肌少症|GLIM|NRS\s*-?\s*2002|评分.{0,6}\d+\s*分',
+    re.IGNORECASE
+)
+# 诊断：PES诊断、病因和临床诊断
+_DIAGNOSIS_PATTERN = re.compile(r'诊断|PES|病因|考虑|符合|合并|继发', re.IGNORECASE)
+# 异常标识
+_ABNORMAL_PATTERN = re.compile(r'↑|↓|偏高|偏低|升高|降低|下降|减少|异常|阳性|不足|缺乏|过低|过高|低于|高于|超过')
+# 带单位或百分比的数值
+_NUMBER_PATTERN = re.compile(
+    r'\d+(?:\.\d+)?\s*(?:%|kcal|千卡|kg|公斤|cm|厘米|g/L|g/kg|ml|mL|mmol/L|μmol/L|umol/L|U/L|mg/L|分|×10\^?\d+/L)',
+    re.IGNORECASE
+)
+
+# 句子、分句边界和需要去除的Markdown标记
+_SENTENCE_SPLIT_PATTERN = re.compile(r'(?<=[。；;！!？?])')
+_CLAUSE_SPLIT_PATTERN = re.compile(r'[，,、]')
+_MARKUP_PATTERN = re.compile(r'^[\s#>*\-•·|]+|^\d+[.、)）]\s*|\*\*|__|\s*\|\s*$')
+
+
+def _segments(text: str) -> List[str]:
+    """将文本切分为去除标记后的句子片段"""
+    segments = []
+    for line in text.splitlines():
+        for sentence in _SENTENCE_SPLIT_PATTERN.split(line):
+            sentence = _MARKUP_PATTERN.sub("", sentence.strip()).strip()
+            if len(sentence) >= 4:
+                segments.append(sentence)
+    return segments
+
+
+def _abnormal_values(segment: str) -> List[str]:
+    """句子中同时带数值和异常标识的分句（如“白蛋白28 g/L，明显偏低”中的检验值）"""
+    if not (_NUMBER_PATTERN.search(segment) and _ABNORMAL_PATTERN.search(segment)):
+        return []
+    clauses = [clause.strip() for clause in _CLAUSE_SPLIT_PATTERN.split(segment) if clause.strip()]
+    values = []
+    for index, clause in enumerate(clauses):
+        if not _NUMBER_PATTERN.search(clause):
+            continue
+        if _ABNORMAL_PATTERN.search(clause):
+            values.append(clause)
+        elif index + 1 < len(clauses) and _ABNORMAL_PATTERN.search(clauses[index + 1]) \
+                and not _NUMBER_PATTERN.search(clauses[index + 1]):
+            # 异常标识单独成句，与前面的数值合并
+            values.append(f"{clause}，{clauses[index + 1]}")
+    return values
+
+
+def extract_digest(text: str) -> Dict[str, List[str]]:
+    """
+    从智能体输出中按原文顺序提取风险结论、异常指标和诊断
+
+    Returns:
+        以DIGEST_SECTIONS的键为键的要点列表（已去重）
+    """
+    digest: Dict[str, List[str]] = {key: [] for key, _ in DIGEST_SECTIONS}
+    seen = set()
+
+    def _add(key: str, item: str):
+        if item not in seen:
+            seen.add(item)
+            digest[key].append(item)
+
+    for segment in _segments(text):
+        if _RISK_PATTERN.search(segment):
+            _add("risk_level", segment)
+        elif _DIAGNOSIS_PATTERN.search(segment):
+            _add("diagnoses", segment)
+        for value in _abnormal_values(segment):
+            _add("abnormal_values", value)
+    return digest
+
+
+def _render_digest(digest: Dict[str, List[str]], max_chars: int) -> str:
+    """按DIGEST_SECTIONS的顺序在长度预算内输出各部分要点，每部分先平分预算，未用完的顺延"""
+    lines = []
+    remaining = max_chars - sum(len(title) + 2 for _, title in DIGEST_SECTIONS)
+    for position, (key, title) in enumerate(DIGEST_SECTIONS):
+        budget = remaining // (len(DIGEST_SECTIONS) - position)
+        used = 0
+        items = []
+        for item in digest[key]:
+            cost = len(item) + 3
+            if used + cost > budget:
+                continue
+            items.append(f"- {item}")
+            used += cost
+        remaining -= used
+        lines.append(f"{title}：")
+        lines.extend(items or ["- 未提及"])
+    return "\n".join(lines)
+
+
+def distill_text(text: Any, max_chars: int = DEFAULT_DIGEST_MAX_CHARS) -> str:
+    """
+    将一段智能体输出提炼为长度有上限的结构化摘要
+
+    确定性算法：按句切分后提取风险等级结论、带数值的异常指标和诊断三部分，
+    在长度预算内按原文顺序输出。原文未超过预算时原样返回。
+
+    Args:
+        text: 智能体输出（非字符串会先序列化为JSON）
+        max_chars: 摘要最大长度
+
+    Returns:
+        结构化摘要；三部分均未提取到内容时返回截断的原文
+    """
+    if not isinstance(text, str):
+        text = json.dumps(text, ensure_ascii=False)
+    if len(text) <= max_chars:
+        return text
+
+    digest = extract_digest(text)
+    if not any(digest.values()):
+        return text[:max_chars]
+    return _render_digest(digest, max_chars)
+
+
+def distill_intermediate_results(intermediate_results: Dict[str, Any],
+                                 max_chars: int = DEFAULT_DIGEST_MAX_CHARS) -> Dict[str, Any]:
+    """
+    生成中间结果的摘要副本，供冲突检测和报告生成使用
+
+    返回与intermediate_results结构相同的新字典，只替换DISTILLED_STAGES中各项的data，
+    原字典（完整文本）保持不变，用于数据追溯。
+
+    Args:
+        intermediate_results: 协调器的中间结果
+        max_chars: 每项摘要的最大长度
+
+    Returns:
+        摘要后的中间结果
+    """
+    distilled = {}
+    for stage, result in intermediate_results.items():
+        if stage in DISTILLED_STAGES and isinstance(result, dict) and "data" in result:
+            digest = distill_text(result["data"], max_chars)
+            distilled[stage] = {**result, "data": digest, "original_chars": len(str(result["data"]))}
+        else:
+            distilled[stage] = result
+    return distilled
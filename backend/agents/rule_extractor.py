@@ -0,0 +1,289 @@
+import re
+from typing import Dict, Any, List, Optional, Tuple
+
+
+# 检验项目：(标准名称, 别名列表, 所属类别)
+LAB_ITEM_DEFINITIONS = [
+    ("白蛋白", ["白蛋白", "血清白蛋白", "ALB"], "biochemistry"),
+    ("前白蛋白", ["前白蛋白", "PA", "PAB"], "biochemistry"),
+    ("总蛋白", ["总蛋白", "TP"], "biochemistry"),
+    ("谷丙转氨酶", ["谷丙转氨酶", "丙氨酸氨基转移酶", "ALT"], "biochemistry"),
+    ("谷草转氨酶", ["谷草转氨酶", "天门冬氨酸氨基转移酶", "AST"], "biochemistry"),
+    ("总胆红素", ["总胆红素", "TBIL"], "biochemistry"),
+    ("肌酐", ["肌酐", "CREA", "Cr"], "biochemistry"),
+    ("尿素", ["尿素氮", "尿素", "UREA", "BUN"], "biochemistry"),
+    ("血糖", ["空腹血糖", "葡萄糖", "血糖", "GLU"], "biochemistry"),
+    ("C-反应蛋白", ["超敏C反应蛋白", "C-反应蛋白", "C反应蛋白", "hs-CRP", "CRP"], "biochemistry"),
+    ("甘油三酯", ["甘油三酯", "TG"], "biochemistry"),
+    ("总胆固醇", ["总胆固醇", "CHOL", "TC"], "biochemistry"),
+    ("钾", ["血钾", "钾", "K"], "biochemistry"),
+    ("钠", ["血钠", "钠", "Na"], "biochemistry"),
+    ("白细胞计数", ["白细胞计数", "白细胞", "WBC"], "complete_blood_count"),
+    ("中性粒细胞计数", ["中性粒细胞计数", "中性粒细胞绝对值", "NEUT#"], "complete_blood_count"),
+    ("淋巴细胞计数", ["淋巴细胞计数", "淋巴细胞绝对值", "LYM#"], "complete_blood_count"),
+    ("血红蛋白", ["血红蛋白", "HGB", "Hb"], "complete_blood_count"),
+    ("红细胞计数", ["红细胞计数", "红细胞", "RBC"], "complete_blood_count"),
+    ("血小板计数", ["血小板计数", "血小板", "PLT"], "complete_blood_count"),
+]
+
+_ALIAS_INDEX = {}
+for _name, _aliases, _category in LAB_ITEM_DEFINITIONS:
+    for _alias in _aliases:
+        _ALIAS_INDEX[_alias.lower()] = (_name, _category)
+
+
+def _alias_pattern(alias: str) -> str:
+    """英文缩写两侧不能紧邻字母，避免在普通单词中误匹配"""
+    escaped = re.escape(alias)
+    if re.match(r'[A-Za-z]', alias):
+        return rf'(?<![A-Za-z]){escaped}(?![A-Za-z])'
+    return escaped
+
+
+# 数值后可选的单位和异常标识
+_UNIT = r'(?:[×xX*]?\s*10\^?\d+\s*/\s*L|[a-zA-Zμ]+/[a-zA-Z]+|%)'
+_FLAG = r'(?:↑|↓|(?<![A-Za-z])[HL](?![A-Za-z]))'
+
+_ALL_ALIASES = sorted(
+    {alias for _, aliases, _ in LAB_ITEM_DEFINITIONS for alias in aliases}, key=len, reverse=True
+)
+
+# 所有别名按长度降序组成一个交替模式，保证“前白蛋白”先于“白蛋白”匹配
+LAB_PATTERN = re.compile(
+    r'(?<!糖化)(?<!平均)(?<!尿)'
+    r'(?P<name>' + '|'.join(_alias_pattern(a) for a in _ALL_ALIASES) + r')'
+    r'(?:\s*[\(（][^\)）\n]{0,20}[\)）])?'
+    r'\s*[:：]?\s*'
+    r'(?P<value>\d+(?:\.\d+)?)'
+    r'\s*(?P<unit>' + _UNIT + r')?'
+    r'\s*(?P<flag>' + _FLAG + r')?',
+    re.IGNORECASE
+)
+
+# 单个“数值 单位 标识”字符串，用于解析旧格式的检验结果
+LAB_VALUE_PATTERN = re.compile(
+    r'^\s*(?P<value>\d+(?:\.\d+)?)\s*(?P<unit>' + _UNIT + r')?\s*(?P<flag>' + _FLAG + r')?'
+)
+
+HEIGHT_PATTERN = re.compile(r'身高\s*[:：为]?\s*(?P<value>\d+(?:\.\d+)?)\s*(?P<unit>cm|CM|厘米|m|M|米)?')
+WEIGHT_PATTERN = re.compile(
+    r'(?<!平时)(?<!既往)(?<!理想)(?<!标准)(?<!通常)(?<!原)(?<!前)'
+    r'体重\s*[:：为]?\s*(?P<value>\d+(?:\.\d+)?)\s*(?P<unit>kg|KG|Kg|公斤|千克|斤)?'
+)
+BMI_PATTERN = re.compile(r'(?<![A-Za-z])BMI\s*[:：为=]?\s*(?P<value>\d+(?:\.\d+)?)', re.IGNORECASE)
+AGE_PATTERN = re.compile(r'(?:年龄\s*[:：]?\s*)?(?P<value>\d{1,3})\s*岁')
+GENDER_PATTERN = re.compile(r'性别\s*[:：]?\s*(?P<value>男|女)|(?P<inline>男|女)\s*[，,、\s]\s*\d{1,3}\s*岁')
+NAME_PATTERN = re.compile(r'姓名\s*[:：]\s*(?P<value>[一-龥·]{2,6})')
+NRS2002_PATTERN = re.compile(
+    r'NRS[-\s]?2002\s*(?:营养风险筛查)?\s*(?:评分|得分|总分)?\s*[:：为=]?\s*(?P<value>\d+)\s*分?',
+    re.IGNORECASE
+)
+
+# 体重前的这些词表示当前体重，原文有多个体重时以此为准
+_CURRENT_WEIGHT_PATTERN = re.compile(r'(?:现|目前|当前|入院|今)[^，,。；;\n]{0,3}$')
+
+# 用药/补充剂量的上下文：检验项目名称出现在这些词之后，或数值后跟剂量单位/频次时不是检验结果
+# （如“补充白蛋白10g/天”、“补钾 10%氯化钾15ml”、“PA 2次/日雾化”）
+_DOSE_PREFIX_PATTERN = re.compile(r'(?:补充|补|口服|静脉|静滴|输注|泵入|给予|予|加用|雾化)[^，,。；;\n]{0,6}$')
+_DOSE_SUFFIX_PATTERN = re.compile(
+    r'^\s*(?:(?:[mμ]?g|m[lL]|I?U|片|粒|支|袋|瓶)?\s*/\s*(?:天|日|次|d)|(?:[mμ]?g|m[lL]|I?U)?\s*(?:次|片|粒|支|袋|瓶|m[lL]\b)|%)'
+)
+
+_CJK_PATTERN = re.compile(r'[一-龥]')
+_TABLE_NOISE_PATTERN = re.compile(r'项目|结果|单位|参考(?:范围|值|区间)|提示|检验(?:日期|时间)|标本|送检|报告(?:日期|时间)')
+# 去除已提取片段后只剩标点、数字（如参考范围）和空白的行视为已被完全提取
+_NON_CONTENT_PATTERN = re.compile(r'[\W\d_]+')
+
+# 残余文本少于该数量汉字时不再调用模型
+RESIDUAL_MIN_CJK_CHARS = 20
+
+
+def _normalize_flag(flag: Optional[str]) -> str:
+    """将H/L统一为↑/↓"""
+    if not flag:
+        return ""
+    return {"H": "↑", "h": "↑", "L": "↓", "l": "↓"}.get(flag, flag)
+
+
+def parse_lab_value_text(value_text: str) -> Optional[Tuple[str, str, str]]:
+    """
+    解析“32.1 g/L ↓”形式的检验结果字符串
+
+    Args:
+        value_text: 检验结果字符串
+
+    Returns:
+        (数值, 单位, 异常标识)，无法解析时返回None
+    """
+    match = LAB_VALUE_PATTERN.match(value_text)
+    if not match:
+        return None
+    return (
+        match.group("value"),
+        (match.group("unit") or "").replace(" ", ""),
+        _normalize_flag(match.group("flag"))
+    )
+
+
+def canonical_lab_name(name: str) -> Optional[str]:
+    """
+    将检验项目名称（如“白蛋白(ALB)”、“CRP”）映射为标准名称
+
+    Args:
+        name: 检验项目名称
+
+    Returns:
+        标准名称，无法识别时返回None
+    """
+    if not isinstance(name, str):
+        return None
+    text = name.strip()
+    candidates = [re.sub(r'[\(（][^\)）]*[\)）]', '', text).strip()]
+    candidates += re.findall(r'[\(（]([^\)）]*)[\)）]', text)
+    for candidate in candidates:
+        entry = _ALIAS_INDEX.get(candidate.strip().lower())
+        if entry:
+            return entry[0]
+    return None
+
+
+def _line_bounds(text: str, start: int, end: int) -> Tuple[int, int]:
+    line_start = text.rfind("\n", 0, start) + 1
+    line_end = text.find("\n", end)
+    return line_start, len(text) if line_end < 0 else line_end
+
+
+def _is_lab_result(text: str, match: "re.Match") -> bool:
+    """
+    LAB_PATTERN的匹配是否为检验结果：数值带检验单位，或所在行是检验表格的一行
+    （除项目名称、数值外没有其他文字）；用药剂量的上下文一律排除
+    """
+    line_start, line_end = _line_bounds(text, match.start(), match.end())
+    if _DOSE_PREFIX_PATTERN.search(text[line_start:match.start()]):
+        return False
+    if _DOSE_SUFFIX_PATTERN.match(text, match.end("value")):
+        return False
+    if match.group("unit") and match.group("unit") != "%":
+        return True
+    rest = text[line_start:match.start()] + text[match.end():line_end]
+    return not _CJK_PATTERN.search(_TABLE_NOISE_PATTERN.sub("", rest))
+
+
+def _to_number(value: str) -> float:
+    number = float(value)
+    return int(number) if number.is_integer() else number
+
+
+def extract_structured_fields(text: str) -> Tuple[Dict[str, Any], str]:
+    """
+    使用预编译的规则从文本中确定性地提取检验结果、人体测量和NRS2002评分
+
+    Args:
+        text: 医疗文本
+
+    Returns:
+        (提取到的标准格式片段, 去除已提取内容后的残余文本)
+    """
+    spans: List[Tuple[int, int]] = []
+    patient_info: Dict[str, Any] = {}
+    lab_results: Dict[str, List[Dict[str, Any]]] = {}
+    consultation: Dict[str, Any] = {}
+    seen_labs = set()
+
+    for match in LAB_PATTERN.finditer(text):
+        if not _is_lab_result(text, match):
+            continue
+        name, category = _ALIAS_INDEX[match.group("name").lower()]
+        item_key = (name, match.group("value"))
+        spans.append(match.span())
+        if item_key in seen_labs:
+            continue
+        seen_labs.add(item_key)
+        lab_results.setdefault(category, []).append({
+            "name": name,
+            "value": match.group("value"),
+            "unit": (match.group("unit") or "").replace(" ", ""),
+            # 原文没有异常标识时留空：未标注不代表正常，且这里没有参考范围可供判断
+            "interpretation": _normalize_flag(match.group("flag"))
+        })
+
+    match = HEIGHT_PATTERN.search(text)
+    if match:
+        height = float(match.group("value"))
+        if match.group("unit") in ("m", "M", "米") or height < 3:
+            height *= 100
+        patient_info["height_cm"] = _to_number(f"{height:.1f}")
+        spans.append(match.span())
+
+    # 原文有多个体重（如“3月前体重60kg，现体重55kg”）时只采用标明当前的一个，无法确定时交给模型
+    candidates = list(WEIGHT_PATTERN.finditer(text))
+    if len(candidates) > 1:
+        candidates = [m for m in candidates if _CURRENT_WEIGHT_PATTERN.search(text, 0, m.start())]
+    match = candidates[0] if len(candidates) == 1 else None
+    if match:
+        weight = float(match.group("value"))
+        if match.group("unit") == "斤":
+            weight /= 2
+        patient_info["weight_kg"] = _to_number(f"{weight:.1f}")
+        spans.append(match.span())
+
+    match = BMI_PATTERN.search(text)
+    if match:
+        patient_info["bmi"] = _to_number(match.group("value"))
+        spans.append(match.span())
+
+    match = AGE_PATTERN.search(text)
+    if match:
+        patient_info["age"] = match.group("value")
+        spans.append(match.span())
+
+    match = GENDER_PATTERN.search(text)
+    if match:
+        patient_info["gender"] = match.group("value") or match.group("inline")
+
+    match = NAME_PATTERN.search(text)
+    if match:
+        patient_info["name"] = match.group("value")
+        spans.append(match.span())
+
+    match = NRS2002_PATTERN.search(text)
+    if match:
+        consultation["NRS2002_score"] = int(match.group("value"))
+        spans.append(match.span())
+
+    structure: Dict[str, Any] = {}
+    if patient_info:
+        structure["patient_info"] = patient_info
+    if lab_results:
+        structure["lab_results"] = lab_results
+    if consultation:
+        structure["consultation_record"] = consultation
+
+    return structure, _residual_text(text, spans)
+
+
+def _residual_text(text: str, spans: List[Tuple[int, int]]) -> str:
+    """
+    丢弃已被提取片段完全覆盖的行和表头行，其余行原样保留
+
+    部分被提取的行（如“NRS2002评分：5分（营养不良风险高）”、散文中的句子）不做删改，
+    避免截断诊断、用药等上下文。
+    """
+    masked = list(text)
+    for start, end in spans:
+        masked[start:end] = " " * (end - start)
+    masked_text = "".join(masked)
+
+    kept_lines = []
+    offset = 0
+    for line in text.split("\n"):
+        remainder = masked_text[offset:offset + len(line)]
+        offset += len(line) + 1
+        if _NON_CONTENT_PATTERN.sub("", _TABLE_NOISE_PATTERN.sub("", remainder)):
+            kept_lines.append(line.strip())
+    return "\n".join(kept_lines)
+
+
+def needs_model_extraction(residual_text: str) -> bool:
+    """残余文本是否仍包含值得交给模型处理的自由文本（诊断、病史、治疗计划等）"""
+    return len(_CJK_PATTERN.findall(residual_text)) >= RESIDUAL_MIN_CJK_CHARS
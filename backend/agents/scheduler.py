@@ -0,0 +1,240 @@
+import math
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+from typing import Any, Callable, Deque, Dict, Optional
+
+
+# 优先级类别，按调度顺序排列：交互式单患者评估 > 批量筛查 > 复评
+PRIORITY_CLASSES = ("interactive", "batch", "reassessment")
+DEFAULT_PRIORITY = "interactive"
+
+_PRIORITY_ALIASES = {
+    "re-assessment": "reassessment",
+    "re_assessment": "reassessment",
+    "bulk": "batch",
+}
+
+# 每个类别保留最近多少次排队耗时用于计算分位数
+_WAIT_WINDOW = 500
+
+
+class QueueFullError(Exception):
+    """类别队列已满，调用方应在retry_after秒后重试"""
+
+    def __init__(self, priority: str, retry_after: int):
+        super().__init__(f"{priority} 队列已满，请在 {retry_after} 秒后重试")
+        self.priority = priority
+        self.retry_after = retry_after
+
+
+def normalize_priority(priority: Optional[str]) -> str:
+    """
+    规范化请求中的优先级
+
+    Raises:
+        ValueError: 未知的优先级
+    """
+    if not priority:
+        return DEFAULT_PRIORITY
+    value = str(priority).strip().lower()
+    value = _PRIORITY_ALIASES.get(value, value)
+    if value not in PRIORITY_CLASSES:
+        raise ValueError(f"Invalid priority: {priority}. Expected one of {', '.join(PRIORITY_CLASSES)}")
+    return value
+
+
+class _Task:
+    __slots__ = ("func", "args", "kwargs", "future", "enqueued_at")
+
+    def __init__(self, func, args, kwargs):
+        self.func = func
+        self.args = args
+        self.kwargs = kwargs
+        self.future = Future()
+        self.enqueued_at = time.monotonic()
+
+
+class _ClassState:
+    def __init__(self, concurrency: int, queue_size: int):
+        self.concurrency = concurrency
+        self.queue_size = queue_size
+        self.queue: Deque[_Task] = deque()
+        self.running = 0
+        self.submitted = 0
+        self.rejected = 0
+        self.completed = 0
+        self.failed = 0
+        self.waits: Deque[float] = deque(maxlen=_WAIT_WINDOW)
+        self.avg_service: Optional[float] = None  # 执行耗时的指数移动平均
+
+
+class PriorityScheduler:
+    """
+    带优先级和准入控制的评估调度器（线程安全）
+
+    固定数量的工作线程按优先级顺序取任务：只要高优先级类别有排队任务且未达到其并发上限，
+    就不会执行低优先级任务。每个类别有独立的并发上限和有界队列；批量和复评类别的并发上限之和
+    小于工作线程数时，总有空闲线程留给交互式评估，大批量筛查不会让病房医生的请求排队。
+    队列已满时submit抛出QueueFullError，附带按当前排队长度和平均执行耗时估算的重试等待时间。
+    """
+
+    def __init__(self, workers: int, limits: Dict[str, Dict[str, int]], name: str = "scheduler"):
+        """
+        Args:
+            workers: 工作线程数
+            limits: 各优先级类别的 {"concurrency": 并发上限, "queue_size": 队列长度上限}
+            name: 工作线程名前缀
+        """
+        self.workers = workers
+        self._cond = threading.Condition()
+        self._classes: Dict[str, _ClassState] = {}
+        for priority in PRIORITY_CLASSES:
+            limit = limits.get(priority, {})
+            self._classes[priority] = _ClassState(
+                concurrency=max(1, min(int(limit.get("concurrency", workers)), workers)),
+                queue_size=max(0, int(limit.get("queue_size", 100)))
+            )
+        self._shutdown = False
+        self._threads = [
+            threading.Thread(target=self._worker, name=f"{name}-{i}", daemon=True)
+            for i in range(workers)
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def submit(self, priority: str, func: Callable[..., Any], *args, **kwargs) -> Future:
+        """
+        提交任务
+
+        Args:
+            priority: 优先级类别
+            func: 要执行的函数
+
+        Returns:
+            任务的Future
+
+        Raises:
+            ValueError: 未知的优先级
+            QueueFullError: 该类别队列已满
+            RuntimeError: 调度器已关闭
+        """
+        priority = normalize_priority(priority)
+        with self._cond:
+            if self._shutdown:
+                raise RuntimeError("Scheduler is shut down")
+            state = self._classes[priority]
+            if len(state.queue) >= state.queue_size:
+                state.rejected += 1
+                raise QueueFullError(priority, self._retry_after(state))
+            task = _Task(func, args, kwargs)
+            state.queue.append(task)
+            state.submitted += 1
+            self._cond.notify()
+        return task.future
+
+    def run(self, priority: str, func: Callable[..., Any], *args, **kwargs) -> Any:
+        """提交任务并等待结果（同步请求使用），异常原样抛出"""
+        return self.submit(priority, func, *args, **kwargs).result()
+
+    def metrics(self) -> Dict[str, Any]:
+        """各类别的排队深度、执行数、计数和排队耗时分位数"""
+        with self._cond:
+            classes = {}
+            for priority, state in self._classes.items():
+                waits = sorted(state.waits)
+                classes[priority] = {
+                    "queue_depth": len(state.queue),
+                    "queue_size": state.queue_size,
+                    "running": state.running,
+                    "concurrency": state.concurrency,
+                    "submitted": state.submitted,
+                    "rejected": state.rejected,
+                    "completed": state.completed,
+                    "failed": state.failed,
+                    "oldest_wait_seconds": round(time.monotonic() - state.queue[0].enqueued_at, 3) if state.queue else 0.0,
+                    "wait_seconds": {
+                        "p50": _percentile(waits, 0.50),
+                        "p95": _percentile(waits, 0.95),
+                        "max": round(waits[-1], 3) if waits else 0.0,
+                        "samples": len(waits),
+                    },
+                    "avg_service_seconds": round(state.avg_service, 3) if state.avg_service is not None else None,
+                }
+            return {
+                "workers": self.workers,
+                "busy": sum(state.running for state in self._classes.values()),
+                "classes": classes,
+            }
+
+    def shutdown(self, wait: bool = True, cancel_pending: bool = False):
+        """
+        停止接收新任务
+
+        Args:
+            wait: 是否等待工作线程退出（排队中的任务执行完后退出）
+            cancel_pending: 是否取消仍在排队的任务
+        """
+        with self._cond:
+            self._shutdown = True
+            if cancel_pending:
+                for state in self._classes.values():
+                    while state.queue:
+                        state.queue.popleft().future.cancel()
+            self._cond.notify_all()
+        if wait:
+            for thread in self._threads:
+                thread.join()
+
+    def _next_task(self):
+        """按优先级选出下一个可执行的任务（调用方持有锁）"""
+        for priority in PRIORITY_CLASSES:
+            state = self._classes[priority]
+            if state.queue and state.running < state.concurrency:
+                return state, state.queue.popleft()
+        return None, None
+
+    def _worker(self):
+        while True:
+            with self._cond:
+                state, task = self._next_task()
+                while task is None:
+                    if self._shutdown and not any(s.queue for s in self._classes.values()):
+                        return
+                    self._cond.wait()
+                    state, task = self._next_task()
+                state.running += 1
+                started = time.monotonic()
+                state.waits.append(started - task.enqueued_at)
+
+            ok = False
+            if task.future.set_running_or_notify_cancel():
+                try:
+                    task.future.set_result(task.func(*task.args, **task.kwargs))
+                    ok = True
+                except BaseException as e:
+                    task.future.set_exception(e)
+
+            with self._cond:
+                state.running -= 1
+                if ok:
+                    state.completed += 1
+                else:
+                    state.failed += 1
+                elapsed = time.monotonic() - started
+                state.avg_service = elapsed if state.avg_service is None else 0.8 * state.avg_service + 0.2 * elapsed
+                # 一个类别的执行槽释放后，其他线程可能可以取该类别的排队任务
+                self._cond.notify_all()
+
+    def _retry_after(self, state: _ClassState) -> int:
+        """排在队尾的任务大约需要等待的秒数（调用方持有锁）"""
+        avg_service = state.avg_service if state.avg_service is not None else 30.0
+        return max(1, math.ceil(len(state.queue) * avg_service / state.concurrency))
+
+
+def _percentile(sorted_values, q: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, math.ceil(q * len(sorted_values)) - 1))
+    return round(sorted_values[index], 3)
@@ -0,0 +1,117 @@
+import hashlib
+import json
+import os
+import threading
+from typing import Any, Callable, Dict, Tuple
+
+
+# 请求中携带图像的字段：按图像内容摘要参与请求键，而不是文件路径或整段base64
+_IMAGE_LIST_FIELDS = ("images", "file_paths")
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.waiters = 0
+
+
+class SingleFlight:
+    """
+    合并相同请求的并发调用
+
+    同一个键的调用正在执行时，后到的调用不再重复执行，而是等待并共享第一次调用的结果（或异常）。
+    调用完成后键即释放，之后的相同请求会重新执行，不做结果缓存。
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls: Dict[str, _Call] = {}
+
+    def do(self, key: str, func: Callable[..., Any], *args, **kwargs) -> Tuple[Any, bool]:
+        """
+        执行或加入一次调用
+
+        Args:
+            key: 请求键，相同键的并发调用只执行一次
+            func: 实际执行的函数
+
+        Returns:
+            (结果, 是否为共享的结果)
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            if call is not None:
+                call.waiters += 1
+                leader = False
+            else:
+                call = self._calls[key] = _Call()
+                leader = True
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result, True
+
+        try:
+            call.result = func(*args, **kwargs)
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.result, False
+
+    def in_flight(self) -> Dict[str, int]:
+        """正在执行的键及其等待者数量"""
+        with self._lock:
+            return {key: call.waiters for key, call in self._calls.items()}
+
+
+def _digest(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def _image_digest(image: Any) -> str:
+    """图像内容摘要：文件路径读取文件内容，base64字符串和其他结构按内容计算"""
+    if isinstance(image, str):
+        if len(image) < 4096 and os.path.isfile(image):
+            with open(image, "rb") as f:
+                return _digest(f.read())
+        return _digest(image.encode("utf-8"))
+    return _digest(json.dumps(image, ensure_ascii=False, sort_keys=True, default=str).encode("utf-8"))
+
+
+def _normalize(value: Any) -> Any:
+    if isinstance(value, dict):
+        normalized = {}
+        for key, item in value.items():
+            if key in _IMAGE_LIST_FIELDS and isinstance(item, list):
+                normalized[key] = [_image_digest(image) for image in item]
+            else:
+                normalized[key] = _normalize(item)
+        return normalized
+    if isinstance(value, list):
+        return [_normalize(item) for item in value]
+    if isinstance(value, str):
+        return value.strip()
+    return value
+
+
+def request_key(kind: str, payload: Any) -> str:
+    """
+    计算请求键：规范化后的请求内容（字段顺序无关、去除首尾空白、图像按内容摘要）的哈希
+
+    Args:
+        kind: 请求类型（assessment、text、image），不同类型的请求不会合并
+        payload: 请求内容
+
+    Returns:
+        请求键
+    """
+    canonical = json.dumps({"kind": kind, "payload": _normalize(payload)}, ensure_ascii=False, sort_keys=True)
+    return _digest(canonical.encode("utf-8"))
@@ -0,0 +1,165 @@
+import json
+import logging
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from .json_extraction import STRUCTURAL as _STRUCTURAL, STRING_SPECIAL as _STRING_SPECIAL
+
+
+logger = logging.getLogger("CNA.streaming_json")
+
+SectionCallback = Callable[[str, Any], None]
+
+
+class StreamingJSONParser:
+    """
+    增量解析模型输出的JSON对象，顶层字段一完成即通知订阅者
+
+    模型按token流式返回时逐段feed()：解析器只扫描新到达的文本，跟踪字符串、转义和括号深度，
+    顶层对象中的一个字段（如diagnoses、patient_info）在遇到其后的逗号或对象结束时立即解析并通知，
+    不必等待后面的lab_results等字段。第一个"{"之前的文字（如```json代码块标记）和对象结束后的文字被忽略。
+    总耗时与输出长度成线性关系，每个字段只解析一次。
+    """
+
+    def __init__(self):
+        self.sections: Dict[str, Any] = {}  # 已完成的顶层字段，按出现顺序
+        self.errors: List[str] = []  # 无法解析的字段片段的错误信息
+        self._subscribers: List[Tuple[SectionCallback, Optional[frozenset]]] = []
+        self._chunks: List[str] = []
+        self._member_parts: List[str] = []
+        self._started = False
+        self._done = False
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+
+    @property
+    def complete(self) -> bool:
+        """顶层对象是否已经结束"""
+        return self._done
+
+    @property
+    def text(self) -> str:
+        """目前收到的全部文本"""
+        return "".join(self._chunks)
+
+    def subscribe(self, callback: SectionCallback, keys: Optional[Iterable[str]] = None):
+        """
+        订阅顶层字段
+
+        Args:
+            callback: 以(字段名, 字段值)调用；回调中的异常只记录日志，不影响解析
+            keys: 只通知这些字段，None为全部字段
+        """
+        self._subscribers.append((callback, frozenset(keys) if keys is not None else None))
+
+    def feed(self, chunk: str) -> List[Tuple[str, Any]]:
+        """
+        输入一段新文本
+
+        Returns:
+            本段文本中完成的(字段名, 字段值)
+        """
+        if not chunk:
+            return []
+        self._chunks.append(chunk)
+        if self._done:
+            return []
+
+        completed = []
+        pos = 0
+        member_start = 0
+        length = len(chunk)
+        if self._escape:
+            # 上一段以反斜杠结尾，本段第一个字符是被转义的字符
+            self._escape = False
+            pos = 1
+
+        while pos < length:
+            if not self._started:
+                pos = chunk.find("{", pos)
+                if pos < 0:
+                    return completed
+                self._started = True
+                self._depth = 1
+                pos += 1
+                member_start = pos
+                continue
+
+            if self._in_string:
+                match = _STRING_SPECIAL.search(chunk, pos)
+                if match is None:
+                    break
+                if match.group() == "\\":
+                    pos = match.end() + 1
+                    if pos > length:
+                        self._escape = True
+                else:
+                    self._in_string = False
+                    pos = match.end()
+                continue
+
+            match = _STRUCTURAL.search(chunk, pos)
+            if match is None:
+                break
+            char = match.group()
+            pos = match.end()
+            if char == '"':
+                self._in_string = True
+            elif char in "{[":
+                self._depth += 1
+            elif char in "}]":
+                self._depth -= 1
+                if self._depth == 0:
+                    self._finish_member(chunk[member_start:match.start()], completed)
+                    self._done = True
+                    return completed
+            elif self._depth == 1:
+                self._finish_member(chunk[member_start:match.start()], completed)
+                member_start = pos
+
+        if self._started:
+            self._member_parts.append(chunk[member_start:])
+        return completed
+
+    def close(self) -> Optional[Dict[str, Any]]:
+        """
+        结束输入
+
+        Returns:
+            完整的JSON对象；对象未结束（输出被截断）或有字段无法解析时返回None，由调用方按原方式回退处理
+        """
+        if not self._done or self.errors:
+            return None
+        return dict(self.sections)
+
+    def _finish_member(self, tail: str, completed: List[Tuple[str, Any]]):
+        self._member_parts.append(tail)
+        text = "".join(self._member_parts)
+        self._member_parts = []
+        if not text.strip():
+            return
+        try:
+            member = json.loads("{" + text + "}")
+        except json.JSONDecodeError as e:
+            self.errors.append(f"{e}: {text[:80]}")
+            return
+        for key, value in member.items():
+            self.sections[key] = value
+            completed.append((key, value))
+            self._notify(key, value)
+
+    def _notify(self, key: str, value: Any):
+        for callback, keys in self._subscribers:
+            if keys is not None and key not in keys:
+                continue
+            try:
+                callback(key, value)
+            except Exception as e:
+                logger.warning(f"字段 {key} 的订阅回调失败: {e}")
+
+
+def iter_sections(chunks: Iterable[str]) -> Iterator[Tuple[str, Any]]:
+    """按到达顺序逐个产出流式文本中完成的顶层字段"""
+    parser = StreamingJSONParser()
+    for chunk in chunks:
+        yield from parser.feed(chunk)
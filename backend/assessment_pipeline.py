@@ -0,0 +1,226 @@
+#!/usr/bin/env python3
+"""
+一体化评估入口 - 在同一个进程中完成 文本/图像 -> 结构化提取 -> CNA评估
+
+原先粘贴文本的评估需要先启动text_processing_service.py提取结构，再把提取结果经前端路由
+序列化后启动main.py评估，两个进程各自导入SDK、加载.env。本入口在一个进程内完成：
+提取结果直接在内存中传给CNA_Coordinator，图像交给协调器的图像识别阶段处理。
+
+请求格式（stdin或工作进程的POST /pipeline）：
+    {
+        "text": "病历文本",                       # 与documents二选一，可省略（只有图像时）
+        "documents": [{"id": ..., "text": ...}],  # 多份文档，批量提取后合并
+        "imageData": {"images": [...]} 或 {"file_paths": [...]},  # 可选
+        "model_series": "gemini" | "deepseek",
+        "chunking": "auto", "local_extraction": true,             # 同text_processing_service
+        "assessment_profile": ..., "deadline_seconds": ..., "prescreen_threshold": ...,  # 同main.py
+        "return_extraction": false                # 为true时在响应的extraction中返回提取结果，供人工核对
+    }
+
+评估总时限（deadline_seconds或ASSESSMENT_DEADLINE_SECONDS）从请求开始计算，包含提取耗时。
+提取失败（模型调用出错、有文档提取失败）、提取期间取消或超时时不启动评估，直接返回错误响应，
+响应的extraction中附带提取信息。
+
+用法：
+    python assessment_pipeline.py < request.json
+"""
+
+import json
+import signal
+import sys
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from main import build_coordinator, original_stdout, null_stream
+from text_processing_service import (
+    setup_client,
+    extract_medical_data,
+    extract_documents_batch,
+    normalize_documents,
+)
+from agents.cancellation import CancellationToken, AssessmentCancelledError
+from agents.llm_cassette import install_cassette
+from agents.llm_usage import UsageRecorder
+from config import LLM_CASSETTE_MODE, LLM_CASSETTE_PATH, LLM_CASSETTE_LATENCY_SCALE, ASSESSMENT_DEADLINE_SECONDS
+
+# 原样传给评估请求的选项（见main.build_coordinator）
+ASSESSMENT_OPTIONS = ("assessment_profile", "deadline_seconds", "prescreen_threshold")
+
+
+def extract_patient_data(data: Dict[str, Any],
+                         usage_recorder: Optional[UsageRecorder] = None) -> Tuple[Dict[str, Any], Optional[Dict[str, Any]]]:
+    """
+    从请求中的文本提取结构化患者数据
+
+    Args:
+        data: 请求JSON
+        usage_recorder: 可选的用量记录器，记录提取阶段的模型调用
+
+    Returns:
+        (患者数据, 提取信息)；请求中没有文本时为({}, None)
+    """
+    model_series = data.get("model_series", "gemini")
+    chunking = data.get("chunking", "auto")
+    local_extraction = data.get("local_extraction", True)
+
+    if data.get("documents") is not None:
+        documents = normalize_documents(data["documents"])
+        if documents:
+            client = setup_client(model_series)
+            results, merged, batch_info = extract_documents_batch(
+                documents, model_series, client, chunking, local_extraction, usage_recorder
+            )
+            return merged, {"documents": results, "batch_info": batch_info}
+
+    text = data.get("text")
+    if text:
+        client = setup_client(model_series)
+        extracted_data, extraction_info = extract_medical_data(text, model_series, client, chunking, local_extraction,
+                                                               usage_recorder=usage_recorder)
+        return extracted_data, {"extraction_info": extraction_info}
+
+    return {}, None
+
+
+def extraction_errors(extraction: Optional[Dict[str, Any]]) -> List[str]:
+    """
+    返回提取信息中的失败原因，提取成功（或请求中没有文本）时为空列表
+
+    Args:
+        extraction: extract_patient_data返回的提取信息
+    """
+    if not extraction:
+        return []
+    if "batch_info" in extraction:
+        return [f"文档 {doc['document_id']}: {doc.get('error', '提取失败')}"
+                for doc in extraction["documents"] if not doc["success"]]
+    return list(extraction["extraction_info"]["model_errors"])
+
+
+def _cancelled_response(error: AssessmentCancelledError, started: float) -> Dict[str, Any]:
+    """提取期间取消时的响应，字段与协调器的取消响应一致"""
+    print(f"{error}，评估尚未开始", file=sys.stderr)
+    return {
+        "error": "评估已取消",
+        "cancelled": True,
+        "cancelled_stage": error.stage,
+        "cancel_reason": error.reason,
+        "processing_duration": time.monotonic() - started,
+        "completed_stages": [],
+    }
+
+
+def run_pipeline_request(data: Dict[str, Any], cancel_token: Optional[CancellationToken] = None) -> Dict[str, Any]:
+    """
+    执行一次一体化评估
+
+    Args:
+        data: 请求JSON，格式见模块说明
+        cancel_token: 可选的取消令牌；提取期间取消时协调器不再启动任何阶段，直接返回取消响应
+
+    Returns:
+        评估结果；return_extraction为true时extraction中包含提取的患者数据和提取信息。
+        提取失败、提取期间取消或耗尽总时限时为错误响应，不启动评估
+
+    Raises:
+        ValueError: 请求中没有文本也没有图像
+    """
+    if not isinstance(data, dict):
+        raise ValueError("Invalid pipeline request. Expected a JSON object.")
+    image_data = data.get("imageData")
+    has_images = isinstance(image_data, dict) and bool(image_data.get("images") or image_data.get("file_paths"))
+    if not (data.get("text") or data.get("documents") or has_images):
+        raise ValueError("Pipeline request needs text, documents or imageData.")
+
+    model_series = data.get("model_series", "gemini")
+    deadline_seconds = float(data["deadline_seconds"]) if data.get("deadline_seconds") else ASSESSMENT_DEADLINE_SECONDS
+    cancel_token = cancel_token or CancellationToken()
+    started = time.monotonic()
+    usage_recorder = UsageRecorder()
+
+    try:
+        cancel_token.raise_if_cancelled("text_extraction")
+        patient_data, extraction = extract_patient_data(data, usage_recorder)
+        cancel_token.raise_if_cancelled("text_extraction")
+    except AssessmentCancelledError as e:
+        return _cancelled_response(e, started)
+
+    # 提取结果先复制一份：评估过程中图像识别结果会并入患者数据
+    extracted_patient_data = json.loads(json.dumps(patient_data, ensure_ascii=False, default=str))
+    extraction_response = {
+        "extracted_data": extracted_patient_data,
+        "model_used": model_series,
+        **(extraction or {}),
+        "llm_usage": usage_recorder.summary(),
+    }
+
+    errors = extraction_errors(extraction)
+    if errors:
+        print(f"文本提取失败，不启动评估: {'；'.join(errors)}", file=sys.stderr)
+        return {
+            "error": f"文本提取失败: {'；'.join(errors)}",
+            "error_type": "ExtractionError",
+            "extraction": extraction_response,
+        }
+
+    # 评估使用提取后剩余的时间
+    remaining = None
+    if deadline_seconds is not None:
+        remaining = deadline_seconds - (time.monotonic() - started)
+        if remaining <= 0:
+            print(f"文本提取耗尽了评估总时限（{deadline_seconds:g}秒），不启动评估", file=sys.stderr)
+            return {
+                "error": f"文本提取耗尽了评估总时限（{deadline_seconds:g}秒）",
+                "error_type": "StageTimeoutError",
+                "extraction": extraction_response,
+            }
+
+    request = {
+        "patient_data": {"patientData": patient_data, "imageData": image_data} if has_images else patient_data,
+        "model_series": model_series,
+        **{key: data[key] for key in ASSESSMENT_OPTIONS if data.get(key) is not None},
+    }
+    if remaining is not None:
+        request["deadline_seconds"] = remaining
+    result = build_coordinator(request, cancel_token).run_assessment()
+
+    if data.get("return_extraction"):
+        result["extraction"] = extraction_response
+    return result
+
+
+def main():
+    try:
+        install_cassette(LLM_CASSETTE_MODE, LLM_CASSETTE_PATH, LLM_CASSETTE_LATENCY_SCALE)
+
+        input_data = sys.stdin.read()
+        if not input_data:
+            print(json.dumps({"error": "No input data received from stdin."}), file=sys.stderr)
+            sys.exit(1)
+        data = json.loads(input_data)
+
+        # 客户端断开时前端向子进程发送SIGTERM
+        cancel_token = CancellationToken()
+        signal.signal(signal.SIGTERM, lambda signum, frame: cancel_token.cancel("收到SIGTERM，客户端已断开"))
+
+        result = run_pipeline_request(data, cancel_token)
+
+        null_stream.close()
+        sys.stdout = original_stdout
+        print(json.dumps(result, ensure_ascii=False))
+        sys.stdout.flush()
+
+    except json.JSONDecodeError:
+        print(json.dumps({"error": "Failed to decode JSON from stdin."}), file=sys.stderr)
+        sys.exit(1)
+    except ValueError as e:
+        print(json.dumps({"error": str(e)}), file=sys.stderr)
+        sys.exit(1)
+    except Exception as e:
+        print(json.dumps({"error": f"An unexpected error occurred: {str(e)}", "error_type": type(e).__name__}),
+              file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
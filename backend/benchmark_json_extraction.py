@@ -0,0 +1,235 @@
+#!/usr/bin/env python3
+"""
+模型输出JSON提取基准测试 - agents/json_extraction.py的随机测试和大响应吞吐量
+
+随机测试：生成随机的提取结果，按模型常见的输出方式变形（```json代码块、前后说明文字、多余的逗号、
+在任意位置截断），检查提取结果：未截断时与原值相等，截断时是原值的前缀（保留的每个值都与原值一致）。
+吞吐量：构造包含大量检验项目的大响应，比较原先的做法（去掉代码块标记或贪婪匹配\\{.*\\}后json.loads）
+与共用提取器在各种变形下的耗时和成功率。
+
+用法：
+    python benchmark_json_extraction.py --cases 5000
+    python benchmark_json_extraction.py --items 20000 --json
+"""
+
+import argparse
+import json
+import random
+import re
+import statistics
+import sys
+import time
+
+from agents.json_extraction import find_json
+
+
+_WORDS = ["白蛋白", "前白蛋白", "血红蛋白", "CRP", "淋巴细胞", "胃癌", "食欲差", "体重下降", "g/L", "↑", "↓",
+          "正常", 'quote"inside', "back\\slash", "换行\n文本", "{括号}", "[方括号]", "逗号,", "tab\t"]
+
+
+def random_value(rng: random.Random, depth: int = 0):
+    """随机的JSON值，结构接近提取结果（嵌套对象、数组、中文字符串、数字和null）"""
+    kind = rng.random()
+    if depth < 4 and kind < 0.25:
+        return {f"{rng.choice(_WORDS)}_{i}": random_value(rng, depth + 1) for i in range(rng.randint(0, 5))}
+    if depth < 4 and kind < 0.45:
+        return [random_value(rng, depth + 1) for _ in range(rng.randint(0, 5))]
+    if kind < 0.7:
+        return "".join(rng.choice(_WORDS) for _ in range(rng.randint(0, 4)))
+    if kind < 0.85:
+        return rng.choice([rng.randint(-1000, 1000), round(rng.uniform(0, 500), 2)])
+    return rng.choice([None, True, False])
+
+
+def random_record(rng: random.Random) -> dict:
+    return {
+        "document_type": rng.choice(["病历", "生化检查", "血常规"]),
+        "patient_info": {"age": rng.randint(18, 95), "gender": rng.choice(["男", "女"]), "bmi": round(rng.uniform(14, 35), 1)},
+        "diagnoses": [{"type": "主要诊断", "description": random_value(rng, 3)} for _ in range(rng.randint(0, 3))],
+        "lab_results": random_value(rng, 1),
+        "notes": random_value(rng),
+    }
+
+
+def add_trailing_commas(text: str, rng: random.Random) -> str:
+    """在部分闭合括号前插入多余的逗号（只改动字符串外的括号）"""
+    out = []
+    in_string = escape = False
+    for char in text:
+        if in_string:
+            if escape:
+                escape = False
+            elif char == "\\":
+                escape = True
+            elif char == '"':
+                in_string = False
+        elif char == '"':
+            in_string = True
+        elif char in "}]" and out and out[-1] not in "{[" and rng.random() < 0.5:
+            out.append(",")
+        out.append(char)
+    return "".join(out)
+
+
+def is_prefix(partial, full) -> bool:
+    """截断后的提取结果是否为原值的前缀：容器只能缺少末尾的元素，标量必须相等"""
+    if isinstance(full, dict):
+        return isinstance(partial, dict) and list(partial) == list(full)[:len(partial)] and all(
+            is_prefix(value, full[key]) for key, value in partial.items()
+        )
+    if isinstance(full, list):
+        return isinstance(partial, list) and len(partial) <= len(full) and all(
+            is_prefix(value, full[i]) for i, value in enumerate(partial)
+        )
+    return partial == full and type(partial) is type(full)
+
+
+def render(record: dict, rng: random.Random):
+    """按随机的输出方式渲染，返回(文本, 是否截断)"""
+    body = json.dumps(record, ensure_ascii=False, indent=rng.choice([None, 2]))
+    if rng.random() < 0.3:
+        body = add_trailing_commas(body, rng)
+    prefix = ""
+    if rng.random() < 0.3:
+        prefix += "以下是提取结果：\n"
+    fenced = rng.random() < 0.5
+    if fenced:
+        prefix += "```json\n"
+    text = prefix + body + ("\n```" if fenced else "")
+    json_end = len(prefix) + len(body)
+    if rng.random() < 0.3:
+        cut = rng.randint(len(prefix) + 1, len(text) - 1)
+        # 截断在对象结束之后（代码块结束标记中）时对象仍是完整的
+        return text[:cut], cut < json_end
+    if rng.random() < 0.3:
+        text += "\n\n说明：以上数据{仅供参考}，如有疑问请核对原始报告。"
+    return text, False
+
+
+def fuzz(cases: int, seed: int) -> dict:
+    """
+    随机测试
+
+    Returns:
+        各类输出的数量和失败样例
+    """
+    rng = random.Random(seed)
+    counts = {"complete": 0, "truncated": 0, "recovered_truncated": 0}
+    failures = []
+    for _ in range(cases):
+        record = random_record(rng)
+        text, truncated = render(record, rng)
+        result = find_json(text, expect=dict)
+        if not truncated:
+            counts["complete"] += 1
+            ok = result is not None and result.value == record
+        else:
+            counts["truncated"] += 1
+            ok = result is None or is_prefix(result.value, record)
+            counts["recovered_truncated"] += result is not None
+        if not ok and len(failures) < 5:
+            failures.append(text[:300])
+        counts.setdefault("failed", 0)
+        counts["failed"] += not ok
+    return {**counts, "failures": failures}
+
+
+def legacy_extract(text: str):
+    """原先的做法：去掉代码块标记，不是合法JSON时贪婪匹配第一个{到最后一个}"""
+    cleaned = text.strip()
+    if cleaned.startswith("```json"):
+        cleaned = cleaned[7:]
+    if cleaned.endswith("```"):
+        cleaned = cleaned[:-3]
+    try:
+        return json.loads(cleaned.strip())
+    except json.JSONDecodeError:
+        pass
+    match = re.search(r"\{.*\}", text, re.DOTALL)
+    if match:
+        try:
+            return json.loads(match.group())
+        except json.JSONDecodeError:
+            return None
+    return None
+
+
+def large_response(items: int, seed: int) -> str:
+    rng = random.Random(seed)
+    record = random_record(rng)
+    record["lab_results"] = {
+        "biochemistry": [
+            {"name": rng.choice(_WORDS), "value": str(round(rng.uniform(0, 200), 1)), "unit": "g/L",
+             "interpretation": rng.choice(["↑", "↓", "正常"])}
+            for _ in range(items)
+        ]
+    }
+    return json.dumps(record, ensure_ascii=False, indent=2)
+
+
+def throughput(items: int, repeat: int, seed: int) -> list:
+    """
+    大响应的提取耗时
+
+    Returns:
+        每种变形下两种做法的耗时（毫秒）、吞吐量（MB/s）和是否成功
+    """
+    text = large_response(items, seed)
+    variants = {
+        "clean": text,
+        "fenced_prose": f"以下是提取结果：\n```json\n{text}\n```\n以上数据{{仅供参考}}。",
+        "trailing_commas": add_trailing_commas(text, random.Random(seed)),
+        "truncated": text[:int(len(text) * 0.9)],
+    }
+    results = []
+    for name, variant in variants.items():
+        size_mb = len(variant.encode("utf-8")) / 1024 / 1024
+        row = {"variant": name, "size_mb": round(size_mb, 2)}
+        for method, func in (("legacy", legacy_extract), ("shared", lambda t: find_json(t, expect=dict))):
+            timings = []
+            for _ in range(repeat):
+                started = time.perf_counter()
+                value = func(variant)
+                timings.append(time.perf_counter() - started)
+            elapsed = statistics.median(timings)
+            row[method] = {
+                "ms": round(elapsed * 1000, 2),
+                "mb_per_s": round(size_mb / elapsed, 1) if elapsed else None,
+                "ok": value is not None,
+            }
+        results.append(row)
+    return results
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="模型输出JSON提取的随机测试和吞吐量")
+    parser.add_argument("--cases", type=int, default=3000, help="随机测试的样例数")
+    parser.add_argument("--items", type=int, default=10000, help="大响应中的检验项目数")
+    parser.add_argument("--repeat", type=int, default=5, help="吞吐量测量的重复次数（取中位数）")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--json", action="store_true", help="以JSON输出结果")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    fuzz_result = fuzz(args.cases, args.seed)
+    throughput_result = throughput(args.items, args.repeat, args.seed)
+
+    if args.json:
+        print(json.dumps({"fuzz": fuzz_result, "throughput": throughput_result}, ensure_ascii=False, indent=2))
+    else:
+        print(f"随机测试: {args.cases} 个样例，完整 {fuzz_result['complete']}，截断 {fuzz_result['truncated']}"
+              f"（恢复 {fuzz_result['recovered_truncated']}），失败 {fuzz_result['failed']}", file=sys.stderr)
+        for failure in fuzz_result["failures"]:
+            print(f"  失败样例: {failure!r}", file=sys.stderr)
+        print(f"{'变形':<18}{'大小(MB)':>10}{'原做法(ms)':>12}{'成功':>6}{'提取器(ms)':>12}{'MB/s':>8}{'成功':>6}")
+        for row in throughput_result:
+            print(f"{row['variant']:<18}{row['size_mb']:>10}{row['legacy']['ms']:>12}{str(row['legacy']['ok']):>6}"
+                  f"{row['shared']['ms']:>12}{row['shared']['mb_per_s']:>8}{str(row['shared']['ok']):>6}")
+    if fuzz_result["failed"]:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+"""
+模型调用方式基准测试 - 比较autogen与直接调用SDK（agents/llm_client.py）的单次调用开销和内存
+
+两种方式向同一个OpenAI兼容服务发送相同的单轮请求，服务端延迟为0时，调用耗时的差异即客户端开销。
+未指定--base-url时在进程内启动本地模拟模型服务（stub_llm_server.py），不消耗模型配额。
+每次调用的提示都不同，避免命中autogen的本地响应缓存。
+
+用法：
+    python benchmark_llm_client.py --calls 200
+    python benchmark_llm_client.py --base-url http://127.0.0.1:8900/v1 --backend direct --json
+"""
+
+import argparse
+import gc
+import json
+import statistics
+import sys
+import threading
+import time
+import tracemalloc
+
+from agents.llm_client import LLM_BACKENDS, create_llm_agent
+from agents.llm_usage import UsageRecorder, instrument_agent
+import stub_llm_server
+
+
+SYSTEM_MESSAGE = "你是一名人体测量评估师。请用中文计算BMI、体重变化百分比，并与标准进行比较。"
+
+PROMPT = ("Evaluate the anthropometric data for the following patient: "
+          "{'patient_info': {'age': 72, 'gender': '男', 'height_cm': 170, 'weight_kg': 52, 'bmi': 18.0}, "
+          "'call': %d}")
+
+
+def start_stub_server() -> str:
+    """在后台线程中启动零延迟的模拟模型服务，返回其base_url"""
+    server = stub_llm_server.build_server(stub_llm_server.parse_args(["--port", "0", "--latency", "fixed:0"]))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return f"http://127.0.0.1:{server.server_address[1]}/v1"
+
+
+def _percentile(values, q):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+def _call(agent, index: int):
+    reply = agent.generate_reply(messages=[{"role": "user", "content": PROMPT % index}])
+    if not reply:
+        raise RuntimeError(f"{agent.name} 返回了空回复")
+
+
+def benchmark(backend: str, llm_config: dict, calls: int, warmup: int) -> dict:
+    """
+    测量一种调用方式
+
+    耗时和内存分两轮测量，避免tracemalloc的开销计入调用耗时。创建耗时不含模块导入（预热时完成）。
+
+    Returns:
+        创建耗时、智能体占用内存、每次调用的耗时分位数、调用线程CPU时间和内存分配
+    """
+    def create():
+        agent = create_llm_agent("Benchmark_Agent", llm_config, SYSTEM_MESSAGE, backend=backend)
+        instrument_agent(agent, "benchmark", UsageRecorder())
+        return agent
+
+    agent = create()
+    for i in range(warmup):
+        _call(agent, -(i + 1))
+    # autogen智能体连续自动回复100次后不再回复，协调器在每次评估后清零，这里在计时外每次清零
+    reset = getattr(agent, "reset_consecutive_auto_reply_counter", None) or (lambda: None)
+
+    started = time.perf_counter()
+    for _ in range(5):
+        create()
+    create_ms = (time.perf_counter() - started) * 1000 / 5
+
+    latencies = []
+    cpu_times = []
+    for i in range(calls):
+        reset()
+        started, cpu_started = time.perf_counter(), time.thread_time()
+        _call(agent, i)
+        latencies.append((time.perf_counter() - started) * 1000)
+        cpu_times.append((time.thread_time() - cpu_started) * 1000)
+
+    gc.collect()
+    tracemalloc.start()
+    agent = create()
+    agent_kb = tracemalloc.get_traced_memory()[0] / 1024
+    allocated = []
+    for i in range(min(calls, 50)):
+        reset()
+        before = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+        _call(agent, calls + i)
+        allocated.append((tracemalloc.get_traced_memory()[1] - before) / 1024)
+    gc.collect()
+    retained_kb = tracemalloc.get_traced_memory()[0] / 1024 - agent_kb
+    tracemalloc.stop()
+
+    return {
+        "backend": backend,
+        "calls": calls,
+        "create_ms": round(create_ms, 2),
+        "agent_kb": round(agent_kb, 1),
+        "call_ms": {
+            "mean": round(statistics.mean(latencies), 3),
+            "p50": round(_percentile(latencies, 0.50), 3),
+            "p95": round(_percentile(latencies, 0.95), 3),
+        },
+        "client_cpu_ms_per_call": round(statistics.mean(cpu_times), 3),
+        "peak_alloc_kb_per_call": round(statistics.mean(allocated), 1),
+        "retained_kb_per_50_calls": round(retained_kb, 1),
+    }
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="比较autogen与直接调用SDK的单次调用开销")
+    parser.add_argument("--calls", type=int, default=200, help="每种方式的测量调用次数")
+    parser.add_argument("--warmup", type=int, default=10, help="测量前的预热调用次数")
+    parser.add_argument("--base-url", help="OpenAI兼容服务地址，缺省时在进程内启动零延迟的模拟服务")
+    parser.add_argument("--model", default="deepseek-chat")
+    parser.add_argument("--backend", choices=LLM_BACKENDS, action="append",
+                        help="要测量的调用方式，可重复指定，缺省时两种都测量")
+    parser.add_argument("--json", action="store_true", help="以JSON输出结果")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    base_url = args.base_url or start_stub_server()
+    llm_config = {
+        "config_list": [{"model": args.model, "api_key": "stub", "api_type": "openai", "base_url": base_url}],
+        "temperature": 0.5,
+    }
+
+    results = [benchmark(backend, llm_config, args.calls, args.warmup) for backend in args.backend or LLM_BACKENDS]
+
+    if args.json:
+        print(json.dumps(results, ensure_ascii=False, indent=2))
+        return
+    print(f"服务地址: {base_url}，每种方式 {args.calls} 次调用（预热 {args.warmup} 次）", file=sys.stderr)
+    print(f"{'方式':<10}{'创建(ms)':>10}{'智能体(KB)':>12}{'均值(ms)':>10}{'p50(ms)':>10}{'p95(ms)':>10}"
+          f"{'调用CPU(ms)':>12}{'单次分配(KB)':>14}{'50次留存(KB)':>14}")
+    for r in results:
+        print(f"{r['backend']:<10}{r['create_ms']:>10}{r['agent_kb']:>12}{r['call_ms']['mean']:>10}"
+              f"{r['call_ms']['p50']:>10}{r['call_ms']['p95']:>10}{r['client_cpu_ms_per_call']:>12}"
+              f"{r['peak_alloc_kb_per_call']:>14}{r['retained_kb_per_50_calls']:>14}")
+
+if __name__ == "__main__":
+    main()
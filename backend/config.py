@@ -11,6 +11,13 @@ GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
 # DeepSeek API Key
 DEEPSEEK_API_KEY = os.getenv("DEEPSEEK_API_KEY")
 
+# 本地模拟模型服务（stub_llm_server.py）的OpenAI兼容地址，如 http://127.0.0.1:8900/v1
+# 设置后所有模型配置都指向该地址，用于在单机上压测并发、限流和故障切换，不消耗模型配额
+LLM_STUB_BASE_URL = os.getenv("LLM_STUB_BASE_URL", "").strip()
+
+# DeepSeek接口地址（可指向其他OpenAI兼容服务），设置了模拟服务时默认使用模拟服务
+DEEPSEEK_BASE_URL = os.getenv("DEEPSEEK_BASE_URL") or LLM_STUB_BASE_URL or "https://api.deepseek.com/v1"
+
 # ==================== 模型配置 ====================
 # 本项目支持两大模型系列：Gemini和DeepSeek
 # 用户可在前端选择使用哪个系列的模型进行分析和报告生成
@@ -55,7 +62,7 @@ llm_config_deepseek_chat = {
             "model": "deepseek-chat",
             "api_key": DEEPSEEK_API_KEY,
             "api_type": "openai",
-            "base_url": "https://api.deepseek.com/v1",
+            "base_url": DEEPSEEK_BASE_URL,
         }
     ],
     "temperature": 0.5,  # 与Gemini Flash相同温度，保证分析准确性
@@ -70,12 +77,92 @@ llm_config_deepseek_reasoner = {
             "model": "deepseek-reasoner",
             "api_key": DEEPSEEK_API_KEY,
             "api_type": "openai",
-            "base_url": "https://api.deepseek.com/v1",
+            "base_url": DEEPSEEK_BASE_URL,
         }
     ],
     "temperature": 0.7,  # 较高温度，生成更自然的报告
 }
 
+# ==================== 本地模拟模型服务 ====================
+# 指向模拟服务时，Gemini系列配置也改用OpenAI兼容接口（模型名保持不变，便于按智能体区分统计）
+if LLM_STUB_BASE_URL:
+    for _config in (llm_config_gemini_flash_standard, llm_config_gemini_flash_preview,
+                    llm_config_deepseek_chat, llm_config_deepseek_reasoner):
+        for _entry in _config["config_list"]:
+            _entry.update({"api_type": "openai", "base_url": LLM_STUB_BASE_URL, "api_key": _entry.get("api_key") or "stub"})
+
+# ==================== 模型调用方式 ====================
+# autogen：各智能体经由autogen.AssistantAgent调用模型；
+# direct：单轮调用直接使用Gemini/OpenAI兼容SDK（相同的llm_config），省去autogen的对话历史和配置解析开销
+LLM_BACKEND = os.getenv("LLM_BACKEND", "autogen").lower()
+
+# ==================== 流式提取 ====================
+# 开启后图像识别和文本提取流式接收模型输出，边接收边解析，已完成的顶层字段（diagnoses、patient_info等）立即通知订阅者
+EXTRACTION_STREAMING = os.getenv("EXTRACTION_STREAMING", "false").lower() in ("1", "true", "yes")
+
+# ==================== 评估时限配置 ====================
+# 单次评估的端到端总时限（秒），按阶段权重拆分为每次LLM调用的时间预算
+# 非关键阶段（如膳食评估）超时后仍会生成标注为"部分报告"的结果；未设置时不限时（请求中的deadline_seconds仍然生效）
+ASSESSMENT_DEADLINE_SECONDS = float(os.getenv("ASSESSMENT_DEADLINE_SECONDS")) if os.getenv("ASSESSMENT_DEADLINE_SECONDS") else None
+
+# ==================== 中间结果提炼配置 ====================
+# 冲突检测和报告生成前，将每个智能体的输出提炼为不超过该长度（字符）的结构化摘要
+# （风险等级、异常指标、诊断）；默认0关闭提炼，直接使用完整文本
+RESULT_DIGEST_MAX_CHARS = int(os.getenv("RESULT_DIGEST_MAX_CHARS", "0"))
+
+# ==================== 报告生成配置 ====================
+# 分部分生成最终报告：先生成风险等级和PES诊断两个核心部分，再并行生成其余五个部分
+REPORT_SECTIONED_GENERATION = os.getenv("REPORT_SECTIONED_GENERATION", "false").lower() in ("1", "true", "yes")
+
+# ==================== 预筛查配置 ====================
+# 批量筛查时，规则计算的风险评分（NRS2002）低于该值且BMI、白蛋白、CRP、体重和进食均无异常的患者
+# 直接返回低风险模板结果，不调用模型；设为0时关闭预筛查
+PRESCREEN_RISK_THRESHOLD = float(os.getenv("PRESCREEN_RISK_THRESHOLD", "0"))
+
+# ==================== 检查点配置 ====================
+# 每个阶段完成后把结果和追溯记录写入本地检查点（含患者数据），进程中断或模型调用失败后
+# 可通过resume_session_id从第一个未完成的阶段继续，不重复图像识别和已完成的分析
+ASSESSMENT_CHECKPOINTS = os.getenv("ASSESSMENT_CHECKPOINTS", "false").lower() in ("1", "true", "yes")
+ASSESSMENT_CHECKPOINT_DIR = os.getenv("ASSESSMENT_CHECKPOINT_DIR", "checkpoints")
+
+# ==================== 模型调用录制/回放配置 ====================
+# record：真实调用模型并把每次请求和响应按请求哈希写入本地cassette
+# replay：只从cassette回放，不访问网络，用于离线的性能回归和profiling；off：关闭
+LLM_CASSETTE_MODE = os.getenv("LLM_CASSETTE_MODE", "off").lower()
+LLM_CASSETTE_PATH = os.getenv("LLM_CASSETTE_PATH", "cassettes/llm_cassette.jsonl")
+# 回放时按录制耗时乘以该系数模拟模型延迟，0为不等待，1为还原录制时的延迟
+LLM_CASSETTE_LATENCY_SCALE = float(os.getenv("LLM_CASSETTE_LATENCY_SCALE", "0"))
+
+# ==================== Python工作进程配置 ====================
+# worker_service.py的监听地址；前端设置PYTHON_WORKER_URL后，API路由将请求转发到该进程而不是每次启动子进程
+PYTHON_WORKER_HOST = os.getenv("PYTHON_WORKER_HOST", "127.0.0.1")
+PYTHON_WORKER_PORT = int(os.getenv("PYTHON_WORKER_PORT", "8800"))
+# 调度器工作线程数：同步请求和异步任务共用，决定同时进行的评估数
+SCHEDULER_WORKERS = int(os.getenv("SCHEDULER_WORKERS", "4"))
+# 各优先级类别（interactive > batch > reassessment）的并发上限；
+# batch与reassessment之和应小于工作线程数，为交互式评估保留执行槽
+SCHEDULER_INTERACTIVE_CONCURRENCY = int(os.getenv("SCHEDULER_INTERACTIVE_CONCURRENCY", str(SCHEDULER_WORKERS)))
+SCHEDULER_BATCH_CONCURRENCY = int(os.getenv("SCHEDULER_BATCH_CONCURRENCY", "2"))
+SCHEDULER_REASSESSMENT_CONCURRENCY = int(os.getenv("SCHEDULER_REASSESSMENT_CONCURRENCY", "1"))
+# 各类别的排队上限，队列满时返回429和Retry-After
+SCHEDULER_INTERACTIVE_QUEUE_SIZE = int(os.getenv("SCHEDULER_INTERACTIVE_QUEUE_SIZE", "20"))
+SCHEDULER_BATCH_QUEUE_SIZE = int(os.getenv("SCHEDULER_BATCH_QUEUE_SIZE", "200"))
+SCHEDULER_REASSESSMENT_QUEUE_SIZE = int(os.getenv("SCHEDULER_REASSESSMENT_QUEUE_SIZE", "200"))
+# 已结束任务的结果保留时间（秒），超时后无法再按session_id查询
+JOB_RESULT_TTL_SECONDS = float(os.getenv("JOB_RESULT_TTL_SECONDS", "3600"))
+# 工作进程数：大于1时主进程导入依赖后预派生多个子进程共同监听（写时复制共享已导入的模块），
+# 调度器并发上限按子进程分别计算
+PYTHON_WORKER_PROCESSES = int(os.getenv("PYTHON_WORKER_PROCESSES", "1"))
+# 每个子进程处理多少个请求后回收（替换为新的子进程），0为不回收；
+# 回收的子进程等待进行中的评估和异步任务结束后退出，其已结束任务的结果随之丢弃
+PYTHON_WORKER_MAX_REQUESTS = int(os.getenv("PYTHON_WORKER_MAX_REQUESTS", "0"))
+# 子进程常驻内存上限（MB），超过后回收，0为不限制
+PYTHON_WORKER_MAX_RSS_MB = float(os.getenv("PYTHON_WORKER_MAX_RSS_MB", "0"))
+# 子进程心跳超时（秒），超时视为卡死并强制重启
+PYTHON_WORKER_HEARTBEAT_TIMEOUT = float(os.getenv("PYTHON_WORKER_HEARTBEAT_TIMEOUT", "30"))
+# 回收或停止时等待子进程完成进行中评估的最长时间（秒）
+PYTHON_WORKER_DRAIN_TIMEOUT = float(os.getenv("PYTHON_WORKER_DRAIN_TIMEOUT", "600"))
+
 # ==================== 向后兼容的别名 ====================
 # 为了保持代码兼容性，保留旧的命名作为别名
 llm_config_flash_standard = llm_config_gemini_flash_standard
@@ -6,6 +6,7 @@ CNA系统演示版本 - 不需要真实API密钥
 import sys
 import json
 from datetime import datetime
+from agents.nutrition_scoring import score_patient
 
 def mock_assessment(patient_data):
     """模拟营养评估结果"""
@@ -42,9 +43,19 @@ def mock_assessment(patient_data):
         if "血红蛋白" in name:
             hemoglobin = item.get("value", "")
     
-    # 提取会诊信息
-    consultation = patient_data.get("consultation_record", {})
-    nrs_score = consultation.get("NRS2002_score", 0)
+    # 风险评分、异常标识和需要量使用与正式评估相同的规则计算
+    scores = score_patient(patient_data)
+    nrs = scores["nrs2002"]
+    glim = scores["glim"]
+    lab_flags = scores["lab_flags"]
+    requirements = scores["requirements"]
+    nrs_score = nrs["reported_total"] if nrs["reported_total"] is not None else nrs["total"]
+    energy = "-".join(f"{v:g}" for v in requirements["energy_kcal"]) if requirements["energy_kcal"] else "待测量体重后计算"
+    protein = "-".join(f"{v:g}" for v in requirements["protein_g"]) if requirements["protein_g"] else "待测量体重后计算"
+    phenotypes = [label for label, hit in (("BMI偏低", glim["phenotypic"]["low_bmi"]),
+                                           ("体重下降", glim["phenotypic"]["weight_loss"])) if hit]
+    etiologies = [label for label, hit in (("摄入减少", glim["etiologic"]["reduced_intake"]),
+                                           ("疾病相关炎症", glim["etiologic"]["inflammation"])) if hit]
     
     # 生成模拟报告
     mock_report = f"""
@@ -56,29 +67,30 @@ def mock_assessment(patient_data):
 
 ## 2. 营养风险等级
 NRS2002评分：{nrs_score}分
-评估结果：{'存在营养风险' if nrs_score >= 3 else '营养风险较低'}
+评估结果：{'存在营养风险' if nrs['at_risk'] else '营养风险较低'}
 
 ## 3. 关键评估发现
 
 ### 生化评估
-• 血清白蛋白：{albumin} g/L {'(偏低)' if albumin and float(albumin) < 35 else ''}
-• C-反应蛋白：{crp} mg/L {'(明显升高，提示炎症状态)' if crp and float(crp) > 10 else ''}
+• 血清白蛋白：{albumin} g/L {'(偏低)' if lab_flags['albumin_low'] else ''}
+• C-反应蛋白：{crp} mg/L {'(明显升高，提示炎症状态)' if lab_flags['crp_elevated'] else ''}
 
 ### 血液学评估  
-• 血红蛋白：{hemoglobin} g/L {'(偏低，提示贫血)' if hemoglobin and float(hemoglobin) < 110 else ''}
+• 血红蛋白：{hemoglobin} g/L {'(偏低，提示贫血)' if lab_flags['anemia'] else ''}
 
 ### 人体测量评估
-• BMI评估：{bmi} kg/m² {'(正常范围)' if 18.5 <= bmi <= 24 else '(需关注)'}
+• BMI评估：{bmi} kg/m² {'(需关注)' if glim['phenotypic']['low_bmi'] else ''}
 
 ### 膳食评估
 • 根据会诊记录，患者存在营养摄入不足的情况
-• 推荐能量摄入：1600-1700 kcal/日
-• 推荐蛋白质摄入：65-70 g/日
+• 推荐能量摄入：{energy} kcal/日
+• 推荐蛋白质摄入：{protein} g/日
 
 ## 4. 营养诊断
 基于GLIM标准评估：
-• 表型标准：{'体重下降/BMI偏低' if bmi < 20 else 'BMI正常范围'}
-• 病因标准：疾病相关炎症，摄入减少
+• 表型标准：{'、'.join(phenotypes) or '未满足'}
+• 病因标准：{'、'.join(etiologies) or '未满足'}
+• 结论：{glim['severity']}
 
 **营养诊断**：蛋白质-能量营养不良，与心血管疾病相关的炎症状态和摄入减少有关
 
@@ -89,8 +101,8 @@ NRS2002评分：{nrs_score}分
 4. 能量和蛋白质摄入不足
 
 ## 6. 营养治疗目标（SMART原则）
-1. 在1周内，将每日能量摄入提高到1600-1700 kcal
-2. 在2周内，将蛋白质摄入量增加到65-70g/日
+1. 在1周内，将每日能量摄入提高到{energy} kcal
+2. 在2周内，将蛋白质摄入量增加到{protein}g/日
 3. 在4周内，血清白蛋白水平提升至36 g/L以上
 4. 在6周内，血红蛋白水平改善至100 g/L以上
 
@@ -129,6 +141,7 @@ NRS2002评分：{nrs_score}分
             "missing_fields": [],
             "warnings": []
         },
+        "nutrition_scores": scores,
         "trace_summary": {
             "total_steps": 6,
             "final_report_trace_id": "demo_report_trace_001",
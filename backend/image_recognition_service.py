@@ -8,13 +8,52 @@ import sys
 import json
 import logging
 from agents.image_recognizer import ImageRecognizer
-from config import llm_config_flash
+from agents.agent_pool import DEFAULT_AGENT_POOL
+from agents.llm_cassette import install_cassette
+from config import llm_config_flash, LLM_CASSETTE_MODE, LLM_CASSETTE_PATH, LLM_CASSETTE_LATENCY_SCALE
 
 # 配置日志
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
+def recognize_images(data):
+    """
+    识别一次请求中的图像
+    
+    Args:
+        data: 请求JSON，包含images或file_paths
+        
+    Returns:
+        识别出的结构化数据，识别失败时为包含error的字典
+        
+    Raises:
+        RuntimeError: 智能体初始化或识别过程异常
+    """
+    # 从智能体池借出图像识别智能体（常驻进程中复用已创建的智能体和模型客户端）
+    try:
+        image_recognizer = DEFAULT_AGENT_POOL.acquire(ImageRecognizer, llm_config_flash)
+    except Exception as e:
+        raise RuntimeError(f"Failed to initialize ImageRecognizer: {str(e)}") from e
+    
+    # 处理图像
+    try:
+        recognition_result = image_recognizer.process(data)
+    except Exception as e:
+        raise RuntimeError(f"Image recognition failed: {str(e)}") from e
+    finally:
+        DEFAULT_AGENT_POOL.release(image_recognizer)
+    
+    # 提取识别结果
+    if recognition_result.get("success", False):
+        return recognition_result.get("data", {})
+    return {
+        "error": recognition_result.get("error", "图像识别失败"),
+        "details": recognition_result
+    }
+
 def main():
     try:
+        install_cassette(LLM_CASSETTE_MODE, LLM_CASSETTE_PATH, LLM_CASSETTE_LATENCY_SCALE)
+
         # 从stdin读取输入数据
         input_data = sys.stdin.read()
         
@@ -31,34 +70,15 @@ def main():
             print(json.dumps(result, ensure_ascii=False))
             sys.exit(1)
         
-        # 创建图像识别智能体
-        try:
-            image_recognizer = ImageRecognizer(llm_config=llm_config_flash)
-        except Exception as e:
-            result = {"error": f"Failed to initialize ImageRecognizer: {str(e)}"}
-            print(json.dumps(result, ensure_ascii=False))
-            sys.exit(1)
-        
-        # 处理图像
-        try:
-            recognition_result = image_recognizer.process(data)
-        except Exception as e:
-            result = {"error": f"Image recognition failed: {str(e)}"}
-            print(json.dumps(result, ensure_ascii=False))
-            sys.exit(1)
-        
-        # 提取识别结果
-        if recognition_result.get("success", False):
-            output = recognition_result.get("data", {})
-        else:
-            output = {
-                "error": recognition_result.get("error", "图像识别失败"),
-                "details": recognition_result
-            }
+        output = recognize_images(data)
         
         # 输出结果
         print(json.dumps(output, ensure_ascii=False))
         
+    except RuntimeError as e:
+        result = {"error": str(e)}
+        print(json.dumps(result, ensure_ascii=False))
+        sys.exit(1)
     except Exception as e:
         error_result = {
             "error": f"Service error: {str(e)}",
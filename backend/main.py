@@ -3,6 +3,9 @@ import json
 import logging
 import os
 import io
+import signal
+import copy
+from typing import Optional
 
 # 保存原始stdout
 original_stdout = sys.stdout
@@ -30,83 +33,273 @@ os.environ['AUTOGEN_SILENT'] = '1'
 os.environ['OPENAI_LOG_LEVEL'] = 'error'
 
 from agents.cna_coordinator import CNA_Coordinator
+from agents.cancellation import CancellationToken
+from agents.checkpoint_store import CheckpointStore
+from agents.document_classifier import classify_document
+from agents.patient_record import PatientRecord, ConsultationRecord, Diagnosis, LabItem, TreatmentPlan
 from config import (
     llm_config_gemini_flash_standard,
     llm_config_gemini_flash_preview,
     llm_config_deepseek_chat,
     llm_config_deepseek_reasoner,
     DEEPSEEK_API_KEY,
-    GEMINI_API_KEY
+    GEMINI_API_KEY,
+    ASSESSMENT_DEADLINE_SECONDS,
+    RESULT_DIGEST_MAX_CHARS,
+    REPORT_SECTIONED_GENERATION,
+    PRESCREEN_RISK_THRESHOLD,
+    LLM_CASSETTE_MODE,
+    LLM_CASSETTE_PATH,
+    LLM_CASSETTE_LATENCY_SCALE,
+    ASSESSMENT_CHECKPOINTS,
+    LLM_BACKEND,
+    EXTRACTION_STREAMING,
+    ASSESSMENT_CHECKPOINT_DIR
 )
+from agents.llm_cassette import install_cassette
+
+# 阶段检查点存储（未开启时为None）
+CHECKPOINT_STORE = CheckpointStore(ASSESSMENT_CHECKPOINT_DIR) if ASSESSMENT_CHECKPOINTS else None
+
+# Classifier types mapped onto the consolidation branches below. Only branches that check for their own
+# structure ("items", "indicators", "data") are reachable by classification; "会诊记录" replaces the whole
+# consultation record, so it still requires an explicit document_type.
+CLASSIFIED_DOCUMENT_TYPES = {
+    "病历首页": "病历",
+    "生化检查": "生化检查",
+    "血常规": "血常规",
+}
 
 def consolidate_patient_data(documents: list) -> dict:
     """
     Consolidates a list of medical documents into a single, structured patient data object.
     """
-    consolidated_data = {
-        "patient_info": {},
-        "diagnoses": [],
-        "lab_results": {"biochemistry": [], "complete_blood_count": [], "stool_routine": []},
-        "symptoms_and_history": {},
-        "treatment_plan": {},
-        "consultation_record": {}
-    }
+    record = PatientRecord()
 
     for doc in documents:
-        doc_type = doc.get("document_type")
+        doc_type = doc.get("document_type") or CLASSIFIED_DOCUMENT_TYPES.get(classify_document(doc))
 
         if doc_type == "会诊记录":
-            consolidated_data["consultation_record"] = doc
+            record.consultation_record = ConsultationRecord.from_dict(doc)
             if doc.get("人体测量"):
-                consolidated_data["patient_info"].update(doc["人体测量"])
+                record.patient_info.update(doc["人体测量"])
             if doc.get("主要诊断"):
-                consolidated_data["diagnoses"].extend([{"type": "会诊诊断", "description": d} for d in doc["主要诊断"]])
+                record.diagnoses.extend(Diagnosis(type="会诊诊断", description=d) for d in doc["主要诊断"])
 
         elif doc_type == "生化检查" and "items" in doc:
-            consolidated_data["lab_results"]["biochemistry"].extend(doc["items"])
+            record.lab_results["biochemistry"].extend(LabItem.from_dict(item) for item in doc["items"])
 
         elif doc_type == "血常规" and "indicators" in doc:
-            consolidated_data["lab_results"]["complete_blood_count"].extend(doc["indicators"])
+            record.lab_results["complete_blood_count"].extend(LabItem.from_dict(item) for item in doc["indicators"])
             if doc.get("patient_info"):
                  # Prioritize more detailed patient info if available
-                for key, value in doc["patient_info"].items():
-                    if key not in consolidated_data["patient_info"] or not consolidated_data["patient_info"][key]:
-                        consolidated_data["patient_info"][key] = value
+                record.patient_info.update(doc["patient_info"], only_missing=True)
 
         elif doc_type == "病历" and "data" in doc:
             if doc["data"].get("主要诊断"):
-                consolidated_data["diagnoses"].extend([{"type": "病历诊断", "description": d} for d in doc["data"]["主要诊断"]])
+                record.diagnoses.extend(Diagnosis(type="病历诊断", description=d) for d in doc["data"]["主要诊断"])
             if doc["data"].get("主要症状"):
-                consolidated_data["symptoms_and_history"]["symptoms_from_record"] = doc["data"]["主要症状"]
+                record.symptoms_and_history.extras["symptoms_from_record"] = doc["data"]["主要症状"]
             if doc["data"].get("治疗方案"):
-                consolidated_data["treatment_plan"] = doc["data"]["治疗方案"]
-        
-        # Fallback for a different "病历" structure
-        elif "病历" in doc and isinstance(doc["病历"], dict):
-            record = doc["病历"]
-            if record.get("主要诊断"):
-                consolidated_data["diagnoses"].extend([{"type": "病历诊断", "description": d} for d in record["主要诊断"]])
-            if record.get("主要症状"):
-                consolidated_data["symptoms_and_history"]["symptoms_from_record_2"] = record["主要症状"]
-            if record.get("人体测量"):
-                for key, value in record["人体测量"].items():
-                    if key not in consolidated_data["patient_info"] or not consolidated_data["patient_info"][key]:
-                        consolidated_data["patient_info"][key] = value
+                treatment_plan = doc["data"]["治疗方案"]
+                record.treatment_plan = (TreatmentPlan.from_dict(treatment_plan) if isinstance(treatment_plan, dict)
+                                         else TreatmentPlan(summary=treatment_plan))
+
+        # Fallback for a different "病历" structure: checked regardless of the (possibly classified) type,
+        # since classify_document may assign another type to a document that nests its record under "病历"
+        if "病历" in doc and isinstance(doc["病历"], dict):
+            medical_record = doc["病历"]
+            if medical_record.get("主要诊断"):
+                record.diagnoses.extend(Diagnosis(type="病历诊断", description=d) for d in medical_record["主要诊断"])
+            if medical_record.get("主要症状"):
+                record.symptoms_and_history.extras["symptoms_from_record_2"] = medical_record["主要症状"]
+            if medical_record.get("人体测量"):
+                record.patient_info.update(medical_record["人体测量"], only_missing=True)
 
 
     # Clean up diagnoses to remove duplicates
-    seen_diagnoses = set()
-    unique_diagnoses = []
-    for d in consolidated_data["diagnoses"]:
-        if d["description"] not in seen_diagnoses:
-            unique_diagnoses.append(d)
-            seen_diagnoses.add(d["description"])
-    consolidated_data["diagnoses"] = unique_diagnoses
+    record.deduplicate(diagnosis_by_type=False)
+
+    return record.to_dict(include_empty=False)
+
+def build_coordinator(parsed_data, cancel_token: Optional[CancellationToken] = None) -> CNA_Coordinator:
+    """
+    根据请求创建评估协调器（尚未开始评估，session_id已确定）
+
+    Args:
+        parsed_data: 请求JSON，{patient_data, model_series, assessment_profile, ...}、
+            {patientData, imageData}、文档列表或单个患者数据对象；
+            {resume_session_id}表示从检查点恢复中断的评估
+        cancel_token: 可选的取消令牌，客户端断开或收到SIGTERM时取消评估
+
+    Returns:
+        CNA_Coordinator实例
+
+    Raises:
+        ValueError: 请求中的患者数据格式无效，或要恢复的检查点不存在
+    """
+    # 恢复中断的评估：按检查点中的原始请求重新创建协调器，从第一个未完成的阶段继续
+    if isinstance(parsed_data, dict) and parsed_data.get('resume_session_id'):
+        if CHECKPOINT_STORE is None:
+            raise ValueError("Checkpoints are disabled (ASSESSMENT_CHECKPOINTS=false); cannot resume an assessment.")
+        checkpoint = CHECKPOINT_STORE.resume(parsed_data['resume_session_id'])
+        coordinator = _create_coordinator(checkpoint['request'], cancel_token)
+        coordinator.checkpoint_store = CHECKPOINT_STORE
+        coordinator.restore_checkpoint(checkpoint)
+        return coordinator
+
+    # 检查点保存原始请求的副本：评估过程中患者数据会被图像识别结果修改
+    original_request = copy.deepcopy(parsed_data) if CHECKPOINT_STORE is not None else None
+    coordinator = _create_coordinator(parsed_data, cancel_token)
+    if CHECKPOINT_STORE is not None:
+        coordinator.checkpoint_store = CHECKPOINT_STORE
+        CHECKPOINT_STORE.begin(coordinator.session_id, original_request)
+    return coordinator
+
+def _create_coordinator(parsed_data, cancel_token: Optional[CancellationToken] = None) -> CNA_Coordinator:
+    """按请求中的模型系列、评估模式等选项创建协调器，参数同build_coordinator"""
+    # 可选的评估总时限覆盖
+    deadline_seconds = ASSESSMENT_DEADLINE_SECONDS
+    if isinstance(parsed_data, dict) and 'patient_data' in parsed_data and parsed_data.get('deadline_seconds'):
+        deadline_seconds = float(parsed_data['deadline_seconds'])
+
+    # 可选的评估模式：standard（默认）、fast（融合分析+报告）或 triage（只返回分诊结论）
+    assessment_profile = 'standard'
+    if isinstance(parsed_data, dict) and 'patient_data' in parsed_data and parsed_data.get('assessment_profile'):
+        assessment_profile = parsed_data['assessment_profile']
+        print(f"收到评估模式选择: {assessment_profile}", file=sys.stderr)
+
+    # 可选的预筛查阈值覆盖（批量筛查时由调用方指定，0为关闭）
+    prescreen_threshold = PRESCREEN_RISK_THRESHOLD
+    if isinstance(parsed_data, dict) and 'patient_data' in parsed_data and parsed_data.get('prescreen_threshold') is not None:
+        prescreen_threshold = float(parsed_data['prescreen_threshold'])
+
+    # 检查新格式：{patient_data: ..., model_series: ...} 或旧格式（直接patient数据）
+    model_series = None
+    if isinstance(parsed_data, dict) and 'patient_data' in parsed_data and 'model_series' in parsed_data:
+        patient_data_input = parsed_data['patient_data']
+        model_series = parsed_data['model_series']
+        print(f"收到前端模型系列选择: {model_series}", file=sys.stderr)
+        parsed_data = patient_data_input  # 替换为患者数据
+    # 向后兼容旧的selected_model字段
+    elif isinstance(parsed_data, dict) and 'patient_data' in parsed_data and 'selected_model' in parsed_data:
+        patient_data_input = parsed_data['patient_data']
+        selected_model = parsed_data['selected_model']
+        # 转换旧的模型名称到新的系列名称
+        if selected_model == 'deepseek':
+            model_series = 'deepseek'
+        else:
+            model_series = 'gemini'
+        print(f"收到旧格式模型选择，转换为: {model_series}", file=sys.stderr)
+        parsed_data = patient_data_input
+    else:
+        # 兼容最旧格式
+        print("使用默认模型系列: gemini", file=sys.stderr)
+        model_series = 'gemini'
+    
+    # 检查是否包含图像数据
+    image_data = None
+    patient_json = None
+    
+    if isinstance(parsed_data, dict) and "patientData" in parsed_data and "imageData" in parsed_data:
+        # 新格式：包含患者数据和图像数据
+        patient_json = parsed_data["patientData"]
+        image_data = parsed_data["imageData"]
+    elif isinstance(parsed_data, list):
+        # 旧格式：文档列表
+        patient_json = consolidate_patient_data(parsed_data)
+    elif isinstance(parsed_data, dict):
+        # 旧格式：单个患者数据对象
+        patient_json = parsed_data
+    
+    if patient_json is None:
+        raise ValueError("Invalid patient data format. Expected a JSON object or a list of documents.")
+
+    # 初始化协调器并运行评估（可选传入图像数据）
+    # 根据前端选择的模型系列，配置相应的模型
 
-    return consolidated_data
+    # 验证API密钥可用性
+    gemini_available = GEMINI_API_KEY is not None and GEMINI_API_KEY.strip() != ""
+    deepseek_available = DEEPSEEK_API_KEY is not None and DEEPSEEK_API_KEY.strip() != "" and DEEPSEEK_API_KEY != "your_deepseek_api_key_here"
+
+    # 根据选择的模型系列和可用性确定使用的配置
+    if model_series == 'deepseek':
+        if not deepseek_available:
+            print("DeepSeek API密钥未配置，回退到Gemini系列", file=sys.stderr)
+            model_series = 'gemini'
+
+    if model_series == 'deepseek':
+        print("=" * 60, file=sys.stderr)
+        print("使用 DeepSeek 系列模型:", file=sys.stderr)
+        print("  • 中间分析智能体: deepseek-chat", file=sys.stderr)
+        print("  • 协调管理: deepseek-chat", file=sys.stderr)
+        print("  • 报告生成: deepseek-reasoner", file=sys.stderr)
+        print("=" * 60, file=sys.stderr)
+
+        coordinator = CNA_Coordinator(
+            patient_json,
+            llm_config_coordinator=llm_config_deepseek_chat,
+            llm_config_analysis=llm_config_deepseek_chat,
+            llm_config_reporter=llm_config_deepseek_reasoner,
+            image_data=image_data,
+            model_series='deepseek',
+            deadline_seconds=deadline_seconds,
+            digest_max_chars=RESULT_DIGEST_MAX_CHARS or None,
+            sectioned_report=REPORT_SECTIONED_GENERATION,
+            assessment_profile=assessment_profile,
+            prescreen_threshold=prescreen_threshold or None,
+            cancel_token=cancel_token,
+            llm_backend=LLM_BACKEND,
+            stream_extraction=EXTRACTION_STREAMING
+        )
+    else:
+        print("=" * 60, file=sys.stderr)
+        print("使用 Gemini 系列模型:", file=sys.stderr)
+        print("  • 中间分析智能体: gemini-2.5-flash", file=sys.stderr)
+        print("  • 协调管理: gemini-2.5-flash-preview-09-2025", file=sys.stderr)
+        print("  • 报告生成: gemini-2.5-flash-preview-09-2025", file=sys.stderr)
+        print("=" * 60, file=sys.stderr)
+
+        coordinator = CNA_Coordinator(
+            patient_json,
+            llm_config_coordinator=llm_config_gemini_flash_preview,
+            llm_config_analysis=llm_config_gemini_flash_standard,
+            llm_config_reporter=llm_config_gemini_flash_preview,
+            image_data=image_data,
+            model_series='gemini',
+            deadline_seconds=deadline_seconds,
+            digest_max_chars=RESULT_DIGEST_MAX_CHARS or None,
+            sectioned_report=REPORT_SECTIONED_GENERATION,
+            assessment_profile=assessment_profile,
+            prescreen_threshold=prescreen_threshold or None,
+            cancel_token=cancel_token,
+            llm_backend=LLM_BACKEND,
+            stream_extraction=EXTRACTION_STREAMING
+        )
+
+    return coordinator
+
+def run_assessment_request(parsed_data, cancel_token: Optional[CancellationToken] = None) -> dict:
+    """
+    执行一次评估请求
+
+    Args:
+        parsed_data: 请求JSON，格式同build_coordinator
+        cancel_token: 可选的取消令牌
+
+    Returns:
+        评估结果
+
+    Raises:
+        ValueError: 请求中的患者数据格式无效
+    """
+    return build_coordinator(parsed_data, cancel_token).run_assessment()
 
 if __name__ == "__main__":
     try:
+        # 可选的模型调用录制/回放，须在创建任何智能体之前安装
+        install_cassette(LLM_CASSETTE_MODE, LLM_CASSETTE_PATH, LLM_CASSETTE_LATENCY_SCALE)
+
         input_data = sys.stdin.read()
 
         if not input_data:
@@ -115,95 +308,11 @@ if __name__ == "__main__":
 
         parsed_data = json.loads(input_data)
 
-        # 检查新格式：{patient_data: ..., model_series: ...} 或旧格式（直接patient数据）
-        model_series = None
-        if isinstance(parsed_data, dict) and 'patient_data' in parsed_data and 'model_series' in parsed_data:
-            patient_data_input = parsed_data['patient_data']
-            model_series = parsed_data['model_series']
-            print(f"收到前端模型系列选择: {model_series}", file=sys.stderr)
-            parsed_data = patient_data_input  # 替换为患者数据
-        # 向后兼容旧的selected_model字段
-        elif isinstance(parsed_data, dict) and 'patient_data' in parsed_data and 'selected_model' in parsed_data:
-            patient_data_input = parsed_data['patient_data']
-            selected_model = parsed_data['selected_model']
-            # 转换旧的模型名称到新的系列名称
-            if selected_model == 'deepseek':
-                model_series = 'deepseek'
-            else:
-                model_series = 'gemini'
-            print(f"收到旧格式模型选择，转换为: {model_series}", file=sys.stderr)
-            parsed_data = patient_data_input
-        else:
-            # 兼容最旧格式
-            print("使用默认模型系列: gemini", file=sys.stderr)
-            model_series = 'gemini'
-        
-        # 检查是否包含图像数据
-        image_data = None
-        patient_json = None
-        
-        if isinstance(parsed_data, dict) and "patientData" in parsed_data and "imageData" in parsed_data:
-            # 新格式：包含患者数据和图像数据
-            patient_json = parsed_data["patientData"]
-            image_data = parsed_data["imageData"]
-        elif isinstance(parsed_data, list):
-            # 旧格式：文档列表
-            patient_json = consolidate_patient_data(parsed_data)
-        elif isinstance(parsed_data, dict):
-            # 旧格式：单个患者数据对象
-            patient_json = parsed_data
-        
-        if patient_json is None:
-            print(json.dumps({"error": "Invalid patient data format. Expected a JSON object or a list of documents."}), file=sys.stderr)
-            sys.exit(1)
+        # 前端在客户端断开时向子进程发送SIGTERM：不再启动新的阶段，已完成阶段的追溯记录保留
+        cancel_token = CancellationToken()
+        signal.signal(signal.SIGTERM, lambda signum, frame: cancel_token.cancel("收到SIGTERM，客户端已断开"))
 
-        # 初始化协调器并运行评估（可选传入图像数据）
-        # 根据前端选择的模型系列，配置相应的模型
-
-        # 验证API密钥可用性
-        gemini_available = GEMINI_API_KEY is not None and GEMINI_API_KEY.strip() != ""
-        deepseek_available = DEEPSEEK_API_KEY is not None and DEEPSEEK_API_KEY.strip() != "" and DEEPSEEK_API_KEY != "your_deepseek_api_key_here"
-
-        # 根据选择的模型系列和可用性确定使用的配置
-        if model_series == 'deepseek':
-            if not deepseek_available:
-                print("DeepSeek API密钥未配置，回退到Gemini系列", file=sys.stderr)
-                model_series = 'gemini'
-
-        if model_series == 'deepseek':
-            print("=" * 60, file=sys.stderr)
-            print("使用 DeepSeek 系列模型:", file=sys.stderr)
-            print("  • 中间分析智能体: deepseek-chat", file=sys.stderr)
-            print("  • 协调管理: deepseek-chat", file=sys.stderr)
-            print("  • 报告生成: deepseek-reasoner", file=sys.stderr)
-            print("=" * 60, file=sys.stderr)
-
-            coordinator = CNA_Coordinator(
-                patient_json,
-                llm_config_coordinator=llm_config_deepseek_chat,
-                llm_config_analysis=llm_config_deepseek_chat,
-                llm_config_reporter=llm_config_deepseek_reasoner,
-                image_data=image_data,
-                model_series='deepseek'
-            )
-        else:
-            print("=" * 60, file=sys.stderr)
-            print("使用 Gemini 系列模型:", file=sys.stderr)
-            print("  • 中间分析智能体: gemini-2.5-flash", file=sys.stderr)
-            print("  • 协调管理: gemini-2.5-flash-preview-09-2025", file=sys.stderr)
-            print("  • 报告生成: gemini-2.5-flash-preview-09-2025", file=sys.stderr)
-            print("=" * 60, file=sys.stderr)
-
-            coordinator = CNA_Coordinator(
-                patient_json,
-                llm_config_coordinator=llm_config_gemini_flash_preview,
-                llm_config_analysis=llm_config_gemini_flash_standard,
-                llm_config_reporter=llm_config_gemini_flash_preview,
-                image_data=image_data,
-                model_series='gemini'
-            )
-
-        result = coordinator.run_assessment()
+        result = run_assessment_request(parsed_data, cancel_token)
 
         # Restore original stdout and print final result
         null_stream.close()  # 关闭null流
@@ -214,6 +323,9 @@ if __name__ == "__main__":
     except json.JSONDecodeError:
         print(json.dumps({"error": "Failed to decode JSON from stdin.", "received_data": input_data}), file=sys.stderr)
         sys.exit(1)
+    except ValueError as e:
+        print(json.dumps({"error": str(e)}), file=sys.stderr)
+        sys.exit(1)
     except Exception as e:
         print(json.dumps({"error": f"An unexpected error occurred: {str(e)}", "error_type": type(e).__name__}), file=sys.stderr)
         sys.exit(1)
\ No newline at end of file
@@ -0,0 +1,334 @@
+#!/usr/bin/env python3
+"""
+本地模拟模型服务 - 实现OpenAI兼容的chat completions接口，用于压力测试
+
+可配置延迟分布、按token速率的流式输出、错误和429注入，以及按提示内容匹配的预设响应。
+设置 LLM_STUB_BASE_URL=http://127.0.0.1:8900/v1 后，config.py中所有模型配置都会指向本服务。
+
+用法：
+    python stub_llm_server.py --port 8900 --latency lognormal:0.5:0.4 --tokens-per-second 60 \
+        --error-rate 0.01 --rate-limit-rate 0.02 --max-concurrency 200
+"""
+
+import argparse
+import json
+import random
+import re
+import sys
+import threading
+import time
+import uuid
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+
+# 内置的预设响应：按提示中的特征文本匹配，覆盖评估流程中需要返回JSON的调用
+BUILTIN_RESPONSES = [
+    ("proceed_to_final_report", json.dumps({
+        "has_conflicts": False,
+        "conflicts_detected": [],
+        "data_quality_issues": [],
+        "recommendations": ["模拟服务：未检测到冲突"],
+        "proceed_to_final_report": True
+    }, ensure_ascii=False)),
+    ("needs_full_assessment", json.dumps({
+        "clinical_context": "模拟服务：主要诊断对营养状况有中度影响。",
+        "anthropometric_evaluation": "模拟服务：BMI处于正常低限。",
+        "biochemical_interpretation": "模拟服务：白蛋白轻度降低，CRP升高。",
+        "dietary_assessment": "模拟服务：近期摄入较需要量减少约25%。",
+        "risk_level": "中风险",
+        "triage_summary": "模拟服务：存在营养风险，建议完整评估。",
+        "needs_full_assessment": True
+    }, ensure_ascii=False)),
+    ("请返回一个JSON数组", None),  # 批量提取：按文档数生成数组
+    ("医疗信息分析专家", json.dumps({
+        "document_type": "病历",
+        "patient_info": {"name": "模拟患者", "age": "65", "gender": "男", "height_cm": 170, "weight_kg": 60, "bmi": 20.8},
+        "diagnoses": [{"type": "主要诊断", "description": "模拟诊断"}],
+        "symptoms_and_history": {"chief_complaint": "模拟主诉", "history_of_present_illness_summary": ""},
+        "lab_results": {"biochemistry": [], "complete_blood_count": [], "stool_routine": []}
+    }, ensure_ascii=False)),
+]
+
+DEFAULT_RESPONSE = ("模拟服务：根据提供的数据，患者存在一定的营养风险。"
+                    "关键指标：BMI 20.8 kg/m²，白蛋白 33 g/L（偏低），CRP 15 mg/L（升高）。"
+                    "建议每日能量25-30 kcal/kg，蛋白质1.2-1.5 g/kg，并每周复评。")
+
+_BATCH_COUNT_PATTERN = re.compile(r'数组长度必须为(\d+)')
+
+
+class LatencyModel:
+    """
+    响应延迟分布，格式为 "类型:参数"：
+    fixed:秒、uniform:最小:最大、normal:均值:标准差、lognormal:mu:sigma（单位秒）
+    """
+
+    def __init__(self, spec: str, rng: random.Random):
+        self.spec = spec
+        self.rng = rng
+        kind, *params = spec.split(":")
+        self.kind = kind
+        self.params = [float(p) for p in params]
+        expected = {"fixed": 1, "uniform": 2, "normal": 2, "lognormal": 2}
+        if kind not in expected or len(self.params) != expected[kind]:
+            raise ValueError(f"无效的延迟分布: {spec}")
+
+    def sample(self) -> float:
+        if self.kind == "fixed":
+            value = self.params[0]
+        elif self.kind == "uniform":
+            value = self.rng.uniform(*self.params)
+        elif self.kind == "normal":
+            value = self.rng.gauss(*self.params)
+        else:
+            value = self.rng.lognormvariate(*self.params)
+        return max(0.0, value)
+
+
+class StubState:
+    """服务配置和运行统计（线程安全）"""
+
+    def __init__(self, args):
+        self.rng = random.Random(args.seed)
+        self.latency = LatencyModel(args.latency, self.rng)
+        self.tokens_per_second = args.tokens_per_second
+        self.error_rate = args.error_rate
+        self.rate_limit_rate = args.rate_limit_rate
+        self.retry_after = args.retry_after
+        self.max_concurrency = args.max_concurrency
+        self.cache_hit_ratio = args.cache_hit_ratio
+        self.responses = []
+        if args.responses:
+            with open(args.responses, "r", encoding="utf-8") as f:
+                self.responses = list(json.load(f).items())
+
+        self._lock = threading.Lock()
+        self.in_flight = 0
+        self.stats = {"requests": 0, "completed": 0, "errors_injected": 0, "rate_limited": 0,
+                      "max_in_flight": 0, "prompt_tokens": 0, "completion_tokens": 0}
+
+    def random(self) -> float:
+        with self._lock:
+            return self.rng.random()
+
+    def sample_latency(self) -> float:
+        with self._lock:
+            return self.latency.sample()
+
+    def enter(self) -> bool:
+        """登记一个进行中的请求，超过并发上限时返回False"""
+        with self._lock:
+            self.stats["requests"] += 1
+            if self.max_concurrency and self.in_flight >= self.max_concurrency:
+                self.stats["rate_limited"] += 1
+                return False
+            self.in_flight += 1
+            self.stats["max_in_flight"] = max(self.stats["max_in_flight"], self.in_flight)
+            return True
+
+    def leave(self):
+        with self._lock:
+            self.in_flight -= 1
+
+    def count(self, name: str, value: int = 1):
+        with self._lock:
+            self.stats[name] += value
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {**self.stats, "in_flight": self.in_flight}
+
+    def pick_response(self, prompt: str) -> str:
+        """按用户预设、内置预设的顺序匹配响应"""
+        for marker, content in self.responses + BUILTIN_RESPONSES:
+            if marker in prompt:
+                if content is None:
+                    match = _BATCH_COUNT_PATTERN.search(prompt)
+                    count = int(match.group(1)) if match else 1
+                    item = json.loads(dict(BUILTIN_RESPONSES)["医疗信息分析专家"])
+                    return json.dumps([item] * count, ensure_ascii=False)
+                return content
+        return DEFAULT_RESPONSE
+
+
+def estimate_tokens(text: str) -> int:
+    """粗略估算token数：中文约每字1个token，其他字符约每4个1个token"""
+    cjk = sum(1 for ch in text if "一" <= ch <= "鿿")
+    return max(1, cjk + (len(text) - cjk) // 4)
+
+
+def _chunks(text: str, size: int = 8):
+    for i in range(0, len(text), size):
+        yield text[i:i + size]
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    state: StubState = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status: int, body: dict, headers: dict = None):
+        payload = json.dumps(body, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def _send_error(self, status: int, message: str, error_type: str, headers: dict = None):
+        self._send_json(status, {"error": {"message": message, "type": error_type}}, headers)
+
+    def do_GET(self):
+        if self.path.rstrip("/") in ("/stats", "/v1/stats"):
+            self._send_json(200, self.state.snapshot())
+        elif self.path.rstrip("/") in ("/v1/models", "/models"):
+            self._send_json(200, {"object": "list", "data": [{"id": "stub", "object": "model"}]})
+        else:
+            self._send_error(404, "not found", "invalid_request_error")
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        raw = self.rfile.read(length) if length else b""
+        if not self.path.rstrip("/").endswith("/chat/completions"):
+            self._send_error(404, "not found", "invalid_request_error")
+            return
+        try:
+            request = json.loads(raw or b"{}")
+        except json.JSONDecodeError:
+            self._send_error(400, "invalid JSON body", "invalid_request_error")
+            return
+
+        state = self.state
+        retry_headers = {"Retry-After": str(state.retry_after)}
+        if not state.enter():
+            self._send_error(429, "stub concurrency limit exceeded", "rate_limit_error", retry_headers)
+            return
+        try:
+            roll = state.random()
+            if roll < state.rate_limit_rate:
+                state.count("rate_limited")
+                self._send_error(429, "stub injected rate limit", "rate_limit_error", retry_headers)
+                return
+            if roll < state.rate_limit_rate + state.error_rate:
+                state.count("errors_injected")
+                time.sleep(state.sample_latency())
+                self._send_error(500, "stub injected server error", "server_error")
+                return
+
+            messages = request.get("messages") or []
+            prompt = "\n".join(str(m.get("content", "")) for m in messages if isinstance(m, dict))
+            content = state.pick_response(prompt)
+            prompt_tokens = estimate_tokens(prompt)
+            completion_tokens = estimate_tokens(content)
+            state.count("prompt_tokens", prompt_tokens)
+            state.count("completion_tokens", completion_tokens)
+            usage = {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens,
+                "prompt_cache_hit_tokens": int(prompt_tokens * state.cache_hit_ratio),
+            }
+            completion_id = f"chatcmpl-stub-{uuid.uuid4().hex[:12]}"
+            model = request.get("model", "stub")
+
+            # 首token延迟按分布采样，其余按token速率输出
+            time.sleep(state.sample_latency())
+            if request.get("stream"):
+                self._stream(completion_id, model, content, completion_tokens, usage)
+            else:
+                if state.tokens_per_second > 0:
+                    time.sleep(completion_tokens / state.tokens_per_second)
+                self._send_json(200, {
+                    "id": completion_id,
+                    "object": "chat.completion",
+                    "created": int(time.time()),
+                    "model": model,
+                    "choices": [{"index": 0, "finish_reason": "stop",
+                                 "message": {"role": "assistant", "content": content}}],
+                    "usage": usage,
+                })
+            state.count("completed")
+        finally:
+            state.leave()
+
+    def _stream(self, completion_id: str, model: str, content: str, completion_tokens: int, usage: dict):
+        """按token速率以SSE格式流式输出"""
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        self.close_connection = True
+
+        pieces = list(_chunks(content))
+        delay = 0.0
+        if self.state.tokens_per_second > 0 and pieces:
+            delay = completion_tokens / self.state.tokens_per_second / len(pieces)
+
+        def _event(delta, finish_reason=None, with_usage=False):
+            chunk = {
+                "id": completion_id,
+                "object": "chat.completion.chunk",
+                "created": int(time.time()),
+                "model": model,
+                "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+            }
+            if with_usage:
+                chunk["usage"] = usage
+            self.wfile.write(f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n".encode("utf-8"))
+            self.wfile.flush()
+
+        _event({"role": "assistant", "content": ""})
+        for piece in pieces:
+            time.sleep(delay)
+            _event({"content": piece})
+        _event({}, finish_reason="stop", with_usage=True)
+        self.wfile.write(b"data: [DONE]\n\n")
+        self.wfile.flush()
+
+
+def build_server(args) -> ThreadingHTTPServer:
+    handler = type("ConfiguredStubHandler", (StubHandler,), {"state": StubState(args)})
+    ThreadingHTTPServer.request_queue_size = args.backlog
+    server = ThreadingHTTPServer((args.host, args.port), handler)
+    server.daemon_threads = True
+    return server
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="OpenAI兼容的本地模拟模型服务")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8900)
+    parser.add_argument("--latency", default="fixed:0.2",
+                        help="首token延迟分布：fixed:秒 | uniform:最小:最大 | normal:均值:标准差 | lognormal:mu:sigma")
+    parser.add_argument("--tokens-per-second", type=float, default=0,
+                        help="输出速率（token/秒），0为不限速")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="注入500错误的概率")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="注入429的概率")
+    parser.add_argument("--retry-after", type=int, default=1, help="429响应的Retry-After（秒）")
+    parser.add_argument("--max-concurrency", type=int, default=0, help="并发请求上限，超过时返回429，0为不限")
+    parser.add_argument("--cache-hit-ratio", type=float, default=0.0, help="usage中模拟的前缀缓存命中比例")
+    parser.add_argument("--responses", help="预设响应JSON文件：{提示中的特征文本: 响应内容}，优先于内置响应")
+    parser.add_argument("--seed", type=int, default=None, help="随机种子，用于复现延迟和错误注入")
+    parser.add_argument("--backlog", type=int, default=1024, help="监听队列长度")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    server = build_server(args)
+    print(f"模拟模型服务已启动: http://{args.host}:{server.server_address[1]}/v1 "
+          f"（延迟 {args.latency}，输出速率 {args.tokens_per_second or '不限'} token/s）", file=sys.stderr)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
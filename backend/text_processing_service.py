@@ -13,11 +13,25 @@ import logging
 import traceback
 from datetime import datetime
 import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
 import google.generativeai as genai
 from openai import OpenAI
 import os
 from dotenv import load_dotenv
 
+from agents.patient_record import PatientRecord
+from agents.rule_extractor import extract_structured_fields, needs_model_extraction
+from agents.document_classifier import classify_document
+from agents.llm_usage import record_usage, UsageRecorder
+from agents.llm_cassette import install_cassette
+from agents.llm_client import response_text
+from agents.streaming_json import StreamingJSONParser
+from agents.json_extraction import extract_json
+from config import (
+    LLM_CASSETTE_MODE, LLM_CASSETTE_PATH, LLM_CASSETTE_LATENCY_SCALE, DEEPSEEK_BASE_URL, EXTRACTION_STREAMING
+)
+
 # 加载环境变量
 load_dotenv(dotenv_path='../.env')
 load_dotenv(dotenv_path='../.env.local', override=True)
@@ -37,6 +51,33 @@ logging.basicConfig(
 
 logger = logging.getLogger(__name__)
 
+# ==================== 长文本分块配置 ====================
+# 超过该长度的文本在auto模式下按章节分块并发提取
+CHUNKING_THRESHOLD_CHARS = int(os.getenv("TEXT_CHUNKING_THRESHOLD_CHARS", "6000"))
+# 单个分块的最大长度
+CHUNK_MAX_CHARS = int(os.getenv("TEXT_CHUNK_MAX_CHARS", "4000"))
+# 并发提取的最大线程数
+MAX_CHUNK_WORKERS = int(os.getenv("TEXT_CHUNK_MAX_WORKERS", "4"))
+
+# ==================== 多文档批量配置 ====================
+# 打包进同一提示的小文档总token预算
+BATCH_PACK_TOKEN_BUDGET = int(os.getenv("TEXT_BATCH_PACK_TOKEN_BUDGET", "3000"))
+# 单份文档超过该token数时不参与打包，单独提取
+BATCH_PACK_MAX_DOC_TOKENS = int(os.getenv("TEXT_BATCH_PACK_MAX_DOC_TOKENS", "1500"))
+# 每个打包提示最多包含的文档数
+BATCH_PACK_MAX_DOCS = int(os.getenv("TEXT_BATCH_PACK_MAX_DOCS", "6"))
+# 批量模式下并发的模型调用数
+MAX_BATCH_WORKERS = int(os.getenv("TEXT_BATCH_MAX_WORKERS", "4"))
+
+# 章节边界：行首的章节标题，可带日期时间前缀（如“2024-05-01 10:30 日常病程记录”）
+SECTION_HEADER_PATTERN = re.compile(
+    r'^[ \t【\[]*'
+    r'(?:\d{4}[-/.年]\d{1,2}[-/.月]\d{1,2}日?[ \t]*(?:\d{1,2}[:：]\d{2}(?:[:：]\d{2})?)?[ \t]*)?'
+    r'(?:首次病程记录|日常病程记录|病程记录|检验报告|检查报告|会诊记录|会诊意见|入院记录|出院记录|出院小结|'
+    r'手术记录|护理记录|营养评估|营养会诊|病历摘要|医嘱)',
+    re.MULTILINE
+)
+
 def setup_gemini():
     """配置Gemini API"""
     try:
@@ -59,253 +100,617 @@ def setup_deepseek():
             raise ValueError("DeepSeek API密钥未配置")
 
         logger.info(f"使用DeepSeek API处理文本，API密钥前缀: {DEEPSEEK_API_KEY[:10]}...")
-        return OpenAI(api_key=DEEPSEEK_API_KEY, base_url="https://api.deepseek.com/v1")
+        return OpenAI(api_key=DEEPSEEK_API_KEY, base_url=DEEPSEEK_BASE_URL)
     except Exception as e:
         logger.error(f"配置DeepSeek API失败: {e}")
         raise
 
-def extract_medical_data_from_text_gemini(text, model):
-    """使用Gemini从医疗文本中提取结构化数据"""
-
-    prompt = f"""
-你是一位经验丰富的医疗信息分析专家。请从以下医疗文本中提取结构化信息，并按照指定的JSON格式返回。
-
-医疗文本内容：
-{text}
-
-请提取以下信息并返回标准JSON格式：
-
-{{
+# 提取结果的目标JSON结构（单文档和批量提取共用）
+EXTRACTION_SCHEMA = """{
   "document_type": "文档类型（病历/检查报告/会诊记录/营养评估等）",
-  "patient_info": {{
+  "patient_info": {
     "name": "患者姓名",
     "age": "年龄",
     "gender": "性别",
     "height_cm": 身高（厘米，数值），
     "weight_kg": 体重（公斤，数值），
     "bmi": BMI值（数值）
-  }},
+  },
   "diagnoses": [
-    {{
+    {
       "type": "诊断类型",
       "description": "诊断描述"
-    }}
+    }
   ],
-  "symptoms_and_history": {{
+  "symptoms_and_history": {
     "chief_complaint": "主诉",
     "history_of_present_illness_summary": "现病史摘要"
-  }},
-  "lab_results": {{
+  },
+  "lab_results": {
     "biochemistry": [
-      {{
+      {
         "name": "检查项目名称",
         "value": "检查数值",
         "unit": "单位",
         "interpretation": "异常标识（↑/↓/正常）"
-      }}
+      }
     ],
     "complete_blood_count": [
-      {{
+      {
         "name": "检查项目名称",
         "value": "检查数值",
         "unit": "单位",
         "interpretation": "异常标识（↑/↓/正常）"
-      }}
+      }
     ],
     "stool_routine": []
-  }},
-  "treatment_plan": {{
+  },
+  "treatment_plan": {
     "summary": "治疗方案摘要",
     "key_medications": ["主要药物列表"]
-  }},
-  "consultation_record": {{
+  },
+  "consultation_record": {
     "department": "会诊科室",
     "purpose": "会诊目的",
     "findings_and_conclusion": "会诊发现和结论",
     "recommendations": "建议",
     "NRS2002_score": NRS2002评分（数值），
     "PES_statement_summary": "PES陈述摘要"
-  }}
-}}
+  }
+}"""
 
-注意事项：
+EXTRACTION_NOTES = """注意事项：
 1. 如果某些信息在文本中不存在，请设为null或空数组
 2. 数值类型的字段请提取纯数字，不要包含单位
 3. 对于检查结果，请识别异常标识（如↑表示偏高，↓表示偏低）
 4. 返回标准JSON格式，不要包含其他文字
-5. 确保JSON格式正确，可以被解析
-"""
-
-    try:
-        logger.info("调用Gemini API分析文本...")
-        response = model.generate_content(prompt)
+5. 确保JSON格式正确，可以被解析"""
 
-        if response.text:
-            logger.info(f"收到响应，长度: {len(response.text)}")
-            return parse_json_response(response.text)
-        else:
-            logger.error("Gemini API返回空响应")
-            return create_basic_structure()
+# 单文档和批量提取共用的静态前缀：角色、目标结构和注意事项在前，医疗文本在后，
+# 保证每次请求的提示前缀逐字节一致，便于Gemini和DeepSeek的隐式前缀缓存
+EXTRACTION_PREFIX = f"""你是一位经验丰富的医疗信息分析专家。你的任务是从医疗文本中提取结构化信息，并按照以下JSON格式返回：
 
-    except Exception as e:
-        logger.error(f"调用Gemini API失败: {e}")
-        logger.error(traceback.format_exc())
-        return create_basic_structure()
+{EXTRACTION_SCHEMA}
 
-def extract_medical_data_from_text_deepseek(text, client):
-    """使用DeepSeek从医疗文本中提取结构化数据"""
+{EXTRACTION_NOTES}
+"""
 
-    prompt = f"""
-你是一位经验丰富的医疗信息分析专家。请从以下医疗文本中提取结构化信息，并按照指定的JSON格式返回。
+def build_extraction_prompt(text):
+    """构建单文档提取提示"""
+    return f"""{EXTRACTION_PREFIX}
+请从以下医疗文本中提取结构化信息，按上述JSON格式返回。
 
 医疗文本内容：
 {text}
+"""
 
-请提取以下信息并返回标准JSON格式：
+def generate_with_gemini(prompt, model, parser=None, usage_recorder=None):
+    """
+    调用Gemini生成文本，空响应返回None
 
-{{
-  "document_type": "文档类型（病历/检查报告/会诊记录/营养评估等）",
-  "patient_info": {{
-    "name": "患者姓名",
-    "age": "年龄",
-    "gender": "性别",
-    "height_cm": 身高（厘米，数值），
-    "weight_kg": 体重（公斤，数值），
-    "bmi": BMI值（数值）
-  }},
-  "diagnoses": [
-    {{
-      "type": "诊断类型",
-      "description": "诊断描述"
-    }}
-  ],
-  "symptoms_and_history": {{
-    "chief_complaint": "主诉",
-    "history_of_present_illness_summary": "现病史摘要"
-  }},
-  "lab_results": {{
-    "biochemistry": [
-      {{
-        "name": "检查项目名称",
-        "value": "检查数值",
-        "unit": "单位",
-        "interpretation": "异常标识（↑/↓/正常）"
-      }}
-    ],
-    "complete_blood_count": [
-      {{
-        "name": "检查项目名称",
-        "value": "检查数值",
-        "unit": "单位",
-        "interpretation": "异常标识（↑/↓/正常）"
-      }}
-    ],
-    "stool_routine": []
-  }},
-  "treatment_plan": {{
-    "summary": "治疗方案摘要",
-    "key_medications": ["主要药物列表"]
-  }},
-  "consultation_record": {{
-    "department": "会诊科室",
-    "purpose": "会诊目的",
-    "findings_and_conclusion": "会诊发现和结论",
-    "recommendations": "建议",
-    "NRS2002_score": NRS2002评分（数值），
-    "PES_statement_summary": "PES陈述摘要"
-  }}
-}}
+    传入parser时流式调用，每收到一段文本就交给parser增量解析。用量记入usage_recorder（缺省为进程级记录器）。
+    """
+    logger.info("调用Gemini API分析文本...")
+    if parser is None:
+        response = model.generate_content(prompt)
+        content = response.text
+    else:
+        response = model.generate_content(prompt, stream=True)
+        for chunk in response:
+            parser.feed(response_text(chunk))
+        content = parser.text
+    record_usage("text_extraction", response, usage_recorder)
+    return content or None
+
+def generate_with_deepseek(prompt, client, parser=None, usage_recorder=None):
+    """
+    调用DeepSeek生成文本，空响应返回None
+
+    传入parser时流式调用，每收到一段文本就交给parser增量解析，用量取自流的最后一个分块。
+    用量记入usage_recorder（缺省为进程级记录器）。
+    """
+    logger.info("调用DeepSeek API分析文本...")
+    request = {"model": "deepseek-chat", "messages": [{"role": "user", "content": prompt}], "temperature": 0.5}
+    if parser is None:
+        response = client.chat.completions.create(**request)
+        record_usage("text_extraction", response, usage_recorder)
+        content = response.choices[0].message.content if response.choices else None
+        return content or None
+
+    usage_chunk = None
+    for chunk in client.chat.completions.create(stream=True, stream_options={"include_usage": True}, **request):
+        if getattr(chunk, "usage", None) is not None:
+            usage_chunk = chunk
+        if chunk.choices:
+            parser.feed(chunk.choices[0].delta.content or "")
+    if usage_chunk is not None:
+        record_usage("text_extraction", usage_chunk, usage_recorder)
+    return parser.text or None
+
+def _extraction_parser(on_section):
+    """
+    流式提取时的增量解析器，未开启流式提取且没有字段回调时返回None（整段调用）
+
+    Args:
+        on_section: 可选的回调，以(字段名, 字段值)通知每个已解析完的顶层字段
+    """
+    if on_section is None and not EXTRACTION_STREAMING:
+        return None
+    parser = StreamingJSONParser()
+    if on_section is not None:
+        parser.subscribe(on_section)
+    return parser
+
+def _parse_extraction(content, parser):
+    """优先使用流式解析的完整结果，解析器未得到完整对象时按原方式解析整段响应"""
+    if parser is not None:
+        extracted_data = parser.close()
+        if extracted_data is not None:
+            logger.info("成功提取JSON数据")
+            return extracted_data
+    return parse_json_response(content)
+
+def extract_medical_data_from_text_gemini(text, model, on_section=None, usage_recorder=None):
+    """使用Gemini从医疗文本中提取结构化数据，on_section为可选的顶层字段回调"""
+    try:
+        parser = _extraction_parser(on_section)
+        content = generate_with_gemini(build_extraction_prompt(text), model, parser, usage_recorder)
+        if content:
+            logger.info(f"收到响应，长度: {len(content)}")
+            return _parse_extraction(content, parser)
+        else:
+            logger.error("Gemini API返回空响应")
+            return FallbackStructure("Gemini API返回空响应")
 
-注意事项：
-1. 如果某些信息在文本中不存在，请设为null或空数组
-2. 数值类型的字段请提取纯数字，不要包含单位
-3. 对于检查结果，请识别异常标识（如↑表示偏高，↓表示偏低）
-4. 返回标准JSON格式，不要包含其他文字
-5. 确保JSON格式正确，可以被解析
-"""
+    except Exception as e:
+        logger.error(f"调用Gemini API失败: {e}")
+        logger.error(traceback.format_exc())
+        return FallbackStructure(f"调用Gemini API失败: {e}")
 
+def extract_medical_data_from_text_deepseek(text, client, on_section=None, usage_recorder=None):
+    """使用DeepSeek从医疗文本中提取结构化数据，on_section为可选的顶层字段回调"""
     try:
-        logger.info("调用DeepSeek API分析文本...")
-        response = client.chat.completions.create(
-            model="deepseek-chat",
-            messages=[{"role": "user", "content": prompt}],
-            temperature=0.5
-        )
-
-        if response.choices and response.choices[0].message.content:
-            content = response.choices[0].message.content
+        parser = _extraction_parser(on_section)
+        content = generate_with_deepseek(build_extraction_prompt(text), client, parser, usage_recorder)
+        if content:
             logger.info(f"收到响应，长度: {len(content)}")
-            return parse_json_response(content)
+            return _parse_extraction(content, parser)
         else:
             logger.error("DeepSeek API返回空响应")
-            return create_basic_structure()
+            return FallbackStructure("DeepSeek API返回空响应")
 
     except Exception as e:
         logger.error(f"调用DeepSeek API失败: {e}")
         logger.error(traceback.format_exc())
-        return create_basic_structure()
+        return FallbackStructure(f"调用DeepSeek API失败: {e}")
 
 def parse_json_response(text):
-    """解析JSON响应"""
-    # 清理响应文本，去除markdown格式
-    cleaned_text = text.strip()
-    if cleaned_text.startswith('```json'):
-        cleaned_text = cleaned_text[7:]
-    if cleaned_text.endswith('```'):
-        cleaned_text = cleaned_text[:-3]
-    cleaned_text = cleaned_text.strip()
-
-    # 解析JSON
-    try:
-        extracted_data = json.loads(cleaned_text)
-        logger.info("成功提取JSON数据")
-        return extracted_data
-    except json.JSONDecodeError as e:
-        logger.error(f"JSON解析失败: {e}")
+    """解析JSON响应：允许代码块标记、前后的说明文字、多余的逗号和被截断的结尾"""
+    extracted_data = extract_json(text, expect=dict)
+    if extracted_data is None:
+        logger.error("JSON解析失败")
         logger.error(f"原始响应: {text}")
         # 返回基础结构
-        return create_basic_structure()
+        return FallbackStructure("模型响应JSON解析失败")
+    logger.info("成功提取JSON数据")
+    return extracted_data
 
 def create_basic_structure():
     """创建基本的数据结构"""
-    return {
-        "document_type": "文本文档",
-        "patient_info": {
-            "name": None,
-            "age": None,
-            "gender": None,
-            "height_cm": None,
-            "weight_kg": None,
-            "bmi": None
-        },
-        "diagnoses": [],
-        "symptoms_and_history": {
-            "chief_complaint": None,
-            "history_of_present_illness_summary": None
-        },
-        "lab_results": {
-            "biochemistry": [],
-            "complete_blood_count": [],
-            "stool_routine": []
-        },
-        "treatment_plan": {
-            "summary": None,
-            "key_medications": []
-        },
-        "consultation_record": {
-            "department": None,
-            "purpose": None,
-            "findings_and_conclusion": None,
-            "recommendations": None,
-            "NRS2002_score": None,
-            "PES_statement_summary": None
+    return PatientRecord(document_type="文本文档").to_dict()
+
+class FallbackStructure(dict):
+    """模型提取失败时代替提取结果的基础结构，error为失败原因，用于如实报告提取状态"""
+
+    def __init__(self, error):
+        super().__init__(create_basic_structure())
+        self.error = error
+
+def _record_model_errors(info, model_structures):
+    """将模型提取失败的原因写入处理信息，返回失败原因列表"""
+    errors = [s.error for s in model_structures if isinstance(s, FallbackStructure)]
+    info["model_errors"] = errors
+    return errors
+
+def split_text_into_chunks(text, max_chars=CHUNK_MAX_CHARS):
+    """
+    按章节边界将长文本切分为若干分块
+
+    先在章节标题处切分，超长章节再按行切分，最后将相邻的小章节合并到不超过max_chars的分块中。
+    """
+    boundaries = [m.start() for m in SECTION_HEADER_PATTERN.finditer(text)]
+    if not boundaries or boundaries[0] != 0:
+        boundaries.insert(0, 0)
+    boundaries.append(len(text))
+
+    sections = []
+    for start, end in zip(boundaries, boundaries[1:]):
+        section = text[start:end]
+        if len(section) <= max_chars:
+            sections.append(section)
+            continue
+        # 超长章节按行切分
+        piece = ""
+        for line in section.splitlines(keepends=True):
+            if piece and len(piece) + len(line) > max_chars:
+                sections.append(piece)
+                piece = ""
+            piece += line
+        if piece:
+            sections.append(piece)
+
+    chunks = []
+    current = ""
+    for section in sections:
+        if current and len(current) + len(section) > max_chars:
+            chunks.append(current)
+            current = ""
+        current += section
+    if current.strip():
+        chunks.append(current)
+
+    return [chunk for chunk in chunks if chunk.strip()]
+
+def merge_extracted_structures(structures):
+    """
+    合并多个分块的提取结果
+
+    使用与图像识别整合相同的合并与去重规则。
+    """
+    merged = PatientRecord(document_type="文本文档")
+    document_types = []
+    for structure in structures:
+        if not isinstance(structure, dict):
+            continue
+        doc_type = structure.get("document_type")
+        if doc_type and doc_type not in document_types:
+            document_types.append(doc_type)
+        merged.merge_dict(structure)
+
+    merged.deduplicate()
+    if len(document_types) == 1:
+        merged.document_type = document_types[0]
+    elif document_types:
+        merged.document_type = "综合病例"
+    return merged.to_dict()
+
+def _select_extract_fn(model_series):
+    """按模型系列选择单文档提取函数"""
+    return extract_medical_data_from_text_deepseek if model_series == 'deepseek' else extract_medical_data_from_text_gemini
+
+def _pre_extract(text, local_extraction):
+    """
+    本地规则预提取
+
+    Returns:
+        (确定性提取结果, 需要交给模型的文本, 处理信息)
+    """
+    local_structure, model_text = {}, text
+    if local_extraction:
+        local_structure, model_text = extract_structured_fields(text)
+        if not local_structure:
+            # 规则未命中时保留原文，避免残余文本过滤掉非表格内容
+            model_text = text
+        logger.info(f"本地规则提取完成，残余文本长度: {len(model_text)}/{len(text)}")
+
+    info = {
+        "document_category": classify_document(text),
+        "chunk_count": 0,
+        "local_fields": sorted(local_structure.keys()),
+        "model_text_chars": 0,
+        "model_skipped": bool(local_structure) and not needs_model_extraction(model_text)
+    }
+    if info["model_skipped"]:
+        logger.info("残余文本不含需要模型处理的内容，跳过模型调用")
+    return local_structure, model_text, info
+
+def _section_callback(on_section, prefix):
+    """给字段名加上来源前缀（如chunk_2.diagnoses），on_section为None时返回None"""
+    if on_section is None:
+        return None
+    return lambda key, value: on_section(f"{prefix}.{key}", value)
+
+def _extract_with_model(model_text, extract_fn, client, chunking, info, on_section=None, usage_recorder=None):
+    """
+    对残余文本调用模型提取，过长时按章节分块并发提取
+
+    on_section为可选的顶层字段回调；分块提取时字段名带分块前缀（chunk_1.diagnoses）。
+    usage_recorder为可选的用量记录器。
+    """
+    use_chunking = chunking == "always" or (chunking == "auto" and len(model_text) > CHUNKING_THRESHOLD_CHARS)
+    chunks = split_text_into_chunks(model_text) if use_chunking else [model_text]
+    info["chunk_count"] = max(len(chunks), 1)
+    info["model_text_chars"] = len(model_text)
+    if len(chunks) <= 1:
+        return [extract_fn(model_text, client, on_section=on_section, usage_recorder=usage_recorder)]
+
+    logger.info(f"文本长度 {len(model_text)}，按章节切分为 {len(chunks)} 个分块并发提取")
+    with ThreadPoolExecutor(max_workers=min(MAX_CHUNK_WORKERS, len(chunks))) as executor:
+        return list(executor.map(
+            lambda item: extract_fn(item[1], client, on_section=_section_callback(on_section, f"chunk_{item[0]}"),
+                                    usage_recorder=usage_recorder),
+            enumerate(chunks, 1)
+        ))
+
+def _finalize_extraction(local_structure, model_structures, info):
+    """合并本地规则结果与模型结果，本地结果排在最前，单值字段以确定性结果为准"""
+    if not local_structure and len(model_structures) == 1:
+        return model_structures[0]
+
+    structures = ([local_structure] if local_structure else []) + list(model_structures)
+    merged = merge_extracted_structures(structures)
+    if info["model_skipped"]:
+        merged["document_type"] = info["document_category"]
+    return merged
+
+def extract_medical_data(text, model_series, client, chunking="auto", local_extraction=True, on_section=None,
+                         usage_recorder=None):
+    """
+    从医疗文本中提取结构化数据
+
+    先用本地规则确定性地提取检验结果、人体测量和NRS2002评分，只把残余的自由文本
+    （诊断、病史、治疗计划等）交给模型；残余文本过长时按章节分块并发提取。
+    传入on_section时，本地规则的结果（字段名前缀rules.）立即通知，模型输出的顶层字段在流式解析完成时逐个通知。
+
+    Args:
+        text: 医疗文本
+        model_series: 模型系列（"gemini" 或 "deepseek"）
+        client: 对应模型系列的模型对象或客户端
+        chunking: 分块模式，"auto"（超过阈值时分块）、"always" 或 "never"
+        local_extraction: 是否启用本地规则预提取
+        on_section: 可选的回调，以(字段名, 字段值)通知已完成的字段
+        usage_recorder: 可选的用量记录器，缺省记入进程级记录器
+
+    Returns:
+        (提取的结构化数据, 处理信息)
+    """
+    local_structure, model_text, info = _pre_extract(text, local_extraction)
+    if on_section is not None:
+        for key, value in local_structure.items():
+            on_section(f"rules.{key}", value)
+    model_structures = []
+    if not info["model_skipped"]:
+        model_structures = _extract_with_model(model_text, _select_extract_fn(model_series), client, chunking, info,
+                                               on_section=on_section, usage_recorder=usage_recorder)
+    _record_model_errors(info, model_structures)
+    return _finalize_extraction(local_structure, model_structures, info), info
+
+def estimate_tokens(text):
+    """粗略估算文本的token数：汉字按1个token，其余字符按4个字符1个token"""
+    cjk_count = len(re.findall(r'[一-鿿]', text))
+    return cjk_count + (len(text) - cjk_count) // 4 + 1
+
+def build_batch_extraction_prompt(texts):
+    """构建多文档打包提取提示，要求按文档顺序返回JSON数组"""
+    sections = "\n\n".join(f"=== 文档{i} ===\n{text}" for i, text in enumerate(texts, 1))
+    return f"""{EXTRACTION_PREFIX}
+以下是{len(texts)}份相互独立的医疗文本，请分别提取结构化信息。
+请返回一个JSON数组，数组长度必须为{len(texts)}，按文档顺序依次对应，每个元素为上述JSON格式。
+
+{sections}
+"""
+
+def parse_json_array_response(text, expected_length):
+    """解析打包提取返回的JSON数组，长度不符或解析失败时返回None"""
+    parsed = extract_json(text, expect=list)
+    if parsed is None:
+        logger.error("打包提取结果JSON解析失败")
+        return None
+    if len(parsed) != expected_length:
+        logger.error(f"打包提取结果数量不符，期望 {expected_length}")
+        return None
+    return [item if isinstance(item, dict) else FallbackStructure("打包提取结果中的元素不是JSON对象") for item in parsed]
+
+def _extract_packed(texts, model_series, client, usage_recorder=None):
+    """一次模型调用提取多份小文档，失败时逐份单独提取"""
+    generate_fn = generate_with_deepseek if model_series == 'deepseek' else generate_with_gemini
+    try:
+        content = generate_fn(build_batch_extraction_prompt(texts), client, usage_recorder=usage_recorder)
+        structures = parse_json_array_response(content, len(texts)) if content else None
+        if structures is not None:
+            return [[structure] for structure in structures], 1
+    except Exception as e:
+        logger.error(f"打包提取失败，改为逐份提取: {e}")
+
+    extract_fn = _select_extract_fn(model_series)
+    return [[extract_fn(text, client, usage_recorder=usage_recorder)] for text in texts], 1 + len(texts)
+
+def _pack_documents(indices, model_texts):
+    """将小文档按token预算和数量上限贪心打包"""
+    groups, current, current_tokens = [], [], 0
+    for index in indices:
+        tokens = estimate_tokens(model_texts[index])
+        if current and (current_tokens + tokens > BATCH_PACK_TOKEN_BUDGET or len(current) >= BATCH_PACK_MAX_DOCS):
+            groups.append(current)
+            current, current_tokens = [], 0
+        current.append(index)
+        current_tokens += tokens
+    if current:
+        groups.append(current)
+    return groups
+
+def extract_documents_batch(documents, model_series, client, chunking="auto", local_extraction=True,
+                            usage_recorder=None):
+    """
+    批量提取多份医疗文档
+
+    每份文档先做本地规则预提取；需要模型处理的小文档按token预算打包进同一个提示，
+    大文档单独提取（必要时分块），所有模型调用并发执行。
+
+    Args:
+        documents: [{"id": 文档标识, "text": 文本}] 列表
+        model_series: 模型系列（"gemini" 或 "deepseek"）
+        client: 对应模型系列的模型对象或客户端
+        chunking: 分块模式
+        local_extraction: 是否启用本地规则预提取
+        usage_recorder: 可选的用量记录器，缺省记入进程级记录器
+
+    Returns:
+        (逐文档结果列表, 合并后的患者数据, 批处理信息)
+    """
+    prepared = [_pre_extract(doc["text"], local_extraction) for doc in documents]
+    model_texts = [model_text for _, model_text, _ in prepared]
+    pending = [i for i, (_, _, info) in enumerate(prepared) if not info["model_skipped"]]
+
+    packable = [i for i in pending if estimate_tokens(model_texts[i]) <= BATCH_PACK_MAX_DOC_TOKENS]
+    groups = [group for group in _pack_documents(packable, model_texts) if len(group) > 1]
+    packed = {i for group in groups for i in group}
+    singles = [i for i in pending if i not in packed]
+
+    model_structures = {}
+    model_calls = 0
+    extract_fn = _select_extract_fn(model_series)
+    with ThreadPoolExecutor(max_workers=max(1, min(MAX_BATCH_WORKERS, len(groups) + len(singles)))) as executor:
+        group_futures = {
+            executor.submit(_extract_packed, [model_texts[i] for i in group], model_series, client,
+                            usage_recorder): group
+            for group in groups
+        }
+        single_futures = {
+            executor.submit(_extract_with_model, model_texts[i], extract_fn, client, chunking, prepared[i][2],
+                            usage_recorder=usage_recorder): i
+            for i in singles
+        }
+        for future, group in group_futures.items():
+            structures_per_doc, calls = future.result()
+            model_calls += calls
+            for i, structures in zip(group, structures_per_doc):
+                model_structures[i] = structures
+                prepared[i][2]["chunk_count"] = 1
+                prepared[i][2]["model_text_chars"] = len(model_texts[i])
+                prepared[i][2]["packed"] = True
+        for future, i in single_futures.items():
+            model_structures[i] = future.result()
+            model_calls += prepared[i][2]["chunk_count"]
+
+    results = []
+    for i, doc in enumerate(documents):
+        local_structure, _, info = prepared[i]
+        errors = _record_model_errors(info, model_structures.get(i, []))
+        extracted = _finalize_extraction(local_structure, model_structures.get(i, []), info)
+        result = {
+            "document_id": doc["id"],
+            # 模型提取失败时extracted_data只含本地规则结果或基础结构
+            "success": not errors,
+            "extracted_data": extracted,
+            "extraction_info": info
         }
+        if errors:
+            result["error"] = "；".join(errors)
+        results.append(result)
+
+    merged = merge_extracted_structures([r["extracted_data"] for r in results])
+    batch_info = {
+        "document_count": len(documents),
+        "model_calls": model_calls,
+        "packed_groups": len(groups),
+        "model_skipped_documents": len(documents) - len(pending),
+        "failed_documents": sum(not r["success"] for r in results)
     }
+    return results, merged, batch_info
+
+def normalize_documents(raw_documents):
+    """将documents字段统一为[{"id", "text"}]，忽略空文本"""
+    documents = []
+    for index, doc in enumerate(raw_documents, 1):
+        if isinstance(doc, str):
+            doc = {"text": doc}
+        if not isinstance(doc, dict) or not doc.get("text"):
+            continue
+        documents.append({"id": doc.get("id", index), "text": doc["text"]})
+    return documents
+
+# 按模型系列缓存的模型对象和客户端：常驻进程中的后续请求直接复用（两种SDK的客户端都可跨线程共享）
+_clients = {}
+_clients_lock = threading.Lock()
+
+def setup_client(model_series):
+    """按模型系列返回模型对象或客户端，首次使用时创建"""
+    key = 'deepseek' if model_series == 'deepseek' else 'gemini'
+    with _clients_lock:
+        if key not in _clients:
+            if key == 'deepseek':
+                logger.info("使用DeepSeek模型系列")
+                _clients[key] = setup_deepseek()
+            else:
+                logger.info("使用Gemini模型系列")
+                _clients[key] = setup_gemini()
+        return _clients[key]
+
+def process_request(data, on_section=None):
+    """
+    处理一次文本提取请求
+
+    Args:
+        data: 请求数据，包含text（单文档）或documents（多文档批量），以及可选的
+              model_series、chunking、local_extraction
+        on_section: 可选的回调，以(字段名, 字段值)通知单文档提取中已完成的字段（批量模式不通知）
+
+    Returns:
+        结果字典
+    """
+    model_series = data.get('model_series', 'gemini')  # 默认使用Gemini
+    chunking = data.get('chunking', 'auto')  # 长文本分块模式
+    local_extraction = data.get('local_extraction', True)  # 本地规则预提取
+    # 每个请求单独统计用量：常驻工作进程中进程级记录器会累计所有请求
+    usage_recorder = UsageRecorder()
+
+    # 多文档批量模式
+    if data.get('documents') is not None:
+        documents = normalize_documents(data['documents'])
+        if not documents:
+            logger.error("未提供文档内容")
+            return {
+                "success": False,
+                "error": "未提供文档内容",
+                "extracted_data": create_basic_structure()
+            }
+
+        client = setup_client(model_series)
+        results, merged, batch_info = extract_documents_batch(documents, model_series, client, chunking, local_extraction,
+                                                             usage_recorder)
+        return {
+            "success": batch_info["failed_documents"] == 0,
+            "documents": results,
+            "merged_data": merged,
+            "extracted_data": merged,
+            "model_used": model_series,
+            "batch_info": batch_info,
+            "llm_usage": usage_recorder.summary(),
+            "processing_time": datetime.now().isoformat()
+        }
+
+    text = data.get('text', '')
+    if not text:
+        logger.error("未提供文本内容")
+        return {
+            "success": False,
+            "error": "未提供文本内容",
+            "extracted_data": create_basic_structure()
+        }
+
+    # 根据选择的模型系列进行处理
+    client = setup_client(model_series)
+    extracted_data, extraction_info = extract_medical_data(text, model_series, client, chunking, local_extraction,
+                                                           on_section=on_section, usage_recorder=usage_recorder)
+
+    result = {
+        "success": not extraction_info["model_errors"],
+        "extracted_data": extracted_data,
+        "model_used": model_series,
+        "extraction_info": extraction_info,
+        "llm_usage": usage_recorder.summary(),
+        "processing_time": datetime.now().isoformat()
+    }
+    if extraction_info["model_errors"]:
+        result["error"] = "；".join(extraction_info["model_errors"])
+    return result
 
 def main():
     """主函数"""
     try:
         logger.info("开始文本处理")
+        install_cassette(LLM_CASSETTE_MODE, LLM_CASSETTE_PATH, LLM_CASSETTE_LATENCY_SCALE)
 
         # 从stdin读取输入
         input_data = sys.stdin.read()
@@ -314,8 +719,6 @@ def main():
         # 解析JSON输入
         try:
             data = json.loads(input_data)
-            text = data.get('text', '')
-            model_series = data.get('model_series', 'gemini')  # 默认使用Gemini
         except json.JSONDecodeError as e:
             logger.error(f"输入JSON解析失败: {e}")
             result = {
@@ -326,33 +729,7 @@ def main():
             print(json.dumps(result, ensure_ascii=False))
             return
 
-        if not text:
-            logger.error("未提供文本内容")
-            result = {
-                "success": False,
-                "error": "未提供文本内容",
-                "extracted_data": create_basic_structure()
-            }
-            print(json.dumps(result, ensure_ascii=False))
-            return
-
-        # 根据选择的模型系列进行处理
-        if model_series == 'deepseek':
-            logger.info("使用DeepSeek模型系列")
-            client = setup_deepseek()
-            extracted_data = extract_medical_data_from_text_deepseek(text, client)
-        else:
-            logger.info("使用Gemini模型系列")
-            model = setup_gemini()
-            extracted_data = extract_medical_data_from_text_gemini(text, model)
-
-        # 返回结果
-        result = {
-            "success": True,
-            "extracted_data": extracted_data,
-            "model_used": model_series,
-            "processing_time": datetime.now().isoformat()
-        }
+        result = process_request(data)
 
         logger.info("文本处理完成")
         print(json.dumps(result, ensure_ascii=False))
@@ -369,4 +746,4 @@ def main():
         print(json.dumps(result, ensure_ascii=False))
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
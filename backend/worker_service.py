@@ -0,0 +1,636 @@
+#!/usr/bin/env python3
+"""
+常驻Python工作进程 - 通过HTTP提供评估、文本提取和图像识别服务
+
+与每个请求启动一个Python子进程相比，常驻进程省去了解释器和依赖的启动开销，
+并可合并相同的并发请求：重复点击或超时重试产生的相同请求会加入正在执行的请求，
+共享同一个结果（包括session_id），而不是重新运行一遍完整流程。
+
+用法：
+    python worker_service.py
+    前端设置 PYTHON_WORKER_URL=http://127.0.0.1:8800 后，API路由会转发到本服务
+
+异步任务：POST /jobs/assessment 立即返回session_id，评估在后台执行，
+通过 GET /jobs/<session_id> 查询状态、已完成阶段的中间结果和最终响应；
+图像识别阶段已解析完的字段（如image_1.diagnoses）在阶段完成前即出现在partial_results中。
+
+一体化评估：POST /pipeline 在同一次请求中完成文本/图像提取和评估（见assessment_pipeline.py），
+请求中的return_extraction为true时响应附带提取结果。
+
+流式文本提取：POST /process-text/stream 以NDJSON逐行返回已解析完的字段（{"section": ..., "data": ...}），
+最后一行为完整响应（{"result": ...}）；该接口不合并相同请求。
+
+调度：同步请求和异步任务都经过优先级调度器，请求中的priority字段
+（interactive（默认）、batch、reassessment）决定排队顺序和并发上限；
+队列满时返回429和Retry-After，GET /metrics 返回排队深度、排队耗时和智能体池的复用情况。
+
+取消：同步评估请求的所有客户端都断开连接后取消评估（不再启动新的阶段，已完成阶段的追溯记录保留）；
+异步任务通过 POST /jobs/<session_id>/cancel 取消。
+
+多进程：PYTHON_WORKER_PROCESSES大于1时以预派生模式运行，主进程导入全部依赖后fork出多个子进程
+共同监听同一端口（见agents/prefork.py），图像解码、大段JSON解析等CPU密集的工作可以使用多个核心。
+每个子进程有独立的调度器、请求合并和任务表；查询或取消不属于本进程的异步任务时转发给其他子进程。
+"""
+
+import importlib
+import json
+import os
+import queue
+import select
+import socket
+import sys
+import threading
+import time
+import traceback
+from contextlib import contextmanager
+from functools import partial
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from main import run_assessment_request, build_coordinator
+from text_processing_service import process_request
+from assessment_pipeline import run_pipeline_request
+from image_recognition_service import recognize_images
+from agents.singleflight import SingleFlight, request_key
+from agents.llm_cassette import install_cassette
+from agents.job_store import JobStore
+from agents.cancellation import CancellationToken, AssessmentCancelledError
+from agents.agent_pool import DEFAULT_AGENT_POOL
+from agents.scheduler import PriorityScheduler, QueueFullError, normalize_priority, DEFAULT_PRIORITY
+from agents.prefork import PreforkSupervisor, ChildContext, UnixHTTPServer, UnixHTTPConnection
+from config import (
+    PYTHON_WORKER_HOST,
+    PYTHON_WORKER_PORT,
+    JOB_RESULT_TTL_SECONDS,
+    PYTHON_WORKER_PROCESSES,
+    PYTHON_WORKER_MAX_REQUESTS,
+    PYTHON_WORKER_MAX_RSS_MB,
+    PYTHON_WORKER_HEARTBEAT_TIMEOUT,
+    PYTHON_WORKER_DRAIN_TIMEOUT,
+    SCHEDULER_WORKERS,
+    SCHEDULER_INTERACTIVE_CONCURRENCY,
+    SCHEDULER_BATCH_CONCURRENCY,
+    SCHEDULER_REASSESSMENT_CONCURRENCY,
+    SCHEDULER_INTERACTIVE_QUEUE_SIZE,
+    SCHEDULER_BATCH_QUEUE_SIZE,
+    SCHEDULER_REASSESSMENT_QUEUE_SIZE,
+    LLM_CASSETTE_MODE,
+    LLM_CASSETTE_PATH,
+    LLM_CASSETTE_LATENCY_SCALE
+)
+
+# 路由：路径 -> (请求类型, 处理函数)
+ROUTES = {
+    "/assessment": ("assessment", run_assessment_request),
+    "/process-text": ("text", process_request),
+    "/recognize-images": ("image", recognize_images),
+    "/pipeline": ("pipeline", run_pipeline_request),
+}
+
+SINGLEFLIGHT = SingleFlight()
+
+JOBS = JobStore(ttl_seconds=JOB_RESULT_TTL_SECONDS)
+_submit_lock = threading.Lock()
+_job_coordinators: Dict[str, Any] = {}  # 未结束任务的协调器，用于取消
+
+# 调度器在服务启动时创建：预派生模式下fork不会复制工作线程，每个子进程各自创建
+SCHEDULER: Optional[PriorityScheduler] = None
+
+# 预派生模式下本子进程的运行状态，单进程模式为None
+PREFORK: Optional[ChildContext] = None
+
+# 子进程之间转发的请求带此请求头，收到的一方不再继续转发
+FORWARDED_HEADER = "X-Worker-Forwarded"
+
+# 预派生模式下在主进程中预先导入的按需导入模块，子进程共享而不是各自导入
+PRELOAD_MODULES = ("PIL.Image", "google.generativeai", "openai")
+
+_in_flight = 0
+_in_flight_lock = threading.Lock()
+
+
+def create_scheduler() -> PriorityScheduler:
+    return PriorityScheduler(
+        workers=SCHEDULER_WORKERS,
+        limits={
+            "interactive": {"concurrency": SCHEDULER_INTERACTIVE_CONCURRENCY, "queue_size": SCHEDULER_INTERACTIVE_QUEUE_SIZE},
+            "batch": {"concurrency": SCHEDULER_BATCH_CONCURRENCY, "queue_size": SCHEDULER_BATCH_QUEUE_SIZE},
+            "reassessment": {"concurrency": SCHEDULER_REASSESSMENT_CONCURRENCY, "queue_size": SCHEDULER_REASSESSMENT_QUEUE_SIZE},
+        },
+        name="assessment"
+    )
+
+
+def log(message: str):
+    print(message, file=sys.stderr, flush=True)
+
+
+def pop_priority(parsed) -> str:
+    """
+    取出请求中的priority字段（不参与请求键，不同优先级的相同请求仍会合并）
+
+    Raises:
+        ValueError: 未知的优先级
+    """
+    if isinstance(parsed, dict):
+        return normalize_priority(parsed.pop("priority", None))
+    return DEFAULT_PRIORITY
+
+
+class _CancelLease:
+    def __init__(self, owner: "SharedCancellation", key: str, token: CancellationToken):
+        self._owner = owner
+        self._key = key
+        self._released = False
+        self._lock = threading.Lock()
+        self.token = token
+
+    def release(self, disconnected: bool = False):
+        """释放一次（重复调用被忽略）；disconnected表示客户端已断开"""
+        with self._lock:
+            if self._released:
+                return
+            self._released = True
+        self._owner._release(self._key, disconnected)
+
+
+class SharedCancellation:
+    """
+    同步评估请求的取消令牌，按请求键在合并的相同请求间共享
+
+    只要还有一个客户端在等待结果就不取消；最后一个等待者断开连接时取消评估。
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries: Dict[str, list] = {}  # 请求键 -> [令牌, 等待者数量]
+
+    def acquire(self, key: str) -> _CancelLease:
+        with self._lock:
+            entry = self._entries.setdefault(key, [CancellationToken(), 0])
+            entry[1] += 1
+            return _CancelLease(self, key, entry[0])
+
+    def _release(self, key: str, disconnected: bool):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return
+            entry[1] -= 1
+            if entry[1] > 0:
+                return
+            del self._entries[key]
+        # 最后一个等待者正常拿到结果时评估已结束，只有它断开时才需要取消
+        if disconnected:
+            entry[0].cancel("客户端已断开")
+
+
+SYNC_CANCELLATION = SharedCancellation()
+
+
+def _watch_disconnect(sock: socket.socket, on_disconnect: Callable[[], None], stop: threading.Event):
+    """
+    在请求处理期间检测客户端断开：对端关闭连接后socket可读且读到EOF
+
+    客户端发送了新的数据（如下一个请求）时不视为断开，停止检测。
+    """
+    while not stop.is_set():
+        try:
+            readable, _, _ = select.select([sock], [], [], 0.5)
+            if not readable:
+                continue
+            if sock.recv(1, socket.MSG_PEEK):
+                return
+        except (OSError, ValueError):
+            pass
+        if not stop.is_set():
+            on_disconnect()
+        return
+
+
+@contextmanager
+def _track_request():
+    """统计进行中的请求，子进程排空时等待其结束"""
+    global _in_flight
+    with _in_flight_lock:
+        _in_flight += 1
+    try:
+        yield
+    finally:
+        with _in_flight_lock:
+            _in_flight -= 1
+
+
+def _busy() -> bool:
+    """是否还有进行中的请求或未结束的异步任务"""
+    with _in_flight_lock:
+        if _in_flight:
+            return True
+    with _submit_lock:
+        return bool(_job_coordinators)
+
+
+def _ask_siblings(method: str, path: str) -> Optional[Tuple[int, Any]]:
+    """
+    向其他子进程转发任务查询或取消请求（预派生模式）
+
+    Returns:
+        第一个找到该任务的子进程的(状态码, 响应)，都没有找到时返回None
+    """
+    if PREFORK is None:
+        return None
+    for socket_path in PREFORK.sibling_socket_paths():
+        connection = UnixHTTPConnection(socket_path)
+        try:
+            connection.request(method, path, headers={FORWARDED_HEADER: "1", "Content-Length": "0"})
+            response = connection.getresponse()
+            status, body = response.status, json.loads(response.read() or b"null")
+        except (OSError, ValueError):
+            # 子进程刚退出或正在重启
+            continue
+        finally:
+            connection.close()
+        if status != 404:
+            return status, body
+    return None
+
+
+def _run_job(coordinator):
+    """在后台线程中执行评估任务"""
+    session_id = coordinator.session_id
+    JOBS.mark_running(session_id)
+    try:
+        JOBS.complete(session_id, coordinator.run_assessment())
+    except Exception as e:
+        log(traceback.format_exc())
+        JOBS.fail(session_id, f"An unexpected error occurred: {str(e)}")
+    finally:
+        with _submit_lock:
+            _job_coordinators.pop(session_id, None)
+
+
+def _run_sync(handler, parsed, cancel_token: CancellationToken = None):
+    """同步请求在调度器中的执行函数；排队期间所有客户端都已断开时不再执行"""
+    if cancel_token is None:
+        return handler(parsed)
+    cancel_token.raise_if_cancelled("queued")
+    return handler(parsed, cancel_token)
+
+
+def cancel_job(session_id: str) -> bool:
+    """
+    取消异步评估任务
+
+    排队中的任务开始执行时直接返回取消响应；执行中的任务不再启动新的阶段，进行中的模型调用立即返回。
+
+    Returns:
+        是否找到未结束的任务
+    """
+    with _submit_lock:
+        coordinator = _job_coordinators.get(session_id)
+    if coordinator is None:
+        return False
+    coordinator.cancel("任务被显式取消")
+    return True
+
+
+def submit_assessment_job(parsed) -> Dict[str, Any]:
+    """
+    提交异步评估任务
+
+    相同请求的任务尚未结束时直接返回该任务，不重复提交。
+
+    Args:
+        parsed: 评估请求JSON，格式同run_assessment_request，可带priority字段
+
+    Returns:
+        任务快照，coalesced表示是否为已存在的任务
+
+    Raises:
+        ValueError: 请求中的患者数据格式或优先级无效
+        QueueFullError: 该优先级的队列已满
+    """
+    priority = pop_priority(parsed)
+    key = request_key("assessment", parsed)
+    with _submit_lock:
+        existing = JOBS.find_active(key)
+        # 已取消但尚未结束的任务不再合并新的请求
+        if existing and existing in _job_coordinators and _job_coordinators[existing].cancel_token.cancelled:
+            existing = None
+        if existing:
+            job = JOBS.get(existing)
+            if job is not None:
+                return {**job, "coalesced": True}
+
+        coordinator = build_coordinator(parsed)
+        coordinator.stage_callback = partial(JOBS.record_stage, coordinator.session_id)
+        coordinator.section_callback = partial(JOBS.record_section, coordinator.session_id)
+        job = JOBS.create(coordinator.session_id, key, assessment_profile=coordinator.assessment_profile, priority=priority)
+        try:
+            SCHEDULER.submit(priority, _run_job, coordinator)
+        except QueueFullError:
+            JOBS.discard(coordinator.session_id)
+            coordinator.release_agents()
+            raise
+        _job_coordinators[coordinator.session_id] = coordinator
+    return {**job, "coalesced": False}
+
+
+class WorkerHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    @property
+    def forwarded(self) -> bool:
+        return self.headers.get(FORWARDED_HEADER) == "1"
+
+    def _send_json(self, status: int, body, headers: dict = None):
+        payload = json.dumps(body, ensure_ascii=False).encode("utf-8")
+        if PREFORK is not None and PREFORK.draining.is_set():
+            # 排空中的子进程即将退出，客户端的下一个请求应连接到其他子进程
+            self.close_connection = True
+            headers = {**(headers or {}), "Connection": "close"}
+        try:
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json; charset=utf-8")
+            self.send_header("Content-Length", str(len(payload)))
+            for name, value in (headers or {}).items():
+                self.send_header(name, value)
+            self.end_headers()
+            self.wfile.write(payload)
+        except (BrokenPipeError, ConnectionResetError):
+            # 客户端已断开（如评估被取消后），丢弃响应
+            self.close_connection = True
+
+    def do_GET(self):
+        path = self.path.rstrip("/")
+        if path == "/health":
+            self._send_json(200, {
+                "status": "ok",
+                "pid": os.getpid(),
+                "in_flight": len(SINGLEFLIGHT.in_flight()),
+                "jobs": JOBS.counts(),
+                "busy_workers": SCHEDULER.metrics()["busy"]
+            })
+        elif path == "/metrics":
+            self._send_json(200, {**SCHEDULER.metrics(), "pid": os.getpid(), "agent_pool": DEFAULT_AGENT_POOL.stats()})
+        elif path.startswith("/jobs/"):
+            job = JOBS.get(path[len("/jobs/"):])
+            forwarded = None if job is not None or self.forwarded else _ask_siblings("GET", path)
+            if forwarded is not None:
+                self._send_json(*forwarded)
+            elif job is None:
+                self._send_json(404, {"error": "Job not found or expired"})
+            else:
+                self._send_json(200, job)
+        else:
+            self._send_json(404, {"error": "Not found"})
+
+    def _read_json(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        try:
+            return json.loads(self.rfile.read(length) or b"null")
+        except json.JSONDecodeError:
+            self._send_json(400, {"error": "Failed to decode JSON body."})
+            return None
+
+    def do_POST(self):
+        with _track_request():
+            self._handle_post()
+        if PREFORK is not None and not self.forwarded:
+            PREFORK.request_finished()
+
+    def _handle_post(self):
+        path = self.path.rstrip("/")
+        if path == "/jobs/assessment":
+            self._submit_job()
+            return
+        if path.startswith("/jobs/") and path.endswith("/cancel"):
+            self._cancel_job(path[len("/jobs/"):-len("/cancel")])
+            return
+        if path == "/process-text/stream":
+            self._stream_text()
+            return
+        route = ROUTES.get(self.path.rstrip("/"))
+        if route is None:
+            self._send_json(404, {"error": "Not found"})
+            return
+        kind, handler = route
+
+        parsed = self._read_json()
+        if parsed is None:
+            return
+
+        lease = None
+        stop_watch = threading.Event()
+        try:
+            priority = pop_priority(parsed)
+            key = request_key(kind, parsed)
+            # 评估请求：所有等待该结果的客户端都断开后取消评估
+            if kind in ("assessment", "pipeline"):
+                lease = SYNC_CANCELLATION.acquire(key)
+                threading.Thread(
+                    target=_watch_disconnect,
+                    args=(self.connection, partial(lease.release, disconnected=True), stop_watch),
+                    daemon=True
+                ).start()
+            result, shared = SINGLEFLIGHT.do(
+                key, SCHEDULER.run, priority, _run_sync, handler, parsed, lease.token if lease else None
+            )
+        except QueueFullError as e:
+            self._send_queue_full(e)
+            return
+        except AssessmentCancelledError as e:
+            log(f"{kind} 请求在排队期间取消: {e}")
+            self._send_json(499, {"error": str(e), "cancelled": True})
+            return
+        except ValueError as e:
+            self._send_json(400, {"error": str(e)})
+            return
+        except Exception as e:
+            log(traceback.format_exc())
+            self._send_json(500, {"error": f"An unexpected error occurred: {str(e)}", "error_type": type(e).__name__})
+            return
+        finally:
+            stop_watch.set()
+            if lease is not None:
+                lease.release()
+
+        if shared:
+            log(f"{kind} 请求 {key[:12]} 合并到进行中的请求")
+        self._send_json(200, result, {"X-Singleflight": "shared" if shared else "leader"})
+
+    def _send_queue_full(self, error: QueueFullError):
+        log(str(error))
+        self._send_json(
+            429,
+            {"error": str(error), "priority": error.priority, "retry_after": error.retry_after},
+            {"Retry-After": str(error.retry_after)}
+        )
+
+    def _cancel_job(self, session_id: str):
+        if cancel_job(session_id):
+            self._send_json(202, {"session_id": session_id, "status": "cancelling"})
+        elif JOBS.get(session_id) is not None:
+            self._send_json(409, {"error": "Job already finished", "session_id": session_id})
+        else:
+            forwarded = None if self.forwarded else _ask_siblings("POST", f"/jobs/{session_id}/cancel")
+            if forwarded is not None:
+                self._send_json(*forwarded)
+            else:
+                self._send_json(404, {"error": "Job not found or expired"})
+
+    def _write_chunk(self, data: bytes):
+        self.wfile.write(f"{len(data):x}\r\n".encode("ascii") + data + b"\r\n")
+        self.wfile.flush()
+
+    def _stream_text(self):
+        """流式文本提取：字段解析完即写出一行，提取结束后写出完整响应"""
+        parsed = self._read_json()
+        if parsed is None:
+            return
+        events = queue.Queue()
+        try:
+            priority = pop_priority(parsed)
+            future = SCHEDULER.submit(
+                priority, process_request, parsed,
+                lambda section, value: events.put({"section": section, "data": value})
+            )
+        except QueueFullError as e:
+            self._send_queue_full(e)
+            return
+        except ValueError as e:
+            self._send_json(400, {"error": str(e)})
+            return
+        future.add_done_callback(lambda f: events.put(None))
+
+        try:
+            self.send_response(200)
+            self.send_header("Content-Type", "application/x-ndjson; charset=utf-8")
+            self.send_header("Transfer-Encoding", "chunked")
+            if PREFORK is not None and PREFORK.draining.is_set():
+                self.close_connection = True
+                self.send_header("Connection", "close")
+            self.end_headers()
+            while True:
+                event = events.get()
+                if event is None:
+                    break
+                self._write_chunk(json.dumps(event, ensure_ascii=False).encode("utf-8") + b"\n")
+            try:
+                event = {"result": future.result()}
+            except Exception as e:
+                log(traceback.format_exc())
+                event = {"error": f"An unexpected error occurred: {str(e)}", "error_type": type(e).__name__}
+            self._write_chunk(json.dumps(event, ensure_ascii=False).encode("utf-8") + b"\n")
+            self.wfile.write(b"0\r\n\r\n")
+        except (BrokenPipeError, ConnectionResetError):
+            # 客户端已断开，提取在后台继续完成，结果丢弃
+            self.close_connection = True
+
+    def _submit_job(self):
+        parsed = self._read_json()
+        if parsed is None:
+            return
+        try:
+            job = submit_assessment_job(parsed)
+        except QueueFullError as e:
+            self._send_queue_full(e)
+            return
+        except ValueError as e:
+            self._send_json(400, {"error": str(e)})
+            return
+        except Exception as e:
+            log(traceback.format_exc())
+            self._send_json(500, {"error": f"An unexpected error occurred: {str(e)}", "error_type": type(e).__name__})
+            return
+        self._send_json(202, {
+            "session_id": job["session_id"],
+            "status": job["status"],
+            "coalesced": job["coalesced"],
+            "status_url": f"/jobs/{job['session_id']}"
+        })
+
+
+def serve_prefork_child(listen_socket: socket.socket, context: ChildContext):
+    """
+    预派生模式的子进程入口
+
+    在共享的监听socket上提供服务，另在运行目录的Unix socket上接收其他子进程转发的任务查询；
+    开始排空后不再接收新连接，进行中的请求和异步任务结束后返回。
+    """
+    global SCHEDULER, PREFORK
+    PREFORK = context
+    SCHEDULER = create_scheduler()
+
+    server = ThreadingHTTPServer(listen_socket.getsockname()[:2], WorkerHandler, bind_and_activate=False)
+    server.socket.close()
+    server.socket = listen_socket
+    server.daemon_threads = True
+    internal = UnixHTTPServer(context.socket_path, WorkerHandler)
+    for target in (server, internal):
+        threading.Thread(target=target.serve_forever, daemon=True).start()
+    context.start_heartbeat()
+
+    while not context.draining.wait(1.0):
+        pass
+    log(f"工作子进程 {context.pid} 开始排空：{context.drain_reason}")
+    server.shutdown()
+    while _busy():
+        time.sleep(0.5)
+    internal.shutdown()
+    internal.server_close()
+    SCHEDULER.shutdown(wait=False)
+
+
+def serve_prefork():
+    """预派生模式：导入依赖后派生PYTHON_WORKER_PROCESSES个子进程共同监听"""
+    for module in PRELOAD_MODULES:
+        try:
+            importlib.import_module(module)
+        except ImportError:
+            pass
+    listen_socket = socket.create_server((PYTHON_WORKER_HOST, PYTHON_WORKER_PORT), backlog=128)
+    # 非阻塞：多个子进程同时被唤醒时，没有抢到连接的子进程不会阻塞在accept上
+    listen_socket.setblocking(False)
+    supervisor = PreforkSupervisor(
+        listen_socket,
+        PYTHON_WORKER_PROCESSES,
+        serve_prefork_child,
+        max_requests=PYTHON_WORKER_MAX_REQUESTS,
+        max_rss_mb=PYTHON_WORKER_MAX_RSS_MB,
+        heartbeat_timeout=PYTHON_WORKER_HEARTBEAT_TIMEOUT,
+        drain_timeout=PYTHON_WORKER_DRAIN_TIMEOUT,
+        name="cna-worker"
+    )
+    log(f"Python工作进程已启动（{PYTHON_WORKER_PROCESSES} 个子进程）: http://{PYTHON_WORKER_HOST}:{PYTHON_WORKER_PORT}")
+    try:
+        supervisor.run()
+    finally:
+        listen_socket.close()
+
+
+def main():
+    global SCHEDULER
+    install_cassette(LLM_CASSETTE_MODE, LLM_CASSETTE_PATH, LLM_CASSETTE_LATENCY_SCALE)
+    if PYTHON_WORKER_PROCESSES > 1:
+        if hasattr(os, "fork"):
+            serve_prefork()
+            return
+        log("当前平台不支持fork，以单进程模式运行")
+    SCHEDULER = create_scheduler()
+    server = ThreadingHTTPServer((PYTHON_WORKER_HOST, PYTHON_WORKER_PORT), WorkerHandler)
+    server.daemon_threads = True
+    log(f"Python工作进程已启动: http://{PYTHON_WORKER_HOST}:{PYTHON_WORKER_PORT}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
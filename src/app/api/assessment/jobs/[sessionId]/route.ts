@@ -0,0 +1,32 @@
+import { NextResponse } from 'next/server';
+import { callPythonWorker, getFromPythonWorker } from '@/lib/pythonWorker';
+
+// 按session_id查询异步评估的状态、已完成阶段的中间结果和最终响应
+export async function GET(request: Request, { params }: { params: { sessionId: string } }) {
+  try {
+    const workerResponse = await getFromPythonWorker(`/jobs/${encodeURIComponent(params.sessionId)}`);
+    if (!workerResponse) {
+      return NextResponse.json({ error: '异步评估需要配置PYTHON_WORKER_URL并运行backend/worker_service.py' }, { status: 503 });
+    }
+    return workerResponse;
+
+  } catch (error) {
+    console.error('API Route Error:', error);
+    return NextResponse.json({ error: 'Internal Server Error' }, { status: 500 });
+  }
+}
+
+// 取消异步评估：不再启动新的阶段，已完成阶段的中间结果和追溯记录保留
+export async function DELETE(request: Request, { params }: { params: { sessionId: string } }) {
+  try {
+    const workerResponse = await callPythonWorker(`/jobs/${encodeURIComponent(params.sessionId)}/cancel`, {});
+    if (!workerResponse) {
+      return NextResponse.json({ error: '异步评估需要配置PYTHON_WORKER_URL并运行backend/worker_service.py' }, { status: 503 });
+    }
+    return workerResponse;
+
+  } catch (error) {
+    console.error('API Route Error:', error);
+    return NextResponse.json({ error: 'Internal Server Error' }, { status: 500 });
+  }
+}
@@ -0,0 +1,33 @@
+import { NextResponse } from 'next/server';
+import { callPythonWorker } from '@/lib/pythonWorker';
+
+// 异步评估：立即返回session_id，评估在Python工作进程中按优先级排队执行
+export async function POST(request: Request) {
+  try {
+    const body = await request.json();
+
+    const patientData = body.patient_data || body;
+    if (!patientData) {
+      return NextResponse.json({ error: 'Patient data is required' }, { status: 400 });
+    }
+
+    // resume_session_id：从检查点恢复中断的评估，其余字段来自检查点中的原始请求
+    const inputData = body.resume_session_id ? { resume_session_id: body.resume_session_id, priority: body.priority } : {
+      patient_data: patientData,
+      model_series: body.model_series || body.selected_model || 'gemini',
+      assessment_profile: body.assessment_profile || 'standard',
+      prescreen_threshold: body.prescreen_threshold,
+      priority: body.priority // interactive（默认）| batch | reassessment，批量筛查应使用batch
+    };
+
+    const workerResponse = await callPythonWorker('/jobs/assessment', inputData);
+    if (!workerResponse) {
+      return NextResponse.json({ error: '异步评估需要配置PYTHON_WORKER_URL并运行backend/worker_service.py' }, { status: 503 });
+    }
+    return workerResponse;
+
+  } catch (error) {
+    console.error('API Route Error:', error);
+    return NextResponse.json({ error: 'Internal Server Error' }, { status: 500 });
+  }
+}
@@ -1,6 +1,7 @@
 import { NextResponse } from 'next/server';
 import { spawn } from 'child_process';
 import path from 'path';
+import { callPythonWorker } from '@/lib/pythonWorker';
 
 export async function POST(request: Request) {
   try {
@@ -10,16 +11,44 @@ export async function POST(request: Request) {
     // 支持新的请求格式: {patient_data: ..., model_series: ...} 或旧的格式(直接patient数据)
     const patientData = body.patient_data || body;
     const modelSeries = body.model_series || body.selected_model || 'gemini'; // 向后兼容selected_model
+    const assessmentProfile = body.assessment_profile || 'standard'; // standard | fast | triage
+    const prescreenThreshold = body.prescreen_threshold; // 可选，批量筛查时低风险患者跳过完整评估
+    const priority = body.priority; // 可选，工作进程调度优先级：interactive（默认）| batch | reassessment
+    const resumeSessionId = body.resume_session_id; // 可选，从检查点恢复中断的评估（需开启ASSESSMENT_CHECKPOINTS）
 
     if (!patientData) {
       return NextResponse.json({ error: 'Patient data is required' }, { status: 400 });
     }
 
-    console.log(`Selected model series: ${modelSeries}`);
+    console.log(`Selected model series: ${modelSeries}, assessment profile: ${assessmentProfile}`);
+
+    // 恢复评估时模型系列、评估模式和患者数据都来自检查点中的原始请求
+    const inputData = resumeSessionId ? { resume_session_id: resumeSessionId, priority: priority } : {
+      patient_data: patientData,
+      model_series: modelSeries,
+      assessment_profile: assessmentProfile,
+      prescreen_threshold: prescreenThreshold,
+      priority: priority
+    };
+
+    // 配置了常驻工作进程时转发给它，相同的并发请求只执行一次
+    const workerResponse = await callPythonWorker('/assessment', inputData, request.signal);
+    if (workerResponse) {
+      return workerResponse;
+    }
 
     const backendPath = path.join(process.cwd(), 'backend');
     const pythonProcess = spawn('python3', ['main.py'], { cwd: backendPath });
 
+    // 客户端断开（关闭页面、取消请求）时终止子进程：Python端收到SIGTERM后不再启动新的阶段并中断进行中的模型调用
+    const abortChild = () => {
+      if (pythonProcess.exitCode === null) {
+        console.log('客户端已断开，终止评估子进程');
+        pythonProcess.kill('SIGTERM');
+      }
+    };
+    request.signal.addEventListener('abort', abortChild, { once: true });
+
     let reportData = '';
     let errorData = '';
 
@@ -32,10 +61,6 @@ export async function POST(request: Request) {
     });
 
     // Write patient data and model series to the Python script's stdin
-    const inputData = {
-      patient_data: patientData,
-      model_series: modelSeries
-    };
     const dataString = JSON.stringify(inputData);
     console.log("Writing to python stdin:", dataString);
     pythonProcess.stdin.write(dataString);
@@ -43,7 +68,10 @@ export async function POST(request: Request) {
 
     const processPromise = new Promise<NextResponse>((resolve) => {
       pythonProcess.on('close', (code) => {
-        if (code !== 0) {
+        request.signal.removeEventListener('abort', abortChild);
+        if (request.signal.aborted) {
+          resolve(NextResponse.json({ error: 'Assessment cancelled', cancelled: true }, { status: 499 }));
+        } else if (code !== 0) {
           console.error(`Python script exited with code ${code}`);
           console.error(errorData);
           resolve(NextResponse.json({ error: 'Error during assessment', details: errorData }, { status: 500 }));
@@ -0,0 +1,101 @@
+import { NextResponse } from 'next/server';
+import { spawn } from 'child_process';
+import path from 'path';
+import { callPythonWorker } from '@/lib/pythonWorker';
+
+// 原样转发给一体化评估入口的可选参数（见backend/assessment_pipeline.py）
+const PIPELINE_OPTIONS = [
+  'documents', 'imageData', 'model_series', 'chunking', 'local_extraction',
+  'assessment_profile', 'deadline_seconds', 'prescreen_threshold', 'return_extraction', 'priority'
+] as const;
+
+/**
+ * 一体化评估：文本/图像 -> 结构化提取 -> CNA评估在同一个Python进程中完成，
+ * 提取结果不再经前端序列化后另起进程评估
+ */
+export async function POST(request: Request) {
+  try {
+    const body = await request.json();
+    const { text, documents, imageData } = body;
+
+    if (text !== undefined && typeof text !== 'string') {
+      return NextResponse.json({ error: 'text must be a string' }, { status: 400 });
+    }
+    if (documents !== undefined && !Array.isArray(documents)) {
+      return NextResponse.json({ error: 'documents must be an array' }, { status: 400 });
+    }
+    const hasImages = imageData && (imageData.images?.length || imageData.file_paths?.length);
+    if (!text?.trim() && !documents?.length && !hasImages) {
+      return NextResponse.json({ error: 'Pipeline request needs text, documents or imageData' }, { status: 400 });
+    }
+
+    const inputData: Record<string, unknown> = { text };
+    for (const key of PIPELINE_OPTIONS) {
+      if (body[key] !== undefined) {
+        inputData[key] = body[key];
+      }
+    }
+    console.log(`Pipeline request: text ${text?.length ?? 0} chars, ${documents?.length ?? 0} documents, model series ${body.model_series || 'gemini'}`);
+
+    // 配置了常驻工作进程时转发给它，客户端断开时工作进程据此取消评估
+    const workerResponse = await callPythonWorker('/pipeline', inputData, request.signal);
+    if (workerResponse) {
+      return workerResponse;
+    }
+
+    const backendPath = path.join(process.cwd(), 'backend');
+    const pythonProcess = spawn('python3', ['assessment_pipeline.py'], { cwd: backendPath });
+
+    // 客户端断开时终止子进程：Python端收到SIGTERM后不再启动新的阶段
+    const abortChild = () => {
+      if (pythonProcess.exitCode === null) {
+        console.log('客户端已断开，终止一体化评估子进程');
+        pythonProcess.kill('SIGTERM');
+      }
+    };
+    request.signal.addEventListener('abort', abortChild, { once: true });
+
+    let reportData = '';
+    let errorData = '';
+
+    pythonProcess.stdout.on('data', (data) => {
+      reportData += data.toString();
+    });
+
+    pythonProcess.stderr.on('data', (data) => {
+      errorData += data.toString();
+    });
+
+    pythonProcess.stdin.write(JSON.stringify(inputData));
+    pythonProcess.stdin.end();
+
+    return await new Promise<NextResponse>((resolve) => {
+      pythonProcess.on('error', (error) => {
+        request.signal.removeEventListener('abort', abortChild);
+        resolve(NextResponse.json({ error: `Failed to start pipeline: ${error.message}` }, { status: 500 }));
+      });
+
+      pythonProcess.on('close', (code) => {
+        request.signal.removeEventListener('abort', abortChild);
+        if (request.signal.aborted) {
+          resolve(NextResponse.json({ error: 'Assessment cancelled', cancelled: true }, { status: 499 }));
+        } else if (code !== 0) {
+          console.error(`assessment_pipeline.py exited with code ${code}`);
+          console.error(errorData);
+          resolve(NextResponse.json({ error: 'Error during pipeline assessment', details: errorData }, { status: 500 }));
+        } else {
+          try {
+            resolve(NextResponse.json(JSON.parse(reportData)));
+          } catch (e) {
+            console.error('Error parsing pipeline output:', e);
+            resolve(NextResponse.json({ error: 'Failed to parse assessment report', details: reportData }, { status: 500 }));
+          }
+        }
+      });
+    });
+
+  } catch (error) {
+    console.error('Pipeline API Route Error:', error);
+    return NextResponse.json({ error: 'Internal Server Error' }, { status: 500 });
+  }
+}
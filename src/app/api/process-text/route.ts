@@ -1,22 +1,59 @@
 import { NextRequest, NextResponse } from "next/server";
 import { spawn } from "child_process";
 import path from "path";
+import { callPythonWorker } from "@/lib/pythonWorker";
+
+// 原样转发给Python提取服务的可选参数（见text_processing_service.process_request）
+const EXTRACTION_OPTIONS = ["model_series", "chunking", "local_extraction"] as const;
+
+/**
+ * 校验多文档批量提取的documents字段：非空数组，元素为文本或{ id?, text }
+ */
+function isValidDocuments(documents: unknown): boolean {
+  return Array.isArray(documents) && documents.length > 0 && documents.every((doc) =>
+    typeof doc === 'string'
+      ? doc.trim().length > 0
+      : typeof doc === 'object' && doc !== null && typeof doc.text === 'string' && doc.text.trim().length > 0
+        && (doc.id === undefined || typeof doc.id === 'string' || typeof doc.id === 'number')
+  );
+}
 
 export async function POST(request: NextRequest) {
   console.log("=== 接收文本处理请求 ===");
 
   try {
     const body = await request.json();
-    const { text } = body;
-
-    if (!text || typeof text !== 'string') {
+    const { text, documents } = body;
+
+    if (documents !== undefined) {
+      if (!isValidDocuments(documents)) {
+        return NextResponse.json(
+          { error: "documents必须是非空数组，每个元素为文本或包含text字段的对象" },
+          { status: 400 }
+        );
+      }
+      console.log("收到多文档批量提取请求，文档数:", documents.length);
+    } else if (!text || typeof text !== 'string') {
       return NextResponse.json(
         { error: "缺少有效的文本内容" },
         { status: 400 }
       );
+    } else {
+      console.log("收到文本内容，长度:", text.length);
+    }
+
+    const payload: Record<string, unknown> = documents !== undefined ? { documents } : { text };
+    for (const key of EXTRACTION_OPTIONS) {
+      if (body[key] !== undefined) {
+        payload[key] = body[key];
+      }
     }
 
-    console.log("收到文本内容，长度:", text.length);
+    // 配置了常驻工作进程时转发给它
+    const workerResponse = await callPythonWorker("/process-text", payload);
+    if (workerResponse) {
+      return workerResponse;
+    }
 
     // 获取后端目录路径
     const backendPath = path.join(process.cwd(), "backend");
@@ -41,8 +78,8 @@ export async function POST(request: NextRequest) {
       console.log("Python stderr:", data.toString());
     });
 
-    // 发送文本数据到Python进程
-    const inputData = JSON.stringify({ text });
+    // 发送请求数据到Python进程
+    const inputData = JSON.stringify(payload);
     pythonProcess.stdin.write(inputData);
     pythonProcess.stdin.end();
 
@@ -3,6 +3,7 @@ import { spawn } from 'child_process';
 import path from 'path';
 import { writeFile, unlink } from 'fs/promises';
 import { v4 as uuidv4 } from 'uuid';
+import { callPythonWorker } from '@/lib/pythonWorker';
 
 export async function POST(request: Request) {
   const tempFiles: string[] = [];
@@ -45,6 +46,19 @@ export async function POST(request: Request) {
       file_paths: imagePaths
     };
     
+    // 配置了常驻工作进程时转发给它（相同内容的图像请求只识别一次）
+    const workerResponse = await callPythonWorker('/recognize-images', imageData);
+    if (workerResponse) {
+      for (const file of tempFiles) {
+        try {
+          await unlink(file);
+        } catch (e) {
+          console.error(`Failed to delete temp file ${file}:`, e);
+        }
+      }
+      return workerResponse;
+    }
+
     const backendPath = path.join(process.cwd(), 'backend');
     const pythonProcess = spawn('python3', ['image_recognition_service.py'], { cwd: backendPath });
     
@@ -62,6 +62,8 @@ export default function Home() {
   const [inputMode, setInputMode] = useState<"json" | "image" | "text">("json");
   const [isIntegrating, setIsIntegrating] = useState(false);
   const [isProcessingText, setIsProcessingText] = useState(false);
+  // 文本录入默认只提取结构化数据，核对后再评估；勾选后提取和评估一次完成
+  const [assessAfterExtraction, setAssessAfterExtraction] = useState(false);
   const [selectedModelSeries, setSelectedModelSeries] = useState<"gemini" | "deepseek">("gemini");
 
   const handleImageUpload = (e: React.ChangeEvent<HTMLInputElement>) => {
@@ -314,7 +316,8 @@ export default function Home() {
     setIsIntegrating(false);
   };
 
-  // 处理文本录入
+  // 处理文本录入：默认只提取结构化数据，在JSON编辑器中核对后再评估；
+  // 勾选"解析后直接评估"时提取和评估在同一个后端进程中完成，提取结果同样回填到JSON编辑器
   const handleTextProcessing = async (formattedText: string) => {
     if (!formattedText.trim()) {
       alert("请输入医疗文本内容");
@@ -322,16 +325,20 @@ export default function Home() {
     }
 
     setIsProcessingText(true);
+    if (assessAfterExtraction) {
+      setAssessmentResult("");
+    }
 
     try {
-      const res = await fetch("/api/process-text", {
+      const res = await fetch(assessAfterExtraction ? "/api/pipeline" : "/api/process-text", {
         method: "POST",
         headers: {
           "Content-Type": "application/json",
         },
         body: JSON.stringify({
           text: formattedText,
-          model_series: selectedModelSeries
+          model_series: selectedModelSeries,
+          ...(assessAfterExtraction ? { return_extraction: true } : {})
         }),
       });
 
@@ -341,8 +348,16 @@ export default function Home() {
 
       const result = await res.json();
 
-      // 将处理后的结果设置到患者数据输入框
-      setPatientData(JSON.stringify(result.extracted_data, null, 2));
+      if (assessAfterExtraction) {
+        // 将提取结果设置到患者数据输入框，评估结果直接显示
+        if (result.extraction?.extracted_data) {
+          setPatientData(JSON.stringify(result.extraction.extracted_data, null, 2));
+        }
+        setAssessmentResult(result);
+      } else {
+        // 将处理后的结果设置到患者数据输入框
+        setPatientData(JSON.stringify(result.extracted_data, null, 2));
+      }
     } catch (error) {
       alert(`文本处理出错: ${error instanceof Error ? error.message : "未知错误"}`);
     } finally {
@@ -493,10 +508,21 @@ export default function Home() {
                   onSubmit={handleTextProcessing}
                   isProcessing={isProcessingText}
                 />
+                <label className="mt-3 flex items-center gap-2 text-sm text-gray-700">
+                  <input
+                    type="checkbox"
+                    checked={assessAfterExtraction}
+                    onChange={(e) => setAssessAfterExtraction(e.target.checked)}
+                    disabled={isProcessingText}
+                  />
+                  解析后直接评估（跳过人工核对）
+                </label>
                 {patientData && (
                   <div className="mt-4 p-3 bg-green-50 border border-green-200 rounded-md">
                     <p className="text-sm text-green-700">
-                      ✓ 文本已成功解析为结构化数据，请在下方JSON编辑器中检查并修改
+                      {assessAfterExtraction
+                        ? "✓ 文本已解析并完成评估，可在下方JSON编辑器中检查提取结果，修改后重新评估"
+                        : "✓ 文本已成功解析为结构化数据，请在下方JSON编辑器中检查并修改"}
                     </p>
                   </div>
                 )}
@@ -0,0 +1,49 @@
+import { NextResponse } from 'next/server';
+
+// 常驻Python工作进程地址（backend/worker_service.py），未设置时各路由仍按请求启动Python子进程
+const PYTHON_WORKER_URL = process.env.PYTHON_WORKER_URL;
+
+/**
+ * 将请求转发到常驻Python工作进程
+ *
+ * @param endpoint 工作进程的路径，如 /assessment
+ * @param payload 原本写入Python子进程stdin的请求数据
+ * @param signal 可选的客户端请求中止信号，客户端断开时关闭到工作进程的连接，工作进程据此取消评估
+ * @returns 工作进程的响应；未配置工作进程时返回null，由调用方回退到子进程方式
+ */
+export async function callPythonWorker(endpoint: string, payload: unknown, signal?: AbortSignal): Promise<NextResponse | null> {
+  if (!PYTHON_WORKER_URL) {
+    return null;
+  }
+
+  const response = await fetch(`${PYTHON_WORKER_URL.replace(/\/$/, '')}${endpoint}`, {
+    method: 'POST',
+    headers: { 'Content-Type': 'application/json' },
+    body: JSON.stringify(payload),
+    signal,
+  });
+  const result = await response.json();
+  if (response.headers.get('X-Singleflight') === 'shared') {
+    console.log(`${endpoint} 请求已合并到进行中的相同请求`);
+  }
+  // 调度队列已满时透传Retry-After，调用方按提示时间重试
+  const retryAfter = response.headers.get('Retry-After');
+  const headers: Record<string, string> = retryAfter ? { 'Retry-After': retryAfter } : {};
+  return NextResponse.json(result, { status: response.status, headers });
+}
+
+/**
+ * 查询常驻Python工作进程（如异步任务状态）
+ *
+ * @param endpoint 工作进程的路径，如 /jobs/<session_id>
+ * @returns 工作进程的响应；未配置工作进程时返回null
+ */
+export async function getFromPythonWorker(endpoint: string): Promise<NextResponse | null> {
+  if (!PYTHON_WORKER_URL) {
+    return null;
+  }
+
+  const response = await fetch(`${PYTHON_WORKER_URL.replace(/\/$/, '')}${endpoint}`, { cache: 'no-store' });
+  const result = await response.json();
+  return NextResponse.json(result, { status: response.status });
+}